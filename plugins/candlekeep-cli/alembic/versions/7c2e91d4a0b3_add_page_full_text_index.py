@@ -0,0 +1,35 @@
+"""add_page_full_text_index
+
+Revision ID: 7c2e91d4a0b3
+Revises: f355e5604d5a
+Create Date: 2026-10-19 09:12:44.318207
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c2e91d4a0b3'
+down_revision: Union[str, Sequence[str], None] = 'f355e5604d5a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # FTS5 full-text index of page/chunk text for BM25 ranking.
+    # rowid encodes (book_id << 20) | chunk_index so a book's rows form one rowid range.
+    # Existing books are populated by `candlekeep reindex`.
+    op.execute(
+        "CREATE VIRTUAL TABLE page_fts USING fts5("
+        "content, book_id UNINDEXED, page_number UNINDEXED, char_start UNINDEXED, char_end UNINDEXED, "
+        "tokenize='porter unicode61')"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TABLE page_fts")
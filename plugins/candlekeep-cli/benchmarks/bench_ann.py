@@ -0,0 +1,142 @@
+"""Benchmark IVF recall@10 against query latency on real text.
+
+Splits text files into chunks the way books are indexed (chunk_markdown,
+about 300 words per chunk), embeds them with embed_texts, computes exact
+top-10 neighbours by brute force, then reports recall@10 and median query
+latency of IVFIndex.search() for a range of nprobe values and for the
+default used by `similar`.
+
+Queries are held-out chunks (not in the index) cut to their first
+--query-words words, like a passage or question pasted into `similar`.
+
+Usage:
+    uv run python benchmarks/bench_ann.py [PATH ...] [--max-chunks 10000] [--queries 200]
+
+Each PATH is a text file or a directory searched for *.md, *.txt and *.rst
+files (default: the library's markdown files). Indexing needs at least
+MIN_TRAIN_ROWS (4,096) chunks.
+"""
+
+import argparse
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import Iterator, List
+
+import numpy as np
+
+from candlekeep.index.ann import MIN_TRAIN_ROWS, IVFIndex, default_nprobe
+from candlekeep.index.embeddings import EMBEDDING_DIM, embed_texts
+from candlekeep.index.vector_store import VectorStore
+from candlekeep.utils.config import get_config
+from candlekeep.utils.content_utils import chunk_markdown
+
+TOP_K = 10
+TEXT_SUFFIXES = ('.md', '.txt', '.rst')
+CHUNKS_PER_BOOK = 1000
+
+
+def text_files(paths: List[Path]) -> Iterator[Path]:
+    """Yield text files under the given files and directories, in a stable order."""
+    for path in paths:
+        if path.is_dir():
+            yield from sorted(p for p in path.rglob('*') if p.suffix in TEXT_SUFFIXES and p.is_file())
+        else:
+            yield path
+
+
+def load_chunks(paths: List[Path], limit: int) -> List[str]:
+    """
+    Read up to `limit` distinct retrieval chunks of at least 50 words.
+
+    Repeated chunks (the same README installed twice) are skipped: their
+    tied scores would make recall depend on which copy wins the tie.
+    """
+    chunks = []
+    seen = set()
+    for path in text_files(paths):
+        try:
+            text = path.read_text(encoding='utf-8')
+        except (OSError, UnicodeDecodeError):
+            continue
+        for _, start, end in chunk_markdown(text):
+            words = text[start:end].split()
+            if len(words) >= 50 and " ".join(words) not in seen:
+                seen.add(" ".join(words))
+                chunks.append(text[start:end])
+                if len(chunks) == limit:
+                    return chunks
+    return chunks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("paths", nargs="*", type=Path, help="Text files or directories (default: the library)")
+    parser.add_argument("--max-chunks", type=int, default=10000, help="Chunks to index")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--query-words", type=int, default=50, help="Words taken from each held-out chunk")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    texts = load_chunks(args.paths or [get_config().library_dir], args.max_chunks + args.queries)
+    if len(texts) < MIN_TRAIN_ROWS + args.queries:
+        parser.error(f"found {len(texts):,} chunks; need at least {MIN_TRAIN_ROWS + args.queries:,}")
+
+    rng = np.random.default_rng(0)
+    held_out = set(rng.choice(len(texts), args.queries, replace=False).tolist())
+    queries = embed_texts([" ".join(texts[i].split()[:args.query_words]) for i in sorted(held_out)])
+    vectors = embed_texts([text for i, text in enumerate(texts) if i not in held_out])
+    embed_seconds = time.perf_counter() - start
+
+    total = len(vectors)
+    book_ids = np.arange(total, dtype=np.int32) // CHUNKS_PER_BOOK + 1
+    pages = np.arange(total, dtype=np.int32) % CHUNKS_PER_BOOK + 1
+    refs = np.column_stack((book_ids, pages, np.zeros((total, 2), dtype=np.int32)))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = VectorStore(Path(tmp) / "vectors")
+        for book_id in np.unique(book_ids):
+            rows = book_ids == book_id
+            store.add_book(int(book_id), vectors[rows], [(int(page), 0, 0) for page in pages[rows]])
+
+        index = IVFIndex(Path(tmp) / "ivf", store=store)
+        start = time.perf_counter()
+        index.build(vectors, refs)
+        build_seconds = time.perf_counter() - start
+
+        exact = []
+        exact_timings = []
+        for query in queries:
+            start = time.perf_counter()
+            hits = store.search(query, top_k=TOP_K)
+            exact_timings.append((time.perf_counter() - start) * 1000)
+            exact.append({(h["book_id"], h["page"]) for h in hits})
+
+        nlist = index.meta['nlist']
+        print(f"Corpus: {total:,} chunks (dim {EMBEDDING_DIM}), {nlist:,} clusters; {len(queries)} queries")
+        print(f"Embed: {embed_seconds:.1f}s, build (train + assign + write): {build_seconds:.1f}s")
+        print(f"Exact search: median {statistics.median(exact_timings):.1f} ms")
+        print()
+        print(f"{'nprobe':>13} {'recall@10':>10} {'median ms':>10} {'p95 ms':>8}")
+
+        default = default_nprobe(nlist)
+        probes = sorted({1, 2, 4, 8, 16, 32, 64, 128, default})
+        for nprobe in (n for n in probes if n <= nlist):
+            recalls = []
+            timings = []
+            for query, truth in zip(queries, exact):
+                start = time.perf_counter()
+                hits = index.search(query, top_k=TOP_K, nprobe=nprobe)
+                timings.append((time.perf_counter() - start) * 1000)
+                recalls.append(len(truth & {(h["book_id"], h["page"]) for h in hits}) / TOP_K)
+            timings.sort()
+            label = f"{nprobe} (default)" if nprobe == default else str(nprobe)
+            print(
+                f"{label:>13} {statistics.mean(recalls):>10.3f} "
+                f"{statistics.median(timings):>10.2f} {timings[int(0.95 * (len(timings) - 1))]:>8.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
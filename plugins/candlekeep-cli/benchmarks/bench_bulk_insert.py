@@ -0,0 +1,187 @@
+"""Benchmark writing a book's image, page and TOC rows: ORM objects vs Core bulk inserts.
+
+Creates a scratch SQLite database per run in a temporary directory and
+times three ways of writing the same synthetic rows in one transaction:
+ORM objects (session.add_all), ORM bulk mappings
+(session.bulk_insert_mappings) and the Core path `add-pdf` uses
+(db.bulk.insert_rows; utils.toc_utils.insert_toc_entries for the TOC).
+
+Usage:
+    uv run python benchmarks/bench_bulk_insert.py [--images 50000] [--pages 5000] [--toc 5000]
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, List
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from candlekeep.db.bulk import insert_rows
+from candlekeep.db.models import Base, Book, BookImage, BookPage, SourceType, TocEntry
+from candlekeep.utils.toc_utils import compute_toc_spans, insert_toc_entries
+
+METHODS = ('orm', 'mappings', 'core')
+
+
+def image_rows(book_id: int, count: int) -> List[dict]:
+    """Rows shaped like parsers.images.book_image_rows output."""
+    return [
+        {
+            'book_id': book_id,
+            'page_number': index // 10 + 1,
+            'printed_page_number': index // 10 + 1,
+            'xref': 0,
+            'file_path': f"/library/images/{book_id}/book.pdf-{index // 10}-{index % 10}.png",
+            'width': 800,
+            'height': 600,
+            'format': 'png',
+            'colorspace': 'DeviceRGB',
+            'has_transparency': False,
+            'file_size': 120_000,
+            'preview_path': f"/library/images/{book_id}/book.pdf-{index // 10}-{index % 10}.preview.png",
+            'preview_width': 256,
+            'preview_height': 192,
+            'preview_file_size': 18_000,
+            'phash': index,
+        }
+        for index in range(count)
+    ]
+
+
+def page_rows(book_id: int, count: int) -> List[dict]:
+    """Rows shaped like utils.content_utils.compute_page_layout output."""
+    return [
+        {
+            'book_id': book_id,
+            'page_number': page,
+            'printed_page_number': page,
+            'char_start': page * 3000,
+            'char_end': page * 3000 + 2900,
+            'byte_start': page * 3000,
+            'byte_end': page * 3000 + 2900,
+            'word_count': 480,
+            'char_count': 2900,
+            'token_count': 725,
+            'image_count': 1,
+            'has_table': False,
+            'has_code': False,
+        }
+        for page in range(1, count + 1)
+    ]
+
+
+def synthetic_toc(count: int) -> List[dict]:
+    """Parser-style TOC: chapters of sections of subsections."""
+    return [
+        {'level': 1 + (index % 3), 'title': f"Section {index}", 'page': index + 1}
+        for index in range(count)
+    ]
+
+
+def write_toc_orm(session: Session, book_id: int, toc: List[dict]):
+    """TocEntry objects with parent relationships, as books were added before the Core path."""
+    rows: List[TocEntry] = []
+    for span in compute_toc_spans(toc, len(toc)):
+        rows.append(TocEntry(
+            book_id=book_id,
+            ordinal=span['ordinal'],
+            level=span['level'],
+            title=span['title'],
+            start_page=span['start_page'],
+            end_page=span['end_page'],
+            parent=rows[span['parent']] if span['parent'] is not None else None,
+        ))
+    session.add_all(rows)
+
+
+def write_toc_mappings(session: Session, book_id: int, toc: List[dict]):
+    """ORM bulk mappings need IDs assigned up front for parent links, like the Core path."""
+    spans = compute_toc_spans(toc, len(toc))
+    session.bulk_insert_mappings(TocEntry, [
+        {
+            'id': span['ordinal'] + 1,
+            'book_id': book_id,
+            'parent_id': span['parent'] + 1 if span['parent'] is not None else None,
+            'ordinal': span['ordinal'],
+            'level': span['level'],
+            'title': span['title'],
+            'start_page': span['start_page'],
+            'end_page': span['end_page'],
+        }
+        for span in spans
+    ])
+
+
+def writer(method: str, model, rows: List[dict]) -> Callable[[Session, int], None]:
+    """Write rows of a model's table by one of METHODS."""
+    def write(session: Session, book_id: int):
+        if method == 'orm':
+            session.add_all([model(**row) for row in rows])
+        elif method == 'mappings':
+            session.bulk_insert_mappings(model, rows)
+        else:
+            insert_rows(session, model, rows)
+    return write
+
+
+def timed_write(directory: Path, name: str, write: Callable[[Session, int], None]) -> float:
+    """Seconds to write and commit in a fresh database (schema creation excluded)."""
+    engine = create_engine(f"sqlite:///{directory / name}.db")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    book = Book(
+        title="Benchmark", original_file_path="book.pdf", markdown_file_path="book.md",
+        source_type=SourceType.PDF, file_hash=name,
+    )
+    session.add(book)
+    session.commit()
+
+    start = time.perf_counter()
+    write(session, book.id)
+    session.commit()
+    seconds = time.perf_counter() - start
+
+    session.close()
+    engine.dispose()
+    return seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--images", type=int, default=50_000)
+    parser.add_argument("--pages", type=int, default=5_000)
+    parser.add_argument("--toc", type=int, default=5_000, help="TOC entries")
+    args = parser.parse_args()
+
+    images = image_rows(1, args.images)
+    pages = page_rows(1, args.pages)
+    toc = synthetic_toc(args.toc)
+    tables = [
+        ('book_images', args.images, {method: writer(method, BookImage, images) for method in METHODS}),
+        ('book_pages', args.pages, {method: writer(method, BookPage, pages) for method in METHODS}),
+        ('toc_entries', args.toc, {
+            'orm': lambda session, book_id: write_toc_orm(session, book_id, toc),
+            'mappings': lambda session, book_id: write_toc_mappings(session, book_id, toc),
+            'core': lambda session, book_id: insert_toc_entries(session, book_id, toc, len(toc)),
+        }),
+    ]
+
+    print(f"{'Table':<12} {'Rows':>8}" + "".join(f" {method + ' rows/s':>16}" for method in METHODS) + f" {'Core vs ORM':>12}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for table, count, writers in tables:
+            rates = {
+                method: count / timed_write(Path(tmp), f"{table}-{method}", write)
+                for method, write in writers.items()
+            }
+            print(
+                f"{table:<12} {count:>8,}"
+                + "".join(f" {rates[method]:>16,.0f}" for method in METHODS)
+                + f" {rates['core'] / rates['orm']:>11.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
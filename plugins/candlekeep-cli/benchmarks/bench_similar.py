@@ -0,0 +1,68 @@
+"""Benchmark brute-force semantic search on a synthetic corpus.
+
+Builds a synthetic vector store (default: 1,000 books x 1,000 chunks = 1M
+chunks) in a temporary directory and times VectorStore.search().
+
+Usage:
+    uv run python benchmarks/bench_similar.py [--books 1000] [--chunks 1000] [--queries 20]
+"""
+
+import argparse
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from candlekeep.index.embeddings import EMBEDDING_DIM, normalize_rows
+from candlekeep.index.vector_store import VectorStore
+
+
+def build_corpus(store: VectorStore, books: int, chunks: int, rng: np.random.Generator):
+    """Fill the store with random unit vectors."""
+    chunk_table = [(page, 0, 0) for page in range(1, chunks + 1)]
+    for book_id in range(1, books + 1):
+        vectors = normalize_rows(rng.standard_normal((chunks, EMBEDDING_DIM), dtype=np.float32))
+        store.add_book(book_id, vectors, chunk_table)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--books", type=int, default=1000)
+    parser.add_argument("--chunks", type=int, default=1000, help="Chunks per book")
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--top-k", type=int, default=10)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        store = VectorStore(Path(tmp))
+
+        start = time.perf_counter()
+        build_corpus(store, args.books, args.chunks, rng)
+        build_seconds = time.perf_counter() - start
+
+        queries = normalize_rows(rng.standard_normal((args.queries, EMBEDDING_DIM), dtype=np.float32))
+
+        # First query warms the page cache; report it separately
+        start = time.perf_counter()
+        store.search(queries[0], top_k=args.top_k)
+        cold_ms = (time.perf_counter() - start) * 1000
+
+        timings = []
+        for query in queries[1:]:
+            start = time.perf_counter()
+            store.search(query, top_k=args.top_k)
+            timings.append((time.perf_counter() - start) * 1000)
+
+    total = args.books * args.chunks
+    print(f"Corpus: {args.books:,} books x {args.chunks:,} chunks = {total:,} vectors (dim {EMBEDDING_DIM})")
+    print(f"Build: {build_seconds:.1f}s")
+    print(f"First query: {cold_ms:.1f} ms")
+    print(f"Warm query: median {statistics.median(timings):.1f} ms, max {max(timings):.1f} ms")
+    print(f"Throughput: {total / (statistics.median(timings) / 1000) / 1e6:.1f}M vectors/sec")
+
+
+if __name__ == "__main__":
+    main()
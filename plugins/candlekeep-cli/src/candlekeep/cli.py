@@ -1,16 +1,65 @@
 """CandleKeep CLI - Main entry point."""
 
+import importlib
+
 import typer
 from rich.console import Console
+from typer.core import TyperGroup
 
 from .commands.init import init_command
-from .commands.add import add_pdf, add_md
-from .commands.query import list_books, get_toc, get_pages
+
+# Module defining each command, in help order. Modules are imported when
+# their command runs, so each invocation only loads the libraries it needs
+# (`list` served from the catalog snapshot never imports SQLAlchemy).
+COMMAND_MODULES = {
+    # Add commands
+    "add-pdf": ".commands.add",
+    "add-md": ".commands.add",
+    # Query commands
+    "list": ".commands.query",
+    "toc": ".commands.query",
+    "pages": ".commands.query",
+    "images": ".commands.query",
+    "batch": ".commands.batch",
+    "warm": ".commands.query",
+    # Management commands
+    "remove": ".commands.remove",
+    # Search commands
+    "similar": ".commands.search",
+    "context": ".commands.search",
+    "toc-search": ".commands.search",
+    "grep": ".commands.search",
+    "locate": ".commands.search",
+    "related": ".commands.search",
+    "similar-images": ".commands.search",
+    # Maintenance commands
+    "reindex": ".commands.maintenance",
+    "materialize": ".commands.maintenance",
+    "strip-boilerplate": ".commands.maintenance",
+    "compact": ".commands.maintenance",
+    "dupes": ".commands.maintenance",
+    "stats": ".commands.maintenance",
+}
+
+
+class LazyGroup(TyperGroup):
+    """Command group that imports a command's module on first use."""
+
+    def list_commands(self, ctx):
+        return super().list_commands(ctx) + [name for name in COMMAND_MODULES if name not in self.commands]
+
+    def get_command(self, ctx, cmd_name):
+        if cmd_name not in self.commands and cmd_name in COMMAND_MODULES:
+            module = importlib.import_module(COMMAND_MODULES[cmd_name], __package__)
+            self.commands[cmd_name] = typer.main.get_group(module.app).commands[cmd_name]
+        return super().get_command(ctx, cmd_name)
+
 
 app = typer.Typer(
     name="candlekeep",
     help="A personal library that brings the wisdom of books to your AI agents",
     add_completion=False,
+    cls=LazyGroup,
 )
 
 console = Console()
@@ -22,16 +71,6 @@ def init():
     init_command()
 
 
-# Register add commands
-app.command(name="add-pdf")(add_pdf)
-app.command(name="add-md")(add_md)
-
-# Register query commands
-app.command(name="list")(list_books)
-app.command(name="toc")(get_toc)
-app.command(name="pages")(get_pages)
-
-
 @app.callback()
 def main():
     """CandleKeep - Your personal library for AI agents."""
@@ -2,7 +2,7 @@
 
 import shutil
 from pathlib import Path
-from typing import Optional, List
+from typing import Callable, Optional, List, Tuple
 
 import typer
 from rich.console import Console
@@ -11,111 +11,236 @@ from rich.panel import Panel
 from rich.table import Table
 from sqlalchemy.exc import IntegrityError
 
+from ..db.bulk import insert_rows
 from ..db.models import Book, BookImage, SourceType
+from ..db.page_store import register_lazy_pages
 from ..db.session import get_db_manager
+from ..index.minhash import (
+    DEFAULT_DUPLICATE_THRESHOLD,
+    compute_signature,
+    find_near_duplicates,
+    markdown_signature,
+    sample_page_indices,
+)
+from ..index.pipeline import index_book, remove_book_indexes
+from ..parsers.engines import ENGINES, PAGE_TIME_BUDGET, engine_runs
+from ..parsers.images import (
+    DEFAULT_IMAGE_DPI,
+    DEFAULT_IMAGE_FORMAT,
+    DEFAULT_IMAGE_PREVIEWS,
+    IMAGE_FORMATS,
+    SKIP_DECORATIVE_IMAGES,
+    ImageRenderer,
+    book_image_rows,
+    image_bytes_saved,
+    skipped_image_counts,
+)
 from ..parsers.pdf import parse_pdf, PDFParser
 from ..parsers.markdown import parse_markdown
 from ..utils.config import get_config
 from ..utils.file_utils import sanitize_filename, ensure_directory, get_unique_filename
 from ..utils.hash_utils import compute_file_hash
-from ..utils.image_utils import create_book_image_directory, generate_image_filename
+from ..utils.content_utils import label_runs
+from ..utils.image_utils import cleanup_book_images, create_book_image_directory
+from ..utils.tag_utils import get_or_create_tags
+from ..utils.toc_utils import insert_toc_entries
 
 console = Console()
 app = typer.Typer()
 
 
-def _process_and_save_images(
+def _convert_with_images(
     book_id: int,
     pdf_path: Path,
     markdown_path: Path,
-    progress_task_id=None,
-    progress_obj=None
-) -> tuple[int, str]:
+    engine: str = "layout",
+    page_time_budget: float = PAGE_TIME_BUDGET,
+    image_dpi: int = DEFAULT_IMAGE_DPI,
+    image_format: str = DEFAULT_IMAGE_FORMAT,
+    image_workers: Optional[int] = None,
+    image_previews: bool = DEFAULT_IMAGE_PREVIEWS,
+    skip_decorative: bool = SKIP_DECORATIVE_IMAGES,
+) -> dict:
     """
-    Extract images from PDF, save them, create database records, and update markdown.
+    Convert a newly added PDF book to markdown, rendering its images in parallel.
+
+    The book is converted once, with image regions recorded rather than
+    rendered; the regions are then rendered in a process pool and written
+    by a thread pool (see parsers.images), compactly encoded and with
+    preview variants if asked for; blank, decorative and repeated images
+    are skipped unless skip_decorative is off. Writes the markdown file,
+    creates the BookImage rows in one bulk insert, and records the word
+    count, conversion engines, page labels and image count on the book.
 
     Args:
         book_id: ID of the book
         pdf_path: Path to the original PDF
-        markdown_path: Path to the saved markdown file
-        progress_task_id: Optional progress task ID for status updates
-        progress_obj: Optional progress object for status updates
+        markdown_path: Path to the book's markdown file
+        engine: Preferred conversion engine (see PDFParser.convert_to_markdown)
+        page_time_budget: Seconds a page may take with the layout engine
+        image_dpi: Image resolution
+        image_format: Image file format (see parsers.images.IMAGE_FORMATS)
+        image_workers: Image render processes (default: one per CPU)
+        image_previews: Also write preview variants of larger images
+        skip_decorative: Leave out blank and much repeated images
 
     Returns:
-        Tuple of (image_count, updated_markdown_content)
+        Dictionary with markdown_content, word_count, conversion_engines,
+        reused_pages, page_labels, boilerplate, image_count, image_seconds
+        (time spent rendering and writing images), image_bytes_saved
+        ((bytes saved, bytes as full-color PNGs) by the compact encodings)
+        and images_skipped (see parsers.images.skipped_image_counts)
+
+    Raises:
+        ValueError: If the PDF can't be converted
+    """
+    image_dir = create_book_image_directory(book_id)
+    renderer = ImageRenderer(
+        str(pdf_path), image_dpi, image_format, image_workers,
+        previews=image_previews, skip_decorative=skip_decorative,
+    )
+    with PDFParser(pdf_path) as parser:
+        markdown = parser.convert_to_markdown(
+            extract_images=True,
+            image_path=image_dir,
+            dpi=image_dpi,
+            size_limit=0.05,
+            engine=engine,
+            page_time_budget=page_time_budget,
+            image_format=renderer.naming_format,
+            image_renderer=renderer,
+        )
+        result = {
+            'word_count': PDFParser.count_words(markdown),
+            'conversion_engines': engine_runs(parser.page_engines),
+            'reused_pages': parser.reused_pages,
+            'page_labels': label_runs(parser.page_labels) or None,
+            'boilerplate': parser.boilerplate,
+        }
+        page_labels = parser.page_labels
+    if renderer.error:
+        console.print(f"\n[yellow]Warning:[/yellow] Image extraction failed: {renderer.error}")
+        console.print("[yellow]Book added successfully, but without images.[/yellow]")
+
+    markdown = PDFParser.convert_image_paths_to_absolute(markdown, book_id, image_dir)
+    with open(markdown_path, 'w', encoding='utf-8') as f:
+        f.write(markdown)
+    rows = book_image_rows(book_id, markdown, renderer.rendered, page_labels)
+
+    db_manager = get_db_manager()
+    with db_manager.get_session() as session:
+        insert_rows(session, BookImage, rows)
+        book = session.query(Book).filter(Book.id == book_id).first()
+        book.word_count = result['word_count']
+        book.conversion_engines = result['conversion_engines']
+        book.page_labels = result['page_labels']
+        book.image_count = len(rows)
+        book.has_images = bool(rows)
+
+    result.update({
+        'markdown_content': markdown,
+        'image_count': len(rows),
+        'image_seconds': renderer.seconds,
+        'image_bytes_saved': image_bytes_saved(renderer.rendered),
+        'images_skipped': skipped_image_counts(renderer.rendered),
+    })
+    return result
+
+
+def _build_search_index(book_id: int, markdown_text: str) -> int:
+    """
+    Build the derived search indexes for a newly added book.
+
+    Args:
+        book_id: ID of the book
+        markdown_text: Full markdown content of the book
+
+    Returns:
+        Number of chunks indexed (0 if indexing failed)
     """
     try:
-        config = get_config()
+        return index_book(book_id, markdown_text)
+    except Exception as e:
+        console.print(f"\n[yellow]Warning:[/yellow] Search indexing failed: {e}")
+        console.print("[yellow]Book added successfully; run 'candlekeep reindex' to retry.[/yellow]")
+        return 0
 
-        # Create image directory for this book
-        image_dir = create_book_image_directory(book_id)
-
-        # Extract images using PDFParser with image extraction enabled
-        with PDFParser(pdf_path) as parser:
-            # Convert to markdown with image extraction
-            markdown_with_images = parser.convert_to_markdown(
-                extract_images=True,
-                image_path=image_dir,
-                dpi=150,
-                size_limit=0.05
-            )
 
-            # Extract image metadata
-            images_metadata = parser.extract_image_metadata()
+def _discard_book(book_id: int, markdown_path: Path, original_copy_path: Optional[Path]):
+    """
+    Undo a book that was inserted but not fully added: its row (with the
+    rows that cascade from it), indexes, markdown, stored original and images.
 
-        # Convert relative image paths to absolute in markdown
-        markdown_absolute = PDFParser.convert_image_paths_to_absolute(
-            markdown_with_images,
-            book_id,
-            image_dir
-        )
+    Args:
+        book_id: ID of the book
+        markdown_path: The book's markdown file
+        original_copy_path: Copy of the original made for the library, if any
+    """
+    with get_db_manager().get_session() as session:
+        book = session.get(Book, book_id)
+        if book is not None:
+            session.delete(book)
+    remove_book_indexes(book_id)
+    markdown_path.unlink(missing_ok=True)
+    if original_copy_path is not None:
+        original_copy_path.unlink(missing_ok=True)
+    cleanup_book_images(book_id)
+
+
+def _find_near_duplicate_books(signature_source: Callable, threshold: float) -> List[Tuple[int, str, float]]:
+    """
+    Find library books that are probably the same text as the one being added.
 
-        # Create BookImage database records
-        db_manager = get_db_manager()
-        image_count = 0
-
-        with db_manager.get_session() as session:
-            for img_meta in images_metadata:
-                # Generate filename for this image
-                filename = generate_image_filename(
-                    page=img_meta['page_number'],
-                    index=image_count,  # Use sequential index
-                    format=img_meta['format']
-                )
-
-                # Create BookImage record
-                book_image = BookImage(
-                    book_id=book_id,
-                    page_number=img_meta['page_number'],
-                    printed_page_number=img_meta.get('printed_page_number'),  # May be None
-                    xref=img_meta['xref'],
-                    file_path=str(image_dir / filename),
-                    width=img_meta['width'],
-                    height=img_meta['height'],
-                    format=img_meta['format'],
-                    colorspace=img_meta.get('colorspace'),
-                    has_transparency=img_meta.get('has_transparency', False),
-                    file_size=img_meta.get('file_size')
-                )
-                session.add(book_image)
-                image_count += 1
-
-            # Update book's image statistics
-            book = session.query(Book).filter(Book.id == book_id).first()
-            if book:
-                book.image_count = image_count
-                book.has_images = image_count > 0
-
-        # Update the markdown file with absolute paths
-        with open(markdown_path, 'w', encoding='utf-8') as f:
-            f.write(markdown_absolute)
-
-        return image_count, markdown_absolute
+    Args:
+        signature_source: Callable returning the new book's MinHash signature (or None)
+        threshold: Minimum estimated Jaccard similarity
 
+    Returns:
+        (book_id, title, similarity) for each near-duplicate, most similar first
+    """
+    try:
+        signature = signature_source()
+        if signature is None:
+            return []
+        matches = find_near_duplicates(signature, threshold)
     except Exception as e:
-        console.print(f"\n[yellow]Warning:[/yellow] Image extraction failed: {e}")
-        console.print("[yellow]Book added successfully, but without images.[/yellow]")
-        return 0, ""
+        console.print(f"\n[yellow]Warning:[/yellow] Near-duplicate check failed: {e}")
+        return []
+
+    if not matches:
+        return []
+
+    with get_db_manager().get_session() as session:
+        titles = dict(
+            session.query(Book.id, Book.title).filter(Book.id.in_([book_id for book_id, _ in matches]))
+        )
+    return [(book_id, titles.get(book_id, 'Untitled'), similarity) for book_id, similarity in matches]
+
+
+def _report_near_duplicates(matches: List[Tuple[int, str, float]], skip: bool, progress: Progress):
+    """
+    Warn about near-duplicates, or stop the add when skipping them.
+
+    Raises:
+        typer.Exit: If skip is set and there is at least one near-duplicate
+    """
+    if not matches:
+        return
+
+    if skip:
+        progress.stop()
+        for book_id, title, similarity in matches:
+            console.print(f"\n[yellow]Near-duplicate already exists:[/yellow] {title} (ID: {book_id}, {similarity:.0%} similar)")
+        raise typer.Exit(0)
+
+    for book_id, title, similarity in matches:
+        console.print(f"[yellow]Warning:[/yellow] Possible near-duplicate of {title} (ID: {book_id}, {similarity:.0%} similar)")
+
+
+def _pdf_signature(pdf_path: Path):
+    """Build a MinHash signature from a sample of the PDF's text layer."""
+    with PDFParser(pdf_path) as parser:
+        return compute_signature(parser.extract_page_texts(sample_page_indices(parser.doc.page_count)))
 
 
 @app.command("add-pdf")
@@ -126,11 +251,56 @@ def add_pdf(
     keep_original: bool = typer.Option(True, "--keep-original/--no-keep-original", help="Keep original PDF file"),
     title: Optional[str] = typer.Option(None, "--title", help="Override extracted title"),
     author: Optional[str] = typer.Option(None, "--author", help="Override extracted author"),
+    duplicate_threshold: float = typer.Option(
+        DEFAULT_DUPLICATE_THRESHOLD, "--duplicate-threshold", min=0.0, max=1.0,
+        help="Similarity (0-1) above which an existing book counts as a near-duplicate",
+    ),
+    skip_duplicates: bool = typer.Option(False, "--skip-duplicates", help="Don't add books that are near-duplicates"),
+    engine: str = typer.Option(
+        "layout", "--engine",
+        help="Conversion engine: layout (headings, tables, images) or fast (plain text, for huge or scanned PDFs)",
+    ),
+    page_timeout: float = typer.Option(
+        PAGE_TIME_BUDGET, "--page-timeout", min=0.1,
+        help="Seconds a page may take with the layout engine before it is converted as plain text",
+    ),
+    lazy: bool = typer.Option(
+        False, "--lazy",
+        help="Register the book now and convert pages when first read (run 'materialize' to finish)",
+    ),
+    image_dpi: int = typer.Option(DEFAULT_IMAGE_DPI, "--image-dpi", min=36, max=600, help="Resolution of extracted images"),
+    image_format: str = typer.Option(
+        DEFAULT_IMAGE_FORMAT, "--image-format",
+        help="Image file format: auto (JPEG for photos, PNG otherwise), png or jpg",
+    ),
+    image_workers: Optional[int] = typer.Option(
+        None, "--image-workers", min=1, help="Processes rendering images (default: one per CPU)",
+    ),
+    image_previews: bool = typer.Option(
+        DEFAULT_IMAGE_PREVIEWS, "--image-previews/--no-image-previews",
+        help="Also write small preview versions of larger images",
+    ),
+    keep_decorative_images: bool = typer.Option(
+        False, "--keep-decorative-images",
+        help="Keep blank images, images repeated on many pages (logos, bullets) and repeated copies",
+    ),
 ):
     """
     Add a PDF book to the CandleKeep library.
 
     The PDF will be converted to markdown and metadata will be extracted and stored.
+    Pages that take longer than --page-timeout (or too much memory) to convert
+    are converted as plain text instead, so adding a book takes bounded time.
+
+    With --lazy, only metadata, TOC and page labels are stored up front: pages
+    are converted the first time they are read, and the book is searchable
+    once 'candlekeep materialize' has converted the rest.
+
+    Images are rendered in parallel after the conversion (--image-workers
+    processes) at --image-dpi, as --image-format files, each larger one
+    with a small preview unless --no-image-previews is given. Blank images
+    and images repeated on many pages (logos, bullets, backgrounds) are
+    left out unless --keep-decorative-images is given.
     """
     try:
         config = get_config()
@@ -145,6 +315,20 @@ def add_pdf(
             console.print(f"[red]Error:[/red] File must be a PDF, got: {file_path.suffix}")
             raise typer.Exit(1)
 
+        if engine not in ENGINES:
+            console.print(f"[red]Error:[/red] Unknown engine: {engine}. Use one of: {', '.join(ENGINES)}")
+            raise typer.Exit(1)
+        if image_format not in IMAGE_FORMATS:
+            console.print(f"[red]Error:[/red] Unknown image format: {image_format}. Use one of: {', '.join(IMAGE_FORMATS)}")
+            raise typer.Exit(1)
+
+        if lazy and not keep_original:
+            console.print("[red]Error:[/red] --lazy converts pages from the original PDF, so it can't be used with --no-keep-original.")
+            raise typer.Exit(1)
+        if lazy and engine == 'fast':
+            console.print("[red]Error:[/red] --lazy converts with the layout engine; the fast engine converts a whole book in seconds anyway.")
+            raise typer.Exit(1)
+
         with Progress(
             SpinnerColumn(),
             TextColumn("[progress.description]{task.description}"),
@@ -166,12 +350,17 @@ def add_pdf(
                     console.print(f"\n[yellow]Book already exists:[/yellow] {existing.title} (ID: {existing.id})")
                     raise typer.Exit(0)
 
+            # Other scans, editions, or exports of a book differ byte-wise but
+            # share most of their text; the PDF text layer is enough to tell
+            near_duplicates = _find_near_duplicate_books(lambda: _pdf_signature(file_path), duplicate_threshold)
+            _report_near_duplicates(near_duplicates, skip_duplicates, progress)
+
             progress.update(task, completed=True)
 
-            # Step 3: Parse PDF and extract metadata
+            # Step 3: Parse PDF and extract metadata (converted once the book has an ID for its images)
             task = progress.add_task("[cyan]Parsing PDF and extracting metadata...", total=None)
             try:
-                metadata = parse_pdf(file_path, convert_to_md=True)
+                metadata = parse_pdf(file_path, convert_to_md=False)
             except Exception as e:
                 progress.stop()
                 console.print(f"\n[red]Error parsing PDF:[/red] {e}")
@@ -198,10 +387,10 @@ def add_pdf(
             safe_filename = sanitize_filename(metadata['title'])
             md_filepath = get_unique_filename(config.library_dir, safe_filename, '.md')
 
-            # Write markdown content
+            # Reserve the markdown file (written by the conversion; lazy books keep it empty until materialized)
             ensure_directory(config.library_dir)
             with open(md_filepath, 'w', encoding='utf-8') as f:
-                f.write(metadata['markdown_content'])
+                f.write('')
 
             progress.update(task, completed=True)
 
@@ -233,6 +422,10 @@ def add_pdf(
                 word_count=metadata.get('word_count'),
                 chapter_count=metadata.get('chapter_count', 0),
                 table_of_contents=metadata.get('table_of_contents'),
+                conversion_engines=metadata.get('conversion_engines'),
+                lazy_conversion=lazy,
+                toc_synthesized=metadata.get('toc_synthesized', False),
+                page_labels=metadata.get('page_labels'),
                 subject=metadata.get('subject'),
                 keywords=metadata.get('keywords'),
                 category=category,
@@ -242,26 +435,48 @@ def add_pdf(
 
             try:
                 with db_manager.get_session() as session:
+                    book.tag_objects = get_or_create_tags(session, tag_list)
                     session.add(book)
                     session.flush()  # Get the ID
                     book_id = book.id
+                    insert_toc_entries(session, book_id, metadata.get('table_of_contents'), metadata.get('page_count'))
+                    if lazy:
+                        register_lazy_pages(session, book_id, original_path)
 
                 progress.update(task, completed=True)
 
-                # Step 7: Extract and save images
-                task = progress.add_task("[cyan]Extracting images from PDF...", total=None)
-                image_count, _ = _process_and_save_images(
-                    book_id=book_id,
-                    pdf_path=file_path,
-                    markdown_path=md_filepath,
-                    progress_task_id=task,
-                    progress_obj=progress
-                )
-                progress.update(task, completed=True)
-
-                # Update metadata with image count for display
-                metadata['image_count'] = image_count
-                metadata['has_images'] = image_count > 0
+                # Lazy books get their markdown, images and search indexes from `materialize`
+                if not lazy:
+                    try:
+                        # Step 7: Convert to markdown and render images
+                        task = progress.add_task("[cyan]Converting to markdown and rendering images...", total=None)
+                        converted = _convert_with_images(
+                            book_id=book_id,
+                            pdf_path=file_path,
+                            markdown_path=md_filepath,
+                            engine=engine,
+                            page_time_budget=page_timeout,
+                            image_dpi=image_dpi,
+                            image_format=image_format,
+                            image_workers=image_workers,
+                            image_previews=image_previews,
+                            skip_decorative=not keep_decorative_images,
+                        )
+                        metadata.update(converted)
+                        progress.update(task, completed=True)
+
+                        # Step 8: Build search indexes
+                        task = progress.add_task("[cyan]Building search index...", total=None)
+                        _build_search_index(book_id, metadata['markdown_content'])
+                        progress.update(task, completed=True)
+                    except BaseException as e:
+                        # Failed, crashed or interrupted: a half-added book would block adding it again
+                        progress.stop()
+                        _discard_book(book_id, md_filepath, original_copy_path if keep_original else None)
+                        if isinstance(e, ValueError):
+                            console.print(f"\n[red]Error converting PDF:[/red] {e}")
+                            raise typer.Exit(1)
+                        raise
 
             except IntegrityError as e:
                 progress.stop()
@@ -283,6 +498,16 @@ def add_pdf(
         raise typer.Exit(1)
 
 
+def _describe_engines(runs: List[List]) -> str:
+    """Summarize per-page conversion engine runs, e.g. "layout (3 pages as fast)"."""
+    pages: dict = {}
+    for first, last, name in runs:
+        pages[name] = pages.get(name, 0) + last - first + 1
+    main = max(pages, key=pages.get)
+    others = [f"{count} pages as {name}" for name, count in pages.items() if name != main]
+    return f"{main} ({', '.join(others)})" if others else main
+
+
 def _display_success(
     book_id: int,
     metadata: dict,
@@ -306,10 +531,45 @@ def _display_success(
     if tags:
         table.add_row("Tags", ", ".join(tags))
     table.add_row("Pages", str(metadata.get('page_count', 'N/A')))
-    table.add_row("Words", f"{metadata.get('word_count', 0):,}")
-    table.add_row("Chapters", str(metadata.get('chapter_count', 0)))
-    if metadata.get('image_count', 0) > 0:
-        table.add_row("Images", str(metadata.get('image_count', 0)))
+    if 'word_count' in metadata:
+        table.add_row("Words", f"{metadata['word_count']:,}")
+    chapters = str(metadata.get('chapter_count', 0))
+    if metadata.get('toc_synthesized'):
+        chapters += " (synthesized from headings, the PDF has no outline)"
+    table.add_row("Chapters", chapters)
+    skipped = metadata.get('images_skipped') or {}
+    if metadata.get('image_count', 0) > 0 or any(skipped.values()):
+        images = str(metadata.get('image_count', 0))
+        if metadata.get('image_seconds'):
+            rate = metadata['image_count'] / metadata['image_seconds']
+            images += f" (rendered in {metadata['image_seconds']:.1f}s, {rate:.1f} images/s)"
+        saved, baseline = metadata.get('image_bytes_saved', (0, 0))
+        if saved > 0:
+            images += f", {saved / 1024:,.0f} KB ({saved / baseline:.0%}) smaller than full-color PNGs"
+        notes = []
+        left_out = skipped.get('blank', 0) + skipped.get('decorative', 0)
+        if left_out:
+            notes.append(f"{left_out} decorative left out")
+        if skipped.get('copy'):
+            notes.append(f"{skipped['copy']} repeated (linked to the first copy)")
+        if notes:
+            images += "; " + ", ".join(notes)
+        table.add_row("Images", images)
+    if metadata.get('conversion_engines'):
+        table.add_row("Conversion", _describe_engines(metadata['conversion_engines']))
+        if metadata.get('reused_pages'):
+            table.add_row(
+                "Reused",
+                f"{metadata['reused_pages']} of {metadata.get('page_count')} pages (unchanged since an earlier conversion)",
+            )
+        if metadata.get('boilerplate', {}).get('lines_removed'):
+            table.add_row(
+                "Boilerplate",
+                f"{metadata['boilerplate']['lines_removed']:,} header/footer lines removed "
+                f"(~{metadata['boilerplate']['tokens_saved']:,} tokens saved)",
+            )
+    elif 'markdown_content' not in metadata:
+        table.add_row("Conversion", "lazy (pages are converted when first read; run 'candlekeep materialize' to finish)")
     table.add_row("Markdown", str(md_filepath))
 
     panel = Panel(
@@ -329,6 +589,11 @@ def add_md(
     tags: Optional[str] = typer.Option(None, "--tags", "-t", help="Comma-separated tags"),
     title: Optional[str] = typer.Option(None, "--title", help="Override extracted title"),
     author: Optional[str] = typer.Option(None, "--author", help="Override extracted author"),
+    duplicate_threshold: float = typer.Option(
+        DEFAULT_DUPLICATE_THRESHOLD, "--duplicate-threshold", min=0.0, max=1.0,
+        help="Similarity (0-1) above which an existing book counts as a near-duplicate",
+    ),
+    skip_duplicates: bool = typer.Option(False, "--skip-duplicates", help="Don't add books that are near-duplicates"),
 ):
     """
     Add a markdown book to the CandleKeep library.
@@ -370,6 +635,12 @@ def add_md(
                     console.print(f"\n[yellow]Book already exists:[/yellow] {existing.title} (ID: {existing.id})")
                     raise typer.Exit(0)
 
+            near_duplicates = _find_near_duplicate_books(
+                lambda: markdown_signature(file_path.read_text(encoding='utf-8')),
+                duplicate_threshold,
+            )
+            _report_near_duplicates(near_duplicates, skip_duplicates, progress)
+
             progress.update(task, completed=True)
 
             # Step 3: Parse markdown and extract metadata
@@ -428,6 +699,7 @@ def add_md(
                 word_count=metadata.get('word_count'),
                 chapter_count=metadata.get('chapter_count', 0),
                 table_of_contents=metadata.get('table_of_contents'),
+                conversion_engines=metadata.get('conversion_engines'),
                 subject=metadata.get('subject'),
                 keywords=metadata.get('keywords'),
                 category=category or metadata.get('category'),
@@ -440,12 +712,24 @@ def add_md(
 
             try:
                 with db_manager.get_session() as session:
+                    book.tag_objects = get_or_create_tags(session, tag_list)
                     session.add(book)
                     session.flush()  # Get the ID
                     book_id = book.id
+                    insert_toc_entries(session, book_id, metadata.get('table_of_contents'), metadata.get('page_count'))
 
                 progress.update(task, completed=True)
 
+                # Step 6: Build search indexes
+                try:
+                    task = progress.add_task("[cyan]Building search index...", total=None)
+                    _build_search_index(book_id, md_filepath.read_text(encoding='utf-8'))
+                    progress.update(task, completed=True)
+                except BaseException:
+                    progress.stop()
+                    _discard_book(book_id, md_filepath, None)
+                    raise
+
             except IntegrityError as e:
                 progress.stop()
                 console.print(f"\n[red]Database error:[/red] {e}")
@@ -0,0 +1,330 @@
+"""Command for answering many queries in one process, as JSON lines."""
+
+import json
+import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import typer
+from rich.console import Console
+from sqlalchemy.orm import Session
+
+from ..db.models import Book
+from ..db.queries import (
+    SORT_COLUMNS,
+    book_to_dict,
+    build_book_filters,
+    query_books,
+    resolve_printed_to_physical_pages,
+)
+from ..db.session import get_db_manager
+from ..index.hybrid import hybrid_search
+from ..utils.config import get_config
+from ..utils.content_utils import split_pages
+from .query import _parse_page_ranges
+from .search import _make_snippet
+
+console = Console()
+app = typer.Typer()
+
+# Books whose markdown is kept in memory during a batch
+BOOK_CACHE_SIZE = 16
+
+
+class _BookCache:
+    """
+    Markdown text and page offsets of the books read during a batch.
+
+    Shared by all worker threads, so a book is read and split into pages
+    once no matter how many requests touch it.
+    """
+
+    def __init__(self, max_books: int = BOOK_CACHE_SIZE):
+        self.max_books = max_books
+        self._books: "OrderedDict[int, Tuple[str, Dict[int, Tuple[int, int]]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, book: Book) -> Tuple[str, Dict[int, Tuple[int, int]]]:
+        """
+        Get a book's markdown and its page map ({page_number: (start, end)}).
+
+        Raises:
+            FileNotFoundError: If the markdown file is missing
+        """
+        with self._lock:
+            if book.id in self._books:
+                self._books.move_to_end(book.id)
+                return self._books[book.id]
+
+        md_path = Path(book.markdown_file_path)
+        if not md_path.exists():
+            raise FileNotFoundError(f"Markdown file not found: {md_path}")
+        content = md_path.read_text(encoding='utf-8')
+        entry = (content, {page: (start, end) for page, start, end in split_pages(content)})
+
+        with self._lock:
+            self._books[book.id] = entry
+            while len(self._books) > self.max_books:
+                self._books.popitem(last=False)
+        return entry
+
+
+def _require(request: Dict[str, Any], field: str) -> Any:
+    """Get a required request field."""
+    if request.get(field) is None:
+        raise ValueError(f"Missing field: {field}")
+    return request[field]
+
+
+def _get_book(session: Session, request: Dict[str, Any]) -> Book:
+    """Look up the book named by a request's book_id."""
+    book_id = int(_require(request, 'book_id'))
+    book = session.get(Book, book_id)
+    if book is None:
+        raise ValueError(f"Book with ID {book_id} not found.")
+    return book
+
+
+def _page_text(content: str, page_map: Dict[int, Tuple[int, int]], page: int) -> Optional[str]:
+    """Text of one page, or None if the book has no such page."""
+    if not page_map:
+        # No page markers: the whole document is page 1
+        return content.strip() if page == 1 else None
+    if page not in page_map:
+        return None
+    start, end = page_map[page]
+    return content[start:end].strip()
+
+
+def _handle_list(session: Session, cache: _BookCache, request: Dict[str, Any]) -> Dict[str, Any]:
+    """Request fields: full, fields, category, tag, author, has_images, sort, desc, limit, after."""
+    sort = request.get('sort', 'id')
+    if sort not in SORT_COLUMNS:
+        raise ValueError(f"Invalid sort key: {sort}. Use one of: {', '.join(SORT_COLUMNS)}")
+
+    fields = request.get('fields')
+    if isinstance(fields, str):
+        fields = [field.strip() for field in fields.split(',')]
+    full = bool(request.get('full', False))
+
+    filters = build_book_filters(
+        request.get('category'),
+        request.get('tag'),
+        request.get('author'),
+        None,
+        request.get('has_images'),
+    )
+    total, books, has_more = query_books(
+        session, filters, sort, bool(request.get('desc', False)),
+        request.get('limit'), request.get('after'), full=full, fields=fields,
+    )
+    return {
+        'total': total,
+        'books': [book_to_dict(book, full=full, fields=fields) for book in books],
+        'next_after': books[-1].id if has_more else None,
+    }
+
+
+def _handle_toc(session: Session, cache: _BookCache, request: Dict[str, Any]) -> Dict[str, Any]:
+    """Request fields: book_id."""
+    book = _get_book(session, request)
+    return {
+        'book_id': book.id,
+        'title': book.title,
+        'synthesized': book.toc_synthesized,
+        'entries': [
+            {
+                'title': entry.title,
+                'level': entry.level,
+                'start_page': entry.start_page,
+                'end_page': entry.end_page,
+            }
+            for entry in book.toc_entries
+        ],
+    }
+
+
+def _handle_pages(session: Session, cache: _BookCache, request: Dict[str, Any]) -> Dict[str, Any]:
+    """Request fields: book_id, pages (range string like "1-5,10" or a list of numbers), printed (page numbers are printed ones)."""
+    book = _get_book(session, request)
+    pages = _require(request, 'pages')
+    page_list = _parse_page_ranges(pages) if isinstance(pages, str) else sorted({int(page) for page in pages})
+    if request.get('printed'):
+        page_list = resolve_printed_to_physical_pages(book.id, page_list, session)
+
+    if book.lazy_conversion:
+        from ..db.page_store import lazy_page_texts  # imports the PDF converters
+
+        texts = lazy_page_texts(session, book, page_list)
+        result = [{'page': page, 'text': texts[page]} for page in page_list if page in texts]
+        return {'book_id': book.id, 'title': book.title, 'pages': result}
+
+    content, page_map = cache.get(book)
+    result = []
+    for page in page_list:
+        text = _page_text(content, page_map, page)
+        if text is not None:
+            result.append({'page': page, 'text': text})
+    return {'book_id': book.id, 'title': book.title, 'pages': result}
+
+
+def _handle_section(session: Session, cache: _BookCache, request: Dict[str, Any]) -> Dict[str, Any]:
+    """Request fields: book_id, section (part of a TOC title; the first match in TOC order is used)."""
+    book = _get_book(session, request)
+    wanted = str(_require(request, 'section')).lower()
+    entry = next((entry for entry in book.toc_entries if wanted in entry.title.lower()), None)
+    if entry is None:
+        raise ValueError(f"No section matching '{request['section']}' in book {book.id}.")
+    if not entry.start_page:
+        raise ValueError(f"Section '{entry.title}' has no page numbers.")
+
+    last_page = entry.end_page or entry.start_page
+    page_range = range(entry.start_page, last_page + 1)
+    if book.lazy_conversion:
+        from ..db.page_store import lazy_page_texts  # imports the PDF converters
+
+        lazy_texts = lazy_page_texts(session, book, list(page_range))
+        texts = [lazy_texts.get(page) for page in page_range]
+    else:
+        content, page_map = cache.get(book)
+        texts = [_page_text(content, page_map, page) for page in page_range]
+    return {
+        'book_id': book.id,
+        'title': book.title,
+        'section': entry.title,
+        'start_page': entry.start_page,
+        'end_page': last_page,
+        'text': "\n\n".join(text for text in texts if text),
+    }
+
+
+def _handle_search(session: Session, cache: _BookCache, request: Dict[str, Any]) -> Dict[str, Any]:
+    """Request fields: query, top_k (default 10), books (list of book IDs)."""
+    query = str(_require(request, 'query'))
+    top_k = int(request.get('top_k', 10))
+    book_ids = request.get('books')
+
+    hits = hybrid_search(query, candidates=max(50, top_k), book_ids=book_ids)[:top_k]
+    results = []
+    for hit in hits:
+        book = session.get(Book, hit['book_id'])
+        if book is None:
+            # Book was removed after it was indexed
+            continue
+        content, _ = cache.get(book)
+        results.append({
+            'book_id': book.id,
+            'title': book.title,
+            'page': hit['page'],
+            'score': round(hit['score'], 6),
+            'snippet': _make_snippet(content[hit['start']:hit['end']]),
+        })
+    return {'query': query, 'hits': results}
+
+
+_HANDLERS: Dict[str, Callable[[Session, _BookCache, Dict[str, Any]], Dict[str, Any]]] = {
+    'list': _handle_list,
+    'toc': _handle_toc,
+    'pages': _handle_pages,
+    'section': _handle_section,
+    'search': _handle_search,
+}
+
+
+class _Batch:
+    """State shared by every request in a batch: the book cache and one session per worker thread."""
+
+    def __init__(self):
+        self.cache = _BookCache()
+        self._db_manager = get_db_manager()
+        self._local = threading.local()
+        self._sessions: List[Session] = []
+        self._lock = threading.Lock()
+
+    def session(self) -> Session:
+        """The calling thread's session (created on first use)."""
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = self._db_manager.SessionLocal()
+            with self._lock:
+                self._sessions.append(session)
+        return session
+
+    def close(self):
+        for session in self._sessions:
+            session.close()
+
+    def answer(self, line: str) -> Optional[Dict[str, Any]]:
+        """
+        Answer one request line.
+
+        Returns:
+            Response dictionary, or None for a blank line
+        """
+        if not line.strip():
+            return None
+
+        request_id = None
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("Request must be a JSON object")
+            request_id = request.get('id')
+
+            op = _require(request, 'op')
+            handler = _HANDLERS.get(op)
+            if handler is None:
+                raise ValueError(f"Unknown op: {op}. Use one of: {', '.join(_HANDLERS)}")
+
+            return {'id': request_id, 'ok': True, 'result': handler(self.session(), self.cache, request)}
+        except Exception as e:
+            # Requests only read, but a failed query can leave the session unusable
+            self.session().rollback()
+            return {'id': request_id, 'ok': False, 'error': str(e)}
+
+
+@app.command("batch")
+def batch(
+    workers: int = typer.Option(1, "--workers", "-w", help="Requests to answer concurrently"),
+):
+    """
+    Answer JSON-lines requests from stdin with JSON-lines responses on stdout.
+
+    Each request is an object with an "op" (list, toc, pages, section,
+    search), its arguments, and an optional "id" that is echoed back.
+    Responses come out in request order. With one worker each response is
+    written as soon as its request is read; with more, all input is read
+    first and requests run concurrently.
+    """
+    try:
+        config = get_config()
+
+        # Check if CandleKeep is initialized
+        if not config.is_initialized:
+            console.print("Error: CandleKeep not initialized. Run 'candlekeep init' first.")
+            raise typer.Exit(1)
+
+        if workers < 1:
+            console.print("Error: --workers must be at least 1.")
+            raise typer.Exit(1)
+
+        state = _Batch()
+        pool = ThreadPoolExecutor(max_workers=workers) if workers > 1 else None
+        try:
+            responses = pool.map(state.answer, sys.stdin) if pool else map(state.answer, sys.stdin)
+            for response in responses:
+                if response is not None:
+                    print(json.dumps(response, ensure_ascii=False), flush=True)
+        finally:
+            if pool:
+                pool.shutdown()
+            state.close()
+
+    except typer.Exit:
+        raise
+    except Exception as e:
+        console.print(f"Error: {e}")
+        raise typer.Exit(1)
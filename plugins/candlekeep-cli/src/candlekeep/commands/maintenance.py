@@ -0,0 +1,515 @@
+"""Commands for maintaining the library and its derived indexes."""
+
+from pathlib import Path
+from typing import Optional
+
+import typer
+from rich.console import Console
+
+from ..db.access_log import AccessLog
+from ..db.conversion_cache import ConversionCache
+from ..db.models import Book, BookSignature
+from ..db.page_cache import PageCache
+from ..db.session import get_db_manager
+from ..index.ann import IVFIndex
+from ..index.image_hash import backfill_image_hashes
+from ..index.minhash import DEFAULT_DUPLICATE_THRESHOLD, cluster_near_duplicates
+from ..index.pipeline import index_book
+from ..parsers.boilerplate import strip_boilerplate
+from ..utils.content_utils import estimate_tokens, expand_label_runs, label_runs
+from ..utils.config import get_config
+from ..utils.output import stream_records, validate_format
+
+console = Console()
+app = typer.Typer()
+
+
+@app.command("reindex")
+def reindex(
+    book_id: Optional[int] = typer.Option(None, "--book-id", "-b", help="Only re-index this book"),
+):
+    """
+    Rebuild the search indexes for books already in the library.
+
+    Use this after upgrading CandleKeep, if indexing failed while adding a
+    book, or after editing a book's markdown file (cached pages of re-indexed
+    books are invalidated). Images extracted before perceptual hashes were
+    stored are hashed, so `similar-images` finds them.
+    """
+    try:
+        config = get_config()
+
+        # Check if CandleKeep is initialized
+        if not config.is_initialized:
+            console.print("[red]Error:[/red] CandleKeep not initialized. Run 'candlekeep init' first.")
+            raise typer.Exit(1)
+
+        db_manager = get_db_manager()
+        with db_manager.get_session() as session:
+            query = session.query(
+                Book.id, Book.title, Book.markdown_file_path, Book.lazy_conversion
+            ).order_by(Book.id)
+            if book_id is not None:
+                query = query.filter(Book.id == book_id)
+            books = query.all()
+            hashed = backfill_image_hashes(session)
+
+        if hashed:
+            console.print(f"[green]✓[/green] Hashed {hashed} images for similar-image search")
+        if not books:
+            console.print("No books found in library.")
+            raise typer.Exit(0)
+
+        failures = 0
+        for book in books:
+            if book.lazy_conversion:
+                console.print(f"[yellow]Skipped[/yellow] {book.title} (ID: {book.id}): not converted yet, run 'candlekeep materialize'")
+                continue
+            md_path = Path(book.markdown_file_path)
+            if not md_path.exists():
+                console.print(f"[yellow]Skipped[/yellow] {book.title} (ID: {book.id}): markdown file missing")
+                failures += 1
+                continue
+
+            try:
+                chunk_count = index_book(book.id, md_path.read_text(encoding='utf-8'))
+                # The markdown may have been edited since it was cached
+                with db_manager.get_session() as session:
+                    session.query(Book).filter(Book.id == book.id).update(
+                        {Book.content_version: Book.content_version + 1}
+                    )
+            except Exception as e:
+                console.print(f"[red]Failed[/red] {book.title} (ID: {book.id}): {e}")
+                failures += 1
+                continue
+
+            console.print(f"[green]✓[/green] {book.title} (ID: {book.id}): {chunk_count} chunks")
+
+        if failures:
+            raise typer.Exit(1)
+
+    except typer.Exit:
+        raise
+    except Exception as e:
+        console.print(f"[red]Unexpected error:[/red] {e}")
+        raise typer.Exit(1)
+
+
+@app.command("strip-boilerplate")
+def strip_boilerplate_command(
+    book_id: Optional[int] = typer.Argument(None, help="Book to clean (default: every book)"),
+    dry_run: bool = typer.Option(False, "--dry-run", help="Report the savings without changing anything"),
+):
+    """
+    Remove running headers, footers and page numbers from books already in the library.
+
+    Books added from now on are cleaned while they are converted. The page
+    numbers found in footers and headers become the books' printed page
+    numbers, and cleaned books are re-indexed.
+    """
+    try:
+        config = get_config()
+
+        # Check if CandleKeep is initialized
+        if not config.is_initialized:
+            console.print("[red]Error:[/red] CandleKeep not initialized. Run 'candlekeep init' first.")
+            raise typer.Exit(1)
+
+        db_manager = get_db_manager()
+        with db_manager.get_session() as session:
+            query = session.query(
+                Book.id, Book.title, Book.markdown_file_path, Book.lazy_conversion
+            ).order_by(Book.id)
+            if book_id is not None:
+                query = query.filter(Book.id == book_id)
+            books = query.all()
+            hashed = backfill_image_hashes(session)
+
+        if hashed:
+            console.print(f"[green]✓[/green] Hashed {hashed} images for similar-image search")
+        if not books:
+            console.print("No books found in library.")
+            raise typer.Exit(0)
+
+        failures = 0
+        total_saved = 0
+        for book in books:
+            if book.lazy_conversion:
+                console.print(f"[yellow]Skipped[/yellow] {book.title} (ID: {book.id}): cleaned by 'candlekeep materialize'")
+                continue
+            md_path = Path(book.markdown_file_path)
+            if not md_path.exists():
+                console.print(f"[yellow]Skipped[/yellow] {book.title} (ID: {book.id}): markdown file missing")
+                failures += 1
+                continue
+
+            try:
+                original = md_path.read_text(encoding='utf-8')
+                markdown, labels, removed = strip_boilerplate(original)
+                if not removed['lines_removed']:
+                    console.print(f"[dim]-[/dim] {book.title} (ID: {book.id}): no running headers or footers found")
+                    continue
+                if not dry_run:
+                    md_path.write_text(markdown, encoding='utf-8')
+                    with db_manager.get_session() as session:
+                        stored = session.get(Book, book.id)
+                        # Keep labels found before; the headers they came from are gone now
+                        merged = {**labels, **expand_label_runs(stored.page_labels)}
+                        stored.page_labels = label_runs(merged) or None
+                        stored.content_version = Book.content_version + 1
+                    index_book(book.id, markdown)
+            except Exception as e:
+                console.print(f"[red]Failed[/red] {book.title} (ID: {book.id}): {e}")
+                failures += 1
+                continue
+
+            total_saved += removed['tokens_saved']
+            share = removed['tokens_saved'] / max(estimate_tokens(original), 1)
+            console.print(
+                f"[green]✓[/green] {book.title} (ID: {book.id}): {removed['lines_removed']:,} lines removed, "
+                f"~{removed['tokens_saved']:,} tokens saved ({share:.1%})"
+            )
+
+        verb = "would be saved" if dry_run else "saved"
+        console.print(f"Total: ~{total_saved:,} tokens {verb}")
+        if failures:
+            raise typer.Exit(1)
+
+    except typer.Exit:
+        raise
+    except Exception as e:
+        console.print(f"[red]Unexpected error:[/red] {e}")
+        raise typer.Exit(1)
+
+
+@app.command("materialize")
+def materialize(
+    book_id: Optional[int] = typer.Argument(None, help="Book to convert (default: all lazily added books)"),
+    limit: Optional[int] = typer.Option(
+        None, "--limit", "-n", min=1, help="Convert at most this many pages per book, then stop"
+    ),
+    page_timeout: Optional[float] = typer.Option(
+        None, "--page-timeout", min=0.1,
+        help="Seconds a page may take with the layout engine before it is converted as plain text (default: 20)",
+    ),
+):
+    """
+    Convert the remaining pages of books added with 'add-pdf --lazy'.
+
+    Pages already converted when they were read are kept. Once every page is
+    converted, the book's markdown file is written and its search indexes
+    are built, after which it behaves like any other book. With --limit the
+    work can be spread over several runs.
+    """
+    try:
+        config = get_config()
+
+        # Check if CandleKeep is initialized
+        if not config.is_initialized:
+            console.print("[red]Error:[/red] CandleKeep not initialized. Run 'candlekeep init' first.")
+            raise typer.Exit(1)
+
+        # Imported here: they load the PDF converters, which the other commands don't need
+        from ..db.page_store import finish_materialize, materialize_pages
+        from ..parsers.engines import PAGE_TIME_BUDGET
+
+        page_timeout = page_timeout or PAGE_TIME_BUDGET
+
+        db_manager = get_db_manager()
+        with db_manager.get_session() as session:
+            query = session.query(Book.id).filter(Book.lazy_conversion.is_(True)).order_by(Book.id)
+            if book_id is not None:
+                if session.get(Book, book_id) is None:
+                    console.print(f"[red]Error:[/red] Book with ID {book_id} not found.")
+                    raise typer.Exit(1)
+                query = query.filter(Book.id == book_id)
+            book_ids = [row.id for row in query]
+
+        if not book_ids:
+            console.print("No lazily added books to convert.")
+            raise typer.Exit(0)
+
+        failures = 0
+        for lazy_book_id in book_ids:
+            with db_manager.get_session() as session:
+                book = session.get(Book, lazy_book_id)
+                title = book.title
+                try:
+                    converted, remaining = materialize_pages(session, book, limit, page_timeout)
+                    if remaining:
+                        console.print(
+                            f"[yellow]…[/yellow] {title} (ID: {lazy_book_id}): "
+                            f"{converted} pages converted, {remaining} to go"
+                        )
+                        continue
+                    markdown = finish_materialize(session, book)
+                except Exception as e:
+                    console.print(f"[red]Failed[/red] {title} (ID: {lazy_book_id}): {e}")
+                    failures += 1
+                    continue
+
+            try:
+                chunk_count = index_book(lazy_book_id, markdown)
+            except Exception as e:
+                console.print(f"[red]Failed[/red] {title} (ID: {lazy_book_id}): converted, but indexing failed: {e}")
+                console.print("[yellow]Run 'candlekeep reindex' to retry.[/yellow]")
+                failures += 1
+                continue
+
+            console.print(f"[green]✓[/green] {title} (ID: {lazy_book_id}): {converted} pages converted, {chunk_count} chunks")
+
+        if failures:
+            raise typer.Exit(1)
+
+    except typer.Exit:
+        raise
+    except Exception as e:
+        console.print(f"[red]Unexpected error:[/red] {e}")
+        raise typer.Exit(1)
+
+
+@app.command("compact")
+def compact(
+    retrain: bool = typer.Option(False, "--retrain", help="Retrain ANN clusters instead of reusing them"),
+):
+    """
+    Compact the approximate nearest-neighbour index.
+
+    Drops vectors of removed books and merges recently added books into the
+    sorted cluster layout. This also happens automatically as the library changes.
+    """
+    try:
+        config = get_config()
+
+        # Check if CandleKeep is initialized
+        if not config.is_initialized:
+            console.print("[red]Error:[/red] CandleKeep not initialized. Run 'candlekeep init' first.")
+            raise typer.Exit(1)
+
+        index = IVFIndex()
+        rows = index.rebuild(retrain=retrain or not index.is_trained)
+        if rows == 0:
+            console.print("Library is small enough for exact search; no ANN index needed.")
+        else:
+            console.print(f"[green]✓[/green] ANN index: {rows:,} vectors in {index.meta['nlist']:,} clusters")
+
+    except typer.Exit:
+        raise
+    except Exception as e:
+        console.print(f"[red]Unexpected error:[/red] {e}")
+        raise typer.Exit(1)
+
+
+def _format_cluster_for_llm(record: dict) -> str:
+    """Format a near-duplicate cluster record as a block of text."""
+    lines = [f"## Cluster {record['cluster']}"]
+    for book in record['books']:
+        details = []
+        if book['author']:
+            details.append(book['author'])
+        if book['pages']:
+            details.append(f"{book['pages']} pages")
+        line = f"- Book ID: {book['book_id']} - {book['title']}"
+        if details:
+            line += f" ({', '.join(details)})"
+        lines.append(f"{line}: {book['similarity']:.0%} similar to Book ID {book['closest_id']}")
+    return "\n".join(lines) + "\n"
+
+
+@app.command("dupes")
+def dupes(
+    threshold: float = typer.Option(
+        DEFAULT_DUPLICATE_THRESHOLD, "--threshold", min=0.0, max=1.0,
+        help="Similarity (0-1) above which books count as near-duplicates",
+    ),
+    output_format: str = typer.Option("text", "--format", "-f", help="Output format: text, json, ndjson"),
+):
+    """
+    Report clusters of near-duplicate books.
+
+    Finds books that are the same text as another book in the library, such
+    as different scans, editions, or exports, so spare copies can be removed.
+    """
+    try:
+        config = get_config()
+
+        # Check if CandleKeep is initialized
+        if not config.is_initialized:
+            console.print("[red]Error:[/red] CandleKeep not initialized. Run 'candlekeep init' first.")
+            raise typer.Exit(1)
+
+        try:
+            validate_format(output_format)
+        except ValueError as e:
+            console.print(f"[red]Error:[/red] {e}")
+            raise typer.Exit(1)
+
+        clusters = cluster_near_duplicates(threshold)
+
+        db_manager = get_db_manager()
+        with db_manager.get_session() as session:
+            unsigned = (
+                session.query(Book.id)
+                .outerjoin(BookSignature, BookSignature.book_id == Book.id)
+                .filter(BookSignature.book_id.is_(None))
+                .count()
+            )
+            books = {
+                book.id: book
+                for book in session.query(Book.id, Book.title, Book.author, Book.page_count).filter(
+                    Book.id.in_([book_id for cluster in clusters for book_id, _, _ in cluster])
+                )
+            }
+
+        records = (
+            {
+                'cluster': number,
+                'books': [
+                    {
+                        'book_id': book_id,
+                        'title': books[book_id].title if book_id in books else "Untitled",
+                        'author': books[book_id].author if book_id in books else None,
+                        'pages': books[book_id].page_count if book_id in books else None,
+                        'closest_id': closest_id,
+                        'similarity': round(float(similarity), 4),
+                    }
+                    for book_id, closest_id, similarity in cluster
+                ],
+            }
+            for number, cluster in enumerate(clusters, 1)
+        )
+
+        def footer():
+            lines = [f"Clusters: {len(clusters)}" if clusters else "No near-duplicate books found."]
+            if unsigned:
+                lines.append(
+                    f"Note: {unsigned} book(s) have no signature (too little text, or added before "
+                    "duplicate detection; run 'candlekeep reindex')."
+                )
+            return lines, {'unsigned': unsigned}
+
+        stream_records(
+            records,
+            output_format,
+            'clusters',
+            _format_cluster_for_llm,
+            header={'threshold': threshold},
+            header_lines=[f"# Near-Duplicate Books (Threshold: {threshold:.0%})", ""],
+            footer=footer,
+        )
+
+    except typer.Exit:
+        raise
+    except Exception as e:
+        console.print(f"[red]Unexpected error:[/red] {e}")
+        raise typer.Exit(1)
+
+
+def _hit_rate(hits: int, misses: int) -> str:
+    return f"{hits / (hits + misses):.1%}" if hits + misses else "n/a"
+
+
+def _switch(value: Optional[str], option: str) -> Optional[bool]:
+    """Parse an on/off option value (None when not given)."""
+    if value is None:
+        return None
+    if value not in ('on', 'off'):
+        raise ValueError(f"Invalid value for {option}: {value}. Use 'on' or 'off'.")
+    return value == 'on'
+
+
+@app.command("stats")
+def stats(
+    reset: bool = typer.Option(False, "--reset", help="Zero the counters and clear the access log"),
+    clear: bool = typer.Option(False, "--clear", help="Drop every cached page and page conversion"),
+    access_log_option: Optional[str] = typer.Option(
+        None, "--access-log", help="Log page and TOC requests: on or off"
+    ),
+    prefetch_option: Optional[str] = typer.Option(
+        None, "--prefetch", help="Warm the cache for likely next requests: on or off"
+    ),
+):
+    """
+    Show page cache statistics.
+
+    Reports how many page extracts and rendered `pages` outputs are cached,
+    the cache's size and limits, and its hits, misses and evictions; and
+    how many PDF pages were reused from the conversion cache instead of
+    being converted again. With the access log on, also compares hit rate
+    and latency of `pages` requests made with prefetching on and off.
+    """
+    try:
+        config = get_config()
+
+        # Check if CandleKeep is initialized
+        if not config.is_initialized:
+            console.print("[red]Error:[/red] CandleKeep not initialized. Run 'candlekeep init' first.")
+            raise typer.Exit(1)
+
+        try:
+            settings = {
+                'access_log': _switch(access_log_option, '--access-log'),
+                'prefetch': _switch(prefetch_option, '--prefetch'),
+            }
+        except ValueError as e:
+            console.print(f"[red]Error:[/red] {e}")
+            raise typer.Exit(1)
+
+        cache = PageCache()
+        conversion_cache = ConversionCache()
+        access_log = AccessLog()
+        for name, enabled in settings.items():
+            if enabled is not None:
+                access_log.set_setting(name, enabled)
+        if clear:
+            cache.clear()
+            conversion_cache.clear()
+        if reset:
+            cache.reset_counters()
+            conversion_cache.reset_counters()
+            access_log.clear()
+        cache_stats = cache.stats()
+        conversion_stats = conversion_cache.stats()
+        conversion_cache.close()
+
+        entries = cache_stats['page_entries'] + cache_stats['render_entries']
+        output = [
+            "# Page Cache",
+            f"Entries: {entries:,} of {cache_stats['max_items']:,} "
+            f"({cache_stats['page_entries']:,} pages, {cache_stats['render_entries']:,} rendered outputs)",
+            f"Size: {cache_stats['bytes'] / 1024 / 1024:.1f} MB of {cache_stats['max_bytes'] / 1024 / 1024:.1f} MB",
+            f"Page hits: {cache_stats['page_hits']:,}, misses: {cache_stats['page_misses']:,} "
+            f"(hit rate {_hit_rate(cache_stats['page_hits'], cache_stats['page_misses'])})",
+            f"Rendered output hits: {cache_stats['render_hits']:,}, misses: {cache_stats['render_misses']:,} "
+            f"(hit rate {_hit_rate(cache_stats['render_hits'], cache_stats['render_misses'])})",
+            f"Evictions: {cache_stats['evictions']:,}",
+            "",
+            "# Conversion Cache",
+            f"Pages: {conversion_stats['entries']:,} of {conversion_stats['max_items']:,}, "
+            f"{conversion_stats['bytes'] / 1024 / 1024:.1f} MB of {conversion_stats['max_bytes'] / 1024 / 1024:.1f} MB",
+            f"Reused: {conversion_stats['hits']:,}, converted: {conversion_stats['misses']:,} "
+            f"(reuse rate {_hit_rate(conversion_stats['hits'], conversion_stats['misses'])})",
+            f"Evictions: {conversion_stats['evictions']:,}",
+            "",
+            "# Access Log",
+            f"Access log: {'on' if access_log.settings()['access_log'] else 'off'}, "
+            f"prefetch: {'on' if access_log.settings()['prefetch'] else 'off'}",
+        ]
+        for prefetch, row in access_log.report().items():
+            label = "Prefetch on" if prefetch else "Prefetch off"
+            if not row['requests']:
+                output.append(f"{label}: no requests logged")
+                continue
+            output.append(
+                f"{label}: {row['requests']:,} requests, {row['pages']:,} pages, "
+                f"hit rate {row['hit_rate']:.1%}, "
+                f"latency p50 {row['latency_p50_ms']:.1f} ms, p95 {row['latency_p95_ms']:.1f} ms"
+            )
+        access_log.close()
+        print("\n".join(output))
+
+    except typer.Exit:
+        raise
+    except Exception as e:
+        console.print(f"[red]Unexpected error:[/red] {e}")
+        raise typer.Exit(1)
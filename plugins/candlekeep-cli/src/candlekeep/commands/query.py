@@ -1,112 +1,146 @@
-"""Commands for querying books in the library."""
+"""Commands for querying books in the library.
 
-import re
+The database modules (SQLAlchemy) are imported inside the commands that use
+them, so `list` answered from the catalog snapshot starts without them.
+"""
+
+import io
+import subprocess
+import sys
+import time
+from datetime import datetime
 from pathlib import Path
-from typing import Optional, List
+from typing import Dict, Iterator, Optional, List, TextIO, Tuple
 
 import typer
 from rich.console import Console
 
-from ..db.models import Book, BookImage
-from ..db.session import get_db_manager
+from ..db.access_log import AccessLog
+from ..db.catalog import open_catalog
+from ..db.page_cache import MAX_CACHED_PAGES, PageCache, content_version
 from ..utils.config import get_config
+from ..utils.content_utils import estimate_tokens, iter_markdown_pages
+from ..utils.output import peek, stream_records, validate_format
 
 console = Console()
 app = typer.Typer()
 
-
-def _format_book_for_llm(book: Book, full: bool = False, fields: Optional[List[str]] = None) -> str:
+# Sort keys for `list` (see queries.SORT_COLUMNS)
+_SORT_KEYS = ('id', 'title', 'added')
+
+# `list --fields` values the catalog snapshot doesn't hold
+_DATABASE_ONLY_FIELDS = ('word_count', 'chapter_count')
+
+# Sections warmed after `toc` when prefetch is on, and how many opening
+# pages are warmed for sections too long to cache whole
+PREFETCH_SECTIONS = 3
+PREFETCH_SECTION_PAGES = 4
+
+
+# Optional book record fields and their text labels, in display order
+_TEXT_LABELS = [
+    ('category', 'Category'),
+    ('tags', 'Tags'),
+    ('word_count', 'Word Count'),
+    ('chapter_count', 'Chapters'),
+    ('subject', 'Subject'),
+    ('keywords', 'Keywords'),
+    ('isbn', 'ISBN'),
+    ('publisher', 'Publisher'),
+    ('publication_year', 'Publication Year'),
+    ('language', 'Language'),
+    ('pdf_creator', 'PDF Creator'),
+    ('pdf_producer', 'PDF Producer'),
+    ('pdf_created', 'PDF Created'),
+    ('pdf_modified', 'PDF Modified'),
+]
+
+
+def _format_book_for_llm(record: dict) -> str:
     """
-    Format a book's metadata in LLM-optimized text format.
+    Format a book record (from queries.book_to_dict) in LLM-optimized text format.
 
     Uses structured markdown with key-value pairs for easy parsing.
     """
+    def _text(key: str, value) -> str:
+        if key == 'tags':
+            return ', '.join(value)
+        if key == 'word_count':
+            return f"{value:,}"
+        if key in ('added', 'pdf_created', 'pdf_modified'):
+            return value.replace('T', ' ')
+        return str(value)
+
     lines = []
-    lines.append(f"## Book ID: {book.id}")
-    lines.append(f"Title: {book.title}")
+    lines.append(f"## Book ID: {record['id']}")
+    lines.append(f"Title: {record['title']}")
 
     # Essential fields (always shown)
-    if book.author:
-        lines.append(f"Author: {book.author}")
-    lines.append(f"Type: {book.source_type.value}")
-
-    if book.page_count:
-        lines.append(f"Pages: {book.page_count}")
-
-    if book.added_date:
-        lines.append(f"Added: {book.added_date.strftime('%Y-%m-%d %H:%M:%S')}")
-
-    # Additional fields based on flags
-    if full or (fields and 'category' in fields):
-        if book.category:
-            lines.append(f"Category: {book.category}")
-
-    if full or (fields and 'tags' in fields):
-        if book.tags:
-            lines.append(f"Tags: {', '.join(book.tags)}")
-
-    if full or (fields and 'word_count' in fields):
-        if book.word_count:
-            lines.append(f"Word Count: {book.word_count:,}")
-
-    if full or (fields and 'chapter_count' in fields):
-        if book.chapter_count:
-            lines.append(f"Chapters: {book.chapter_count}")
-
-    if full:
-        # Show all metadata
-        if book.subject:
-            lines.append(f"Subject: {book.subject}")
-        if book.keywords:
-            lines.append(f"Keywords: {book.keywords}")
-        if book.isbn:
-            lines.append(f"ISBN: {book.isbn}")
-        if book.publisher:
-            lines.append(f"Publisher: {book.publisher}")
-        if book.publication_year:
-            lines.append(f"Publication Year: {book.publication_year}")
-        if book.language:
-            lines.append(f"Language: {book.language}")
-        if book.pdf_creator:
-            lines.append(f"PDF Creator: {book.pdf_creator}")
-        if book.pdf_producer:
-            lines.append(f"PDF Producer: {book.pdf_producer}")
-        if book.pdf_creation_date:
-            lines.append(f"PDF Created: {book.pdf_creation_date.strftime('%Y-%m-%d %H:%M:%S')}")
-        if book.pdf_mod_date:
-            lines.append(f"PDF Modified: {book.pdf_mod_date.strftime('%Y-%m-%d %H:%M:%S')}")
-        lines.append(f"Original Path: {book.original_file_path}")
-        lines.append(f"Markdown Path: {book.markdown_file_path}")
+    if record['author']:
+        lines.append(f"Author: {record['author']}")
+    lines.append(f"Type: {record['type']}")
+
+    if record['pages']:
+        lines.append(f"Pages: {record['pages']}")
+
+    if record['added']:
+        lines.append(f"Added: {_text('added', record['added'])}")
+
+    # Additional fields present for --full / --fields
+    for key, label in _TEXT_LABELS:
+        if record.get(key):
+            lines.append(f"{label}: {_text(key, record[key])}")
+
+    if 'original_path' in record:
+        lines.append(f"Original Path: {record['original_path']}")
+        lines.append(f"Markdown Path: {record['markdown_path']}")
 
     return "\n".join(lines)
 
 
-def _format_toc_for_llm(book: Book) -> str:
+def _format_toc_entry_for_llm(record: dict) -> str:
     """
-    Format a book's table of contents in LLM-optimized text format.
+    Format a TOC entry record (from queries.toc_records) as one line of text.
 
-    Uses hierarchical indentation for nested structure.
+    Uses hierarchical indentation (2 spaces per level) for nested structure.
     """
-    lines = []
-    lines.append(f"## Table of Contents - Book ID: {book.id}")
-    lines.append(f"Title: {book.title}")
-    lines.append("")
+    page = record['start_page'] if record['start_page'] is not None else 'N/A'
+    indent = "  " * (record['level'] - 1)
+    if record.get('tokens') is not None:
+        return f"{indent}{record['title']} (Page {page}, ~{record['tokens']} tokens)"
+    return f"{indent}{record['title']} (Page {page})"
+
+
+def _format_image_for_llm(record: dict) -> str:
+    """Format an image record (from queries.image_to_dict) as a block of text."""
+    page = f"Page: {record['page']}"
+    if record['printed_page'] is not None:
+        page += f" (Printed Page: {record['printed_page']})"
+    size = f"Size: {record['width']}x{record['height']} {record['format']}"
+    if record['colorspace']:
+        size += f" {record['colorspace']}"
+    lines = [f"## Image ID: {record['id']} - Book ID: {record['book_id']} - {record['book_title']}", page, size]
+    if record['variant'] != 'full':
+        lines.append(f"Variant: {record['variant']}")
+    lines.append(f"File: {record['path']}")
+    if record.get('preview_path'):
+        lines.append(f"Preview: {record['preview_path']}")
+    return "\n".join(lines)
 
-    if not book.table_of_contents:
-        lines.append("No table of contents available for this book.")
-        return "\n".join(lines)
 
-    # Format TOC entries with hierarchical indentation
-    for entry in book.table_of_contents:
-        level = entry.get('level', 1)
-        title = entry.get('title', 'Untitled')
-        page = entry.get('page', 'N/A')
+def _with_sizes(records: Iterator[dict], prefix: List[int]) -> Iterator[dict]:
+    """
+    Add each TOC entry's estimated token total ('tokens') from page token
+    prefix sums (see index.page_table.token_prefix_sums).
 
-        # Indent based on level (2 spaces per level)
-        indent = "  " * (level - 1)
-        lines.append(f"{indent}{title} (Page {page})")
+    Sections have no size (None) when page statistics are unknown.
+    """
+    from ..index.page_table import range_tokens
 
-    return "\n".join(lines)
+    for record in records:
+        known = len(prefix) > 1 and record['start_page'] is not None
+        record['tokens'] = range_tokens(prefix, record['start_page'], record['end_page']) if known else None
+        yield record
 
 
 def _parse_page_ranges(page_str: str) -> List[int]:
@@ -141,122 +175,372 @@ def _parse_page_ranges(page_str: str) -> List[int]:
     return sorted(pages)
 
 
-def _resolve_printed_to_physical_pages(book_id: int, page_list: List[int], session) -> List[int]:
+def _format_page_for_llm(record: dict) -> str:
+    """Format a page record (from _page_records) as a markdown block."""
+    return f"### Page {record['page']}\n{record['text']}\n"
+
+
+def _page_records(book_id: int, md_path: Path, pages: List[int]) -> Iterator[dict]:
     """
-    Attempt to resolve printed page numbers to physical PDF page numbers.
+    Yield the requested pages of a markdown file in page order.
 
-    Strategy:
-    1. Query BookImage table for pages with matching printed_page_number
-    2. If found, map to physical page_number
-    3. If not found, assume page_list contains physical page numbers (fallback)
+    The file is streamed and reading stops after the last requested page,
+    so memory stays bounded by one page however long the range is.
 
-    Args:
-        book_id: Book ID to query
-        page_list: List of page numbers (potentially printed page numbers)
-        session: Database session
+    Note: pymupdf4llm uses 0-based PDF indices in page markers (e.g., "end of page=103"),
+    but our database uses 1-based page numbers (e.g., page_number=104);
+    iter_markdown_pages does the conversion.
+    """
+    if not pages:
+        return
+    wanted = set(pages)
+    for page_number, text in iter_markdown_pages(md_path, last_page=max(wanted)):
+        if page_number in wanted:
+            yield {'book_id': book_id, 'page': page_number, 'text': text}
+
+
+def _cached_page_records(
+    book_id: int, version: int, md_path: Path, pages: List[int], cache: PageCache
+) -> Tuple[int, Iterator[dict]]:
+    """
+    Like _page_records, but serve pages from the page cache and cache the rest.
+
+    Only for small requests (see MAX_CACHED_PAGES): missing pages are
+    read and cached right away, then everything is yielded in page order.
 
     Returns:
-        List of physical page numbers (PDF indices)
-    """
-    # Query for all BookImage records for this book with printed page numbers
-    images_with_printed = session.query(BookImage).filter(
-        BookImage.book_id == book_id,
-        BookImage.printed_page_number.isnot(None)
-    ).all()
-
-    if not images_with_printed:
-        # No printed page data available, treat as physical pages
-        return page_list
-
-    # Build mapping: printed_page_number -> physical page_number
-    printed_to_physical = {}
-    for img in images_with_printed:
-        if img.printed_page_number not in printed_to_physical:
-            printed_to_physical[img.printed_page_number] = img.page_number
-
-    # Try to resolve each requested page
-    resolved_pages = []
-    for page_num in page_list:
-        if page_num in printed_to_physical:
-            # Found mapping: this is a printed page number
-            resolved_pages.append(printed_to_physical[page_num])
+        (number of pages found in the cache, page records)
+    """
+    keys = {page: f"page:{page}" for page in pages}
+    cached = cache.get_many(book_id, version, keys.values())
+    texts = {page: cached[key] for page, key in keys.items() if key in cached}
+    cached_count = len(texts)
+
+    missing = set(pages) - set(texts)
+    if missing:
+        read = {page: text for page, text in iter_markdown_pages(md_path, last_page=max(missing)) if page in missing}
+        cache.put_many(book_id, version, {keys[page]: text for page, text in read.items()})
+        texts.update(read)
+
+    records = ({'book_id': book_id, 'page': page, 'text': texts[page]} for page in pages if page in texts)
+    return cached_count, records
+
+
+def _format_ranges(page_list: List[int]) -> str:
+    """Compact sorted page numbers into ranges (e.g. [1, 2, 3, 7] -> "1-3,7")."""
+    ranges = []
+    for page in page_list:
+        if ranges and page == ranges[-1][1] + 1:
+            ranges[-1][1] = page
         else:
-            # No mapping: assume it's already a physical page number
-            resolved_pages.append(page_num)
+            ranges.append([page, page])
+    return ",".join(_format_range(first, last) for first, last in ranges)
 
-    return sorted(set(resolved_pages))  # Remove duplicates and sort
 
-
-def _extract_pages_from_markdown(md_path: Path, pages: List[int]) -> str:
+def _within_budget(pages: List[int], tokens: Dict[int, int], max_tokens: int) -> Tuple[List[int], List[int], int]:
     """
-    Extract specific pages from a markdown file.
+    Cut a page list at the last page that keeps the total within max_tokens.
+
+    Args:
+        pages: Physical page numbers in order
+        tokens: Estimated tokens per page (pages without an estimate don't exist)
+        max_tokens: Token budget
 
-    Uses page markers inserted during PDF/markdown processing.
-    Returns markdown content for requested pages.
+    Returns:
+        (pages kept, pages left out, estimated tokens of the pages left out)
 
-    Note: pymupdf4llm uses 0-based PDF indices in page markers (e.g., "end of page=103"),
-    but our database uses 1-based page numbers (e.g., page_number=104).
-    We must convert: marker_index = page_number - 1
+    Raises:
+        ValueError: If the first page alone is over the budget
+    """
+    pages = [page for page in pages if page in tokens]
+    total = 0
+    for index, page in enumerate(pages):
+        if total + tokens[page] > max_tokens:
+            if index == 0:
+                raise ValueError(
+                    f"Page {page} is about {tokens[page]} tokens, more than --max-tokens {max_tokens}."
+                )
+            rest = pages[index:]
+            return pages[:index], rest, sum(tokens[page] for page in rest)
+        total += tokens[page]
+    return pages, [], 0
+
+
+def _write_pages(
+    session,
+    book,
+    pages: str,
+    page_list: List[int],
+    output_format: str,
+    out: TextIO,
+    version: Optional[int] = None,
+    page_cache: Optional[PageCache] = None,
+    max_tokens: Optional[int] = None,
+    printed_pages: Optional[List[int]] = None,
+) -> Tuple[bool, int]:
     """
-    if not md_path.exists():
-        raise FileNotFoundError(f"Markdown file not found: {md_path}")
+    Write a book's pages the way `pages` prints them.
 
-    with open(md_path, 'r', encoding='utf-8') as f:
-        content = f.read()
+    Args:
+        session: Database session
+        book: Book whose markdown file exists (lazily converted books are
+            read from their page store instead)
+        pages: Page ranges as given by the user (echoed in the header)
+        page_list: Physical page numbers to write
+        output_format: One of OUTPUT_FORMATS
+        out: Stream to write to
+        version: The book's content version (with page_cache)
+        page_cache: Serve and store pages through this cache
+        max_tokens: Stop before the first page that would take the
+            estimated total over this many tokens; the pages left out are
+            reported after the last page (text and json)
+        printed_pages: The printed page numbers asked for, when page_list
+            was resolved from them (pages left out are reported in them)
 
-    # Find all page markers
-    # Pattern: --- end of page=N ---
-    page_pattern = re.compile(r'--- end of page=(\d+) ---')
-    matches = list(page_pattern.finditer(content))
+    Returns:
+        (whether anything was written, number of pages served from the
+        page cache). Nothing is written in text format when none of the
+        pages exist.
 
-    if not matches:
-        # No page markers found - return entire content if page 1 is requested
-        if 1 in pages:
-            return content
-        else:
-            return ""
-
-    # Build a map of page numbers to content positions
-    # Note: pymupdf4llm markers use 0-based PDF indices
-    # "end of page=103" means PDF index 103 (our DB page 104) content ends here
-    page_map = {}
-    for i, match in enumerate(matches):
-        pdf_index = int(match.group(1))  # 0-based PDF index from marker
-        db_page_num = pdf_index + 1  # Convert to 1-based page number for our DB
-
-        # Start position is after previous marker (or start of file for page 0)
-        if i == 0:
-            start_pos = 0
+    Raises:
+        ValueError: If max_tokens is smaller than the first page
+    """
+    from ..db import queries
+
+    resolved_page_list = page_list
+    md_path = Path(book.markdown_file_path)
+    texts = None
+    if book.lazy_conversion:
+        # Pages are converted on first read and kept in the page store
+        from ..db.page_store import lazy_page_texts  # imports the PDF converters
+
+        texts = lazy_page_texts(session, book, resolved_page_list)
+
+    left_out: List[int] = []
+    left_out_tokens = 0
+    if max_tokens is not None:
+        if texts is not None:
+            tokens = {page: estimate_tokens(text) for page, text in texts.items()}
         else:
-            start_pos = matches[i - 1].end()
+            from ..index.page_table import page_token_counts
+
+            tokens = page_token_counts(session, book)
+        if tokens:
+            resolved_page_list, left_out, left_out_tokens = _within_budget(resolved_page_list, tokens, max_tokens)
+
+    def _footer():
+        if not left_out:
+            return [], {}
+        # Report the pages left out the way they were asked for
+        remaining_pages = left_out
+        if printed_pages is not None:
+            printed = {physical: printed for printed, physical in queries.printed_page_map(book.id, session).items()}
+            asked = set(printed_pages)
+            remaining_pages = [printed[page] if printed.get(page) in asked else page for page in left_out]
+        remaining = _format_ranges(sorted(remaining_pages))
+        return (
+            [f"(Stopped at --max-tokens {max_tokens}: pages {remaining} left out, about {left_out_tokens} tokens)"],
+            {'truncated': True, 'remaining_pages': remaining, 'remaining_tokens': left_out_tokens},
+        )
+
+    if texts is not None:
+        cached_count = 0
+        records = ({'book_id': book.id, 'page': page, 'text': texts[page]} for page in resolved_page_list if page in texts)
+    elif page_cache is not None:
+        cached_count, records = _cached_page_records(book.id, version, md_path, resolved_page_list, page_cache)
+    else:
+        cached_count, records = 0, _page_records(book.id, md_path, resolved_page_list)
+    found, records = peek(records)
+    if not found and output_format == 'text':
+        return False, cached_count
+
+    stream_records(
+        records,
+        output_format,
+        'pages',
+        _format_page_for_llm,
+        header={'book_id': book.id, 'title': book.title},
+        header_lines=[f"## Book ID: {book.id} - {book.title}", f"Pages: {pages}", ""],
+        footer=_footer,
+        out=out,
+    )
+    return True, cached_count
+
+
+def _format_range(first: int, last: int) -> str:
+    return str(first) if first == last else f"{first}-{last}"
+
+
+def _next_range(page_list: List[int], page_count: Optional[int]) -> Optional[str]:
+    """
+    Predict the pages read after page_list: the same number of pages again,
+    starting after the last one (page N is usually followed by N+1).
+
+    Returns:
+        Page range string, or None past the end of the book
+    """
+    first = page_list[-1] + 1
+    last = first + min(len(page_list), MAX_CACHED_PAGES) - 1
+    if page_count:
+        if first > page_count:
+            return None
+        last = min(last, page_count)
+    return _format_range(first, last)
+
+
+def _likely_sections(toc: List[dict], reads: List[Tuple[int, int]], limit: int = PREFETCH_SECTIONS) -> List[dict]:
+    """
+    Pick the TOC entries most likely to be read next.
 
-        # End position is at the current marker (before "--- end of page=N ---")
-        end_pos = match.start()
+    Sections are ranked by how many logged requests touched their pages,
+    then by TOC order (so with no history, the opening sections win).
+    """
+    candidates = []
+    for ordinal, entry in enumerate(toc):
+        if not entry['start_page']:
+            continue
+        end = entry['end_page'] or entry['start_page']
+        score = sum(1 for first, last in reads if first <= end and last >= entry['start_page'])
+        candidates.append((-score, ordinal, entry))
+    candidates.sort(key=lambda candidate: candidate[:2])
+    return [entry for _, _, entry in candidates[:limit]]
+
+
+def _record_access(
+    op: str,
+    book_id: int,
+    page_list: List[int],
+    cached_pages: int,
+    started: float,
+    output_format: str,
+    pages: Optional[str] = None,
+    printed: bool = False,
+    log_range: bool = True,
+):
+    """
+    After a read: log it (if the access log is on) and start warming the
+    cache for the next one (if prefetch is on).
+
+    Prefetching runs in a detached `warm` process, so the command returns
+    as soon as its own output is written. The log keeps physical page
+    ranges (what prefetching compares with the TOC); printed is whether
+    pages was given in printed numbers, and without log_range the request
+    is logged without its pages.
+    """
+    latency_ms = (time.perf_counter() - started) * 1000
+    access_log = AccessLog()
+    settings = access_log.settings()
+
+    if settings['prefetch']:
+        args = [sys.executable, '-m', 'candlekeep.cli', 'warm', str(book_id), '--format', output_format]
+        if pages is not None:
+            args += ['--after', pages]
+            if printed:
+                args.append('--printed')
+        subprocess.Popen(
+            args,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True,
+        )
+
+    if settings['access_log']:
+        logged = page_list if log_range else []
+        access_log.record(
+            op,
+            book_id,
+            logged[0] if logged else None,
+            logged[-1] if logged else None,
+            len(page_list),
+            cached_pages,
+            latency_ms,
+            settings['prefetch'],
+        )
+    access_log.close()
+
+
+class _BookPage:
+    """
+    The first limit records of a book stream.
+
+    After iteration, next_after is the cursor for the next page (None if
+    this was the last one).
+    """
 
-        page_map[db_page_num] = (start_pos, end_pos)
+    def __init__(self, records: Iterator[dict], limit: Optional[int]):
+        self.records = records
+        self.limit = limit
+        self.next_after: Optional[int] = None
+
+    def __iter__(self) -> Iterator[dict]:
+        last_id = None
+        for count, record in enumerate(self.records):
+            if count == self.limit:
+                self.next_after = last_id
+                break
+            last_id = record['id']
+            yield record
+
+
+def _print_books(
+    records: Iterator[dict],
+    total: Optional[int],
+    filtered: bool,
+    limit: Optional[int],
+    output_format: str,
+):
+    """Print a page of book records as they are produced (see list_books)."""
+    books = _BookPage(records, limit)
+    found, records = peek(books)
+    if not found and output_format == 'text':
+        if total == 0 and not filtered:
+            console.print("No books found in library.")
+        else:
+            console.print("No books match the given filters.")
+        raise typer.Exit(0)
 
-    # Extract requested pages
-    result_lines = []
-    for page_num in pages:
-        if page_num in page_map:
-            start, end = page_map[page_num]
-            page_content = content[start:end].strip()
-            result_lines.append(f"### Page {page_num}")
-            result_lines.append(page_content)
-            result_lines.append("")  # Blank line separator
+    def _footer():
+        lines = [f"Next page: --after {books.next_after}"] if books.next_after is not None else []
+        return lines, {'next_after': books.next_after}
 
-    return "\n".join(result_lines)
+    stream_records(
+        records,
+        output_format,
+        'books',
+        lambda record: _format_book_for_llm(record) + "\n",
+        header={'total': total},
+        header_lines=[f"# Library Books (Total: {total})", ""],
+        footer=_footer,
+    )
 
 
 @app.command("list")
 def list_books(
     full: bool = typer.Option(False, "--full", help="Show all metadata fields"),
     fields: Optional[str] = typer.Option(None, "--fields", help="Comma-separated list of specific fields to show"),
+    category: Optional[str] = typer.Option(None, "--category", help="Only books in this category"),
+    tag: Optional[str] = typer.Option(None, "--tag", help="Only books with this tag (comma-separated: all of them)"),
+    author: Optional[str] = typer.Option(None, "--author", help="Only books whose author contains this text"),
+    added_since: Optional[datetime] = typer.Option(
+        None, "--added-since", formats=["%Y-%m-%d"], help="Only books added on or after this date (YYYY-MM-DD)"
+    ),
+    has_images: Optional[bool] = typer.Option(None, "--has-images/--no-images", help="Only books with (or without) images"),
+    sort: str = typer.Option("id", "--sort", help="Sort by: id, title, added"),
+    desc: bool = typer.Option(False, "--desc", help="Sort in descending order"),
+    limit: Optional[int] = typer.Option(None, "--limit", help="Maximum number of books to show"),
+    after: Optional[int] = typer.Option(None, "--after", help="Show books after this book ID in the sort order (next page)"),
+    output_format: str = typer.Option("text", "--format", "-f", help="Output format: text, json, ndjson"),
 ):
     """
     List all books in the library with metadata.
 
     Output is optimized for LLM consumption with structured markdown format.
+    Default metadata is read from the memory-mapped catalog snapshot, which
+    starts printing within milliseconds even for very large libraries;
+    --full and the word_count/chapter_count fields query the database.
+    Books are streamed as they are read; --format json or ndjson emits
+    machine-readable records instead of text.
     """
     try:
         config = get_config()
@@ -266,30 +550,71 @@ def list_books(
             console.print("Error: CandleKeep not initialized. Run 'candlekeep init' first.")
             raise typer.Exit(1)
 
+        try:
+            validate_format(output_format)
+        except ValueError as e:
+            console.print(f"Error: {e}")
+            raise typer.Exit(1)
+
+        if sort not in _SORT_KEYS:
+            console.print(f"Error: Invalid sort key: {sort}. Use one of: {', '.join(_SORT_KEYS)}")
+            raise typer.Exit(1)
+
+        if limit is not None and limit <= 0:
+            console.print("Error: --limit must be positive.")
+            raise typer.Exit(1)
+
         # Parse fields if provided
         field_list = None
         if fields:
             field_list = [f.strip() for f in fields.split(',')]
 
-        # Get all books from database
-        db_manager = get_db_manager()
-        with db_manager.get_session() as session:
-            books = session.query(Book).order_by(Book.id).all()
+        # Default metadata comes from the catalog snapshot when it is usable
+        catalog = None
+        if not full and not set(field_list or []) & set(_DATABASE_ONLY_FIELDS):
+            catalog = open_catalog()
+
+        if catalog is not None:
+            filters = {
+                'category': category or None,
+                'tag': tag or None,
+                'author': author or None,
+                'added_since': added_since.isoformat(timespec='seconds') if added_since else None,
+                'has_images': has_images,
+            }
+            try:
+                selection = catalog.select(sort=sort, desc=desc, after=after, **filters)
+            except ValueError as e:
+                console.print(f"Error: {e}")
+                raise typer.Exit(1)
 
-            if not books:
-                console.print("No books found in library.")
-                raise typer.Exit(0)
+            # NDJSON carries only the book records, so skip the count
+            total = catalog.count_matching(**filters) if output_format != 'ndjson' else None
+            records = (catalog.record(index, field_list) for index in selection)
+            filtered = any(value is not None for value in filters.values())
+            _print_books(records, total, filtered, limit, output_format)
+            return
 
-            # Format output
-            output_lines = [f"# Library Books (Total: {len(books)})", ""]
+        from ..db import queries
+        from ..db.session import get_db_manager
 
-            for book in books:
-                book_text = _format_book_for_llm(book, full=full, fields=field_list)
-                output_lines.append(book_text)
-                output_lines.append("")  # Blank line between books
+        filters = queries.build_book_filters(category, tag, author, added_since, has_images)
 
-            # Print to stdout
-            print("\n".join(output_lines))
+        db_manager = get_db_manager()
+        with db_manager.get_session() as session:
+            try:
+                query = queries.build_books_query(session, filters, sort, desc, after, full=full, fields=field_list)
+            except ValueError as e:
+                console.print(f"Error: {e}")
+                raise typer.Exit(1)
+
+            total = queries.count_books(session, filters) if output_format != 'ndjson' else None
+
+            # Fetch one extra row to know whether there is a next page
+            if limit is not None:
+                query = query.limit(limit + 1)
+            records = queries.book_records(query, full=full, fields=field_list)
+            _print_books(records, total, bool(filters), limit, output_format)
 
     except typer.Exit:
         raise
@@ -301,12 +626,20 @@ def list_books(
 @app.command("toc")
 def get_toc(
     book_id: int = typer.Argument(..., help="Book ID to get table of contents for"),
+    output_format: str = typer.Option("text", "--format", "-f", help="Output format: text, json, ndjson"),
+    with_sizes: bool = typer.Option(False, "--with-sizes", help="Show each section's estimated size in tokens"),
 ):
     """
     Get table of contents for a specific book.
 
-    Output is optimized for LLM consumption with hierarchical text format.
+    Output is optimized for LLM consumption with hierarchical text format;
+    --format json or ndjson emits one record per TOC entry instead.
+    With --with-sizes, each entry also gets its section's estimated token
+    total (from the per-page statistics; unknown for lazily converted books).
+    TOCs built from heading fonts, for PDFs without an outline, are marked
+    as synthesized.
     """
+    started = time.perf_counter()
     try:
         config = get_config()
 
@@ -315,6 +648,16 @@ def get_toc(
             console.print("Error: CandleKeep not initialized. Run 'candlekeep init' first.")
             raise typer.Exit(1)
 
+        try:
+            validate_format(output_format)
+        except ValueError as e:
+            console.print(f"Error: {e}")
+            raise typer.Exit(1)
+
+        from ..db import queries
+        from ..db.models import Book
+        from ..db.session import get_db_manager
+
         # Get book from database
         db_manager = get_db_manager()
         with db_manager.get_session() as session:
@@ -324,9 +667,26 @@ def get_toc(
                 console.print(f"Error: Book with ID {book_id} not found.")
                 raise typer.Exit(1)
 
-            # Format and print TOC
-            toc_text = _format_toc_for_llm(book)
-            print(toc_text)
+            records = queries.toc_records(session, book.id)
+            if with_sizes:
+                from ..index.page_table import page_token_counts, token_prefix_sums
+
+                records = _with_sizes(records, token_prefix_sums(page_token_counts(session, book)))
+            found, records = peek(records)
+            header_lines = [f"## Table of Contents - Book ID: {book.id}", f"Title: {book.title}"]
+            if book.toc_synthesized:
+                header_lines.append("(Synthesized from heading fonts; the PDF has no outline)")
+            stream_records(
+                records,
+                output_format,
+                'entries',
+                _format_toc_entry_for_llm,
+                header={'book_id': book.id, 'title': book.title, 'synthesized': book.toc_synthesized},
+                header_lines=[*header_lines, ""],
+                footer=lambda: ([] if found else ["No table of contents available for this book."], {}),
+            )
+
+        _record_access('toc', book_id, [], 0, started, output_format)
 
     except typer.Exit:
         raise
@@ -339,12 +699,29 @@ def get_toc(
 def get_pages(
     book_id: int = typer.Argument(..., help="Book ID to get pages from"),
     pages: str = typer.Option(..., "--pages", "-p", help="Page ranges (e.g., '1-5,10-15' or '1,2,3')"),
+    output_format: str = typer.Option("text", "--format", "-f", help="Output format: text, json, ndjson"),
+    max_tokens: Optional[int] = typer.Option(
+        None, "--max-tokens", min=1, help="Stop before the page that would go over this many tokens (estimated)"
+    ),
+    printed: bool = typer.Option(
+        False, "--printed", help="Read --pages as the page numbers printed in the book (where CandleKeep found them)"
+    ),
 ):
     """
     Get specific pages from a book's markdown content.
 
-    Supports page ranges and multiple pages. Output is raw markdown content.
+    Supports page ranges and multiple pages. Output is raw markdown content;
+    --format json or ndjson emits one record per page instead. Pages are
+    streamed from the markdown file, so long ranges use little memory.
+    Requests of up to 64 pages are cached, so asking again for the same
+    pages is answered without reading the book or the database.
+    With --max-tokens, output stops at the last whole page within the
+    budget and ends with the pages left out. Pages are PDF page numbers,
+    as `toc` and the search commands show them; with --printed they are
+    the numbers printed on the pages instead.
     """
+    started = time.perf_counter()
+    page_cache = None
     try:
         config = get_config()
 
@@ -353,13 +730,36 @@ def get_pages(
             console.print("Error: CandleKeep not initialized. Run 'candlekeep init' first.")
             raise typer.Exit(1)
 
-        # Parse page ranges
+        # Parse page ranges and output format
         try:
             page_list = _parse_page_ranges(pages)
+            validate_format(output_format)
         except ValueError as e:
             console.print(f"Error: {e}")
             raise typer.Exit(1)
 
+        # Repeated requests come straight from the page cache
+        version = content_version(book_id)
+        render_key = f"{output_format}:{pages}" + (f":{max_tokens}" if max_tokens is not None else "")
+        if printed:
+            render_key += ":printed"
+        if version is not None and len(page_list) <= MAX_CACHED_PAGES:
+            page_cache = PageCache()
+            rendered = page_cache.get(book_id, version, render_key)
+            if rendered is not None:
+                sys.stdout.write(rendered)
+                sys.stdout.flush()
+                # The physical pages of a printed request aren't known without the database
+                _record_access(
+                    'pages', book_id, page_list, len(page_list), started, output_format, pages, printed,
+                    log_range=not printed,
+                )
+                return
+
+        from ..db import queries
+        from ..db.models import Book
+        from ..db.session import get_db_manager
+
         # Get book from database
         db_manager = get_db_manager()
         with db_manager.get_session() as session:
@@ -369,31 +769,209 @@ def get_pages(
                 console.print(f"Error: Book with ID {book_id} not found.")
                 raise typer.Exit(1)
 
-            # Resolve printed page numbers to physical page numbers
-            # This allows users to query by the page number printed in the book
-            resolved_page_list = _resolve_printed_to_physical_pages(book_id, page_list, session)
-
-            # Extract pages from markdown file
             md_path = Path(book.markdown_file_path)
-            try:
-                content = _extract_pages_from_markdown(md_path, resolved_page_list)
+            if not md_path.exists():
+                console.print(f"Error: Markdown file not found: {md_path}")
+                raise typer.Exit(1)
 
-                if not content:
-                    console.print(f"Warning: No content found for requested pages.")
-                    raise typer.Exit(0)
+            printed_pages = None
+            if printed:
+                printed_pages = page_list
+                page_list = queries.resolve_printed_to_physical_pages(book.id, page_list, session)
+
+            # Cached requests are small, so render them in memory to store the output
+            out = io.StringIO() if page_cache is not None else sys.stdout
+            found, cached_pages = _write_pages(
+                session, book, pages, page_list, output_format, out, version, page_cache, max_tokens, printed_pages
+            )
+            if not found:
+                console.print(f"Warning: No content found for requested pages.")
+                raise typer.Exit(0)
+
+            if page_cache is not None:
+                sys.stdout.write(out.getvalue())
+                sys.stdout.flush()
+                page_cache.put(book.id, version, render_key, out.getvalue())
+
+        _record_access('pages', book_id, page_list, cached_pages, started, output_format, pages, printed)
+
+    except typer.Exit:
+        raise
+    except Exception as e:
+        console.print(f"Error: {e}")
+        raise typer.Exit(1)
+    finally:
+        # Writes the buffered hit counts and recency, after the output
+        if page_cache is not None:
+            page_cache.close()
+
+
+@app.command("images")
+def list_images(
+    book_id: Optional[int] = typer.Option(None, "--book", "-b", help="Only this book's images"),
+    pages: Optional[str] = typer.Option(None, "--pages", "-p", help="Only these pages of --book (e.g., '40-60')"),
+    printed: bool = typer.Option(False, "--printed", help="Read --pages as the page numbers printed in the book"),
+    category: Optional[str] = typer.Option(None, "--category", help="Only images of books in this category"),
+    tag: Optional[str] = typer.Option(None, "--tag", help="Only images of books with this tag (comma-separated: all of them)"),
+    min_width: Optional[int] = typer.Option(None, "--min-width", min=1, help="Smallest width in pixels"),
+    min_height: Optional[int] = typer.Option(None, "--min-height", min=1, help="Smallest height in pixels"),
+    image_format: Optional[str] = typer.Option(None, "--image-format", help="Only this file format: png, jpg"),
+    colorspace: Optional[str] = typer.Option(None, "--colorspace", help="Only this colorspace: rgb, gray, cmyk"),
+    fit: Optional[int] = typer.Option(
+        None, "--fit", min=1, help="Show the smallest stored version at least this many pixels on its longer side"
+    ),
+    limit: int = typer.Option(50, "--limit", min=1, help="Maximum number of images to show"),
+    after: Optional[int] = typer.Option(None, "--after", help="Show images after this image ID (next page)"),
+    output_format: str = typer.Option("text", "--format", "-f", help="Output format: text, json, ndjson"),
+):
+    """
+    List the images extracted from the library's books.
 
-                # Print header and content
-                print(f"## Book ID: {book.id} - {book.title}")
-                print(f"Pages: {pages}")
-                print("")
-                print(content)
+    Images are listed by book, page and ID with their file path, size,
+    format and colorspace; filters combine freely, and --after pages
+    through the results. The catalog is indexed by book and page and by
+    size, so filtered pages come back quickly even from millions of
+    images. --pages takes PDF page numbers, or printed ones with --printed.
+    """
+    try:
+        config = get_config()
 
-            except FileNotFoundError as e:
+        # Check if CandleKeep is initialized
+        if not config.is_initialized:
+            console.print("Error: CandleKeep not initialized. Run 'candlekeep init' first.")
+            raise typer.Exit(1)
+
+        try:
+            validate_format(output_format)
+            page_list = _parse_page_ranges(pages) if pages else None
+        except ValueError as e:
+            console.print(f"Error: {e}")
+            raise typer.Exit(1)
+
+        if page_list and book_id is None:
+            console.print("Error: --pages needs --book.")
+            raise typer.Exit(1)
+
+        if image_format and image_format.lower() not in ('png', 'jpg'):
+            console.print(f"Error: Invalid image format: {image_format}. Use one of: png, jpg")
+            raise typer.Exit(1)
+
+        from ..db import queries
+        from ..db.session import get_db_manager
+
+        db_manager = get_db_manager()
+        with db_manager.get_session() as session:
+            if page_list and printed:
+                page_list = queries.resolve_printed_to_physical_pages(book_id, page_list, session)
+            book_filters = queries.build_book_filters(category, tag, None, None, None)
+            filters = queries.build_image_filters(
+                book_id, page_list, min_width, min_height, image_format, colorspace, book_filters
+            )
+            try:
+                min_size = (min_width, min_height or 0) if book_id is None else None
+                query = queries.build_images_query(session, filters, after, min_size)
+            except ValueError as e:
                 console.print(f"Error: {e}")
                 raise typer.Exit(1)
 
+            # Fetch one extra row to know whether there is a next page
+            rows = query.limit(limit + 1)
+            images = _BookPage((queries.image_to_dict(image, title, fit) for image, title in rows), limit)
+            found, records = peek(images)
+            if not found and output_format == 'text':
+                console.print("No images match the given filters.")
+                raise typer.Exit(0)
+
+            def _footer():
+                lines = [f"Next page: --after {images.next_after}"] if images.next_after is not None else []
+                return lines, {'next_after': images.next_after}
+
+            stream_records(
+                records,
+                output_format,
+                'images',
+                lambda record: _format_image_for_llm(record) + "\n",
+                header_lines=["# Library Images", ""],
+                footer=_footer,
+            )
+
     except typer.Exit:
         raise
     except Exception as e:
         console.print(f"Error: {e}")
         raise typer.Exit(1)
+
+
+@app.command("warm", hidden=True)
+def warm(
+    book_id: int = typer.Argument(..., help="Book ID to warm the page cache for"),
+    after: Optional[str] = typer.Option(None, "--after", help="Page ranges just read (default: the TOC was just read)"),
+    output_format: str = typer.Option("text", "--format", "-f", help="Output format to pre-render"),
+    printed: bool = typer.Option(False, "--printed", help="--after was given in printed page numbers"),
+):
+    """
+    Warm the page cache with what is likely to be read next.
+
+    Started in the background by `pages` and `toc` when prefetch is on:
+    after pages N-M it renders the pages that follow, after `toc` the
+    sections the access log shows are read most (or the opening sections).
+    TOC ranges are physical pages and are cached under the keys of the
+    `pages` requests for them. Failures are silent; warming never affects
+    the command that started it.
+    """
+    try:
+        version = content_version(book_id)
+        if version is None:
+            return
+
+        from ..db import queries
+        from ..db.models import Book
+        from ..db.session import get_db_manager
+
+        page_cache = PageCache(count_hits=False)
+        db_manager = get_db_manager()
+        with db_manager.get_session() as session:
+            book = session.query(Book).filter(Book.id == book_id).first()
+            if not book or not Path(book.markdown_file_path).exists():
+                return
+
+            targets = []
+            if after is not None:
+                next_range = _next_range(_parse_page_ranges(after), book.page_count)
+                if next_range:
+                    targets.append(next_range)
+            else:
+                access_log = AccessLog()
+                reads = access_log.page_reads(book_id)
+                access_log.close()
+                for entry in _likely_sections(list(queries.toc_records(session, book_id)), reads):
+                    end = entry['end_page'] or entry['start_page']
+                    if end - entry['start_page'] < MAX_CACHED_PAGES:
+                        targets.append(_format_range(entry['start_page'], end))
+                        continue
+                    # Too long to render whole: cache its opening pages (TOC pages are physical)
+                    opening = list(range(entry['start_page'], entry['start_page'] + PREFETCH_SECTION_PAGES))
+                    _cached_page_records(book_id, version, Path(book.markdown_file_path), opening, page_cache)
+
+            for target in targets:
+                # Rendered and keyed the way `pages` would be asked for them (TOC ranges are physical)
+                target_printed = printed and after is not None
+                render_key = f"{output_format}:{target}" + (":printed" if target_printed else "")
+                if page_cache.get(book_id, version, render_key) is not None:
+                    continue
+                page_list = printed_pages = _parse_page_ranges(target)
+                if target_printed:
+                    page_list = queries.resolve_printed_to_physical_pages(book_id, printed_pages, session)
+                else:
+                    printed_pages = None
+                out = io.StringIO()
+                found, _ = _write_pages(
+                    session, book, target, page_list, output_format, out, version, page_cache,
+                    printed_pages=printed_pages,
+                )
+                if found:
+                    page_cache.put(book_id, version, render_key, out.getvalue())
+        page_cache.close()
+
+    except Exception:
+        raise typer.Exit(1)
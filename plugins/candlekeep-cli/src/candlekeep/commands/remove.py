@@ -0,0 +1,79 @@
+"""Command for removing books from the library."""
+
+from pathlib import Path
+
+import typer
+from rich.console import Console
+from rich.prompt import Confirm
+
+from ..db.models import Book
+from ..db.session import get_db_manager
+from ..index.pipeline import remove_book_indexes
+from ..utils.config import get_config
+from ..utils.image_utils import cleanup_book_images
+
+console = Console()
+app = typer.Typer()
+
+
+@app.command("remove")
+def remove_book(
+    book_id: int = typer.Argument(..., help="Book ID to remove"),
+    keep_files: bool = typer.Option(False, "--keep-files", help="Keep markdown, original, and image files on disk"),
+    yes: bool = typer.Option(False, "--yes", "-y", help="Skip the confirmation prompt"),
+):
+    """
+    Remove a book from the library.
+
+    Deletes the database record and search index entries, and (unless
+    --keep-files is given) the book's markdown, stored original, and images.
+    """
+    try:
+        config = get_config()
+
+        # Check if CandleKeep is initialized
+        if not config.is_initialized:
+            console.print("[red]Error:[/red] CandleKeep not initialized. Run 'candlekeep init' first.")
+            raise typer.Exit(1)
+
+        db_manager = get_db_manager()
+        with db_manager.get_session() as session:
+            book = session.query(Book).filter(Book.id == book_id).first()
+
+            if not book:
+                console.print(f"[red]Error:[/red] Book with ID {book_id} not found.")
+                raise typer.Exit(1)
+
+            console.print(f"Book ID: {book.id}")
+            console.print(f"Title: {book.title}")
+            if book.author:
+                console.print(f"Author: {book.author}")
+
+            if not yes and not Confirm.ask("Remove this book?", default=False):
+                console.print("[cyan]Removal cancelled.[/cyan]")
+                raise typer.Exit(0)
+
+            title = book.title
+            markdown_path = Path(book.markdown_file_path)
+            original_path = Path(book.original_file_path)
+
+            # ORM cascade removes notes and image records
+            session.delete(book)
+
+        remove_book_indexes(book_id)
+
+        if not keep_files:
+            if markdown_path.exists():
+                markdown_path.unlink()
+            # Only delete originals we copied into the library, never the user's source file
+            if original_path.parent == config.originals_dir and original_path.exists():
+                original_path.unlink()
+            cleanup_book_images(book_id)
+
+        console.print(f"[green]✓[/green] Removed {title} (ID: {book_id})")
+
+    except typer.Exit:
+        raise
+    except Exception as e:
+        console.print(f"[red]Unexpected error:[/red] {e}")
+        raise typer.Exit(1)
@@ -0,0 +1,874 @@
+"""Commands for searching book content across the library."""
+
+import re
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+import typer
+from rich.console import Console
+
+from ..db.models import Book, BookImage, RelatedUnit, TocEntry
+from ..db.queries import image_to_dict
+from ..db.session import get_db_manager
+from ..index.ann import semantic_search
+from ..index.embeddings import embed_text
+from ..index.fingerprints import locate_passage
+from ..index.grep import compile_pattern, grep_books
+from ..index.hybrid import hybrid_search, pack_context
+from ..index.image_hash import (
+    DEFAULT_SIMILAR_DISTANCE,
+    HASH_BITS,
+    hash_from_db,
+    hash_image_file,
+    similar_images,
+)
+from ..index.page_table import PageLocator
+from ..index.related import find_section_unit, related_books, related_sections
+from ..utils.config import get_config
+from ..utils.content_utils import estimate_tokens
+from ..utils.output import stream_records, validate_format
+from ..utils.toc_utils import search_toc_entries
+
+console = Console()
+app = typer.Typer()
+
+# Characters of chunk text shown per hit
+SNIPPET_CHARS = 300
+
+
+def _parse_book_ids(books: Optional[str]) -> Optional[List[int]]:
+    """
+    Parse a comma-separated list of book IDs.
+
+    Raises:
+        ValueError: If any entry is not an integer
+    """
+    if not books:
+        return None
+    try:
+        return [int(part.strip()) for part in books.split(',') if part.strip()]
+    except ValueError:
+        raise ValueError(f"Invalid book ID list: {books}")
+
+
+def _make_snippet(text: str, max_chars: int = SNIPPET_CHARS) -> str:
+    """Collapse whitespace and truncate text for display."""
+    snippet = re.sub(r'\s+', ' ', text).strip()
+    if len(snippet) > max_chars:
+        snippet = snippet[:max_chars].rsplit(' ', 1)[0] + " ..."
+    return snippet
+
+
+def _read_markdown(book: Book) -> str:
+    """A book's markdown text ("" if the file is missing)."""
+    md_path = Path(book.markdown_file_path)
+    return md_path.read_text(encoding='utf-8') if md_path.exists() else ""
+
+
+def _hit_records(hits: List[Dict[str, Any]], books_by_id: Dict[int, Book]) -> Iterator[dict]:
+    """Yield `similar` hits as records, reading each book's markdown once."""
+    contents: Dict[int, str] = {}
+    for hit in hits:
+        book = books_by_id.get(hit['book_id'])
+        if book is None:
+            # Book was removed after it was indexed
+            continue
+        if book.id not in contents:
+            contents[book.id] = _read_markdown(book)
+        yield {
+            'book_id': book.id,
+            'title': book.title,
+            'page': hit['page'],
+            'score': round(hit['score'], 6),
+            'snippet': _make_snippet(contents[book.id][hit['start']:hit['end']]),
+        }
+
+
+def _format_hit_for_llm(record: dict) -> str:
+    """Format a `similar` hit record as a block of text."""
+    lines = [
+        f"## Book ID: {record['book_id']} - {record['title']}",
+        f"Page: {record['page']}",
+        f"Score: {record['score']:.4f}",
+        f"Snippet: {record['snippet']}",
+    ]
+    return "\n".join(lines) + "\n"
+
+
+@app.command("similar")
+def similar(
+    text: str = typer.Argument(..., help="Text or question to find similar passages for"),
+    top_k: int = typer.Option(10, "--top-k", "-k", help="Number of passages to return"),
+    books: Optional[str] = typer.Option(None, "--books", help="Comma-separated book IDs to search"),
+    exact: bool = typer.Option(False, "--exact", help="Score every stored vector instead of using the ANN index"),
+    nprobe: Optional[int] = typer.Option(
+        None, "--nprobe", min=1,
+        help="ANN clusters to scan (default: a third of them; higher = better recall, slower)",
+    ),
+    output_format: str = typer.Option("text", "--format", "-f", help="Output format: text, json, ndjson"),
+):
+    """
+    Find passages semantically similar to the given text.
+
+    Uses the local semantic index (no network model) and its approximate
+    nearest-neighbour index once the library is large enough. Output is
+    optimized for LLM consumption with one block per matching page.
+
+    The approximate index scans a third of its clusters by default, which
+    finds about 90% of the exact top 10 in 2-3x less time than --exact.
+    Lower --nprobe is faster but misses more (16 clusters: about 75%);
+    --exact always finds the true top results.
+    """
+    try:
+        config = get_config()
+
+        # Check if CandleKeep is initialized
+        if not config.is_initialized:
+            console.print("Error: CandleKeep not initialized. Run 'candlekeep init' first.")
+            raise typer.Exit(1)
+
+        try:
+            validate_format(output_format)
+            book_ids = _parse_book_ids(books)
+        except ValueError as e:
+            console.print(f"Error: {e}")
+            raise typer.Exit(1)
+
+        hits = semantic_search(embed_text(text), top_k=top_k, book_ids=book_ids, exact=exact, nprobe=nprobe)
+        if not hits and output_format == 'text':
+            console.print("No similar passages found. Run 'candlekeep reindex' to build the index.")
+            raise typer.Exit(0)
+
+        db_manager = get_db_manager()
+        with db_manager.get_session() as session:
+            hit_book_ids = {hit['book_id'] for hit in hits}
+            books_by_id: Dict[int, Book] = {
+                book.id: book
+                for book in session.query(Book).filter(Book.id.in_(hit_book_ids))
+            }
+
+            stream_records(
+                _hit_records(hits, books_by_id),
+                output_format,
+                'hits',
+                _format_hit_for_llm,
+                header={'query': text},
+                header_lines=[f"# Similar Passages (Query: {text})", ""],
+            )
+
+    except typer.Exit:
+        raise
+    except Exception as e:
+        console.print(f"Error: {e}")
+        raise typer.Exit(1)
+
+
+def _format_pages(first_page: int, last_page: int) -> str:
+    """Format a page citation, e.g. 'page 4' or 'pages 4-6'."""
+    if first_page == last_page:
+        return f"page {first_page}"
+    return f"pages {first_page}-{last_page}"
+
+
+def _format_passage_for_llm(record: dict) -> str:
+    """Format a `context` passage record as a cited block of text."""
+    return (
+        f"## [{record['number']}] Book ID: {record['book_id']} - {record['title']}, "
+        f"{_format_pages(record['first_page'], record['last_page'])}\n\n{record['text']}\n"
+    )
+
+
+def _format_source(record: dict) -> str:
+    """Format the source line a `context` passage's citation number refers to."""
+    author = f" by {record['author']}" if record['author'] else ""
+    return (
+        f"[{record['number']}] {record['title']}{author} (Book ID: {record['book_id']}), "
+        f"{_format_pages(record['first_page'], record['last_page'])}"
+    )
+
+
+@app.command("context")
+def context(
+    question: str = typer.Argument(..., help="Question or topic to gather context for"),
+    max_tokens: int = typer.Option(6000, "--max-tokens", "-t", help="Token budget for the returned passages"),
+    books: Optional[str] = typer.Option(None, "--books", help="Comma-separated book IDs to search"),
+    candidates: int = typer.Option(50, "--candidates", help="Hits taken from each retriever before fusion"),
+    output_format: str = typer.Option("text", "--format", "-f", help="Output format: text, json, ndjson"),
+):
+    """
+    Gather the most relevant passages for a question within a token budget.
+
+    Runs keyword (BM25) and semantic search in parallel, fuses them with
+    reciprocal rank fusion, and packs the best passages into --max-tokens
+    with book and page citations. Replaces list -> toc -> pages round trips.
+    """
+    try:
+        config = get_config()
+
+        # Check if CandleKeep is initialized
+        if not config.is_initialized:
+            console.print("Error: CandleKeep not initialized. Run 'candlekeep init' first.")
+            raise typer.Exit(1)
+
+        if max_tokens <= 0:
+            console.print("Error: --max-tokens must be positive.")
+            raise typer.Exit(1)
+
+        try:
+            validate_format(output_format)
+            book_ids = _parse_book_ids(books)
+        except ValueError as e:
+            console.print(f"Error: {e}")
+            raise typer.Exit(1)
+
+        hits = hybrid_search(question, candidates=candidates, book_ids=book_ids)
+        if not hits and output_format == 'text':
+            console.print("No relevant passages found. Run 'candlekeep reindex' to build the index.")
+            raise typer.Exit(0)
+
+        db_manager = get_db_manager()
+        with db_manager.get_session() as session:
+            hit_book_ids = {hit['book_id'] for hit in hits}
+            books_by_id: Dict[int, Book] = {
+                book.id: book
+                for book in session.query(Book).filter(Book.id.in_(hit_book_ids))
+            }
+            # Book was removed after it was indexed
+            hits = [hit for hit in hits if hit['book_id'] in books_by_id]
+
+            contents: Dict[int, str] = {}
+
+            def load_text(book_id: int) -> str:
+                if book_id not in contents:
+                    contents[book_id] = _read_markdown(books_by_id[book_id])
+                return contents[book_id]
+
+            def header_tokens(hit: Dict) -> int:
+                return estimate_tokens(f"## [00] Book ID: {hit['book_id']} - {books_by_id[hit['book_id']].title}, pages 0000-0000\n\n")
+
+            passages = pack_context(hits, load_text, max_tokens, header_tokens)
+
+            used_tokens = sum(passage['tokens'] + header_tokens(passage) for passage in passages)
+            records = [
+                {
+                    'number': number,
+                    'book_id': passage['book_id'],
+                    'title': books_by_id[passage['book_id']].title,
+                    'author': books_by_id[passage['book_id']].author,
+                    'first_page': passage['first_page'],
+                    'last_page': passage['last_page'],
+                    'tokens': passage['tokens'],
+                    'text': passage['text'],
+                }
+                for number, passage in enumerate(passages, start=1)
+            ]
+
+            stream_records(
+                records,
+                output_format,
+                'passages',
+                _format_passage_for_llm,
+                header={'question': question, 'max_tokens': max_tokens, 'used_tokens': used_tokens},
+                header_lines=[
+                    f"# Context for: {question}",
+                    f"Passages: {len(passages)} (~{used_tokens:,} of {max_tokens:,} tokens)",
+                    "",
+                ],
+                footer=lambda: (["## Sources", *(_format_source(record) for record in records)], {}),
+            )
+
+    except typer.Exit:
+        raise
+    except Exception as e:
+        console.print(f"Error: {e}")
+        raise typer.Exit(1)
+
+
+def _format_section_pages(record: dict) -> str:
+    """Format a TOC section's page span, e.g. 'Pages 40-55'."""
+    if not record['start_page']:
+        return "Page N/A"
+    if record['end_page'] and record['end_page'] != record['start_page']:
+        return f"Pages {record['start_page']}-{record['end_page']}"
+    return f"Page {record['start_page']}"
+
+
+def _section_records(entries: List[TocEntry]) -> Iterator[dict]:
+    """Yield `toc-search` matches as records, grouped by book in order of each book's best match."""
+    by_book: Dict[int, List[TocEntry]] = {}
+    for entry in entries:
+        by_book.setdefault(entry.book_id, []).append(entry)
+
+    for entries_in_book in by_book.values():
+        for entry in entries_in_book:
+            ancestors = []
+            parent = entry.parent
+            while parent is not None:
+                ancestors.append(parent.title)
+                parent = parent.parent
+            yield {
+                'book_id': entry.book_id,
+                'book_title': entry.book.title,
+                'title': entry.title,
+                'level': entry.level,
+                'start_page': entry.start_page,
+                'end_page': entry.end_page,
+                'ancestors': list(reversed(ancestors)),
+            }
+
+
+def _section_formatter():
+    """Format `toc-search` records, starting a new block at each book."""
+    current_book = None
+
+    def format_section(record: dict) -> str:
+        nonlocal current_book
+        lines = []
+        if record['book_id'] != current_book:
+            if current_book is not None:
+                lines.append("")
+            lines.append(f"## Book ID: {record['book_id']} - {record['book_title']}")
+            current_book = record['book_id']
+        lines.append(f"{record['title']} ({_format_section_pages(record)})")
+        if record['ancestors']:
+            lines.append(f"  In: {' > '.join(record['ancestors'])}")
+        return "\n".join(lines)
+
+    return format_section
+
+
+@app.command("toc-search")
+def toc_search(
+    query: str = typer.Argument(..., help="Words to look for in section titles"),
+    limit: int = typer.Option(20, "--limit", "-n", help="Maximum number of sections to return"),
+    books: Optional[str] = typer.Option(None, "--books", help="Comma-separated book IDs to search"),
+    output_format: str = typer.Option("text", "--format", "-f", help="Output format: text, json, ndjson"),
+):
+    """
+    Find chapters and sections across all books by title.
+
+    Matches sections whose titles contain every query word (substrings too,
+    so "hash" finds "Consistent Hashing"). Output is grouped by book with
+    page spans ready for the `pages` command.
+    """
+    try:
+        config = get_config()
+
+        # Check if CandleKeep is initialized
+        if not config.is_initialized:
+            console.print("Error: CandleKeep not initialized. Run 'candlekeep init' first.")
+            raise typer.Exit(1)
+
+        try:
+            validate_format(output_format)
+            book_ids = _parse_book_ids(books)
+        except ValueError as e:
+            console.print(f"Error: {e}")
+            raise typer.Exit(1)
+
+        db_manager = get_db_manager()
+        with db_manager.get_session() as session:
+            entries = search_toc_entries(session, query, limit=limit, book_ids=book_ids)
+            if not entries and output_format == 'text':
+                console.print(f"No sections found matching: {query}")
+                raise typer.Exit(0)
+
+            stream_records(
+                _section_records(entries),
+                output_format,
+                'sections',
+                _section_formatter(),
+                header={'query': query},
+                header_lines=[f"# TOC Search (Query: {query})", f"Matches: {len(entries)}", ""],
+            )
+
+    except typer.Exit:
+        raise
+    except Exception as e:
+        console.print(f"Error: {e}")
+        raise typer.Exit(1)
+
+
+def _format_grep_hit_for_llm(record: dict) -> str:
+    """Format a `grep` hit record as a block of text."""
+    lines = [f"## Book ID: {record['book_id']} - {record['title']}"]
+    if record['page'] is not None:
+        page_line = f"Page: {record['page']}"
+        if record['printed_page'] is not None:
+            page_line += f" (Printed: {record['printed_page']})"
+        lines.append(page_line)
+    if record['section']:
+        lines.append(f"Section: {record['section']}")
+    lines.append(f"Line: {record['line']}")
+    return "\n".join(lines) + "\n"
+
+
+@app.command("grep")
+def grep(
+    pattern: str = typer.Argument(..., help="Regular expression to search for"),
+    books: Optional[str] = typer.Option(None, "--books", help="Comma-separated book IDs to search"),
+    category: Optional[str] = typer.Option(None, "--category", help="Only search books in this category"),
+    max_hits: int = typer.Option(50, "--max-hits", "-m", help="Stop after this many matches"),
+    ignore_case: bool = typer.Option(False, "--ignore-case", "-i", help="Case-insensitive matching"),
+    output_format: str = typer.Option("text", "--format", "-f", help="Output format: text, json, ndjson"),
+):
+    """
+    Find exact text or regex matches across every book.
+
+    Use for error codes, API names, and other strings that word-based search
+    mangles. Books are scanned in parallel and matches are printed as they
+    are found, each with its page, printed page, and TOC section (one
+    NDJSON line per match with --format ndjson).
+    """
+    try:
+        config = get_config()
+
+        # Check if CandleKeep is initialized
+        if not config.is_initialized:
+            console.print("Error: CandleKeep not initialized. Run 'candlekeep init' first.")
+            raise typer.Exit(1)
+
+        try:
+            validate_format(output_format)
+            book_ids = _parse_book_ids(books)
+            regex = compile_pattern(pattern, ignore_case=ignore_case)
+        except ValueError as e:
+            console.print(f"Error: {e}")
+            raise typer.Exit(1)
+
+        db_manager = get_db_manager()
+        with db_manager.get_session() as session:
+            query = session.query(Book.id, Book.title, Book.markdown_file_path).order_by(Book.id)
+            if book_ids:
+                query = query.filter(Book.id.in_(book_ids))
+            if category:
+                query = query.filter(Book.category == category)
+            targets = query.all()
+
+            if not targets and output_format == 'text':
+                console.print("No books to search.")
+                raise typer.Exit(0)
+
+            titles = {book.id: book.title for book in targets}
+            locator = PageLocator(session)
+            # Keep warnings out of the JSON stream
+            warnings = console if output_format == 'text' else Console(stderr=True)
+
+            def report_error(book_id: int, message: str):
+                warnings.print(f"Warning: Could not scan book {book_id}: {message}")
+
+            hit_count = 0
+
+            def records() -> Iterator[dict]:
+                nonlocal hit_count
+                for hit in grep_books(
+                    [(book.id, Path(book.markdown_file_path)) for book in targets],
+                    regex,
+                    max_hits=max_hits,
+                    on_error=report_error,
+                ):
+                    location = locator.locate(hit['book_id'], hit['offset'])
+                    yield {
+                        'book_id': hit['book_id'],
+                        'title': titles[hit['book_id']],
+                        'page': location['page'],
+                        'printed_page': location['printed_page'],
+                        'section': location['section'],
+                        'line': hit['line'],
+                        'offset': hit['offset'],
+                    }
+                    hit_count += 1
+
+            def footer():
+                if hit_count == 0:
+                    line = "No matches found."
+                elif hit_count >= max_hits:
+                    line = f"Matches: {hit_count} (stopped at --max-hits)"
+                else:
+                    line = f"Matches: {hit_count}"
+                return [line], {'truncated': hit_count >= max_hits}
+
+            stream_records(
+                records(),
+                output_format,
+                'matches',
+                _format_grep_hit_for_llm,
+                header={'pattern': pattern},
+                header_lines=[f"# Grep Results (Pattern: {pattern})", ""],
+                footer=footer,
+                flush_each=True,
+            )
+
+    except typer.Exit:
+        raise
+    except Exception as e:
+        console.print(f"Error: {e}")
+        raise typer.Exit(1)
+
+
+def _format_location_for_llm(record: dict) -> str:
+    """Format a `locate` match record as a block of text."""
+    lines = [f"## Book ID: {record['book_id']} - {record['title']}"]
+    if record['first_page'] is not None:
+        if record['last_page'] != record['first_page']:
+            lines.append(f"Pages: {record['first_page']}-{record['last_page']}")
+        else:
+            lines.append(f"Page: {record['first_page']}")
+        if record['printed_page'] is not None:
+            lines.append(f"Printed Page: {record['printed_page']}")
+    if record['section']:
+        lines.append(f"Section: {record['section']}")
+    lines.append(f"Offset: {record['start']}-{record['end']}")
+    lines.append(f"Match: {record['score']:.0%} ({record['matched']} of {record['total']} fingerprints)")
+    lines.append(f"Text: {record['text']}")
+    return "\n".join(lines) + "\n"
+
+
+@app.command("locate")
+def locate(
+    passage: str = typer.Argument(..., help="Quoted or closely paraphrased passage to find"),
+    top_k: int = typer.Option(3, "--top-k", "-k", help="Number of books to return"),
+    books: Optional[str] = typer.Option(None, "--books", help="Comma-separated book IDs to search"),
+    output_format: str = typer.Option("text", "--format", "-f", help="Output format: text, json, ndjson"),
+):
+    """
+    Find the book, page, and offset a quoted passage comes from.
+
+    Matches on text fingerprints, so differences in spacing, punctuation,
+    hyphenation, and small OCR errors are tolerated. Use it to cite a quote.
+    """
+    try:
+        config = get_config()
+
+        # Check if CandleKeep is initialized
+        if not config.is_initialized:
+            console.print("Error: CandleKeep not initialized. Run 'candlekeep init' first.")
+            raise typer.Exit(1)
+
+        try:
+            validate_format(output_format)
+            book_ids = _parse_book_ids(books)
+        except ValueError as e:
+            console.print(f"Error: {e}")
+            raise typer.Exit(1)
+
+        matches = locate_passage(passage, top_k=top_k, book_ids=book_ids)
+        if not matches and output_format == 'text':
+            console.print("No matching passage found. Quotes shorter than about ten words may not be locatable.")
+            raise typer.Exit(0)
+
+        db_manager = get_db_manager()
+        with db_manager.get_session() as session:
+            books_by_id: Dict[int, Book] = {
+                book.id: book
+                for book in session.query(Book).filter(Book.id.in_({match['book_id'] for match in matches}))
+            }
+            locator = PageLocator(session)
+
+            def records() -> Iterator[dict]:
+                for match in matches:
+                    book = books_by_id.get(match['book_id'])
+                    if book is None:
+                        # Book was removed after it was indexed
+                        continue
+
+                    content = _read_markdown(book)
+                    end = min(match['end'], len(content))
+
+                    first = locator.locate_char(book.id, match['start'])
+                    last = locator.locate_char(book.id, max(end - 1, match['start']))
+                    yield {
+                        'book_id': book.id,
+                        'title': book.title,
+                        'first_page': first['page'],
+                        'last_page': last['page'],
+                        'printed_page': first['printed_page'],
+                        'section': first['section'],
+                        'start': match['start'],
+                        'end': end,
+                        'score': round(match['score'], 4),
+                        'matched': match['matched'],
+                        'total': match['total'],
+                        'text': _make_snippet(content[match['start']:end]),
+                    }
+
+            stream_records(
+                records(),
+                output_format,
+                'locations',
+                _format_location_for_llm,
+                header={'passage': passage},
+                header_lines=["# Passage Locations", ""],
+            )
+
+    except typer.Exit:
+        raise
+    except Exception as e:
+        console.print(f"Error: {e}")
+        raise typer.Exit(1)
+
+
+def _unit_record(unit: RelatedUnit) -> dict:
+    """A related-content section as a record (section is None for page-range units)."""
+    return {
+        'section': unit.toc_entry.title if unit.toc_entry is not None else None,
+        'first_page': unit.first_page,
+        'last_page': unit.last_page,
+    }
+
+
+def _format_unit(record: dict) -> str:
+    """Describe a related-content section, e.g. 'Chapter 6: Partitioning (Pages 199-224)'."""
+    if record['first_page'] == record['last_page']:
+        pages = f"Page {record['first_page']}"
+    else:
+        pages = f"Pages {record['first_page']}-{record['last_page']}"
+    if record['section'] is not None:
+        return f"{record['section']} ({pages})"
+    return pages
+
+
+def _format_related_section_for_llm(record: dict) -> str:
+    """Format a `related --section` record as a block of text."""
+    return (
+        f"## Book ID: {record['book_id']} - {record['title']}\n"
+        f"{_format_unit(record)}\n"
+        f"Similarity: {record['similarity']:.2f}\n"
+    )
+
+
+def _format_related_book_for_llm(record: dict) -> str:
+    """Format a `related` book record, with its closest section pairs, as a block of text."""
+    lines = [f"## Book ID: {record['book_id']} - {record['title']}", f"Similarity: {record['similarity']:.2f}"]
+    if record['sections']:
+        lines.append("Closest sections:")
+        for pair in record['sections']:
+            lines.append(f"- {_format_unit(pair['own'])} -> {_format_unit(pair['other'])} ({pair['similarity']:.2f})")
+    return "\n".join(lines) + "\n"
+
+
+@app.command("related")
+def related(
+    book_id: int = typer.Argument(..., help="Book ID"),
+    section: Optional[str] = typer.Option(
+        None, "--section", "-s", help="Section title (or page number) to find counterparts of, instead of the whole book"
+    ),
+    limit: int = typer.Option(10, "--limit", "-n", help="Maximum number of results"),
+    output_format: str = typer.Option("text", "--format", "-f", help="Output format: text, json, ndjson"),
+):
+    """
+    Find books, or sections of other books, that cover the same ground.
+
+    Uses precomputed TF-IDF similarity, so it answers instantly. Without
+    --section, lists similar books with their closest section pairs.
+    """
+    try:
+        config = get_config()
+
+        # Check if CandleKeep is initialized
+        if not config.is_initialized:
+            console.print("Error: CandleKeep not initialized. Run 'candlekeep init' first.")
+            raise typer.Exit(1)
+
+        try:
+            validate_format(output_format)
+        except ValueError as e:
+            console.print(f"Error: {e}")
+            raise typer.Exit(1)
+
+        db_manager = get_db_manager()
+        with db_manager.get_session() as session:
+            book = session.query(Book).filter(Book.id == book_id).first()
+            if not book:
+                console.print(f"Error: Book with ID {book_id} not found.")
+                raise typer.Exit(1)
+
+            if section:
+                unit = find_section_unit(session, book_id, section)
+                if unit is None:
+                    console.print(f"Error: No section matching '{section}' in book {book_id}. Run 'candlekeep reindex' if the book is new.")
+                    raise typer.Exit(1)
+
+                neighbors = related_sections(session, unit.id, limit)
+                if not neighbors and output_format == 'text':
+                    console.print("No related sections found in other books.")
+                    raise typer.Exit(0)
+
+                titles = dict(
+                    session.query(Book.id, Book.title).filter(Book.id.in_({other.book_id for other, _ in neighbors}))
+                )
+                section_record = _unit_record(unit)
+                stream_records(
+                    (
+                        {
+                            'book_id': other.book_id,
+                            'title': titles.get(other.book_id, 'Untitled'),
+                            **_unit_record(other),
+                            'similarity': round(float(score), 4),
+                        }
+                        for other, score in neighbors
+                    ),
+                    output_format,
+                    'sections',
+                    _format_related_section_for_llm,
+                    header={'book_id': book.id, 'title': book.title, 'section': section_record},
+                    header_lines=[
+                        f"# Related Sections - Book ID: {book.id} - {book.title}",
+                        f"Section: {_format_unit(section_record)}",
+                        "",
+                    ],
+                )
+            else:
+                results = related_books(session, book_id, limit)
+                if not results and output_format == 'text':
+                    console.print("No related books found. Run 'candlekeep reindex' if the book is new.")
+                    raise typer.Exit(0)
+
+                titles = dict(
+                    session.query(Book.id, Book.title).filter(Book.id.in_({result['book_id'] for result in results}))
+                )
+                stream_records(
+                    (
+                        {
+                            'book_id': result['book_id'],
+                            'title': titles.get(result['book_id'], 'Untitled'),
+                            'similarity': round(float(result['score']), 4),
+                            'sections': [
+                                {'own': _unit_record(own), 'other': _unit_record(other), 'similarity': round(float(score), 4)}
+                                for own, other, score in result['sections']
+                            ],
+                        }
+                        for result in results
+                    ),
+                    output_format,
+                    'books',
+                    _format_related_book_for_llm,
+                    header={'book_id': book.id, 'title': book.title},
+                    header_lines=[f"# Related Books - Book ID: {book.id} - {book.title}", ""],
+                )
+
+    except typer.Exit:
+        raise
+    except Exception as e:
+        console.print(f"Error: {e}")
+        raise typer.Exit(1)
+
+
+def _format_image(record: dict) -> List[str]:
+    """Describe a book image record (from queries.image_to_dict): page, size and files."""
+    page = f"Page: {record['page']}"
+    if record['printed_page'] is not None:
+        page += f" (Printed Page: {record['printed_page']})"
+    lines = [
+        f"Image ID: {record['id']}",
+        page,
+        f"Size: {record['width']}x{record['height']} {record['format']}",
+        f"File: {record['path']}",
+    ]
+    if record['preview_path']:
+        lines.append(f"Preview: {record['preview_path']}")
+    return lines
+
+
+def _format_similar_image_for_llm(record: dict) -> str:
+    """Format a `similar-images` match record as a block of text."""
+    lines = [
+        f"## Book ID: {record['book_id']} - {record['book_title']}",
+        *_format_image(record),
+        f"Distance: {record['distance']} of {HASH_BITS} bits",
+    ]
+    return "\n".join(lines) + "\n"
+
+
+@app.command("similar-images")
+def similar_images_command(
+    image_id: Optional[int] = typer.Argument(None, help="Image ID to find similar images of"),
+    file: Optional[Path] = typer.Option(None, "--file", help="Find images similar to this image file instead"),
+    max_distance: int = typer.Option(
+        DEFAULT_SIMILAR_DISTANCE, "--max-distance", min=0, max=HASH_BITS,
+        help="Most differing bits of the perceptual hash (0 = identical, 64 = anything)",
+    ),
+    limit: int = typer.Option(10, "--limit", "-n", help="Maximum number of results"),
+    books: Optional[str] = typer.Option(None, "--books", help="Comma-separated book IDs to search"),
+    output_format: str = typer.Option("text", "--format", "-f", help="Output format: text, json, ndjson"),
+):
+    """
+    Find figures across the library that look like an image.
+
+    Compares perceptual hashes, so rescaled, re-encoded or slightly edited
+    copies of a figure (another edition, another book reusing it) are found.
+    """
+    try:
+        config = get_config()
+
+        # Check if CandleKeep is initialized
+        if not config.is_initialized:
+            console.print("Error: CandleKeep not initialized. Run 'candlekeep init' first.")
+            raise typer.Exit(1)
+
+        if (image_id is None) == (file is None):
+            console.print("Error: Give either an image ID or --file.")
+            raise typer.Exit(1)
+
+        try:
+            validate_format(output_format)
+            book_ids = _parse_book_ids(books)
+        except ValueError as e:
+            console.print(f"Error: {e}")
+            raise typer.Exit(1)
+
+        db_manager = get_db_manager()
+        with db_manager.get_session() as session:
+            if file is not None:
+                if not file.exists():
+                    console.print(f"Error: File not found: {file}")
+                    raise typer.Exit(1)
+                value = hash_image_file(str(file))
+                header = {'file': str(file)}
+                header_lines = [f"# Images Similar to {file}", ""]
+            else:
+                image = session.get(BookImage, image_id)
+                if image is None:
+                    console.print(f"Error: Image with ID {image_id} not found.")
+                    raise typer.Exit(1)
+                if image.phash is None:
+                    console.print(f"Error: Image {image_id} has no hash yet. Run 'candlekeep reindex' to hash it.")
+                    raise typer.Exit(1)
+                value = hash_from_db(image.phash)
+                record = image_to_dict(image, image.book.title)
+                header = {'image': record}
+                header_lines = [
+                    f"# Images Similar to Image {image.id} - Book ID: {image.book_id} - {image.book.title}",
+                    *_format_image(record)[1:],
+                    "",
+                ]
+
+            matches = similar_images(session, value, max_distance, limit, book_ids, exclude_id=image_id)
+            if not matches and output_format == 'text':
+                console.print(f"No similar images found within {max_distance} bits.")
+                raise typer.Exit(0)
+
+            images = {
+                image.id: image
+                for image in session.query(BookImage).filter(BookImage.id.in_([match['image_id'] for match in matches]))
+            }
+            stream_records(
+                (
+                    {
+                        **image_to_dict(images[match['image_id']], images[match['image_id']].book.title),
+                        'distance': match['distance'],
+                    }
+                    for match in matches
+                ),
+                output_format,
+                'images',
+                _format_similar_image_for_llm,
+                header={**header, 'max_distance': max_distance},
+                header_lines=header_lines,
+            )
+
+    except typer.Exit:
+        raise
+    except Exception as e:
+        console.print(f"Error: {e}")
+        raise typer.Exit(1)
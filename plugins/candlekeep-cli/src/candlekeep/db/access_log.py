@@ -0,0 +1,215 @@
+"""Opt-in log of `pages` and `toc` requests, and the prefetch settings.
+
+Each request is recorded with its book, first and last page, timestamp,
+how many of its pages came from the page cache and how long it took. The
+log feeds the prefetcher (which sections of a book get read) and lets
+`candlekeep stats` compare hit rate and latency with prefetching on and off.
+
+Records are buffered and written with one batched insert once the command's
+output is out, so logging never slows the read itself. The log keeps the
+most recent LOG_MAX_ROWS requests. Like the page cache, this module only
+uses the standard library.
+"""
+
+import sqlite3
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..utils.config import get_config
+
+LOG_FILENAME = "access.db"
+
+# Buffered records are written once this many have accumulated (and on flush)
+LOG_BATCH_SIZE = 256
+
+# Older requests are dropped
+LOG_MAX_ROWS = 100_000
+
+# Settings and their defaults: both off until enabled with `candlekeep stats`
+SETTINGS = ('access_log', 'prefetch')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS accesses (
+    id INTEGER PRIMARY KEY,
+    op TEXT NOT NULL,
+    book_id INTEGER NOT NULL,
+    first_page INTEGER,
+    last_page INTEGER,
+    pages INTEGER NOT NULL,
+    cached_pages INTEGER NOT NULL,
+    latency_ms REAL NOT NULL,
+    prefetch INTEGER NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_accesses_book ON accesses (book_id);
+CREATE TABLE IF NOT EXISTS settings (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+) WITHOUT ROWID;
+"""
+
+
+def _percentile(values: List[float], fraction: float) -> Optional[float]:
+    """Nearest-rank percentile of sorted values (None if empty)."""
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+class AccessLog:
+    """
+    Buffered writer and reader of the access log (see module docstring).
+
+    Errors opening or writing the log (e.g. a read-only cache directory) are
+    ignored: the log is diagnostic and must never make a command fail.
+    """
+
+    def __init__(self, path: Optional[Path] = None, batch_size: int = LOG_BATCH_SIZE):
+        self.path = path or get_config().cache_dir / LOG_FILENAME
+        self.batch_size = batch_size
+        self._pending: List[Tuple] = []
+        self._settings: Optional[Dict[str, bool]] = None
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def close(self):
+        self.flush()
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def settings(self) -> Dict[str, bool]:
+        """Current settings ({name: enabled} for every name in SETTINGS)."""
+        if self._settings is None:
+            self._settings = dict.fromkeys(SETTINGS, False)
+            if self.path.exists():
+                try:
+                    for name, value in self._db().execute("SELECT name, value FROM settings"):
+                        if name in self._settings:
+                            self._settings[name] = bool(value)
+                except sqlite3.Error:
+                    pass
+        return self._settings
+
+    def set_setting(self, name: str, enabled: bool):
+        """
+        Turn a setting on or off.
+
+        Raises:
+            ValueError: If the setting doesn't exist
+        """
+        if name not in SETTINGS:
+            raise ValueError(f"Unknown setting: {name}. Use one of: {', '.join(SETTINGS)}")
+        self._db().execute(
+            "INSERT INTO settings (name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = excluded.value",
+            (name, int(enabled)),
+        )
+        self._settings = None
+
+    def record(
+        self,
+        op: str,
+        book_id: int,
+        first_page: Optional[int],
+        last_page: Optional[int],
+        pages: int,
+        cached_pages: int,
+        latency_ms: float,
+        prefetch: bool,
+    ):
+        """Buffer one request; written with the next batch."""
+        self._pending.append(
+            (op, book_id, first_page, last_page, pages, cached_pages, latency_ms, int(prefetch), time.time())
+        )
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Write buffered requests in one transaction."""
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, []
+        try:
+            conn = self._db()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany(
+                    "INSERT INTO accesses (op, book_id, first_page, last_page, pages, cached_pages, "
+                    "latency_ms, prefetch, accessed_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    pending,
+                )
+                conn.execute("DELETE FROM accesses WHERE id <= (SELECT MAX(id) FROM accesses) - ?", (LOG_MAX_ROWS,))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        except sqlite3.Error:
+            pass
+
+    def page_reads(self, book_id: int, limit: int = 1000) -> List[Tuple[int, int]]:
+        """
+        The book's most recent `pages` requests.
+
+        Returns:
+            List of (first_page, last_page), physical page numbers
+        """
+        if not self.path.exists():
+            return []
+        try:
+            return self._db().execute(
+                "SELECT first_page, last_page FROM accesses "
+                "WHERE book_id = ? AND op = 'pages' AND first_page IS NOT NULL ORDER BY id DESC LIMIT ?",
+                (book_id, limit),
+            ).fetchall()
+        except sqlite3.Error:
+            return []
+
+    def clear(self):
+        """Drop every logged request (settings are kept)."""
+        self._pending = []
+        self._db().execute("DELETE FROM accesses")
+
+    def report(self) -> Dict[bool, Dict[str, Any]]:
+        """
+        Summarize logged `pages` requests by whether prefetching was on.
+
+        Returns:
+            {prefetch: stats} for False and True, where stats has requests,
+            pages, cached_pages, hit_rate (None without requests) and
+            latency_p50_ms / latency_p95_ms (None without requests)
+        """
+        report = {}
+        for prefetch in (False, True):
+            requests, pages, cached = 0, 0, 0
+            latencies: List[float] = []
+            if self.path.exists():
+                conn = self._db()
+                requests, pages, cached = conn.execute(
+                    "SELECT COUNT(*), COALESCE(SUM(pages), 0), COALESCE(SUM(cached_pages), 0) "
+                    "FROM accesses WHERE op = 'pages' AND prefetch = ?",
+                    (int(prefetch),),
+                ).fetchone()
+                latencies = [row[0] for row in conn.execute(
+                    "SELECT latency_ms FROM accesses WHERE op = 'pages' AND prefetch = ? ORDER BY latency_ms",
+                    (int(prefetch),),
+                )]
+            report[prefetch] = {
+                'requests': requests,
+                'pages': pages,
+                'cached_pages': cached,
+                'hit_rate': cached / pages if pages else None,
+                'latency_p50_ms': _percentile(latencies, 0.5),
+                'latency_p95_ms': _percentile(latencies, 0.95),
+            }
+        return report
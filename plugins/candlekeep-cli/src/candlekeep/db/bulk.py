@@ -0,0 +1,55 @@
+"""Bulk inserts of a book's rows with SQLAlchemy Core.
+
+Adding a book writes one row per image, page and TOC entry, tens of
+thousands for an image-heavy book. ORM objects (and even ORM bulk
+mappings) cost per-row identity and unit-of-work bookkeeping the add
+never uses, so these rows go through a Core INSERT executed with many
+parameter sets, BULK_CHUNK rows per statement, in the caller's session:
+they commit together with the book's other changes, or not at all.
+"""
+
+from itertools import islice
+from typing import Any, Dict, Iterable, Type
+
+from sqlalchemy import func, insert
+from sqlalchemy.orm import Session
+
+from .models import Base
+
+# Rows sent per executemany; bounds the parameter lists held in memory
+BULK_CHUNK = 2000
+
+
+def insert_rows(session: Session, model: Type[Base], rows: Iterable[Dict[str, Any]]) -> int:
+    """
+    Insert plain row dictionaries into a model's table.
+
+    Every row must have the same keys; columns left out get their defaults.
+
+    Args:
+        session: Database session whose transaction the rows join
+        model: Mapped class of the table
+        rows: Column values of each row
+
+    Returns:
+        Number of rows inserted
+    """
+    statement = insert(model.__table__)
+    rows = iter(rows)
+    count = 0
+    while True:
+        chunk = list(islice(rows, BULK_CHUNK))
+        if not chunk:
+            return count
+        session.execute(statement, chunk)
+        count += len(chunk)
+
+
+def next_id(session: Session, model: Type[Base]) -> int:
+    """
+    First free ID of a model's table, for rows that reference each other by ID.
+
+    Only reliable once the session's transaction has written (SQLite then
+    holds the database's write lock until commit).
+    """
+    return (session.query(func.max(model.id)).scalar() or 0) + 1
@@ -0,0 +1,355 @@
+"""Memory-mapped snapshot of the book catalog for instant listing.
+
+Listing a large library through the ORM spends most of its time building
+Book objects and converting datetimes. The snapshot keeps the columns
+`list` shows by default in one flat file that is read with mmap and struct,
+so `list` can stream books without importing SQLAlchemy at all.
+
+File layout (little-endian):
+
+    header  magic, generation, book count
+    rows    one fixed-size row per book, in id order
+    orders  row indices sorted by (title, id) and by (added, id)
+    heap    UTF-8 strings, referenced from rows by (offset, length)
+
+The database's catalog_state row holds a generation counter that triggers
+on books and book_tags bump on every change to a snapshot column. A
+snapshot is current exactly when its generation matches; writers rebuild it
+after committing, and readers rebuild it if they find it stale. The file is
+replaced atomically, so readers never see a partial snapshot.
+
+Only the standard library is used here (not SQLAlchemy), which is what
+makes the fast path fast.
+"""
+
+import json
+import mmap
+import os
+import sqlite3
+import struct
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+from ..utils.config import get_config
+
+CATALOG_FILENAME = "catalog.bin"
+
+_MAGIC = b"CKCATLG1"
+_HEADER = struct.Struct("<8sQI4x")  # magic, generation, book count
+
+# id, page_count (-1 for NULL), has_images flags, then (offset, length) of
+# title, author, type, category, tags (JSON), tag names, added
+_STRINGS = ('title', 'author', 'type', 'category', 'tags', 'tag_names', 'added')
+_ROW = struct.Struct("<iiB3x" + "II" * len(_STRINGS))
+_STRING_POS = {name: 3 + 2 * i for i, name in enumerate(_STRINGS)}
+_NULL = 0xFFFFFFFF
+
+_HAS_IMAGES = 1
+_NO_IMAGES = 2
+
+# books.source_type stores SourceType member names; the snapshot holds values
+_SOURCE_TYPES = {'PDF': 'pdf', 'MARKDOWN': 'markdown'}
+
+# SQLite LIKE and NOCASE fold ASCII letters only
+_ASCII_LOWER = str.maketrans("ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz")
+
+def _default_paths(db_path: Optional[Path], path: Optional[Path]):
+    config = get_config()
+    return db_path or config.config_dir / "candlekeep.db", path or config.index_dir / CATALOG_FILENAME
+
+
+def _connect(db_path: Path) -> sqlite3.Connection:
+    # Autocommit mode, so BEGIN below starts an explicit read transaction
+    return sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, isolation_level=None)
+
+
+def _read_generation(conn: sqlite3.Connection) -> Optional[int]:
+    """The database's catalog generation, or None before the migration."""
+    try:
+        row = conn.execute("SELECT generation FROM catalog_state WHERE id = 1").fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return row[0] if row else None
+
+
+def _added_text(value: Optional[str]) -> Optional[str]:
+    """SQLite datetime text as isoformat(timespec='seconds')."""
+    return value[:19].replace(' ', 'T') if value else None
+
+
+def write_catalog(db_path: Optional[Path] = None, path: Optional[Path] = None) -> Optional[int]:
+    """
+    Rebuild the catalog snapshot from the database.
+
+    Args:
+        db_path: SQLite database (default: the library's)
+        path: Snapshot file (default: index/catalog.bin in the library)
+
+    Returns:
+        Generation of the written snapshot, or None if the database has no
+        catalog_state table yet
+    """
+    db_path, path = _default_paths(db_path, path)
+    conn = _connect(db_path)
+    try:
+        # One read transaction, so the rows match the generation
+        conn.execute("BEGIN")
+        generation = _read_generation(conn)
+        if generation is None:
+            return None
+        tag_names: Dict[int, List[str]] = {}
+        for book_id, name in conn.execute(
+            "SELECT book_tags.book_id, tags.name FROM book_tags JOIN tags ON tags.id = book_tags.tag_id"
+        ):
+            tag_names.setdefault(book_id, []).append(name)
+        books = conn.execute(
+            "SELECT id, page_count, has_images, title, author, source_type, category, tags, added_date "
+            "FROM books ORDER BY id"
+        ).fetchall()
+        conn.execute("COMMIT")
+    finally:
+        conn.close()
+
+    heap = bytearray()
+    strings: Dict[str, int] = {}
+
+    def _ref(value: Optional[str]):
+        if value is None:
+            return _NULL, 0
+        data = value.encode('utf-8')
+        # Authors, types and categories repeat across books; store each once
+        offset = strings.get(value)
+        if offset is None:
+            offset = strings[value] = len(heap)
+            heap.extend(data)
+        return offset, len(data)
+
+    count = len(books)
+    rows = bytearray(_ROW.size * count)
+    titles = []
+    added = []
+    for i, (book_id, page_count, has_images, title, author, source_type, category, tags, added_date) in enumerate(books):
+        flags = 0 if has_images is None else (_HAS_IMAGES if has_images else _NO_IMAGES)
+        names = tag_names.get(book_id)
+        refs = []
+        for value in (
+            title,
+            author,
+            _SOURCE_TYPES.get(source_type, str(source_type).lower()),
+            category,
+            tags,
+            "\n".join(names) if names else None,
+            _added_text(added_date),
+        ):
+            refs.extend(_ref(value))
+        _ROW.pack_into(rows, i * _ROW.size, book_id, -1 if page_count is None else page_count, flags, *refs)
+        titles.append(title)
+        added.append(_added_text(added_date))
+
+    # Same order as SQL ORDER BY ..., id: rows are in id order and sort() is
+    # stable; NULL dates sort first like in SQLite
+    by_title = sorted(range(count), key=titles.__getitem__)
+    by_added = sorted(range(count), key=lambda i: added[i] or "")
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, 'wb') as f:
+        f.write(_HEADER.pack(_MAGIC, generation, count))
+        f.write(rows)
+        f.write(struct.pack(f"<{count}I", *by_title))
+        f.write(struct.pack(f"<{count}I", *by_added))
+        f.write(heap)
+    os.replace(tmp_path, path)
+    return generation
+
+
+def refresh_catalog(db_path: Optional[Path] = None, path: Optional[Path] = None):
+    """Rebuild the snapshot if the database has changed since it was written."""
+    db_path, path = _default_paths(db_path, path)
+    conn = _connect(db_path)
+    try:
+        generation = _read_generation(conn)
+    finally:
+        conn.close()
+    if generation is not None and _snapshot_generation(path) != generation:
+        write_catalog(db_path, path)
+
+
+def _snapshot_generation(path: Path) -> Optional[int]:
+    try:
+        with open(path, 'rb') as f:
+            magic, generation, _ = _HEADER.unpack(f.read(_HEADER.size))
+    except (OSError, struct.error):
+        return None
+    return generation if magic == _MAGIC else None
+
+
+class Catalog:
+    """A memory-mapped catalog snapshot."""
+
+    def __init__(self, path: Path):
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.generation, self.count = _HEADER.unpack_from(self._map, 0)
+        if magic != _MAGIC:
+            raise ValueError(f"Not a catalog snapshot: {path}")
+        orders_start = _HEADER.size + _ROW.size * self.count
+        self._heap_start = orders_start + 8 * self.count
+        self._view = memoryview(self._map)
+        orders = self._view[orders_start:self._heap_start].cast('I')
+        self._orders = {'title': orders[:self.count], 'added': orders[self.count:]}
+        self._views = [self._view, orders, *self._orders.values()]
+
+    def close(self):
+        for view in reversed(self._views):
+            view.release()
+        self._map.close()
+
+    def _row(self, index: int) -> tuple:
+        return _ROW.unpack_from(self._map, _HEADER.size + _ROW.size * index)
+
+    def _string(self, row: tuple, name: str) -> Optional[str]:
+        pos = _STRING_POS[name]
+        offset, length = row[pos], row[pos + 1]
+        if offset == _NULL:
+            return None
+        start = self._heap_start + offset
+        return self._map[start:start + length].decode('utf-8')
+
+    def _find(self, book_id: int) -> Optional[int]:
+        """Row index of a book (rows are sorted by id)."""
+        low, high = 0, self.count
+        while low < high:
+            mid = (low + high) // 2
+            mid_id = _ROW.unpack_from(self._map, _HEADER.size + _ROW.size * mid)[0]
+            if mid_id < book_id:
+                low = mid + 1
+            elif mid_id > book_id:
+                high = mid
+            else:
+                return mid
+        return None
+
+    def _order(self, sort: str) -> Sequence[int]:
+        return self._orders[sort] if sort in self._orders else range(self.count)
+
+    def _matches(
+        self,
+        row: tuple,
+        category: Optional[str],
+        tags: List[str],
+        author: Optional[str],
+        added_since: Optional[str],
+        has_images: Optional[bool],
+    ) -> bool:
+        if category is not None and self._string(row, 'category') != category:
+            return False
+        if has_images is not None and row[2] != (_HAS_IMAGES if has_images else _NO_IMAGES):
+            return False
+        if added_since is not None and (self._string(row, 'added') or "") < added_since:
+            return False
+        if author is not None and author not in (self._string(row, 'author') or "").translate(_ASCII_LOWER):
+            return False
+        if tags:
+            names = set((self._string(row, 'tag_names') or "").translate(_ASCII_LOWER).split("\n"))
+            if not all(tag in names for tag in tags):
+                return False
+        return True
+
+    def select(
+        self,
+        category: Optional[str] = None,
+        tag: Optional[str] = None,
+        author: Optional[str] = None,
+        added_since: Optional[str] = None,
+        has_images: Optional[bool] = None,
+        sort: str = 'id',
+        desc: bool = False,
+        after: Optional[int] = None,
+    ) -> Iterator[int]:
+        """
+        Row indices of matching books, in display order (read lazily).
+
+        Filters and keyset pagination mirror the SQL path of `list`.
+
+        Args:
+            category: Exact category
+            tag: Comma-separated tags (all must be present, case-insensitive)
+            author: Text the author must contain (case-insensitive)
+            added_since: ISO date or datetime the book was added on or after
+            has_images: Whether the book must have (or not have) images
+            sort: 'id', 'title' or 'added'
+            desc: Sort in descending order
+            after: Start after this book ID in the sort order
+
+        Raises:
+            ValueError: If the after book doesn't exist
+        """
+        tags = [t.strip().translate(_ASCII_LOWER) for t in (tag or '').split(',') if t.strip()]
+        if author is not None:
+            author = author.translate(_ASCII_LOWER)
+
+        order = self._order(sort)
+        positions = range(len(order) - 1, -1, -1) if desc else range(len(order))
+        if after is not None:
+            anchor = self._find(after)
+            if anchor is None:
+                raise ValueError(f"Book with ID {after} not found.")
+            # Position of the anchor in this order
+            anchor_pos = anchor if sort not in self._orders else order.tolist().index(anchor)
+            positions = range(anchor_pos - 1, -1, -1) if desc else range(anchor_pos + 1, len(order))
+
+        if not tags and all(value is None for value in (category, author, added_since, has_images)):
+            return (order[pos] for pos in positions)
+        return (
+            order[pos] for pos in positions
+            if self._matches(self._row(order[pos]), category, tags, author, added_since, has_images)
+        )
+
+    def count_matching(self, **filters) -> int:
+        """Number of books matching select() filters, ignoring pagination."""
+        if not any(value is not None for value in filters.values()):
+            return self.count
+        return sum(1 for _ in self.select(**filters))
+
+    def record(self, index: int, fields: Optional[List[str]] = None) -> Dict[str, Any]:
+        """A book record with the same keys as the SQL path of `list`."""
+        row = self._row(index)
+        data = {
+            'id': row[0],
+            'title': self._string(row, 'title'),
+            'author': self._string(row, 'author'),
+            'type': self._string(row, 'type'),
+            'pages': None if row[1] < 0 else row[1],
+            'added': self._string(row, 'added'),
+        }
+        if fields and 'category' in fields:
+            data['category'] = self._string(row, 'category')
+        if fields and 'tags' in fields:
+            tags = self._string(row, 'tags')
+            data['tags'] = json.loads(tags) if tags is not None else None
+        return data
+
+
+def open_catalog(db_path: Optional[Path] = None, path: Optional[Path] = None) -> Optional[Catalog]:
+    """
+    Open the current catalog snapshot, rebuilding it if it is stale.
+
+    Returns:
+        The snapshot, or None if it can't be used (database not migrated,
+        or the snapshot can't be written)
+    """
+    db_path, path = _default_paths(db_path, path)
+    try:
+        conn = _connect(db_path)
+        try:
+            generation = _read_generation(conn)
+        finally:
+            conn.close()
+        if generation is None:
+            return None
+        if _snapshot_generation(path) != generation and write_catalog(db_path, path) is None:
+            return None
+        return Catalog(path)
+    except (OSError, sqlite3.Error, ValueError):
+        return None
@@ -0,0 +1,221 @@
+"""LRU cache of converted PDF pages, keyed by page content.
+
+A revised edition or a re-exported PDF gets a new file hash, so it used to
+be converted from scratch even when almost every page was unchanged. Each
+converted page is stored under a hash of the page's content (its content
+stream and resources, see parsers.engines.page_fingerprint) combined with
+the engine's settings, so any PDF containing an identical page reuses the
+earlier conversion, whatever book, file or page number it came from.
+
+Entries hold the page markdown and the images it references (file paths of
+a previous conversion, copied for the new book when reused). Least-recently
+used entries are evicted once the cache exceeds its byte or item budget.
+Like the page cache, this module only uses the standard library.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from ..utils.config import get_config
+
+CACHE_FILENAME = "conversions.db"
+
+# Disk budget
+DISK_MAX_BYTES = 256 * 1024 * 1024
+DISK_MAX_ITEMS = 200_000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    markdown TEXT NOT NULL,
+    images TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    last_used INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_entries_last_used ON entries (last_used);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+) WITHOUT ROWID;
+"""
+
+_COUNTERS = ('hits', 'misses', 'evictions')
+
+# A cached page: (markdown, [image file path, ...])
+CachedPage = Tuple[str, List[str]]
+
+
+class ConversionCache:
+    """
+    Page conversion cache shared by every CandleKeep process (see module docstring).
+
+    Thread-safe. Disk errors (e.g. a locked or read-only cache) are treated
+    as misses, so the cache never makes a conversion fail. `hits` and
+    `misses` count this instance's lookups, for reporting how much of one
+    conversion was reused.
+    """
+
+    def __init__(
+        self,
+        path: Optional[Path] = None,
+        max_bytes: int = DISK_MAX_BYTES,
+        max_items: int = DISK_MAX_ITEMS,
+    ):
+        """
+        Args:
+            path: Cache file (default: conversions.db in the cache directory)
+            max_bytes: Byte budget
+            max_items: Entry budget
+        """
+        self.path = path or get_config().cache_dir / CACHE_FILENAME
+        self.max_bytes = max_bytes
+        self.max_items = max_items
+        self.hits = 0
+        self.misses = 0
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.RLock()
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            # Disposable data: favour speed over durability
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _count(self, conn: sqlite3.Connection, counts: Dict[str, int]):
+        for name, value in counts.items():
+            if value:
+                conn.execute(
+                    "INSERT INTO counters (name, value) VALUES (?, ?) "
+                    "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+                    (name, value),
+                )
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, CachedPage]:
+        """
+        Look up several pages.
+
+        Returns:
+            {key: (markdown, image paths)} for the keys that were cached
+        """
+        keys = list(keys)
+        found: Dict[str, CachedPage] = {}
+        with self._lock:
+            try:
+                conn = self._db()
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    now = time.time_ns()
+                    for key in keys:
+                        row = conn.execute("SELECT markdown, images FROM entries WHERE key = ?", (key,)).fetchone()
+                        if row is not None:
+                            found[key] = (row[0], json.loads(row[1]))
+                    conn.executemany("UPDATE entries SET last_used = ? WHERE key = ?", [(now, key) for key in found])
+                    conn.execute("COMMIT")
+                except BaseException:
+                    conn.execute("ROLLBACK")
+                    raise
+            except sqlite3.Error:
+                pass
+        return found
+
+    def record_lookups(self, hits: int, misses: int):
+        """
+        Count pages reused and converted.
+
+        Separate from get_many because a cached page whose images have
+        since been deleted is converted again, i.e. counts as a miss.
+        """
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+            try:
+                self._count(self._db(), {'hits': hits, 'misses': misses})
+            except sqlite3.Error:
+                pass
+
+    def put_many(self, values: Dict[str, CachedPage]):
+        """Store pages, evicting least-recently-used ones over budget."""
+        if not values:
+            return
+        with self._lock:
+            try:
+                conn = self._db()
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    now = time.time_ns()
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO entries (key, markdown, images, size, last_used) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        [
+                            (key, markdown, json.dumps(images), len(markdown.encode('utf-8')), now)
+                            for key, (markdown, images) in values.items()
+                        ],
+                    )
+                    self._evict(conn)
+                    conn.execute("COMMIT")
+                except BaseException:
+                    conn.execute("ROLLBACK")
+                    raise
+            except sqlite3.Error:
+                pass
+
+    def _evict(self, conn: sqlite3.Connection):
+        """Drop least-recently-used entries until within budget."""
+        items, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        if items <= self.max_items and size <= self.max_bytes:
+            return
+        evicted = []
+        for key, entry_size in conn.execute("SELECT key, size FROM entries ORDER BY last_used"):
+            if items <= self.max_items and size <= self.max_bytes:
+                break
+            evicted.append((key,))
+            items -= 1
+            size -= entry_size
+        conn.executemany("DELETE FROM entries WHERE key = ?", evicted)
+        self._count(conn, {'evictions': len(evicted)})
+
+    def clear(self):
+        """Drop every entry."""
+        with self._lock:
+            self._db().execute("DELETE FROM entries")
+
+    def reset_counters(self):
+        """Zero the hit, miss and eviction counters."""
+        with self._lock:
+            self._db().execute("DELETE FROM counters")
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Cache statistics.
+
+        Returns:
+            Dictionary with entries, bytes, max_bytes, max_items and the
+            counters (hits, misses, evictions)
+        """
+        with self._lock:
+            conn = self._db()
+            stats = dict.fromkeys(_COUNTERS, 0)
+            stats.update(conn.execute("SELECT name, value FROM counters"))
+            entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        stats.update({
+            'entries': entries,
+            'bytes': size,
+            'max_bytes': self.max_bytes,
+            'max_items': self.max_items,
+        })
+        return stats
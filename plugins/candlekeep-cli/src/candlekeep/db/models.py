@@ -6,6 +6,7 @@ from typing import Optional
 from sqlalchemy import (
     Column,
     Integer,
+    BigInteger,
     String,
     Text,
     DateTime,
@@ -14,8 +15,11 @@ from sqlalchemy import (
     Index,
     JSON,
     Boolean,
+    Float,
+    LargeBinary,
+    Table,
 )
-from sqlalchemy.orm import DeclarativeBase, relationship
+from sqlalchemy.orm import DeclarativeBase, deferred, relationship
 import enum
 
 
@@ -55,6 +59,8 @@ class Book(Base):
     markdown_file_path = Column(String(1000), nullable=False)
     source_type = Column(Enum(SourceType), nullable=False, index=True)
     file_hash = Column(String(64), unique=True, nullable=False)
+    # Bumped whenever the markdown may have changed; keys cached page content
+    content_version = Column(Integer, default=1, nullable=False)
 
     # Dates
     added_date = Column(DateTime, default=datetime.utcnow, nullable=False)
@@ -75,13 +81,23 @@ class Book(Base):
     page_count = Column(Integer)
     word_count = Column(Integer)
     chapter_count = Column(Integer)
-    table_of_contents = Column(JSON)  # List of TOC entries with level, title, page
+    table_of_contents = deferred(Column(JSON))  # List of TOC entries with level, title, page (see toc_entries)
+    # Set when the PDF had no outline and the TOC was built from heading fonts (see parsers.toc_synthesis)
+    toc_synthesized = Column(Boolean, default=False, nullable=False)
+    # PDF conversion engine of each page, as [first_page, last_page, engine] runs (see parsers.engines)
+    conversion_engines = deferred(Column(JSON))
+    # Set while pages are converted on first access (see LazyPage); cleared by `materialize`
+    lazy_conversion = Column(Boolean, default=False, nullable=False)
+    # Heading font sizes, so a lazy book's pages get consistent heading levels (see parsers.engines)
+    heading_sizes = deferred(Column(JSON))
+    # Printed page numbers, as [first_page, last_page, first_printed_page] runs (see parsers.boilerplate)
+    page_labels = deferred(Column(JSON))
 
     # Categorization
     subject = Column(String(500))
     keywords = Column(Text)  # Comma-separated
     category = Column(String(100), index=True)
-    tags = Column(JSON)  # List of tags
+    tags = Column(JSON)  # List of tags, as entered (see tag_objects for filtering)
 
     # Additional info
     isbn = Column(String(20))
@@ -96,11 +112,64 @@ class Book(Base):
     # Relationships
     notes = relationship("BookNote", back_populates="book", cascade="all, delete-orphan")
     images = relationship("BookImage", back_populates="book", cascade="all, delete-orphan")
+    toc_entries = relationship(
+        "TocEntry",
+        back_populates="book",
+        cascade="all, delete-orphan",
+        order_by="TocEntry.ordinal",
+    )
+    tag_objects = relationship("Tag", secondary="book_tags", back_populates="books")
+    pages = relationship(
+        "BookPage",
+        back_populates="book",
+        cascade="all, delete-orphan",
+        order_by="BookPage.page_number",
+    )
+    lazy_pages = relationship(
+        "LazyPage",
+        back_populates="book",
+        cascade="all, delete-orphan",
+        order_by="LazyPage.page_number",
+    )
+
+    # Indexes for list filters and keyset pagination (SQLite appends rowid, so id is implied)
+    __table_args__ = (
+        Index("idx_books_added_date", "added_date"),
+        Index("idx_books_category_added", "category", "added_date"),
+    )
 
     def __repr__(self):
         return f"<Book(id={self.id}, title='{self.title}', author='{self.author}')>"
 
 
+# Many-to-many link between books and tags
+book_tags = Table(
+    "book_tags",
+    Base.metadata,
+    Column("book_id", Integer, ForeignKey("books.id", ondelete="CASCADE"), primary_key=True),
+    Column("tag_id", Integer, ForeignKey("tags.id", ondelete="CASCADE"), primary_key=True),
+    Index("idx_book_tags_tag", "tag_id", "book_id"),
+)
+
+
+class Tag(Base):
+    """Tag names, shared across books (matched case-insensitively)."""
+
+    __tablename__ = "tags"
+
+    # Primary key
+    id = Column(Integer, primary_key=True, autoincrement=True)
+
+    # Tag data
+    name = Column(String(100, collation="NOCASE"), unique=True, nullable=False)
+
+    # Relationships
+    books = relationship("Book", secondary="book_tags", back_populates="tag_objects")
+
+    def __repr__(self):
+        return f"<Tag(id={self.id}, name='{self.name}')>"
+
+
 class BookNote(Base):
     """Book notes and annotations."""
 
@@ -156,6 +225,20 @@ class BookImage(Base):
     has_transparency = Column(Boolean, default=False)
     file_size = Column(Integer)  # Size in bytes
 
+    # Preview variant (same format, longer side at most PREVIEW_MAX_SIDE); NULL for small images
+    preview_path = Column(String(1000), nullable=True)
+    preview_width = Column(Integer, nullable=True)
+    preview_height = Column(Integer, nullable=True)
+    preview_file_size = Column(Integer, nullable=True)
+
+    # Perceptual hash (dHash, stored signed; see index.image_hash); NULL until computed
+    phash = Column(BigInteger, nullable=True)
+    # The hash's four 16-bit bands (lowest first), indexed for similar-image lookups
+    phash_band0 = Column(Integer, nullable=True)
+    phash_band1 = Column(Integer, nullable=True)
+    phash_band2 = Column(Integer, nullable=True)
+    phash_band3 = Column(Integer, nullable=True)
+
     # Metadata
     created_date = Column(DateTime, default=datetime.utcnow, nullable=False)
 
@@ -165,7 +248,235 @@ class BookImage(Base):
     # Indexes
     __table_args__ = (
         Index("idx_book_page", "book_id", "page_number"),
+        Index("idx_image_size", "width", "height"),
+        Index("idx_image_phash_band0", "phash_band0"),
+        Index("idx_image_phash_band1", "phash_band1"),
+        Index("idx_image_phash_band2", "phash_band2"),
+        Index("idx_image_phash_band3", "phash_band3"),
     )
 
     def __repr__(self):
         return f"<BookImage(id={self.id}, book_id={self.book_id}, page={self.page_number}, format={self.format})>"
+
+
+class TocEntry(Base):
+    """Table of contents entry - one row per section, searchable across books via toc_fts."""
+
+    __tablename__ = "toc_entries"
+
+    # Primary key
+    id = Column(Integer, primary_key=True, autoincrement=True)
+
+    # Foreign keys
+    book_id = Column(Integer, ForeignKey("books.id", ondelete="CASCADE"), nullable=False)
+    parent_id = Column(Integer, ForeignKey("toc_entries.id", ondelete="CASCADE"), nullable=True)
+
+    # Position in the book's TOC
+    ordinal = Column(Integer, nullable=False)  # 0-based order within the book
+    level = Column(Integer, nullable=False)  # 1 = top level
+
+    # Section data
+    title = Column(String(1000), nullable=False)
+    start_page = Column(Integer)  # 1-based; 0 or NULL when the source has no pages
+    end_page = Column(Integer)  # Last page before the next section at the same or higher level
+
+    # Relationships
+    book = relationship("Book", back_populates="toc_entries")
+    parent = relationship("TocEntry", remote_side=[id])
+
+    # Indexes
+    __table_args__ = (
+        Index("idx_toc_book_ordinal", "book_id", "ordinal", unique=True),
+        Index("idx_toc_parent", "parent_id"),
+    )
+
+    def __repr__(self):
+        return f"<TocEntry(id={self.id}, book_id={self.book_id}, level={self.level}, title='{self.title}')>"
+
+
+class BookPage(Base):
+    """Page layout of a book's markdown file, for mapping text offsets back to pages."""
+
+    __tablename__ = "book_pages"
+
+    # Composite primary key
+    book_id = Column(Integer, ForeignKey("books.id", ondelete="CASCADE"), primary_key=True)
+    page_number = Column(Integer, primary_key=True)  # 1-based physical page
+
+    # Number printed on the page, if detected
+    printed_page_number = Column(Integer, nullable=True)
+
+    # Offsets of the page content (markers excluded) in the markdown file
+    char_start = Column(Integer, nullable=False)
+    char_end = Column(Integer, nullable=False)
+    byte_start = Column(Integer, nullable=False)  # UTF-8 offsets, for memory-mapped scans
+    byte_end = Column(Integer, nullable=False)
+
+    # Page statistics, so agents can size requests (see utils.content_utils.page_stats);
+    # NULL for rows written before they existed, filled in on first use
+    word_count = Column(Integer)
+    char_count = Column(Integer)
+    token_count = Column(Integer)
+    image_count = Column(Integer)
+    has_table = Column(Boolean)
+    has_code = Column(Boolean)
+
+    # Relationships
+    book = relationship("Book", back_populates="pages")
+
+    def __repr__(self):
+        return f"<BookPage(book_id={self.book_id}, page={self.page_number}, printed={self.printed_page_number})>"
+
+
+class LazyPage(Base):
+    """Page store of a lazily converted PDF: one row per page, filled in as pages are first read."""
+
+    __tablename__ = "lazy_pages"
+
+    # Composite primary key
+    book_id = Column(Integer, ForeignKey("books.id", ondelete="CASCADE"), primary_key=True)
+    page_number = Column(Integer, primary_key=True)  # 1-based physical page
+
+    # Numeric page label from the PDF, if any
+    printed_page_number = Column(Integer, nullable=True)
+
+    # Converted page (without its page marker); NULL until first read
+    markdown = Column(Text, nullable=True)
+    engine = Column(String(20), nullable=True)  # Conversion engine that produced markdown
+
+    # Relationships
+    book = relationship("Book", back_populates="lazy_pages")
+
+    __table_args__ = (
+        Index("idx_lazy_pages_printed", "book_id", "printed_page_number"),
+    )
+
+    def __repr__(self):
+        return f"<LazyPage(book_id={self.book_id}, page={self.page_number}, converted={self.markdown is not None})>"
+
+
+class PageFingerprint(Base):
+    """Winnowed k-gram fingerprint of book text, for locating quoted passages."""
+
+    __tablename__ = "page_fingerprints"
+
+    # Clustered on hash so a passage lookup is one index seek per fingerprint
+    hash = Column(Integer, primary_key=True, autoincrement=False)
+    book_id = Column(Integer, ForeignKey("books.id", ondelete="CASCADE"), primary_key=True)
+    char_offset = Column(Integer, primary_key=True, autoincrement=False)  # Start of the k-gram in the markdown
+
+    __table_args__ = {"sqlite_with_rowid": False}
+
+    def __repr__(self):
+        return f"<PageFingerprint(hash={self.hash}, book_id={self.book_id}, offset={self.char_offset})>"
+
+
+class BookSignature(Base):
+    """MinHash signature of a book's text, for near-duplicate detection."""
+
+    __tablename__ = "book_signatures"
+
+    book_id = Column(Integer, ForeignKey("books.id", ondelete="CASCADE"), primary_key=True)
+    signature = Column(LargeBinary, nullable=False)  # NUM_PERM little-endian uint32 minimums
+
+    def __repr__(self):
+        return f"<BookSignature(book_id={self.book_id})>"
+
+
+class MinHashBand(Base):
+    """LSH band bucket of a book signature; books sharing a bucket are duplicate candidates."""
+
+    __tablename__ = "minhash_bands"
+
+    band = Column(Integer, primary_key=True, autoincrement=False)
+    bucket = Column(Integer, primary_key=True, autoincrement=False)  # 64-bit hash of the band's rows
+    book_id = Column(Integer, ForeignKey("books.id", ondelete="CASCADE"), primary_key=True)
+
+    __table_args__ = (
+        Index("idx_minhash_bands_book", "book_id"),
+        {"sqlite_with_rowid": False},
+    )
+
+    def __repr__(self):
+        return f"<MinHashBand(band={self.band}, bucket={self.bucket}, book_id={self.book_id})>"
+
+
+class RelatedUnit(Base):
+    """TF-IDF vector of a book or one of its sections, for related-content lookups."""
+
+    __tablename__ = "related_units"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    book_id = Column(Integer, ForeignKey("books.id", ondelete="CASCADE"), nullable=False)
+    toc_entry_id = Column(Integer, ForeignKey("toc_entries.id", ondelete="CASCADE"), nullable=True)  # NULL for page windows
+
+    # Whole-book units are compared with other books, section units with other sections
+    is_book = Column(Boolean, nullable=False, default=False)
+    first_page = Column(Integer)  # 1-based; NULL for whole-book units
+    last_page = Column(Integer)
+
+    # Sparse L2-normalized vector: sorted uint32 term hashes and their float32 weights
+    term_ids = Column(LargeBinary, nullable=False)
+    weights = Column(LargeBinary, nullable=False)
+
+    # Whole-book units only: every distinct term hash in the book, for document frequencies,
+    # and the number of books in the library when the book's vectors were built
+    vocabulary = deferred(Column(LargeBinary))
+    library_size = Column(Integer)
+
+    # Relationships
+    toc_entry = relationship("TocEntry")
+
+    __table_args__ = (
+        Index("idx_related_units_book", "book_id", "is_book"),
+    )
+
+    def __repr__(self):
+        return f"<RelatedUnit(id={self.id}, book_id={self.book_id}, pages={self.first_page}-{self.last_page})>"
+
+
+class RelatedNeighbor(Base):
+    """Precomputed nearest neighbour of a related unit in another book."""
+
+    __tablename__ = "related_neighbors"
+
+    unit_id = Column(Integer, ForeignKey("related_units.id", ondelete="CASCADE"), primary_key=True)
+    neighbor_id = Column(Integer, ForeignKey("related_units.id", ondelete="CASCADE"), primary_key=True)
+    score = Column(Float, nullable=False)  # Cosine similarity
+
+    __table_args__ = (
+        Index("idx_related_neighbors_neighbor", "neighbor_id"),
+        {"sqlite_with_rowid": False},
+    )
+
+    def __repr__(self):
+        return f"<RelatedNeighbor(unit_id={self.unit_id}, neighbor_id={self.neighbor_id}, score={self.score:.3f})>"
+
+
+class RelatedTerm(Base):
+    """Number of books containing a term, for TF-IDF weighting."""
+
+    __tablename__ = "related_terms"
+
+    term_id = Column(Integer, primary_key=True, autoincrement=False)  # CRC32 of the token
+    book_count = Column(Integer, nullable=False)
+
+    def __repr__(self):
+        return f"<RelatedTerm(term_id={self.term_id}, book_count={self.book_count})>"
+
+
+class CatalogState(Base):
+    """
+    Generation counter of the book catalog (a single row with id 1).
+
+    Triggers on books and book_tags bump it whenever a column stored in the
+    catalog snapshot changes (see db/catalog.py).
+    """
+
+    __tablename__ = "catalog_state"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    generation = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<CatalogState(generation={self.generation})>"
@@ -0,0 +1,338 @@
+"""LRU cache of extracted pages and rendered `pages` output.
+
+Agents ask for the same pages again and again across turns (the intro next
+to the TOC, a key chapter). Entries are keyed by (book id, content version,
+key), where key is "page:<n>" for one page's text or "<format>:<pages>" for
+a complete `pages` output. Bumping a book's content_version (reindex) or
+dropping its entries (remove, re-add) invalidates exactly that book.
+
+Two tiers, each evicting least-recently-used entries once it exceeds its
+byte or item budget:
+
+- memory: an OrderedDict in front of the disk tier, for long-lived
+  processes such as `batch`
+- disk: a SQLite file in the cache directory, shared by every invocation
+
+Hit and miss counters are kept on disk for `candlekeep stats`. Lookups
+are plain reads: the recency of the entries they hit and the counter
+increments are buffered and written with the next `put_many`, or by
+`close`, so a cache hit never waits for the write lock. When
+prefetching is on (see access_log), `pages` and `toc` warm the entries a
+reader is likely to ask for next. Like the
+catalog snapshot, this module only uses the standard library, so answering
+`pages` from the cache never imports SQLAlchemy.
+"""
+
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+from ..utils.config import get_config
+
+CACHE_FILENAME = "pages.db"
+
+# Disk tier budget
+DISK_MAX_BYTES = 64 * 1024 * 1024
+DISK_MAX_ITEMS = 20_000
+
+# In-process tier budget
+MEMORY_MAX_BYTES = 16 * 1024 * 1024
+MEMORY_MAX_ITEMS = 2_000
+
+# Larger requests are streamed without caching, so one long read doesn't
+# flush the pages agents keep coming back to
+MAX_CACHED_PAGES = 64
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    book_id INTEGER NOT NULL,
+    version INTEGER NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    last_used INTEGER NOT NULL,
+    PRIMARY KEY (book_id, version, key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_entries_last_used ON entries (last_used);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+) WITHOUT ROWID;
+"""
+
+_COUNTERS = ('page_hits', 'page_misses', 'render_hits', 'render_misses', 'evictions')
+
+
+def content_version(book_id: int, db_path: Optional[Path] = None) -> Optional[int]:
+    """
+    A book's content version, read without SQLAlchemy.
+
+    Returns:
+        The version, or None if the book doesn't exist (or the database
+        predates content versions)
+    """
+    db_path = db_path or get_config().config_dir / "candlekeep.db"
+    try:
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+        try:
+            row = conn.execute("SELECT content_version FROM books WHERE id = ?", (book_id,)).fetchone()
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return None
+    return row[0] if row else None
+
+
+def _kind(key: str) -> str:
+    return 'page' if key.startswith('page:') else 'render'
+
+
+class PageCache:
+    """
+    Page cache shared by every CandleKeep process (see module docstring).
+
+    Thread-safe. Disk errors (e.g. a locked or read-only cache) are treated
+    as misses, so the cache never makes a command fail.
+    """
+
+    def __init__(
+        self,
+        path: Optional[Path] = None,
+        max_bytes: int = DISK_MAX_BYTES,
+        max_items: int = DISK_MAX_ITEMS,
+        memory_max_bytes: int = MEMORY_MAX_BYTES,
+        memory_max_items: int = MEMORY_MAX_ITEMS,
+        count_hits: bool = True,
+    ):
+        """
+        Args:
+            path: Cache file (default: pages.db in the cache directory)
+            max_bytes: Disk tier byte budget
+            max_items: Disk tier entry budget
+            memory_max_bytes: Memory tier byte budget
+            memory_max_items: Memory tier entry budget
+            count_hits: Update the hit and miss counters (off when warming
+                the cache, so stats reflect real requests)
+        """
+        self.path = path or get_config().cache_dir / CACHE_FILENAME
+        self.max_bytes = max_bytes
+        self.max_items = max_items
+        self.memory_max_bytes = memory_max_bytes
+        self.memory_max_items = memory_max_items
+        self.count_hits = count_hits
+        self._memory: "OrderedDict[Tuple[int, int, str], str]" = OrderedDict()
+        self._memory_bytes = 0
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.RLock()
+        # Buffered writes of lookups: last_used of hit entries, counter increments
+        self._touched: Dict[Tuple[int, int, str], int] = {}
+        self._counts: Dict[str, int] = dict.fromkeys(_COUNTERS, 0)
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            # Disposable data: favour speed over durability
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def close(self):
+        """Write the buffered recency updates and counters, and close the cache file."""
+        with self._lock:
+            if self._touched or any(self._counts.values()):
+                try:
+                    conn = self._db()
+                    conn.execute("BEGIN")
+                    try:
+                        self._flush(conn)
+                        conn.execute("COMMIT")
+                    except BaseException:
+                        conn.execute("ROLLBACK")
+                        raise
+                except sqlite3.Error:
+                    pass
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _remember(self, entry: Tuple[int, int, str], value: str):
+        """Add an entry to the memory tier, evicting the oldest ones."""
+        old = self._memory.pop(entry, None)
+        if old is not None:
+            self._memory_bytes -= len(old)
+        self._memory[entry] = value
+        self._memory_bytes += len(value)
+        while self._memory and (
+            self._memory_bytes > self.memory_max_bytes or len(self._memory) > self.memory_max_items
+        ):
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+
+    def _count(self, conn: sqlite3.Connection, counts: Dict[str, int]):
+        for name, value in counts.items():
+            if value:
+                conn.execute(
+                    "INSERT INTO counters (name, value) VALUES (?, ?) "
+                    "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+                    (name, value),
+                )
+
+    def _flush(self, conn: sqlite3.Connection):
+        """Write the buffered lookups within the caller's transaction."""
+        conn.executemany(
+            "UPDATE entries SET last_used = ? WHERE book_id = ? AND version = ? AND key = ?",
+            [(now, *entry) for entry, now in self._touched.items()],
+        )
+        self._count(conn, self._counts)
+        self._touched.clear()
+        self._counts = dict.fromkeys(_COUNTERS, 0)
+
+    def get_many(self, book_id: int, version: int, keys: Iterable[str]) -> Dict[str, str]:
+        """
+        Look up several entries of one book.
+
+        Returns:
+            {key: value} for the keys that were cached
+        """
+        keys = list(keys)
+        found: Dict[str, str] = {}
+        with self._lock:
+            for key in keys:
+                entry = (book_id, version, key)
+                if entry in self._memory:
+                    self._memory.move_to_end(entry)
+                    found[key] = self._memory[entry]
+
+            wanted = [key for key in keys if key not in found]
+            if wanted:
+                try:
+                    rows = self._db().execute(
+                        "SELECT key, value FROM entries WHERE book_id = ? AND version = ? "
+                        f"AND key IN ({', '.join('?' * len(wanted))})",
+                        (book_id, version, *wanted),
+                    ).fetchall()
+                except sqlite3.Error:
+                    rows = []
+                for key, value in rows:
+                    found[key] = value
+                    self._remember((book_id, version, key), value)
+
+            now = time.time_ns()
+            for key in keys:
+                if key in found:
+                    self._touched[(book_id, version, key)] = now
+                if self.count_hits:
+                    self._counts[f"{_kind(key)}_{'hits' if key in found else 'misses'}"] += 1
+        return found
+
+    def get(self, book_id: int, version: int, key: str) -> Optional[str]:
+        """Look up one entry (None on a miss)."""
+        return self.get_many(book_id, version, [key]).get(key)
+
+    def put_many(self, book_id: int, version: int, values: Dict[str, str]):
+        """Store entries of one book, evicting least-recently-used ones over budget."""
+        if not values:
+            return
+        with self._lock:
+            for key, value in values.items():
+                self._remember((book_id, version, key), value)
+            try:
+                conn = self._db()
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    now = time.time_ns()
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO entries (book_id, version, key, value, size, last_used) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        [
+                            (book_id, version, key, value, len(value.encode('utf-8')), now)
+                            for key, value in values.items()
+                        ],
+                    )
+                    # Recency of earlier hits decides what is evicted
+                    self._flush(conn)
+                    self._evict(conn)
+                    conn.execute("COMMIT")
+                except BaseException:
+                    conn.execute("ROLLBACK")
+                    raise
+            except sqlite3.Error:
+                pass
+
+    def put(self, book_id: int, version: int, key: str, value: str):
+        """Store one entry."""
+        self.put_many(book_id, version, {key: value})
+
+    def _evict(self, conn: sqlite3.Connection):
+        """Drop least-recently-used disk entries until within budget."""
+        items, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        if items <= self.max_items and size <= self.max_bytes:
+            return
+        evicted = []
+        for book_id, version, key, entry_size in conn.execute(
+            "SELECT book_id, version, key, size FROM entries ORDER BY last_used"
+        ):
+            if items <= self.max_items and size <= self.max_bytes:
+                break
+            evicted.append((book_id, version, key))
+            items -= 1
+            size -= entry_size
+        conn.executemany("DELETE FROM entries WHERE book_id = ? AND version = ? AND key = ?", evicted)
+        self._count(conn, {'evictions': len(evicted)})
+
+    def invalidate_book(self, book_id: int):
+        """Drop every entry of a book, whatever its version."""
+        with self._lock:
+            for entry in [entry for entry in self._memory if entry[0] == book_id]:
+                self._memory_bytes -= len(self._memory.pop(entry))
+            try:
+                self._db().execute("DELETE FROM entries WHERE book_id = ?", (book_id,))
+            except sqlite3.Error:
+                pass
+
+    def clear(self):
+        """Drop every entry."""
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+            self._db().execute("DELETE FROM entries")
+
+    def reset_counters(self):
+        """Zero the hit, miss and eviction counters."""
+        with self._lock:
+            self._counts = dict.fromkeys(_COUNTERS, 0)
+            self._db().execute("DELETE FROM counters")
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Disk tier statistics.
+
+        Returns:
+            Dictionary with page_entries, render_entries, bytes, max_bytes,
+            max_items and the counters (page_hits, page_misses, render_hits,
+            render_misses, evictions)
+        """
+        with self._lock:
+            conn = self._db()
+            stats = dict.fromkeys(_COUNTERS, 0)
+            stats.update(conn.execute("SELECT name, value FROM counters"))
+            for name, value in self._counts.items():
+                stats[name] += value
+            page_entries, render_entries, size = conn.execute(
+                "SELECT COALESCE(SUM(key LIKE 'page:%'), 0), COALESCE(SUM(key NOT LIKE 'page:%'), 0), "
+                "COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()
+        stats.update({
+            'page_entries': page_entries,
+            'render_entries': render_entries,
+            'bytes': size,
+            'max_bytes': self.max_bytes,
+            'max_items': self.max_items,
+        })
+        return stats
@@ -0,0 +1,238 @@
+"""Page store of lazily converted PDF books.
+
+`add-pdf --lazy` registers a book without converting it: its metadata, TOC,
+page labels and original PDF are stored, and every page gets an empty
+LazyPage row. Reading pages converts just those pages (with the budgeted
+engines of parsers.engines) and keeps the result, so each page is converted
+at most once. `materialize` converts whatever is left, writes the book's
+markdown file and builds its search indexes, after which the book is like
+any other and its page store is dropped.
+"""
+
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import fitz  # PyMuPDF
+from sqlalchemy.orm import Session
+
+from ..parsers.engines import (
+    PAGE_TIME_BUDGET,
+    LayoutEngine,
+    convert_pages,
+    engine_runs,
+    headers_from_json,
+    headers_to_json,
+    identify_headers,
+    join_pages,
+)
+from ..parsers.boilerplate import strip_boilerplate
+from ..parsers.images import ImageRenderer, book_image_rows, drop_repeated_images
+from ..parsers.pdf import PDFParser
+from ..utils.content_utils import label_runs
+from ..utils.image_utils import create_book_image_directory
+from .bulk import insert_rows
+from .conversion_cache import ConversionCache
+from .models import Book, BookImage, LazyPage
+
+# Pages converted (and committed) at a time by materialize_pages
+MATERIALIZE_BATCH_PAGES = 50
+
+
+def page_labels(doc: fitz.Document) -> Dict[int, int]:
+    """
+    Numeric page labels of a PDF (e.g. "xii" is skipped, "17" kept).
+
+    Returns:
+        {1-based physical page: printed page number}, empty if the PDF has no labels
+    """
+    if not doc.get_page_labels():
+        return {}
+    labels = {}
+    for index in range(doc.page_count):
+        label = doc[index].get_label().strip()
+        if label.isdigit():
+            labels[index + 1] = int(label)
+    return labels
+
+
+def register_lazy_pages(session: Session, book_id: int, pdf_path: Path) -> int:
+    """
+    Create the empty page store of a lazily converted book.
+
+    Args:
+        session: Database session
+        book_id: Book ID
+        pdf_path: The book's PDF
+
+    Returns:
+        Number of pages registered
+    """
+    with fitz.open(str(pdf_path)) as doc:
+        page_count = doc.page_count
+        labels = page_labels(doc)
+    insert_rows(session, LazyPage, (
+        {'book_id': book_id, 'page_number': page, 'printed_page_number': labels.get(page)}
+        for page in range(1, page_count + 1)
+    ))
+    return page_count
+
+
+def _layout_engine(book: Book, image_dir: Path, renderer: ImageRenderer) -> LayoutEngine:
+    """
+    Layout engine with the book's heading sizes (computed and saved on first
+    use) that defers page images to renderer, like `add-pdf` does.
+    """
+    if book.heading_sizes is None:
+        with fitz.open(book.original_file_path) as doc:
+            book.heading_sizes = headers_to_json(identify_headers(doc))
+    return LayoutEngine(
+        hdr_info=headers_from_json(book.heading_sizes),
+        write_images=True,
+        image_path=str(image_dir),
+        image_format=renderer.naming_format,
+        dpi=renderer.dpi,
+        image_size_limit=0.05,
+        defer_images=True,
+    )
+
+
+def _convert_rows(book: Book, rows: List[LazyPage], page_time_budget: float):
+    """Convert the given unconverted pages and store them in their rows."""
+    image_dir = create_book_image_directory(book.id)
+    renderer = ImageRenderer(book.original_file_path)
+    cache = ConversionCache()
+    try:
+        converted = convert_pages(
+            Path(book.original_file_path),
+            indices=[row.page_number - 1 for row in rows],
+            engine=_layout_engine(book, image_dir, renderer),
+            page_time_budget=page_time_budget,
+            cache=cache,
+            image_renderer=renderer,
+        )
+    finally:
+        cache.close()
+    for row in rows:
+        markdown, row.engine = converted[row.page_number - 1]
+        row.markdown = PDFParser.convert_image_paths_to_absolute(markdown, book.id, image_dir)
+
+
+def _record_images(session: Session, book: Book, markdown: str, labels: Dict[int, int], images: Dict[str, Dict]):
+    """Create the BookImage rows of a materialized book in one bulk insert, as `add-pdf` does."""
+    rows = book_image_rows(book.id, markdown, images, labels)
+    insert_rows(session, BookImage, rows)
+    book.image_count = len(rows)
+    book.has_images = bool(rows)
+
+
+def lazy_page_texts(
+    session: Session,
+    book: Book,
+    pages: List[int],
+    page_time_budget: float = PAGE_TIME_BUDGET,
+) -> Dict[int, str]:
+    """
+    Pages of a lazily converted book, converting (and storing) those read for the first time.
+
+    Args:
+        session: Database session (committed after converting)
+        book: Book with lazy_conversion set
+        pages: 1-based physical page numbers
+        page_time_budget: Seconds a page may take with the layout engine
+
+    Returns:
+        {page_number: page text stripped of surrounding whitespace} for the
+        pages that exist, like iter_markdown_pages
+    """
+    rows = (
+        session.query(LazyPage)
+        .filter(LazyPage.book_id == book.id, LazyPage.page_number.in_(pages))
+        .all()
+    )
+    missing = [row for row in rows if row.markdown is None]
+    if missing:
+        _convert_rows(book, missing, page_time_budget)
+        session.commit()
+    return {row.page_number: row.markdown.strip() for row in rows}
+
+
+def materialize_pages(
+    session: Session,
+    book: Book,
+    limit: Optional[int] = None,
+    page_time_budget: float = PAGE_TIME_BUDGET,
+) -> Tuple[int, int]:
+    """
+    Convert a lazy book's remaining pages in order, committing every
+    MATERIALIZE_BATCH_PAGES pages so an interrupted run keeps its work.
+
+    Args:
+        session: Database session
+        book: Book with lazy_conversion set
+        limit: Convert at most this many pages (default: all remaining)
+        page_time_budget: Seconds a page may take with the layout engine
+
+    Returns:
+        (pages converted now, pages still unconverted)
+    """
+    query = (
+        session.query(LazyPage)
+        .filter(LazyPage.book_id == book.id, LazyPage.markdown.is_(None))
+        .order_by(LazyPage.page_number)
+    )
+    remaining = query.count()
+    todo = remaining if limit is None else min(limit, remaining)
+
+    converted = 0
+    while converted < todo:
+        rows = query.limit(min(MATERIALIZE_BATCH_PAGES, todo - converted)).all()
+        _convert_rows(book, rows, page_time_budget)
+        session.commit()
+        converted += len(rows)
+
+    return converted, remaining - converted
+
+
+def finish_materialize(session: Session, book: Book) -> str:
+    """
+    Turn a fully converted lazy book into a regular one.
+
+    Writes the markdown file from the page store (without running headers
+    and footers, see parsers.boilerplate, and without the images repeated
+    across the book, see parsers.images.drop_repeated_images), records word
+    count, conversion engines, page labels and images, clears
+    lazy_conversion and drops the page store.
+    The caller builds the search indexes from the returned markdown.
+
+    Returns:
+        The book's markdown
+
+    Raises:
+        ValueError: If some pages are not converted yet
+    """
+    rows = (
+        session.query(LazyPage.page_number, LazyPage.markdown, LazyPage.engine, LazyPage.printed_page_number)
+        .filter(LazyPage.book_id == book.id)
+        .order_by(LazyPage.page_number)
+        .all()
+    )
+    if any(markdown is None for _, markdown, _, _ in rows):
+        raise ValueError(f"Book {book.id} still has unconverted pages.")
+
+    markdown, labels, _ = strip_boilerplate(join_pages({page - 1: (text, engine) for page, text, engine, _ in rows}))
+    # Pages were rendered in batches: repeated and decorative images are only known now
+    markdown, images = drop_repeated_images(markdown)
+    # The PDF's own page labels win over numbers found in footers
+    labels.update({page: printed for page, _, _, printed in rows if printed is not None})
+    with open(book.markdown_file_path, 'w', encoding='utf-8') as f:
+        f.write(markdown)
+
+    book.word_count = PDFParser.count_words(markdown)
+    book.conversion_engines = engine_runs([engine for _, _, engine, _ in rows])
+    book.page_labels = label_runs(labels) or None
+    _record_images(session, book, markdown, labels, images)
+    book.lazy_conversion = False
+    book.content_version = Book.content_version + 1
+    session.query(LazyPage).filter(LazyPage.book_id == book.id).delete(synchronize_session=False)
+    session.commit()
+    return markdown
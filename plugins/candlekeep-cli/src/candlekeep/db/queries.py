@@ -0,0 +1,458 @@
+"""SQL queries behind the read commands.
+
+Kept apart from the commands so that `list` can answer from the catalog
+snapshot (db/catalog.py) without importing SQLAlchemy.
+"""
+
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import and_, func, or_, select, tuple_
+from sqlalchemy.orm import Query, load_only
+
+from ..utils.content_utils import expand_label_runs
+from .models import Book, BookImage, LazyPage, Tag, TocEntry, book_tags
+
+
+def book_to_dict(book: Book, full: bool = False, fields: Optional[List[str]] = None) -> dict:
+    """
+    Convert a book's metadata to a JSON-serializable dictionary.
+
+    This is the record `list` streams (the catalog snapshot produces the
+    same keys); commands/query.py renders it as text.
+    """
+    def _date(value: Optional[datetime]) -> Optional[str]:
+        return value.isoformat(timespec='seconds') if value else None
+
+    data = {
+        'id': book.id,
+        'title': book.title,
+        'author': book.author,
+        'type': book.source_type.value,
+        'pages': book.page_count,
+        'added': _date(book.added_date),
+    }
+
+    for field in ('category', 'tags', 'word_count', 'chapter_count'):
+        if full or (fields and field in fields):
+            data[field] = getattr(book, field)
+
+    if full:
+        data.update({
+            'subject': book.subject,
+            'keywords': book.keywords,
+            'isbn': book.isbn,
+            'publisher': book.publisher,
+            'publication_year': book.publication_year,
+            'language': book.language,
+            'pdf_creator': book.pdf_creator,
+            'pdf_producer': book.pdf_producer,
+            'pdf_created': _date(book.pdf_creation_date),
+            'pdf_modified': _date(book.pdf_mod_date),
+            'original_path': book.original_file_path,
+            'markdown_path': book.markdown_file_path,
+        })
+
+    return data
+
+
+def toc_records(session, book_id: int) -> Iterator[dict]:
+    """Yield a book's TOC entries in order, streamed from the database."""
+    entries = (
+        session.query(TocEntry)
+        .filter(TocEntry.book_id == book_id)
+        .order_by(TocEntry.ordinal)
+        .yield_per(500)
+    )
+    for entry in entries:
+        yield {
+            'book_id': book_id,
+            'title': entry.title,
+            'level': entry.level,
+            'start_page': entry.start_page,
+            'end_page': entry.end_page,
+        }
+
+
+def printed_page_map(book_id: int, session) -> Dict[int, int]:
+    """
+    Map a book's printed page numbers to physical page numbers.
+
+    Sources, first match wins: BookImage printed page numbers, the PDF's page
+    labels of lazily converted books (lazy_pages), and the page numbers found
+    in the book's running headers and footers (Book.page_labels).
+
+    Args:
+        book_id: Book ID
+        session: Database session
+
+    Returns:
+        {printed page number: physical page number}, empty when the book
+        has no printed page data
+    """
+    # Query for all BookImage records for this book with printed page numbers
+    images_with_printed = session.query(BookImage).filter(
+        BookImage.book_id == book_id,
+        BookImage.printed_page_number.isnot(None)
+    ).all()
+    labelled_pages = session.query(LazyPage.page_number, LazyPage.printed_page_number).filter(
+        LazyPage.book_id == book_id,
+        LazyPage.printed_page_number.isnot(None)
+    ).all()
+
+    page_labels = expand_label_runs(session.query(Book.page_labels).filter(Book.id == book_id).scalar())
+
+    # Build mapping: printed_page_number -> physical page_number
+    printed_to_physical = {}
+    for img in images_with_printed:
+        if img.printed_page_number not in printed_to_physical:
+            printed_to_physical[img.printed_page_number] = img.page_number
+    for page_number, printed_page_number in [*labelled_pages, *page_labels.items()]:
+        if printed_page_number not in printed_to_physical:
+            printed_to_physical[printed_page_number] = page_number
+    return printed_to_physical
+
+
+def image_variant(image: BookImage, min_side: Optional[int] = None) -> dict:
+    """
+    The cheapest stored version of an image that is large enough.
+
+    Args:
+        image: BookImage row
+        min_side: Pixels the longer side must have at least (default: any
+            size, i.e. the preview when there is one)
+
+    Returns:
+        Dictionary with variant ("preview" or "full"), path, width, height,
+        format and file_size
+    """
+    if image.preview_path and (min_side is None or max(image.preview_width, image.preview_height) >= min_side):
+        return {
+            'variant': 'preview',
+            'path': image.preview_path,
+            'width': image.preview_width,
+            'height': image.preview_height,
+            'format': image.format,
+            'file_size': image.preview_file_size,
+        }
+    return {
+        'variant': 'full',
+        'path': image.file_path,
+        'width': image.width,
+        'height': image.height,
+        'format': image.format,
+        'file_size': image.file_size,
+    }
+
+
+def resolve_printed_to_physical_pages(book_id: int, page_list: List[int], session) -> List[int]:
+    """
+    Attempt to resolve printed page numbers to physical PDF page numbers.
+
+    Strategy:
+    1. Look the pages up in the book's printed page numbers (see printed_page_map)
+    2. If found, map to physical page_number
+    3. If not found, assume page_list contains physical page numbers (fallback)
+
+    Args:
+        book_id: Book ID to query
+        page_list: List of page numbers (potentially printed page numbers)
+        session: Database session
+
+    Returns:
+        List of physical page numbers (PDF indices)
+    """
+    printed_to_physical = printed_page_map(book_id, session)
+
+    if not printed_to_physical:
+        # No printed page data available, treat as physical pages
+        return page_list
+
+    # Try to resolve each requested page
+    resolved_pages = []
+    for page_num in page_list:
+        if page_num in printed_to_physical:
+            # Found mapping: this is a printed page number
+            resolved_pages.append(printed_to_physical[page_num])
+        else:
+            # No mapping: assume it's already a physical page number
+            resolved_pages.append(page_num)
+
+    return sorted(set(resolved_pages))  # Remove duplicates and sort
+
+
+# Book columns needed to display each optional field
+_FIELD_COLUMNS = {
+    'category': [Book.category],
+    'tags': [Book.tags],
+    'word_count': [Book.word_count],
+    'chapter_count': [Book.chapter_count],
+}
+
+# Sort keys for `list`
+SORT_COLUMNS = {
+    'id': Book.id,
+    'title': Book.title,
+    'added': Book.added_date,
+}
+
+
+def _display_columns(fields: Optional[List[str]]) -> list:
+    """Columns book_to_dict reads when not showing full metadata."""
+    columns = [Book.id, Book.title, Book.author, Book.source_type, Book.page_count, Book.added_date]
+    for field in fields or []:
+        columns.extend(_FIELD_COLUMNS.get(field, []))
+    return columns
+
+
+def build_book_filters(
+    category: Optional[str],
+    tag: Optional[str],
+    author: Optional[str],
+    added_since: Optional[datetime],
+    has_images: Optional[bool],
+) -> list:
+    """Build SQL filter clauses for `list` options."""
+    filters = []
+    if category:
+        filters.append(Book.category == category)
+    if author:
+        filters.append(Book.author.ilike(f"%{author}%"))
+    if added_since:
+        filters.append(Book.added_date >= added_since)
+    if has_images is not None:
+        filters.append(Book.has_images == has_images)
+    # Every listed tag must be present
+    for tag_name in [t.strip() for t in (tag or '').split(',') if t.strip()]:
+        filters.append(Book.id.in_(
+            select(book_tags.c.book_id)
+            .join(Tag, Tag.id == book_tags.c.tag_id)
+            .where(Tag.name == tag_name)
+        ))
+    return filters
+
+
+def count_books(session, filters: list) -> int:
+    """Number of books matching build_book_filters() clauses."""
+    return session.query(func.count(Book.id)).filter(*filters).scalar()
+
+
+def build_books_query(
+    session,
+    filters: list,
+    sort: str = 'id',
+    desc: bool = False,
+    after: Optional[int] = None,
+    full: bool = False,
+    fields: Optional[List[str]] = None,
+) -> Query:
+    """
+    Build a filtered, sorted, keyset-paginated book query.
+
+    Args:
+        session: Database session
+        filters: Clauses from build_book_filters()
+        sort: Key in SORT_COLUMNS
+        desc: Sort in descending order
+        after: Return books after this book ID in the sort order
+        full: Load all columns (otherwise only those displayed for fields)
+        fields: Optional fields that will be displayed
+
+    Returns:
+        Query over the matching books, in display order
+
+    Raises:
+        ValueError: If the after book doesn't exist
+    """
+    sort_column = SORT_COLUMNS[sort]
+
+    # Only load displayed columns; full loads everything except the
+    # deferred table_of_contents JSON
+    query = session.query(Book).filter(*filters)
+    if not full:
+        query = query.options(load_only(*_display_columns(fields), raiseload=True))
+
+    # Keyset pagination: continue after the anchor book's (sort value, id)
+    if after is not None:
+        anchor = session.query(sort_column).filter(Book.id == after).first()
+        if anchor is None:
+            raise ValueError(f"Book with ID {after} not found.")
+        if sort_column is Book.id:
+            query = query.filter(Book.id < after if desc else Book.id > after)
+        elif desc:
+            query = query.filter(or_(sort_column < anchor[0], and_(sort_column == anchor[0], Book.id < after)))
+        else:
+            query = query.filter(or_(sort_column > anchor[0], and_(sort_column == anchor[0], Book.id > after)))
+
+    if desc:
+        return query.order_by(sort_column.desc(), Book.id.desc())
+    return query.order_by(sort_column, Book.id)
+
+
+def query_books(
+    session,
+    filters: list,
+    sort: str = 'id',
+    desc: bool = False,
+    limit: Optional[int] = None,
+    after: Optional[int] = None,
+    full: bool = False,
+    fields: Optional[List[str]] = None,
+) -> Tuple[int, List[Book], bool]:
+    """
+    Run a book query from build_books_query() and load one page of results.
+
+    Returns:
+        (total matching books, books on this page, whether there is a next page)
+
+    Raises:
+        ValueError: If the after book doesn't exist
+    """
+    total = count_books(session, filters)
+    query = build_books_query(session, filters, sort, desc, after, full=full, fields=fields)
+
+    # Fetch one extra row to know whether there is a next page
+    if limit is not None:
+        query = query.limit(limit + 1)
+    books = query.all()
+    has_more = limit is not None and len(books) > limit
+    return total, books[:limit], has_more
+
+
+def book_records(query: Query, full: bool = False, fields: Optional[List[str]] = None) -> Iterator[dict]:
+    """Yield book_to_dict records for a query, loading books in batches."""
+    for book in query.yield_per(1000):
+        yield book_to_dict(book, full=full, fields=fields)
+
+
+# Shorthands accepted for image colorspaces (PyMuPDF names)
+COLORSPACES = {'rgb': 'DeviceRGB', 'gray': 'DeviceGray', 'cmyk': 'DeviceCMYK'}
+
+# Size filters matching fewer images than this are read through idx_image_size
+SIZE_INDEX_ROWS = 10_000
+
+
+def build_image_filters(
+    book_id: Optional[int] = None,
+    pages: Optional[List[int]] = None,
+    min_width: Optional[int] = None,
+    min_height: Optional[int] = None,
+    image_format: Optional[str] = None,
+    colorspace: Optional[str] = None,
+    book_filters: Optional[list] = None,
+) -> list:
+    """
+    Build SQL filter clauses for `images` options.
+
+    Args:
+        book_id: Only this book's images
+        pages: Only these physical pages (with book_id)
+        min_width: Smallest width in pixels
+        min_height: Smallest height in pixels
+        image_format: png or jpg
+        colorspace: Colorspace name or a COLORSPACES shorthand
+        book_filters: Clauses from build_book_filters() the images' books must match
+    """
+    filters = []
+    if book_id is not None:
+        filters.append(BookImage.book_id == book_id)
+    if pages:
+        filters.append(BookImage.page_number.in_(pages))
+    if min_width:
+        filters.append(BookImage.width >= min_width)
+    if min_height:
+        filters.append(BookImage.height >= min_height)
+    if image_format:
+        filters.append(BookImage.format == image_format.lower())
+    if colorspace:
+        filters.append(BookImage.colorspace == COLORSPACES.get(colorspace.lower(), colorspace))
+    if book_filters:
+        filters.append(BookImage.book_id.in_(select(Book.id).where(*book_filters)))
+    return filters
+
+
+def _few_images_of_size(session, min_width: int, min_height: int) -> bool:
+    """Whether fewer than SIZE_INDEX_ROWS images are this large (counted in idx_image_size, stopping there)."""
+    matching = (
+        session.query(BookImage.id)
+        .filter(BookImage.width >= min_width, BookImage.height >= min_height)
+        .limit(SIZE_INDEX_ROWS)
+        .subquery()
+    )
+    return session.query(func.count()).select_from(matching).scalar() < SIZE_INDEX_ROWS
+
+
+def build_images_query(
+    session,
+    filters: list,
+    after: Optional[int] = None,
+    min_size: Optional[Tuple[int, int]] = None,
+) -> Query:
+    """
+    Build a filtered, keyset-paginated image query in (book, page, image) order.
+
+    SQLite reads images in that order from idx_book_page and stops after a
+    page of matches, which is fast unless few images match. Without STAT4
+    statistics it can't tell when a size filter is that selective, so the
+    matches are counted first: when there are few, they are read through
+    idx_image_size and sorted instead.
+
+    Args:
+        session: Database session
+        filters: Clauses from build_image_filters()
+        after: Return images after this image ID in that order
+        min_size: (min width, min height) of a size filter across books, if any
+
+    Returns:
+        Query over (BookImage, book title) rows
+
+    Raises:
+        ValueError: If the after image doesn't exist
+    """
+    query = session.query(BookImage, Book.title).join(Book, Book.id == BookImage.book_id).filter(*filters)
+    book_key = BookImage.book_id
+    if min_size and min_size[0] and _few_images_of_size(session, *min_size):
+        # An expression, not the column, so SQLite uses idx_image_size rather than idx_book_page
+        book_key = BookImage.book_id + 0
+    if after is not None:
+        anchor = session.query(BookImage.book_id, BookImage.page_number).filter(BookImage.id == after).first()
+        if anchor is None:
+            raise ValueError(f"Image with ID {after} not found.")
+        # A row-value comparison, which SQLite seeks on in idx_book_page (whose rowid is the ID)
+        query = query.filter(
+            tuple_(book_key, BookImage.page_number, BookImage.id) > tuple_(anchor[0], anchor[1], after)
+        )
+    return query.order_by(book_key, BookImage.page_number, BookImage.id)
+
+
+def image_to_dict(image: BookImage, title: str, fit: Optional[int] = None) -> dict:
+    """
+    An image as an `images` record.
+
+    Args:
+        image: BookImage row
+        title: Title of its book
+        fit: Describe the cheapest stored version at least this many pixels
+            on its longer side (see image_variant) instead of the full image
+    """
+    record = {
+        'id': image.id,
+        'book_id': image.book_id,
+        'book_title': title,
+        'page': image.page_number,
+        'printed_page': image.printed_page_number,
+        'colorspace': image.colorspace,
+    }
+    if fit is None:
+        record.update({
+            'variant': 'full',
+            'path': image.file_path,
+            'width': image.width,
+            'height': image.height,
+            'format': image.format,
+            'file_size': image.file_size,
+            'preview_path': image.preview_path,
+        })
+    else:
+        record.update(image_variant(image, fit))
+    return record
@@ -1,13 +1,15 @@
 """Database session management for CandleKeep."""
 
+from itertools import chain
 from pathlib import Path
 from typing import Optional
 from contextlib import contextmanager
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, Session
 
-from .models import Base
+from .catalog import refresh_catalog
+from .models import Base, Book
 
 
 def get_db_path() -> Path:
@@ -29,6 +31,23 @@ def get_connection_string() -> str:
     return f"sqlite:///{db_path}"
 
 
+def _note_book_changes(session: Session, flush_context):
+    """Remember that the transaction wrote books (see _refresh_catalog)."""
+    # Before after_flush returns, new/dirty/deleted still hold the flushed objects
+    if any(isinstance(obj, Book) for obj in chain(session.new, session.dirty, session.deleted)):
+        session.info['books_changed'] = True
+
+
+def _refresh_catalog(session: Session):
+    """Rewrite the catalog snapshot after a commit that changed books."""
+    if session.info.pop('books_changed', False):
+        try:
+            refresh_catalog(db_path=get_db_path())
+        except Exception:
+            # The commit succeeded; a stale snapshot is rebuilt by the next `list`
+            pass
+
+
 class DatabaseManager:
     """Manages database connections and sessions."""
 
@@ -55,6 +74,10 @@ class DatabaseManager:
             bind=self.engine
         )
 
+        # Keep the catalog snapshot (db/catalog.py) in step with books
+        event.listen(self.SessionLocal, "after_flush", _note_book_changes)
+        event.listen(self.SessionLocal, "after_commit", _refresh_catalog)
+
     @contextmanager
     def get_session(self):
         """Get a database session with automatic cleanup.
@@ -0,0 +1,120 @@
+"""Local text embeddings for semantic search.
+
+Embeddings are built with the hashing trick: word unigrams and bigrams are
+hashed with a stable CRC32 and scattered (with a hash-derived sign) into a
+small dense vector. This is a sparse random projection of the bag-of-n-grams
+vector, so it needs no model download, no network, and no training, and the
+same text always maps to the same vector.
+"""
+
+import re
+import zlib
+from collections import Counter
+from functools import lru_cache
+from typing import Iterable, List
+
+import numpy as np
+
+# Embedding width; a power of two so bucket selection is a bit mask
+EMBEDDING_DIM = 256
+
+# Each feature is scattered into this many buckets to soften collisions
+_HASH_PROBES = 2
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+
+_STOPWORDS = frozenset(
+    "a an and are as at be been but by can do does for from has have he her his how i if in into is it its "
+    "more no not of on or our she so such than that the their them then there these they this those to "
+    "was we were what when where which while who will with would you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text into lowercase word tokens, dropping stopwords.
+
+    Args:
+        text: Text to tokenize
+
+    Returns:
+        List of tokens
+    """
+    return [token for token in _TOKEN_PATTERN.findall(text.lower()) if token not in _STOPWORDS]
+
+
+def _features(text: str) -> Iterable[str]:
+    """Yield the unigram and bigram features of a text."""
+    tokens = tokenize(text)
+    yield from tokens
+    for first, second in zip(tokens, tokens[1:]):
+        yield f"{first} {second}"
+
+
+@lru_cache(maxsize=1 << 17)
+def _feature_hash(feature: str) -> int:
+    """Stable 32-bit hash of a feature (Python's hash() is salted per process)."""
+    return zlib.crc32(feature.encode("utf-8"))
+
+
+def embed_texts(texts: List[str], dim: int = EMBEDDING_DIM) -> np.ndarray:
+    """
+    Embed a batch of texts into L2-normalized float32 vectors.
+
+    Feature counts are dampened with 1 + log(tf) so that a single repeated
+    word cannot dominate a page.
+
+    Args:
+        texts: Texts to embed
+        dim: Embedding width (power of two)
+
+    Returns:
+        Array of shape (len(texts), dim); rows of empty texts are all zeros
+    """
+    matrix = np.zeros((len(texts), dim), dtype=np.float32)
+    mask = dim - 1
+
+    for row, text in enumerate(texts):
+        counts = Counter(_features(text))
+        if not counts:
+            continue
+
+        hashes = np.fromiter((_feature_hash(f) for f in counts), dtype=np.uint32, count=len(counts))
+        weights = 1.0 + np.log(np.fromiter(counts.values(), dtype=np.float32, count=len(counts)))
+
+        for probe in range(_HASH_PROBES):
+            shifted = hashes >> np.uint32(11 * probe)
+            buckets = (shifted & np.uint32(mask)).astype(np.intp)
+            signs = np.where(shifted & np.uint32(1 << 10), 1.0, -1.0)
+            matrix[row] += np.bincount(buckets, weights=weights * signs, minlength=dim).astype(np.float32)
+
+    return normalize_rows(matrix)
+
+
+def embed_text(text: str, dim: int = EMBEDDING_DIM) -> np.ndarray:
+    """
+    Embed a single text (e.g. a query).
+
+    Args:
+        text: Text to embed
+        dim: Embedding width
+
+    Returns:
+        L2-normalized float32 vector of shape (dim,)
+    """
+    return embed_texts([text], dim)[0]
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """
+    L2-normalize the rows of a matrix in place, leaving all-zero rows untouched.
+
+    Args:
+        matrix: 2-D float array
+
+    Returns:
+        The same array, normalized
+    """
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    np.divide(matrix, norms, out=matrix, where=norms > 0)
+    return matrix
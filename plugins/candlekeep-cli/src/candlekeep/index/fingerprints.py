@@ -0,0 +1,325 @@
+"""Winnowed k-gram fingerprints for locating quoted passages.
+
+Page text is normalized to lowercase letters and digits only, so spacing,
+punctuation, markdown markup, and line-break hyphenation don't matter. Every
+K-character substring is hashed, and winnowing keeps the minimum hash of each
+window of W consecutive hashes. Any passage sharing at least K + W - 1
+normalized characters with a book is guaranteed to share a fingerprint with
+it, while only about 2 / (W + 1) of positions are stored.
+
+Fingerprints live in the page_fingerprints table keyed by (hash, book_id,
+char_offset), so looking up a passage is a handful of index seeks.
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from ..db.session import get_db_manager
+from ..utils.content_utils import split_pages
+
+# k-gram length in normalized characters (roughly four words)
+FP_K = 20
+
+# Winnowing window, in k-grams
+FP_WINDOW = 24
+
+# Hashes found in more places than this are boilerplate and ignored at query time
+MAX_POSTINGS = 500
+
+# Minimum share of a passage's fingerprints a span must contain to be reported
+MIN_SCORE = 0.1
+
+_HASH_BASE = np.uint64(1_000_003)
+
+
+def normalize_text(markdown_text: str, start: int = 0, end: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Reduce text to lowercase letters and digits, remembering where each came from.
+
+    Args:
+        markdown_text: Source text
+        start: Offset of the region to normalize
+        end: End of the region (default: end of text)
+
+    Returns:
+        (codes, positions): code points of the normalized characters and the
+        offset of each in markdown_text
+    """
+    codes = np.frombuffer(markdown_text[start:end].encode('utf-32-le'), dtype=np.uint32)
+
+    upper = (codes >= 65) & (codes <= 90)
+    keep = upper | ((codes >= 97) & (codes <= 122)) | ((codes >= 48) & (codes <= 57))
+    lowered = codes + upper.astype(np.uint32) * 32
+
+    # Non-ASCII: classify each distinct character once
+    high = codes >= 128
+    if high.any():
+        distinct, inverse = np.unique(codes[high], return_inverse=True)
+        chars = [chr(code) for code in distinct.tolist()]
+        is_alnum = np.array([char.isalnum() for char in chars], dtype=bool)
+        lower = np.array(
+            [ord(char.lower()) if len(char.lower()) == 1 else ord(char) for char in chars],
+            dtype=np.uint32,
+        )
+        keep[high] = is_alnum[inverse]
+        lowered[high] = lower[inverse]
+
+    positions = np.flatnonzero(keep) + start
+    return lowered[keep].astype(np.uint64), positions.astype(np.int64)
+
+
+def kgram_hashes(codes: np.ndarray, k: int = FP_K) -> np.ndarray:
+    """
+    Hash every k-character substring.
+
+    Args:
+        codes: Normalized code points
+        k: Substring length
+
+    Returns:
+        uint32 hash per k-gram (len(codes) - k + 1 values)
+    """
+    count = len(codes) - k + 1
+    if count <= 0:
+        return np.zeros(0, dtype=np.uint32)
+
+    # Polynomial hash mod 2**64, built with k vectorized passes
+    hashes = np.zeros(count, dtype=np.uint64)
+    for offset in range(k):
+        hashes = hashes * _HASH_BASE + codes[offset:offset + count]
+
+    # Finalize (splitmix64) so the low 32 bits are well mixed
+    hashes ^= hashes >> np.uint64(30)
+    hashes *= np.uint64(0xBF58476D1CE4E5B9)
+    hashes ^= hashes >> np.uint64(27)
+    hashes *= np.uint64(0x94D049BB133111EB)
+    hashes ^= hashes >> np.uint64(31)
+    return (hashes & np.uint64(0xFFFFFFFF)).astype(np.uint32)
+
+
+def winnow(hashes: np.ndarray, window: int = FP_WINDOW) -> np.ndarray:
+    """
+    Select fingerprint positions by winnowing.
+
+    A position is selected if its hash is the minimum of at least one window
+    containing it. Every window's minimum is <= the hashes it contains, so
+    that holds exactly when the largest window-minimum among the windows
+    covering a position equals its hash, which needs only rolling min/max.
+
+    Args:
+        hashes: k-gram hashes
+        window: Window size in k-grams
+
+    Returns:
+        Sorted, unique indices into hashes of the selected fingerprints
+    """
+    if len(hashes) == 0:
+        return np.zeros(0, dtype=np.int64)
+    if len(hashes) <= window:
+        return np.array([int(np.argmin(hashes))], dtype=np.int64)
+
+    # Minimum of each window: window_min[j] = min(hashes[j:j + window])
+    count = len(hashes) - window + 1
+    window_min = hashes[:count].copy()
+    for offset in range(1, window):
+        np.minimum(window_min, hashes[offset:offset + count], out=window_min)
+
+    # For each position, the largest minimum among windows covering it
+    padded = np.concatenate((
+        np.zeros(window - 1, dtype=hashes.dtype),
+        window_min,
+        np.zeros(window - 1, dtype=hashes.dtype),
+    ))
+    covering_max = padded[:len(hashes)].copy()
+    for offset in range(1, window):
+        np.maximum(covering_max, padded[offset:offset + len(hashes)], out=covering_max)
+
+    return np.flatnonzero(covering_max == hashes)
+
+
+def fingerprint(codes: np.ndarray, positions: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Fingerprint normalized text.
+
+    Args:
+        codes: Normalized code points from normalize_text()
+        positions: Source offsets from normalize_text()
+
+    Returns:
+        (hashes, offsets): selected hashes and the source offset where each k-gram starts
+    """
+    hashes = kgram_hashes(codes)
+    picks = winnow(hashes)
+    return hashes[picks], positions[picks]
+
+
+def fingerprint_book(markdown_text: str) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Fingerprint a book's page text, skipping page markers.
+
+    Pages are normalized separately and joined, so passages that run across
+    a page break still match.
+
+    Args:
+        markdown_text: Full markdown content of the book
+
+    Returns:
+        (hashes, char_offsets) of the book's fingerprints
+    """
+    pages = split_pages(markdown_text) or [(1, 0, len(markdown_text))]
+    parts = [normalize_text(markdown_text, start, end) for _, start, end in pages]
+    codes = np.concatenate([part[0] for part in parts])
+    positions = np.concatenate([part[1] for part in parts])
+    return fingerprint(codes, positions)
+
+
+def build_fingerprint_index(session: Session, book_id: int, markdown_text: str) -> int:
+    """
+    Replace a book's fingerprints.
+
+    Args:
+        session: Database session (the caller commits)
+        book_id: Book ID
+        markdown_text: Full markdown content of the book
+
+    Returns:
+        Number of fingerprints stored
+    """
+    hashes, offsets = fingerprint_book(markdown_text)
+
+    # Insert in key order so B-tree pages are filled sequentially
+    order = np.argsort(hashes, kind='stable')
+    hashes, offsets = hashes[order], offsets[order]
+    rows = [
+        {"hash": int(h), "book_id": book_id, "char_offset": int(offset)}
+        for h, offset in zip(hashes.tolist(), offsets.tolist())
+    ]
+
+    remove_fingerprint_index(session, book_id)
+    if rows:
+        session.execute(
+            text(
+                "INSERT OR IGNORE INTO page_fingerprints (hash, book_id, char_offset) "
+                "VALUES (:hash, :book_id, :char_offset)"
+            ),
+            rows,
+        )
+    return len(rows)
+
+
+def remove_fingerprint_index(session: Session, book_id: int):
+    """
+    Delete a book's fingerprints.
+
+    Args:
+        session: Database session (the caller commits)
+        book_id: Book ID
+    """
+    session.execute(text("DELETE FROM page_fingerprints WHERE book_id = :book_id"), {"book_id": book_id})
+
+
+def _best_spans(
+    postings: List[Tuple[int, int, int]],
+    query_offsets: Dict[int, List[int]],
+    tolerance: int,
+) -> List[Tuple[int, int, int]]:
+    """
+    Find, per book, the alignment supported by the most distinct query fingerprints.
+
+    Each posting votes for where the passage would start in the book
+    (book offset minus the fingerprint's offset in the passage). Votes within
+    `tolerance` characters of each other are the same alignment.
+
+    Returns:
+        List of (book_id, estimated start, distinct fingerprints matched)
+    """
+    votes: Dict[int, List[Tuple[int, int]]] = {}
+    for h, book_id, offset in postings:
+        for query_offset in query_offsets[h]:
+            votes.setdefault(book_id, []).append((offset - query_offset, h))
+
+    spans = []
+    for book_id, book_votes in votes.items():
+        book_votes.sort()
+        starts = [start for start, _ in book_votes]
+        best = (0, 0, 0)  # (matched, left, right)
+        left = 0
+        for right in range(len(book_votes)):
+            while starts[right] - starts[left] > tolerance:
+                left += 1
+            if right - left + 1 > best[0]:
+                matched = len({h for _, h in book_votes[left:right + 1]})
+                if matched > best[0]:
+                    best = (matched, left, right)
+        matched, left, right = best
+        start = max(int(np.median(starts[left:right + 1])), 0)
+        spans.append((book_id, start, matched))
+    return spans
+
+
+def locate_passage(
+    passage: str,
+    top_k: int = 3,
+    book_ids: Optional[List[int]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Find where a quoted or lightly paraphrased passage appears in the library.
+
+    Args:
+        passage: Passage text
+        top_k: Number of books to return
+        book_ids: Restrict search to these books (default: all)
+
+    Returns:
+        List of matches sorted by descending score, each a dictionary with
+        book_id, start and end (character offsets into the book's markdown),
+        score (share of the passage's fingerprints found), matched, and total
+    """
+    codes, positions = normalize_text(passage)
+    hashes, offsets = fingerprint(codes, positions)
+    if len(hashes) == 0:
+        return []
+
+    query_offsets: Dict[int, List[int]] = {}
+    for h, offset in zip(hashes.tolist(), offsets.tolist()):
+        query_offsets.setdefault(h, []).append(offset)
+
+    params: Dict[str, Any] = {f"h{i}": h for i, h in enumerate(query_offsets)}
+    sql = (
+        "SELECT hash, book_id, char_offset FROM page_fingerprints WHERE hash IN ("
+        + ", ".join(f":h{i}" for i in range(len(query_offsets))) + ")"
+    )
+    if book_ids:
+        sql += " AND book_id IN (" + ", ".join(f":b{i}" for i in range(len(book_ids))) + ")"
+        params.update({f"b{i}": book_id for i, book_id in enumerate(book_ids)})
+
+    with get_db_manager().engine.connect() as conn:
+        rows = conn.execute(text(sql), params).fetchall()
+
+    # Drop boilerplate hashes (headers, licenses) that occur everywhere
+    counts: Dict[int, int] = {}
+    for row in rows:
+        counts[row.hash] = counts.get(row.hash, 0) + 1
+    postings = [(row.hash, row.book_id, row.char_offset) for row in rows if counts[row.hash] <= MAX_POSTINGS]
+
+    total = len(query_offsets)
+    tolerance = max(50, len(passage) // 5)
+    matches = []
+    for book_id, start, matched in _best_spans(postings, query_offsets, tolerance):
+        score = matched / total
+        if score < MIN_SCORE or matched < min(2, total):
+            continue
+        matches.append({
+            "book_id": book_id,
+            "start": start,
+            "end": start + len(passage),
+            "score": score,
+            "matched": matched,
+            "total": total,
+        })
+
+    matches.sort(key=lambda match: match["score"], reverse=True)
+    return matches[:top_k]
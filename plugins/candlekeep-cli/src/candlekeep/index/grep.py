@@ -0,0 +1,155 @@
+"""Parallel regex scan of book markdown files.
+
+Each book's markdown is memory-mapped and scanned with a bytes regex in a
+worker process. Hits are pushed onto a shared queue as soon as they are
+found so the caller can stream them, and a shared event tells every worker
+to stop once the caller has enough.
+"""
+
+import mmap
+import multiprocessing
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+# Longest line excerpt returned per hit, in bytes (the match is kept centered)
+MAX_LINE_BYTES = 400
+
+# Page separator lines emitted by pymupdf4llm; matches inside them are skipped
+PAGE_MARKER_BYTES = re.compile(rb'--- end of page=\d+ ---')
+
+# Set in each worker by _init_worker
+_hit_queue = None
+_stop_event = None
+
+
+def compile_pattern(pattern: str, ignore_case: bool = False) -> re.Pattern:
+    """
+    Compile a user regex for scanning raw UTF-8 bytes.
+
+    Raises:
+        ValueError: If the pattern is not a valid regular expression
+    """
+    try:
+        return re.compile(pattern.encode('utf-8'), re.IGNORECASE if ignore_case else 0)
+    except re.error as e:
+        raise ValueError(f"Invalid regular expression: {e}")
+
+
+def _init_worker(hit_queue, stop_event):
+    """Give a worker process access to the shared hit queue and stop flag."""
+    global _hit_queue, _stop_event
+    _hit_queue = hit_queue
+    _stop_event = stop_event
+    # Don't block process exit on hits the parent no longer wants
+    _hit_queue.cancel_join_thread()
+
+
+def _excerpt(mm: mmap.mmap, start: int, end: int) -> Tuple[int, bytes]:
+    """Return (line start offset, line bytes) around a match, trimmed to MAX_LINE_BYTES."""
+    line_start = mm.rfind(b'\n', 0, start) + 1
+    line_end = mm.find(b'\n', end)
+    if line_end == -1:
+        line_end = len(mm)
+
+    if line_end - line_start > MAX_LINE_BYTES:
+        margin = max((MAX_LINE_BYTES - (end - start)) // 2, 0)
+        line_start = max(line_start, start - margin)
+        line_end = min(line_end, end + margin)
+
+    return line_start, mm[line_start:line_end]
+
+
+def _scan_book(book_id: int, path: str, pattern: bytes, flags: int, max_hits: int):
+    """Worker: scan one markdown file and push hits onto the shared queue."""
+    count = 0
+    try:
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            return
+
+        regex = re.compile(pattern, flags)
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for match in regex.finditer(mm):
+                if _stop_event.is_set():
+                    break
+
+                _, line = _excerpt(mm, match.start(), match.end())
+                if PAGE_MARKER_BYTES.search(line):
+                    continue
+
+                _hit_queue.put(('hit', {
+                    'book_id': book_id,
+                    'offset': match.start(),
+                    'line': line.decode('utf-8', errors='ignore').strip(),
+                }))
+                count += 1
+                if count >= max_hits:
+                    break
+    except Exception as e:
+        _hit_queue.put(('error', {'book_id': book_id, 'error': str(e)}))
+    finally:
+        _hit_queue.put(('done', {'book_id': book_id, 'hits': count}))
+
+
+def grep_books(
+    books: List[Tuple[int, Path]],
+    pattern: re.Pattern,
+    max_hits: int = 100,
+    workers: Optional[int] = None,
+    on_error: Optional[Callable[[int, str], None]] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Scan markdown files in parallel and yield hits as they are found.
+
+    Workers stop as soon as max_hits hits have been yielded (or the caller
+    stops iterating), so a narrow limit over a large library returns quickly.
+    Hits from different books interleave in completion order.
+
+    Args:
+        books: (book_id, markdown path) pairs to scan
+        pattern: Pattern from compile_pattern()
+        max_hits: Stop after this many hits in total
+        workers: Worker processes (default: one per CPU, at most one per book)
+        on_error: Called with (book_id, message) when a file can't be scanned
+
+    Yields:
+        Hit dictionaries with book_id, offset (byte offset of the match in
+        the file), and line (the surrounding line of text)
+    """
+    if not books or max_hits <= 0:
+        return
+
+    workers = max(1, min(workers or os.cpu_count() or 1, len(books)))
+    context = multiprocessing.get_context()
+    hit_queue = context.Queue()
+    stop_event = context.Event()
+
+    pool = ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=context,
+        initializer=_init_worker,
+        initargs=(hit_queue, stop_event),
+    )
+    try:
+        for book_id, path in books:
+            pool.submit(_scan_book, book_id, str(path), pattern.pattern, pattern.flags, max_hits)
+
+        pending = len(books)
+        found = 0
+        while pending:
+            kind, payload = hit_queue.get()
+            if kind == 'hit':
+                yield payload
+                found += 1
+                if found >= max_hits:
+                    break
+            elif kind == 'error':
+                if on_error:
+                    on_error(payload['book_id'], payload['error'])
+            else:
+                pending -= 1
+    finally:
+        stop_event.set()
+        pool.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,178 @@
+"""Hybrid retrieval: fuse BM25 and vector hits and pack them into a token budget."""
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from ..utils.content_utils import CHARS_PER_TOKEN, estimate_tokens
+from .ann import semantic_search
+from .embeddings import embed_text, tokenize
+from .lexical import lexical_search
+
+# Rank constant from the original RRF paper; damps the influence of top ranks
+RRF_K = 60
+
+# Don't bother truncating a passage to fit if less than this budget remains
+MIN_PASSAGE_TOKENS = 100
+
+
+def reciprocal_rank_fusion(
+    result_lists: Sequence[List[Dict[str, Any]]],
+    k: int = RRF_K,
+) -> List[Dict[str, Any]]:
+    """
+    Merge ranked hit lists with reciprocal rank fusion.
+
+    Each hit scores sum(1 / (k + rank)) over the lists it appears in, so
+    passages found by both retrievers rise to the top without having to
+    calibrate BM25 scores against cosine similarities.
+
+    Args:
+        result_lists: Hit lists sorted best-first (dicts with book_id, page, start, end)
+        k: Rank constant
+
+    Returns:
+        Fused hits sorted by descending fused score
+    """
+    fused: Dict[tuple, Dict[str, Any]] = {}
+    for hits in result_lists:
+        for rank, hit in enumerate(hits, start=1):
+            key = (hit['book_id'], hit['start'], hit['end'])
+            entry = fused.get(key)
+            if entry is None:
+                entry = fused[key] = {**hit, 'score': 0.0}
+            entry['score'] += 1.0 / (k + rank)
+    return sorted(fused.values(), key=lambda hit: hit['score'], reverse=True)
+
+
+def dedupe_overlapping(hits: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Drop hits whose character range overlaps a better-ranked hit in the same book.
+
+    Args:
+        hits: Hits sorted best-first
+
+    Returns:
+        Hits with overlaps removed, order preserved
+    """
+    kept: List[Dict[str, Any]] = []
+    ranges: Dict[int, List[tuple]] = {}
+    for hit in hits:
+        book_ranges = ranges.setdefault(hit['book_id'], [])
+        if any(hit['start'] < end and start < hit['end'] for start, end in book_ranges):
+            continue
+        book_ranges.append((hit['start'], hit['end']))
+        kept.append(hit)
+    return kept
+
+
+def hybrid_search(
+    query: str,
+    candidates: int = 50,
+    book_ids: Optional[List[int]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Run lexical and semantic search in parallel and fuse the results.
+
+    Args:
+        query: Free-text query
+        candidates: Hits taken from each retriever before fusion
+        book_ids: Restrict search to these books (default: all)
+
+    Returns:
+        Fused, de-duplicated hits sorted by descending fused score
+    """
+    if not tokenize(query):
+        # Only stopwords: nothing for either retriever to match on
+        return []
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        lexical = pool.submit(lexical_search, query, candidates, book_ids)
+        semantic = pool.submit(
+            lambda: semantic_search(embed_text(query), top_k=candidates, book_ids=book_ids)
+        )
+        result_lists = [lexical.result(), semantic.result()]
+    return dedupe_overlapping(reciprocal_rank_fusion(result_lists))
+
+
+def _truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut text at a word boundary so it fits in max_tokens."""
+    cut = text[:max_tokens * CHARS_PER_TOKEN]
+    if len(cut) < len(text):
+        cut = cut.rsplit(' ', 1)[0] + " ..."
+        while estimate_tokens(cut) > max_tokens and ' ' in cut:
+            cut = cut.rsplit(' ', 2)[0] + " ..."
+    return cut
+
+
+def pack_context(
+    hits: List[Dict[str, Any]],
+    load_text: Callable[[int], str],
+    max_tokens: int,
+    header_tokens: Callable[[Dict[str, Any]], int] = lambda hit: 0,
+) -> List[Dict[str, Any]]:
+    """
+    Greedily pack the best hits into a token budget.
+
+    Hits are taken best-first; any that doesn't fit is skipped in favour of
+    smaller ones further down, and the last passage is truncated if a useful
+    amount of budget is left. Selected chunks that are adjacent pages of the
+    same book are merged into a single passage so they're cited as a range.
+
+    Args:
+        hits: Hits sorted best-first (dicts with book_id, page, start, end, score)
+        load_text: Returns a book's full markdown given its ID
+        max_tokens: Token budget for passage text plus headers
+        header_tokens: Token cost of a passage's citation header
+
+    Returns:
+        Passages in rank order, each a dictionary with book_id, first_page,
+        last_page, text, tokens, and score
+    """
+    selected: List[Dict[str, Any]] = []
+    remaining = max_tokens
+
+    for hit in hits:
+        overhead = header_tokens(hit)
+        if remaining - overhead < MIN_PASSAGE_TOKENS and selected:
+            break
+
+        text = load_text(hit['book_id'])[hit['start']:hit['end']].strip()
+        if not text:
+            continue
+        tokens = estimate_tokens(text)
+        if tokens + overhead > remaining:
+            if remaining - overhead < MIN_PASSAGE_TOKENS:
+                continue
+            text = _truncate_to_tokens(text, remaining - overhead)
+            tokens = estimate_tokens(text)
+
+        selected.append({**hit, 'text': text, 'tokens': tokens, 'rank': len(selected)})
+        remaining -= tokens + overhead
+
+    # Merge runs of consecutive pages within a book; a merged passage keeps
+    # the rank and score of its best member
+    by_position = sorted(selected, key=lambda p: (p['book_id'], p['page'], p['start']))
+    passages: List[Dict[str, Any]] = []
+    for part in by_position:
+        prev = passages[-1] if passages else None
+        if prev and prev['book_id'] == part['book_id'] and part['page'] - prev['last_page'] == 1:
+            prev['last_page'] = part['page']
+            prev['text'] += "\n\n" + part['text']
+            prev['tokens'] += part['tokens']
+            prev['rank'] = min(prev['rank'], part['rank'])
+            prev['score'] = max(prev['score'], part['score'])
+            continue
+        passages.append({
+            'book_id': part['book_id'],
+            'first_page': part['page'],
+            'last_page': part['page'],
+            'text': part['text'],
+            'tokens': part['tokens'],
+            'score': part['score'],
+            'rank': part['rank'],
+        })
+
+    passages.sort(key=lambda p: p['rank'])
+    for passage in passages:
+        del passage['rank']
+    return passages
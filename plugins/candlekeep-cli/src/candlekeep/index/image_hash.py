@@ -0,0 +1,265 @@
+"""Perceptual hashes of book images and a BK-tree for Hamming-distance lookups.
+
+An image's dHash is 64 bits: the image is reduced to 9x8 gray cells (cell
+averages) and each bit says whether a cell is brighter than its right-hand
+neighbour. Re-encoded, rescaled or slightly retouched copies of an image
+differ in a few bits, unrelated images in about half of them.
+
+A BK-tree indexes hashes by Hamming distance: every child hangs off its
+parent under their distance, so by the triangle inequality a lookup within
+radius r only descends into children whose edge distance is within r of
+the query's distance to the node. It serves the near-duplicate check while
+a book's images are rendered (parsers.images).
+
+Across the library (`similar-images`), hashes are found by multi-index
+hashing: each stored hash is also split into HASH_BANDS bands of BAND_BITS
+bits in indexed columns. Two hashes at most r bits apart differ in at most
+r // HASH_BANDS bits in one of their bands, so the candidates are the
+images having one band within that distance of the query's band, looked
+up by their values (a few hundred a band). The candidates' distances are
+then computed at once with NumPy.
+"""
+
+import os
+from itertools import combinations
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import fitz  # PyMuPDF
+import numpy as np
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from ..db.models import BookImage
+
+HASH_BITS = 64
+
+# Images of one book at most this many bits apart (and of the same size) are copies,
+# if their fine hashes (FINE_HASH_SIZE cells a side) also differ in at most FINE_DUPLICATE_DISTANCE bits
+DUPLICATE_DISTANCE = 4
+FINE_HASH_SIZE = 16
+FINE_DUPLICATE_DISTANCE = 24
+
+# Default largest distance `similar-images` reports
+DEFAULT_SIMILAR_DISTANCE = 12
+
+# Indexed bands of a stored hash (BookImage.phash_band0...)
+HASH_BANDS = 4
+BAND_BITS = HASH_BITS // HASH_BANDS
+
+# Largest band distance looked up by value (C(16, 0..3) = 697 values a band);
+# wider searches compare every hash
+MAX_BAND_DISTANCE = 3
+
+# Set bits of each byte value
+_POPCOUNT = np.array([bin(value).count('1') for value in range(256)], dtype=np.uint8)
+
+# Images hashed from their files (and stored) per batch when backfilling
+BACKFILL_BATCH = 500
+
+
+def gray_pixels(pix: fitz.Pixmap) -> np.ndarray:
+    """A pixmap's luminance as a 2-D array (alpha ignored)."""
+    samples = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, pix.n)
+    channels = samples[:, :, :min(3, pix.n - pix.alpha)]
+    return channels.mean(axis=2) if channels.shape[2] > 1 else channels[:, :, 0].astype(np.float64)
+
+
+def _cell_bounds(length: int, cells: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Start and end of each of cells equal slices of length (at least one pixel each)."""
+    starts = np.minimum((np.arange(cells) * length) // cells, length - 1)
+    ends = np.maximum((np.arange(1, cells + 1) * length) // cells, starts + 1)
+    return starts, ends
+
+
+def dhash(gray: np.ndarray, size: int = 8) -> int:
+    """
+    Difference hash of a gray image.
+
+    Args:
+        gray: 2-D luminance array (see gray_pixels)
+        size: Cells a side (size + 1 wide, to compare neighbours)
+
+    Returns:
+        Unsigned hash of size * size bits (64 by default)
+    """
+    # Cell sums from the integral image
+    integral = np.zeros((gray.shape[0] + 1, gray.shape[1] + 1))
+    integral[1:, 1:] = gray.cumsum(axis=0).cumsum(axis=1)
+    r0, r1 = _cell_bounds(gray.shape[0], size)
+    c0, c1 = _cell_bounds(gray.shape[1], size + 1)
+    sums = (
+        integral[r1[:, None], c1[None, :]] - integral[r0[:, None], c1[None, :]]
+        - integral[r1[:, None], c0[None, :]] + integral[r0[:, None], c0[None, :]]
+    )
+    cells = sums / ((r1 - r0)[:, None] * (c1 - c0)[None, :])
+    bits = (cells[:, 1:] > cells[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+def hash_to_db(value: int) -> int:
+    """An unsigned hash as the signed 64-bit integer SQLite stores."""
+    return value - (1 << HASH_BITS) if value >= 1 << (HASH_BITS - 1) else value
+
+
+def hash_from_db(value: int) -> int:
+    """The unsigned hash of a stored signed integer."""
+    return value + (1 << HASH_BITS) if value < 0 else value
+
+
+def hash_bands(value: int) -> Dict[str, int]:
+    """The BookImage band columns of an unsigned hash."""
+    mask = (1 << BAND_BITS) - 1
+    return {f'phash_band{band}': (value >> (band * BAND_BITS)) & mask for band in range(HASH_BANDS)}
+
+
+def _band_values(band: int, max_distance: int) -> List[int]:
+    """Band values at most max_distance bits from band."""
+    return [
+        band ^ sum(1 << bit for bit in bits)
+        for distance in range(max_distance + 1)
+        for bits in combinations(range(BAND_BITS), distance)
+    ]
+
+
+def hamming_distances(value: int, stored: np.ndarray) -> np.ndarray:
+    """Bits in which an unsigned hash differs from each of an array of stored (signed) hashes."""
+    differences = stored.astype(np.int64).view(np.uint64) ^ np.uint64(value)
+    return _POPCOUNT[differences.view(np.uint8).reshape(-1, 8)].sum(axis=1, dtype=np.int64)
+
+
+def hamming(a: int, b: int) -> int:
+    """Bits in which two hashes differ."""
+    return (a ^ b).bit_count()
+
+
+class BKTree:
+    """BK-tree of 64-bit hashes; each hash keeps the items added with it."""
+
+    def __init__(self, entries: Iterable[Tuple[int, Any]] = ()):
+        # Node: [hash, items, {distance: child node}]
+        self._root: Optional[list] = None
+        self._size = 0
+        for value, item in entries:
+            self.add(value, item)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, value: int, item: Any):
+        """Add an item under a hash."""
+        self._size += 1
+        if self._root is None:
+            self._root = [value, [item], {}]
+            return
+        node = self._root
+        while True:
+            distance = hamming(value, node[0])
+            if distance == 0:
+                node[1].append(item)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [value, [item], {}]
+                return
+            node = child
+
+    def find(self, value: int, max_distance: int) -> List[Tuple[int, Any]]:
+        """
+        Items whose hash is within max_distance bits of value.
+
+        Returns:
+            (distance, item) pairs, closest first
+        """
+        found = []
+        stack = [self._root] if self._root is not None else []
+        while stack:
+            node = stack.pop()
+            distance = hamming(value, node[0])
+            if distance <= max_distance:
+                found.extend((distance, item) for item in node[1])
+            for edge, child in node[2].items():
+                if distance - max_distance <= edge <= distance + max_distance:
+                    stack.append(child)
+        found.sort(key=lambda pair: pair[0])
+        return found
+
+
+def hash_image_file(path: str) -> int:
+    """dHash of an image file."""
+    return dhash(gray_pixels(fitz.Pixmap(path)))
+
+
+def backfill_image_hashes(session: Session) -> int:
+    """
+    Hash the images extracted before hashes were stored (missing files are
+    skipped); run by `reindex`.
+
+    Returns:
+        Number of images hashed
+    """
+    hashed = 0
+    skipped = set()
+    while True:
+        query = session.query(BookImage.id, BookImage.file_path).filter(BookImage.phash.is_(None))
+        if skipped:
+            query = query.filter(BookImage.id.notin_(skipped))
+        rows = query.limit(BACKFILL_BATCH).all()
+        if not rows:
+            return hashed
+        updates = []
+        for image_id, path in rows:
+            if not os.path.exists(path):
+                skipped.add(image_id)
+                continue
+            try:
+                value = hash_image_file(path)
+                updates.append({'id': image_id, 'phash': hash_to_db(value), **hash_bands(value)})
+            except (RuntimeError, ValueError):
+                # Unreadable image file
+                skipped.add(image_id)
+        session.bulk_update_mappings(BookImage, updates)
+        session.commit()
+        hashed += len(updates)
+
+
+def similar_images(
+    session: Session,
+    value: int,
+    max_distance: int = DEFAULT_SIMILAR_DISTANCE,
+    limit: int = 10,
+    book_ids: Optional[List[int]] = None,
+    exclude_id: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Images of the library whose hash is close to value.
+
+    Args:
+        session: Database session
+        value: Unsigned dHash to compare against
+        max_distance: Largest Hamming distance reported
+        limit: Most images returned
+        book_ids: Only search these books
+        exclude_id: Image to leave out (the one searched for)
+
+    Returns:
+        Dictionaries with image_id and distance, closest first (then by ID)
+    """
+    query = session.query(BookImage.id, BookImage.phash).filter(BookImage.phash.isnot(None))
+    if book_ids:
+        query = query.filter(BookImage.book_id.in_(book_ids))
+    if exclude_id is not None:
+        query = query.filter(BookImage.id != exclude_id)
+    band_distance = max_distance // HASH_BANDS
+    if band_distance <= MAX_BAND_DISTANCE:
+        query = query.filter(or_(*(
+            getattr(BookImage, column).in_(_band_values(band, band_distance))
+            for column, band in hash_bands(value).items()
+        )))
+    rows = query.all()
+    if not rows:
+        return []
+    ids = np.array([image_id for image_id, _ in rows], dtype=np.int64)
+    distances = hamming_distances(value, np.array([phash for _, phash in rows], dtype=np.int64))
+    order = np.lexsort((ids, distances))
+    order = order[distances[order] <= max_distance][:limit]
+    return [{'image_id': int(ids[i]), 'distance': int(distances[i])} for i in order]
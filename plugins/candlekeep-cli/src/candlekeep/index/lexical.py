@@ -0,0 +1,142 @@
+"""BM25 keyword search over page text with SQLite FTS5.
+
+Chunks are stored in the `page_fts` virtual table (created by migration
+7c2e91d4a0b3) with the same (page, char_start, char_end) boundaries as the
+semantic index, so hits from both can be fused by position.
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from ..db.session import get_db_manager
+from .embeddings import tokenize
+
+# rowid = (book_id << CHUNK_BITS) | chunk_index, so one book is one rowid range
+CHUNK_BITS = 20
+
+
+def _rowid_range(book_id: int) -> Tuple[int, int]:
+    first = book_id << CHUNK_BITS
+    return first, first + (1 << CHUNK_BITS) - 1
+
+
+def build_lexical_index(session: Session, book_id: int, markdown_text: str, chunks: List[Tuple[int, int, int]]):
+    """
+    Replace a book's rows in the full-text index.
+
+    Args:
+        session: Database session (the caller commits)
+        book_id: Book ID
+        markdown_text: Full markdown content of the book
+        chunks: (page_number, char_start, char_end) for each chunk
+    """
+    first_rowid, last_rowid = _rowid_range(book_id)
+    rows = [
+        {
+            "rowid": first_rowid + i,
+            "content": markdown_text[start:end],
+            "book_id": book_id,
+            "page_number": page,
+            "char_start": start,
+            "char_end": end,
+        }
+        for i, (page, start, end) in enumerate(chunks)
+    ]
+
+    remove_lexical_index(session, book_id)
+    if rows:
+        session.execute(
+            text(
+                "INSERT INTO page_fts (rowid, content, book_id, page_number, char_start, char_end) "
+                "VALUES (:rowid, :content, :book_id, :page_number, :char_start, :char_end)"
+            ),
+            rows,
+        )
+
+
+def remove_lexical_index(session: Session, book_id: int):
+    """
+    Delete a book's rows from the full-text index.
+
+    Args:
+        session: Database session (the caller commits)
+        book_id: Book ID
+    """
+    first_rowid, last_rowid = _rowid_range(book_id)
+    session.execute(
+        text("DELETE FROM page_fts WHERE rowid BETWEEN :first AND :last"),
+        {"first": first_rowid, "last": last_rowid},
+    )
+
+
+def build_match_query(query: str) -> Optional[str]:
+    """
+    Turn free text into an FTS5 MATCH expression.
+
+    Each non-stopword term is quoted (so punctuation can't be parsed as FTS
+    syntax) and terms are OR-ed; BM25 then ranks chunks matching more and
+    rarer terms first.
+
+    Args:
+        query: Free-text query
+
+    Returns:
+        MATCH expression, or None if the query has no searchable terms
+    """
+    terms = list(dict.fromkeys(tokenize(query)))
+    if not terms:
+        return None
+    return " OR ".join(f'"{term}"' for term in terms)
+
+
+def lexical_search(
+    query: str,
+    top_k: int = 10,
+    book_ids: Optional[List[int]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Rank chunks by BM25 relevance to a free-text query.
+
+    Args:
+        query: Free-text query
+        top_k: Number of results to return
+        book_ids: Restrict search to these books (default: all)
+
+    Returns:
+        List of hits sorted by relevance, each a dictionary with book_id,
+        page, start, end, and score (higher is better)
+    """
+    match = build_match_query(query)
+    if match is None:
+        return []
+
+    sql = (
+        "SELECT book_id, page_number, char_start, char_end, bm25(page_fts) AS rank "
+        "FROM page_fts WHERE page_fts MATCH :match"
+    )
+    params: Dict[str, Any] = {"match": match, "limit": top_k}
+    if book_ids:
+        # Filter on the rowid ranges, which FTS5 can use directly
+        ranges = []
+        for i, book_id in enumerate(book_ids):
+            params[f"first{i}"], params[f"last{i}"] = _rowid_range(book_id)
+            ranges.append(f"rowid BETWEEN :first{i} AND :last{i}")
+        sql += " AND (" + " OR ".join(ranges) + ")"
+    sql += " ORDER BY rank LIMIT :limit"
+
+    with get_db_manager().engine.connect() as conn:
+        rows = conn.execute(text(sql), params).fetchall()
+
+    # FTS5's bm25() is negated so that ascending order is best-first
+    return [
+        {
+            "book_id": int(row.book_id),
+            "page": int(row.page_number),
+            "start": int(row.char_start),
+            "end": int(row.char_end),
+            "score": -float(row.rank),
+        }
+        for row in rows
+    ]
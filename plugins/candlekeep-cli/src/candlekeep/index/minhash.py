@@ -0,0 +1,304 @@
+"""MinHash signatures and LSH banding for near-duplicate book detection.
+
+A book is reduced to the set of its word shingles (runs of SHINGLE_WORDS
+consecutive non-stopword tokens). The MinHash signature keeps, for each of
+NUM_PERM hash functions, the smallest hash over that set; the share of
+positions where two signatures agree estimates the Jaccard similarity of
+the two shingle sets. Signatures are cut into LSH_BANDS bands whose hashes
+go into the minhash_bands table, so candidates are found with index seeks
+instead of comparing against every book.
+
+Signatures are built from page text only, so the PDF text layer (read
+before conversion) and the converted markdown of the same book agree.
+"""
+
+import re
+import zlib
+from hashlib import blake2b
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from ..db.session import get_db_manager
+from ..utils.content_utils import split_pages
+from .embeddings import tokenize
+
+# Hash functions per signature
+NUM_PERM = 128
+
+# Bands of NUM_PERM // LSH_BANDS rows. With 32 bands of 4 rows, pairs above
+# ~0.5 Jaccard are almost always candidates and pairs below ~0.3 rarely are.
+LSH_BANDS = 32
+
+# Words per shingle
+SHINGLE_WORDS = 3
+
+# Books with fewer shingles than this (e.g. scans without a text layer) get no signature
+MIN_SHINGLES = 50
+
+# Longest run of pages read for a signature; longer books are sampled evenly
+MAX_SAMPLE_PAGES = 500
+
+# Default estimated Jaccard similarity above which books are near-duplicates
+DEFAULT_DUPLICATE_THRESHOLD = 0.8
+
+_IMAGE_LINK = re.compile(r'!\[[^\]]*\]\([^)]*\)')
+
+# Fixed seeds so signatures are comparable across runs
+_SEEDS = np.random.default_rng(0x5EED).integers(0, 2**63, size=NUM_PERM, dtype=np.uint64)
+
+
+def sample_page_indices(page_count: int, max_pages: int = MAX_SAMPLE_PAGES) -> List[int]:
+    """
+    Choose which pages (0-based) a signature is built from.
+
+    Args:
+        page_count: Pages in the book
+        max_pages: Most pages to read
+
+    Returns:
+        Every page for books up to max_pages, otherwise max_pages evenly spaced pages
+    """
+    if page_count <= max_pages:
+        return list(range(page_count))
+    return sorted({int(i) for i in np.linspace(0, page_count - 1, max_pages)})
+
+
+def _mix(values: np.ndarray) -> np.ndarray:
+    """splitmix64 finalizer (wraps mod 2**64)."""
+    values = values ^ (values >> np.uint64(30))
+    values = values * np.uint64(0xBF58476D1CE4E5B9)
+    values = values ^ (values >> np.uint64(27))
+    values = values * np.uint64(0x94D049BB133111EB)
+    return values ^ (values >> np.uint64(31))
+
+
+def shingle_hashes(page_texts: Iterable[str]) -> np.ndarray:
+    """
+    Hash the distinct word shingles of a book's pages.
+
+    Args:
+        page_texts: Text of each sampled page, in order
+
+    Returns:
+        Unique uint64 shingle hashes
+    """
+    tokens = []
+    for page_text in page_texts:
+        tokens.extend(tokenize(page_text))
+    if len(tokens) < SHINGLE_WORDS:
+        return np.zeros(0, dtype=np.uint64)
+
+    ids = np.array([zlib.crc32(token.encode('utf-8')) for token in tokens], dtype=np.uint64)
+    count = len(ids) - SHINGLE_WORDS + 1
+    with np.errstate(over='ignore'):
+        hashes = np.zeros(count, dtype=np.uint64)
+        for offset in range(SHINGLE_WORDS):
+            hashes = _mix(hashes ^ ids[offset:offset + count])
+    return np.unique(hashes)
+
+
+def compute_signature(page_texts: Iterable[str]) -> Optional[np.ndarray]:
+    """
+    Build a MinHash signature from page text.
+
+    Args:
+        page_texts: Text of each sampled page, in order
+
+    Returns:
+        uint32 array of NUM_PERM minimums, or None if the text is too short
+    """
+    shingles = shingle_hashes(page_texts)
+    if len(shingles) < MIN_SHINGLES:
+        return None
+
+    signature = np.empty(NUM_PERM, dtype=np.uint64)
+    with np.errstate(over='ignore'):
+        for i, seed in enumerate(_SEEDS):
+            signature[i] = _mix(shingles ^ seed).min()
+    return (signature >> np.uint64(32)).astype(np.uint32)
+
+
+def markdown_signature(markdown_text: str) -> Optional[np.ndarray]:
+    """
+    Build a book's MinHash signature from its markdown.
+
+    Page markers and image links are skipped so the result matches a
+    signature of the PDF text layer.
+
+    Args:
+        markdown_text: Full markdown content of the book
+
+    Returns:
+        Signature, or None if the text is too short
+    """
+    pages = split_pages(markdown_text) or [(1, 0, len(markdown_text))]
+    sampled = [pages[i] for i in sample_page_indices(len(pages))]
+    return compute_signature(_IMAGE_LINK.sub(' ', markdown_text[start:end]) for _, start, end in sampled)
+
+
+def band_hashes(signature: np.ndarray) -> List[int]:
+    """
+    Hash each LSH band of a signature.
+
+    Args:
+        signature: MinHash signature
+
+    Returns:
+        Signed 64-bit bucket per band
+    """
+    return [
+        int.from_bytes(blake2b(band.tobytes(), digest_size=8).digest(), 'little', signed=True)
+        for band in np.split(signature, LSH_BANDS)
+    ]
+
+
+def estimate_jaccard(first: np.ndarray, second: np.ndarray) -> float:
+    """Estimate the Jaccard similarity of two books from their signatures."""
+    return float(np.mean(first == second))
+
+
+def build_signature_index(session: Session, book_id: int, markdown_text: str) -> bool:
+    """
+    Replace a book's signature and LSH bands.
+
+    Args:
+        session: Database session (the caller commits)
+        book_id: Book ID
+        markdown_text: Full markdown content of the book
+
+    Returns:
+        True if a signature was stored (False if the book has too little text)
+    """
+    signature = markdown_signature(markdown_text)
+
+    remove_signature_index(session, book_id)
+    if signature is None:
+        return False
+
+    session.execute(
+        text("INSERT INTO book_signatures (book_id, signature) VALUES (:book_id, :signature)"),
+        {"book_id": book_id, "signature": signature.tobytes()},
+    )
+    session.execute(
+        text("INSERT OR IGNORE INTO minhash_bands (band, bucket, book_id) VALUES (:band, :bucket, :book_id)"),
+        [
+            {"band": band, "bucket": bucket, "book_id": book_id}
+            for band, bucket in enumerate(band_hashes(signature))
+        ],
+    )
+    return True
+
+
+def remove_signature_index(session: Session, book_id: int):
+    """
+    Delete a book's signature and LSH bands.
+
+    Args:
+        session: Database session (the caller commits)
+        book_id: Book ID
+    """
+    session.execute(text("DELETE FROM book_signatures WHERE book_id = :book_id"), {"book_id": book_id})
+    session.execute(text("DELETE FROM minhash_bands WHERE book_id = :book_id"), {"book_id": book_id})
+
+
+def _load_signatures(conn, book_ids: Iterable[int]) -> Dict[int, np.ndarray]:
+    book_ids = list(book_ids)
+    if not book_ids:
+        return {}
+    rows = conn.execute(
+        text(
+            "SELECT book_id, signature FROM book_signatures WHERE book_id IN ("
+            + ", ".join(f":b{i}" for i in range(len(book_ids))) + ")"
+        ),
+        {f"b{i}": book_id for i, book_id in enumerate(book_ids)},
+    )
+    return {row.book_id: np.frombuffer(row.signature, dtype=np.uint32) for row in rows}
+
+
+def find_near_duplicates(
+    signature: np.ndarray,
+    threshold: float = DEFAULT_DUPLICATE_THRESHOLD,
+    exclude_book_id: Optional[int] = None,
+) -> List[Tuple[int, float]]:
+    """
+    Find library books whose estimated Jaccard similarity reaches a threshold.
+
+    Args:
+        signature: Signature of the book being checked
+        threshold: Minimum estimated Jaccard similarity (0-1)
+        exclude_book_id: Book to leave out (the book itself, when already stored)
+
+    Returns:
+        (book_id, similarity) pairs, most similar first
+    """
+    buckets = band_hashes(signature)
+    with get_db_manager().engine.connect() as conn:
+        rows = conn.execute(
+            text(
+                "SELECT DISTINCT book_id FROM minhash_bands WHERE "
+                + " OR ".join(f"(band = {band} AND bucket = :k{band})" for band in range(LSH_BANDS))
+            ),
+            {f"k{band}": bucket for band, bucket in enumerate(buckets)},
+        )
+        candidates = {row.book_id for row in rows} - {exclude_book_id}
+        signatures = _load_signatures(conn, candidates)
+
+    matches = [
+        (book_id, estimate_jaccard(signature, other))
+        for book_id, other in signatures.items()
+    ]
+    matches = [match for match in matches if match[1] >= threshold]
+    matches.sort(key=lambda match: (-match[1], match[0]))
+    return matches
+
+
+def cluster_near_duplicates(threshold: float = DEFAULT_DUPLICATE_THRESHOLD) -> List[List[Tuple[int, int, float]]]:
+    """
+    Group library books into clusters of near-duplicates.
+
+    Candidate pairs come from shared LSH buckets and are kept if their
+    estimated Jaccard similarity reaches the threshold; clusters are the
+    connected components of the kept pairs.
+
+    Args:
+        threshold: Minimum estimated Jaccard similarity (0-1)
+
+    Returns:
+        Clusters ordered by lowest book ID. Each is a list of
+        (book_id, closest other member, similarity to it), ordered by book ID.
+    """
+    with get_db_manager().engine.connect() as conn:
+        pairs = conn.execute(text(
+            "SELECT DISTINCT a.book_id AS first, b.book_id AS second "
+            "FROM minhash_bands a JOIN minhash_bands b "
+            "ON a.band = b.band AND a.bucket = b.bucket AND a.book_id < b.book_id"
+        )).fetchall()
+        signatures = _load_signatures(conn, {book_id for pair in pairs for book_id in pair})
+
+    # Union-find over pairs above the threshold
+    parent: Dict[int, int] = {}
+
+    def find(book_id: int) -> int:
+        parent.setdefault(book_id, book_id)
+        while parent[book_id] != book_id:
+            parent[book_id] = parent[parent[book_id]]
+            book_id = parent[book_id]
+        return book_id
+
+    closest: Dict[int, Tuple[int, float]] = {}
+    for first, second in pairs:
+        similarity = estimate_jaccard(signatures[first], signatures[second])
+        if similarity < threshold:
+            continue
+        parent[find(second)] = find(first)
+        for book_id, other in ((first, second), (second, first)):
+            if book_id not in closest or similarity > closest[book_id][1]:
+                closest[book_id] = (other, similarity)
+
+    clusters: Dict[int, List[Tuple[int, int, float]]] = {}
+    for book_id in sorted(closest):
+        clusters.setdefault(find(book_id), []).append((book_id, *closest[book_id]))
+    return sorted(clusters.values(), key=lambda cluster: cluster[0][0])
@@ -0,0 +1,188 @@
+"""Store per-page offsets and statistics of a book's markdown and map offsets back to pages."""
+
+from bisect import bisect_right
+from itertools import accumulate
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from ..db.bulk import insert_rows
+from ..db.models import Book, BookPage, TocEntry
+from ..utils.content_utils import compute_page_layout, expand_label_runs
+
+
+def _replace_pages(session: Session, book_id: int, markdown_text: str) -> List[Dict[str, Any]]:
+    """Replace a book's rows in book_pages within the given session and return them."""
+    runs = session.query(Book.page_labels).filter(Book.id == book_id).scalar()
+    layout = compute_page_layout(markdown_text, expand_label_runs(runs))
+    session.query(BookPage).filter(BookPage.book_id == book_id).delete(synchronize_session=False)
+    insert_rows(session, BookPage, ({'book_id': book_id, **page} for page in layout))
+    return layout
+
+
+def build_page_table(session: Session, book_id: int, markdown_text: str) -> int:
+    """
+    Replace a book's rows in book_pages.
+
+    Printed page numbers come from the book's page labels where known.
+
+    Args:
+        session: Database session (the caller commits)
+        book_id: Book ID
+        markdown_text: Full markdown content of the book
+
+    Returns:
+        Number of pages stored
+    """
+    return len(_replace_pages(session, book_id, markdown_text))
+
+
+def page_token_counts(session: Session, book: Book) -> Dict[int, int]:
+    """
+    Estimated tokens of each page of a book.
+
+    Books indexed before page statistics existed get them from their
+    markdown file here, once (the rows are rebuilt in the caller's session).
+
+    Args:
+        session: Database session
+        book: Book
+
+    Returns:
+        {physical page number: token estimate}, empty when unknown (lazily
+        converted books, or a missing markdown file)
+    """
+    rows = (
+        session.query(BookPage.page_number, BookPage.token_count)
+        .filter(BookPage.book_id == book.id)
+        .all()
+    )
+    if not rows or any(tokens is None for _, tokens in rows):
+        md_path = Path(book.markdown_file_path)
+        if book.lazy_conversion or not md_path.exists():
+            return {}
+        layout = _replace_pages(session, book.id, md_path.read_text(encoding='utf-8'))
+        rows = [(page['page_number'], page['token_count']) for page in layout]
+    return dict(rows)
+
+
+def token_prefix_sums(counts: Dict[int, int]) -> List[int]:
+    """
+    Cumulative page tokens: element p is the total of pages 1..p (element 0 is 0).
+
+    Pages missing from counts count as 0.
+    """
+    last_page = max(counts, default=0)
+    return [0, *accumulate(counts.get(page, 0) for page in range(1, last_page + 1))]
+
+
+def range_tokens(prefix: List[int], start_page: int, end_page: Optional[int] = None) -> int:
+    """Total tokens of pages start_page..end_page (inclusive) from token_prefix_sums."""
+    last = len(prefix) - 1
+    end_page = min(end_page or start_page, last)
+    start_page = max(start_page, 1)
+    if start_page > end_page:
+        return 0
+    return prefix[end_page] - prefix[start_page - 1]
+
+
+class PageLocator:
+    """
+    Map byte offsets in books' markdown files to pages and TOC sections.
+
+    Page and TOC rows are loaded per book on first use, so locating a few
+    hits in a large library only touches the books that actually matched.
+    """
+
+    def __init__(self, session: Session):
+        """
+        Args:
+            session: Open database session
+        """
+        self.session = session
+        self._pages: Dict[int, List[BookPage]] = {}
+        self._starts: Dict[int, List[int]] = {}
+        self._char_starts: Dict[int, List[int]] = {}
+        self._sections: Dict[int, List[Tuple[int, int, str]]] = {}
+
+    def _load(self, book_id: int):
+        pages = (
+            self.session.query(BookPage)
+            .filter(BookPage.book_id == book_id)
+            .order_by(BookPage.page_number)
+            .all()
+        )
+        self._pages[book_id] = pages
+        self._starts[book_id] = [page.byte_start for page in pages]
+        self._char_starts[book_id] = [page.char_start for page in pages]
+
+        entries = (
+            self.session.query(TocEntry.id, TocEntry.parent_id, TocEntry.title, TocEntry.start_page, TocEntry.end_page)
+            .filter(TocEntry.book_id == book_id)
+            .order_by(TocEntry.ordinal)
+            .all()
+        )
+        titles = {entry.id: (entry.parent_id, entry.title) for entry in entries}
+
+        sections = []
+        for entry in entries:
+            if not entry.start_page or entry.start_page < 1:
+                continue
+            path = [entry.title]
+            parent_id = entry.parent_id
+            while parent_id in titles:
+                parent_id, title = titles[parent_id]
+                path.append(title)
+            sections.append((entry.start_page, entry.end_page or entry.start_page, ' > '.join(reversed(path))))
+        self._sections[book_id] = sections
+
+    def locate(self, book_id: int, byte_offset: int) -> Dict[str, Any]:
+        """
+        Find the page and section containing a byte offset.
+
+        Args:
+            book_id: Book ID
+            byte_offset: Offset into the book's markdown file
+
+        Returns:
+            Dictionary with page (None if the book has no page table yet),
+            printed_page, and section (deepest TOC section covering the page)
+        """
+        return self._describe(book_id, byte_offset, self._starts)
+
+    def locate_char(self, book_id: int, char_offset: int) -> Dict[str, Any]:
+        """
+        Find the page and section containing a character offset.
+
+        Args:
+            book_id: Book ID
+            char_offset: Offset into the book's decoded markdown text
+
+        Returns:
+            Same as locate()
+        """
+        return self._describe(book_id, char_offset, self._char_starts)
+
+    def _describe(self, book_id: int, offset: int, starts: Dict[int, List[int]]) -> Dict[str, Any]:
+        if book_id not in self._pages:
+            self._load(book_id)
+
+        pages = self._pages[book_id]
+        if not pages:
+            return {'page': None, 'printed_page': None, 'section': None}
+
+        index = max(bisect_right(starts[book_id], offset) - 1, 0)
+        page = pages[index]
+
+        # Later entries at the same span are deeper or more specific
+        section = None
+        for start_page, end_page, path in self._sections[book_id]:
+            if start_page <= page.page_number <= end_page:
+                section = path
+
+        return {
+            'page': page.page_number,
+            'printed_page': page.printed_page_number,
+            'section': section,
+        }
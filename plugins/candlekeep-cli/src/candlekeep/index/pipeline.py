@@ -0,0 +1,86 @@
+"""Build derived search indexes for a book after ingest."""
+
+from typing import List, Tuple
+
+from ..db.page_cache import PageCache
+from ..db.session import get_db_manager
+from ..utils.content_utils import chunk_markdown
+from .ann import IVFIndex
+from .embeddings import embed_texts
+from .fingerprints import build_fingerprint_index, remove_fingerprint_index
+from .lexical import build_lexical_index, remove_lexical_index
+from .minhash import build_signature_index, remove_signature_index
+from .page_table import build_page_table
+from .related import build_related_index, refresh_stale_books, remove_related_index
+from .vector_store import VectorStore
+
+
+def build_semantic_index(book_id: int, markdown_text: str, chunks: List[Tuple[int, int, int]]) -> int:
+    """
+    Embed a book's chunks and store them in the vector store.
+
+    Args:
+        book_id: Book ID
+        markdown_text: Full markdown content of the book
+        chunks: (page_number, char_start, char_end) for each chunk
+
+    Returns:
+        Number of chunks indexed
+    """
+    vectors = embed_texts([markdown_text[start:end] for _, start, end in chunks])
+    store = VectorStore()
+    store.add_book(book_id, vectors, chunks)
+    IVFIndex(store=store).add_book(book_id, vectors, chunks)
+    return len(chunks)
+
+
+def index_book(book_id: int, markdown_text: str) -> int:
+    """
+    Build every derived index for a newly added (or re-indexed) book.
+
+    The database tables (pages, fingerprints, signature, related units and
+    full-text rows) are replaced in one transaction, so a failure leaves the
+    book's previous rows, or none, rather than a mix. The vector files are
+    written once that transaction has committed.
+
+    Args:
+        book_id: Book ID
+        markdown_text: Full markdown content of the book
+
+    Returns:
+        Number of chunks indexed
+    """
+    # A new book may reuse the ID of a removed one
+    PageCache().invalidate_book(book_id)
+
+    # Both indexes share chunk boundaries so their hits can be fused by position
+    chunks = chunk_markdown(markdown_text)
+
+    with get_db_manager().get_session() as session:
+        build_page_table(session, book_id, markdown_text)
+        build_fingerprint_index(session, book_id, markdown_text)
+        build_signature_index(session, book_id, markdown_text)
+        build_related_index(session, book_id, markdown_text)
+        build_lexical_index(session, book_id, markdown_text, chunks)
+
+    chunk_count = build_semantic_index(book_id, markdown_text, chunks)
+    refresh_stale_books(book_id)
+    return chunk_count
+
+
+def remove_book_indexes(book_id: int):
+    """
+    Drop a book from every derived index.
+
+    Args:
+        book_id: Book ID
+    """
+    store = VectorStore()
+    store.remove_book(book_id)
+    IVFIndex(store=store).remove_book(book_id)
+    with get_db_manager().get_session() as session:
+        remove_lexical_index(session, book_id)
+        remove_fingerprint_index(session, book_id)
+        remove_signature_index(session, book_id)
+        remove_related_index(session, book_id)
+    PageCache().invalidate_book(book_id)
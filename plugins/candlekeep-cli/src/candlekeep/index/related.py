@@ -0,0 +1,504 @@
+"""Related books and sections from sparse TF-IDF similarity.
+
+Every book is stored as one whole-book unit plus one unit per TOC section
+(or per window of PAGE_WINDOW pages when the book has no usable TOC). Each
+unit holds a sparse, L2-normalized TF-IDF vector of its top terms, with
+terms identified by their CRC32 hash and IDF counted over books.
+
+Similarities are precomputed into related_neighbors, which keeps the
+TOP_K_NEIGHBORS most similar units in other books for every unit. Adding a
+book compares only its units against the stored vectors: its own neighbour
+lists are written, and its units are merged into existing units' lists
+where they rank high enough. Lookups are then a single indexed query.
+
+Vectors keep the IDF weights they were built with. Books weighted for a
+library under half its current size are rebuilt a few at a time as new
+books are added, and `candlekeep reindex` rebuilds everything.
+"""
+
+import re
+import zlib
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import func, text
+from sqlalchemy.orm import Session
+
+from ..db.models import Book, RelatedNeighbor, RelatedTerm, RelatedUnit, TocEntry
+from ..db.session import get_db_manager
+from ..utils.content_utils import split_pages
+from .embeddings import tokenize
+
+# Neighbours kept per unit
+TOP_K_NEIGHBORS = 10
+
+# Terms kept per vector
+MAX_SECTION_TERMS = 200
+MAX_BOOK_TERMS = 1000
+
+# Pages per pseudo-section for books without a usable TOC
+PAGE_WINDOW = 10
+
+# Pairs less similar than this are not stored
+MIN_SIMILARITY = 0.05
+
+# Stale books rebuilt per added book (see refresh_stale_books)
+REFRESH_PER_ADD = 2
+
+# Bound on the (matched entries x new units) block scored at once
+_SCORE_BLOCK = 4_000_000
+
+_IMAGE_LINK = re.compile(r'!\[[^\]]*\]\([^)]*\)')
+
+
+def _term_counts(text_value: str) -> Counter:
+    """Count the hashed terms of a text."""
+    return Counter(zlib.crc32(token.encode('utf-8')) for token in tokenize(_IMAGE_LINK.sub(' ', text_value)))
+
+
+def _book_sections(session: Session, book_id: int, pages: List[Tuple[int, int, int]]) -> List[Tuple[Optional[int], int, int]]:
+    """
+    Choose a book's section units.
+
+    Returns:
+        (toc_entry_id, first_page, last_page) per section; TOC sections when
+        the book has any with page spans, otherwise windows of PAGE_WINDOW pages
+    """
+    page_count = len(pages)
+    if page_count == 0:
+        return []
+
+    entries = (
+        session.query(TocEntry.id, TocEntry.start_page, TocEntry.end_page)
+        .filter(TocEntry.book_id == book_id, TocEntry.start_page >= 1)
+        .order_by(TocEntry.ordinal)
+        .all()
+    )
+    sections = [
+        (entry.id, min(entry.start_page, page_count), min(entry.end_page or entry.start_page, page_count))
+        for entry in entries
+    ]
+    if sections:
+        return sections
+
+    return [
+        (None, first, min(first + PAGE_WINDOW - 1, page_count))
+        for first in range(1, page_count + 1, PAGE_WINDOW)
+    ]
+
+
+def _vectorize(counts: Counter, book_counts: Dict[int, int], book_total: int, max_terms: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Turn term counts into a pruned, L2-normalized TF-IDF vector.
+
+    Returns:
+        (term_ids, weights) sorted by term ID
+    """
+    if not counts:
+        return np.zeros(0, dtype=np.uint32), np.zeros(0, dtype=np.float32)
+
+    terms = np.fromiter(counts.keys(), dtype=np.uint32, count=len(counts))
+    tf = 1.0 + np.log(np.fromiter(counts.values(), dtype=np.float64, count=len(counts)))
+    df = np.fromiter((book_counts.get(int(term), 0) for term in terms), dtype=np.float64, count=len(terms))
+    weights = tf * (np.log((1.0 + book_total) / (1.0 + df)) + 1.0)
+
+    if len(terms) > max_terms:
+        keep = np.argpartition(weights, -max_terms)[-max_terms:]
+        terms, weights = terms[keep], weights[keep]
+
+    order = np.argsort(terms)
+    weights = weights[order] / np.linalg.norm(weights)
+    return terms[order], weights.astype(np.float32)
+
+
+def _load_vectors(session: Session, is_book: bool, exclude_book_id: int):
+    """
+    Load stored vectors of one unit kind in CSR form.
+
+    Returns:
+        (unit_ids, indptr, indices, data)
+    """
+    rows = (
+        session.query(RelatedUnit.id, RelatedUnit.term_ids, RelatedUnit.weights)
+        .filter(RelatedUnit.is_book == is_book, RelatedUnit.book_id != exclude_book_id)
+        .order_by(RelatedUnit.id)
+        .all()
+    )
+    unit_ids = np.array([row.id for row in rows], dtype=np.int64)
+    indices = [np.frombuffer(row.term_ids, dtype=np.uint32) for row in rows]
+    data = [np.frombuffer(row.weights, dtype=np.float32) for row in rows]
+    indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+    np.cumsum([len(terms) for terms in indices], out=indptr[1:])
+    if not rows:
+        return unit_ids, indptr, np.zeros(0, dtype=np.uint32), np.zeros(0, dtype=np.float32)
+    return unit_ids, indptr, np.concatenate(indices), np.concatenate(data)
+
+
+def cosine_scores(vectors: List[Tuple[np.ndarray, np.ndarray]], indptr: np.ndarray, indices: np.ndarray, data: np.ndarray) -> np.ndarray:
+    """
+    Score sparse query vectors against a CSR matrix of stored vectors.
+
+    Only stored entries whose term occurs in some query are touched, and
+    entries are summed per row with reduceat (rows are contiguous in CSR).
+
+    Args:
+        vectors: (term_ids, weights) per query, both L2-normalized
+        indptr, indices, data: Stored vectors in CSR form
+
+    Returns:
+        (stored rows x queries) cosine similarities
+    """
+    scores = np.zeros((len(indptr) - 1, len(vectors)), dtype=np.float32)
+    if not vectors or len(indices) == 0:
+        return scores
+
+    vocab = np.unique(np.concatenate([terms for terms, _ in vectors]))
+    if len(vocab) == 0:
+        return scores
+    dense = np.zeros((len(vocab), len(vectors)), dtype=np.float32)
+    for column, (terms, weights) in enumerate(vectors):
+        dense[np.searchsorted(vocab, terms), column] = weights
+
+    positions = np.minimum(np.searchsorted(vocab, indices), len(vocab) - 1)
+    matched = np.flatnonzero(vocab[positions] == indices)
+    rows = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+
+    block = max(1, _SCORE_BLOCK // len(vectors))
+    for begin in range(0, len(matched), block):
+        picks = matched[begin:begin + block]
+        contributions = data[picks, None] * dense[positions[picks]]
+        picked_rows = rows[picks]
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(picked_rows)) + 1))
+        scores[picked_rows[starts]] += np.add.reduceat(contributions, starts, axis=0)
+    return scores
+
+
+def _update_term_counts(session: Session, term_ids: np.ndarray, delta: int):
+    """Add delta to the book count of each term, dropping terms no book has."""
+    if len(term_ids) == 0:
+        return
+    session.execute(
+        text(
+            "INSERT INTO related_terms (term_id, book_count) VALUES (:term_id, :delta) "
+            "ON CONFLICT(term_id) DO UPDATE SET book_count = book_count + excluded.book_count"
+        ),
+        [{"term_id": int(term), "delta": delta} for term in term_ids.tolist()],
+    )
+    if delta < 0:
+        session.execute(text("DELETE FROM related_terms WHERE book_count <= 0"))
+
+
+def _load_term_counts(session: Session, term_ids: np.ndarray) -> Dict[int, int]:
+    """Look up book counts for the given terms (in batches, to stay under SQLite's variable limit)."""
+    counts: Dict[int, int] = {}
+    terms = term_ids.tolist()
+    for begin in range(0, len(terms), 10000):
+        counts.update(
+            session.query(RelatedTerm.term_id, RelatedTerm.book_count)
+            .filter(RelatedTerm.term_id.in_(terms[begin:begin + 10000]))
+        )
+    return counts
+
+
+def _delete_book_units(session: Session, book_id: int):
+    """Remove a book's units, their neighbour rows, and its term counts."""
+    vocabulary = (
+        session.query(RelatedUnit.vocabulary)
+        .filter(RelatedUnit.book_id == book_id, RelatedUnit.is_book.is_(True))
+        .scalar()
+    )
+    if vocabulary:
+        _update_term_counts(session, np.frombuffer(vocabulary, dtype=np.uint32), -1)
+
+    unit_ids = [row.id for row in session.query(RelatedUnit.id).filter(RelatedUnit.book_id == book_id)]
+    if unit_ids:
+        session.query(RelatedNeighbor).filter(RelatedNeighbor.unit_id.in_(unit_ids)).delete(synchronize_session=False)
+        session.query(RelatedNeighbor).filter(RelatedNeighbor.neighbor_id.in_(unit_ids)).delete(synchronize_session=False)
+    session.query(RelatedUnit).filter(RelatedUnit.book_id == book_id).delete(synchronize_session=False)
+
+
+def _link_units(session: Session, new_units: List[RelatedUnit], vectors: List[Tuple[np.ndarray, np.ndarray]], is_book: bool, book_id: int):
+    """Write neighbour lists for new units and merge them into existing units' lists."""
+    unit_ids, indptr, indices, data = _load_vectors(session, is_book, book_id)
+    if len(unit_ids) == 0 or not new_units:
+        return
+
+    scores = cosine_scores(vectors, indptr, indices, data)
+    rows = []
+    trimmed = []
+
+    # Neighbours of the new units
+    for column, unit in enumerate(new_units):
+        column_scores = scores[:, column]
+        top = np.argsort(-column_scores)[:TOP_K_NEIGHBORS]
+        rows.extend(
+            {"unit_id": unit.id, "neighbor_id": int(unit_ids[i]), "score": float(column_scores[i])}
+            for i in top if column_scores[i] >= MIN_SIMILARITY
+        )
+
+    # New units that make it into existing units' lists
+    touched = np.flatnonzero(scores.max(axis=1) >= MIN_SIMILARITY)
+    if len(touched):
+        current = dict(
+            (row.unit_id, (row.count, row.min_score))
+            for row in session.query(
+                RelatedNeighbor.unit_id,
+                func.count().label("count"),
+                func.min(RelatedNeighbor.score).label("min_score"),
+            ).group_by(RelatedNeighbor.unit_id)
+        )
+        for i in touched.tolist():
+            unit_id = int(unit_ids[i])
+            count, min_score = current.get(unit_id, (0, 0.0))
+            row_scores = scores[i]
+            for column in np.argsort(-row_scores)[:TOP_K_NEIGHBORS]:
+                score = float(row_scores[column])
+                if score < MIN_SIMILARITY or (count >= TOP_K_NEIGHBORS and score <= min_score):
+                    break
+                rows.append({"unit_id": unit_id, "neighbor_id": new_units[column].id, "score": score})
+                count += 1
+            if count > TOP_K_NEIGHBORS:
+                trimmed.append({"unit_id": unit_id, "k": TOP_K_NEIGHBORS})
+
+    if rows:
+        session.execute(
+            text("INSERT OR REPLACE INTO related_neighbors (unit_id, neighbor_id, score) VALUES (:unit_id, :neighbor_id, :score)"),
+            rows,
+        )
+    if trimmed:
+        session.execute(
+            text(
+                "DELETE FROM related_neighbors WHERE unit_id = :unit_id AND neighbor_id NOT IN ("
+                "SELECT neighbor_id FROM related_neighbors WHERE unit_id = :unit_id ORDER BY score DESC LIMIT :k)"
+            ),
+            trimmed,
+        )
+
+
+def _index_book(session: Session, book_id: int, markdown_text: str) -> int:
+    """Replace one book's units and link them to the rest of the library."""
+    pages = split_pages(markdown_text)
+
+    _delete_book_units(session, book_id)
+
+    book_terms = _term_counts(markdown_text)
+    vocabulary = np.array(sorted(book_terms), dtype=np.uint32)
+    _update_term_counts(session, vocabulary, 1)
+
+    book_total = session.query(func.count(RelatedUnit.id)).filter(RelatedUnit.is_book.is_(True)).scalar() + 1
+    section_specs = _book_sections(session, book_id, pages)
+    section_counts = [
+        _term_counts(markdown_text[pages[first - 1][1]:pages[last - 1][2]])
+        for _, first, last in section_specs
+    ]
+
+    book_counts = _load_term_counts(session, vocabulary)
+
+    book_vector = _vectorize(book_terms, book_counts, book_total, MAX_BOOK_TERMS)
+    book_unit = RelatedUnit(
+        book_id=book_id,
+        is_book=True,
+        term_ids=book_vector[0].tobytes(),
+        weights=book_vector[1].tobytes(),
+        vocabulary=vocabulary.tobytes(),
+        library_size=book_total,
+    )
+
+    section_units, section_vectors = [], []
+    for (toc_entry_id, first, last), counts in zip(section_specs, section_counts):
+        vector = _vectorize(counts, book_counts, book_total, MAX_SECTION_TERMS)
+        if len(vector[0]) == 0:
+            continue
+        section_units.append(RelatedUnit(
+            book_id=book_id,
+            toc_entry_id=toc_entry_id,
+            is_book=False,
+            first_page=first,
+            last_page=last,
+            term_ids=vector[0].tobytes(),
+            weights=vector[1].tobytes(),
+        ))
+        section_vectors.append(vector)
+
+    session.add(book_unit)
+    session.add_all(section_units)
+    session.flush()
+
+    if len(book_vector[0]):
+        _link_units(session, [book_unit], [book_vector], True, book_id)
+    _link_units(session, section_units, section_vectors, False, book_id)
+
+    return len(section_units)
+
+
+def refresh_stale_books(exclude_book_id: int, limit: int = REFRESH_PER_ADD):
+    """
+    Rebuild the books whose vectors were weighted for a library under half its current size.
+
+    IDF weights, and so which terms a vector keeps, shift as the library
+    grows; the first books added are weighted against almost nothing.
+    Refreshing a few of the stalest books per add keeps up with growth at
+    a bounded cost per add. Each book is rebuilt in its own transaction.
+    """
+    db_manager = get_db_manager()
+    with db_manager.get_session() as session:
+        book_total = session.query(func.count(RelatedUnit.id)).filter(RelatedUnit.is_book.is_(True)).scalar()
+        stale = (
+            session.query(RelatedUnit.book_id, Book.markdown_file_path)
+            .join(Book, Book.id == RelatedUnit.book_id)
+            .filter(
+                RelatedUnit.is_book.is_(True),
+                RelatedUnit.book_id != exclude_book_id,
+                RelatedUnit.library_size * 2 < book_total,
+            )
+            .order_by(RelatedUnit.library_size)
+            .limit(limit)
+            .all()
+        )
+
+    for book_id, markdown_file_path in stale:
+        md_path = Path(markdown_file_path)
+        with db_manager.get_session() as session:
+            if md_path.exists():
+                _index_book(session, book_id, md_path.read_text(encoding='utf-8'))
+            else:
+                # Nothing to rebuild from; don't retry on every add
+                session.query(RelatedUnit).filter(
+                    RelatedUnit.book_id == book_id, RelatedUnit.is_book.is_(True)
+                ).update({RelatedUnit.library_size: book_total}, synchronize_session=False)
+
+
+def build_related_index(session: Session, book_id: int, markdown_text: str) -> int:
+    """
+    Replace a book's related-content vectors and neighbours.
+
+    Call refresh_stale_books once the session is committed, so other books
+    keep up with the library's growth.
+
+    Args:
+        session: Database session (the caller commits)
+        book_id: Book ID
+        markdown_text: Full markdown content of the book
+
+    Returns:
+        Number of section units stored
+    """
+    return _index_book(session, book_id, markdown_text)
+
+
+def remove_related_index(session: Session, book_id: int):
+    """
+    Delete a book's related-content vectors and neighbours.
+
+    Other units lose their links to this book; lists shorter than
+    TOP_K_NEIGHBORS are refilled the next time those books are re-indexed.
+
+    Args:
+        session: Database session (the caller commits)
+        book_id: Book ID
+    """
+    _delete_book_units(session, book_id)
+
+
+def find_section_unit(session: Session, book_id: int, section: str) -> Optional[RelatedUnit]:
+    """
+    Find a book's section unit by page number or TOC title.
+
+    Args:
+        session: Database session
+        book_id: Book ID
+        section: A page number (picks the narrowest section containing it) or
+            part of a section title (picks the first match in TOC order)
+
+    Returns:
+        The section unit, or None if nothing matches
+    """
+    query = session.query(RelatedUnit).filter(RelatedUnit.book_id == book_id, RelatedUnit.is_book.is_(False))
+    section = section.strip()
+
+    if section.isdigit():
+        page = int(section)
+        return (
+            query.filter(RelatedUnit.first_page <= page, RelatedUnit.last_page >= page)
+            .order_by(RelatedUnit.last_page - RelatedUnit.first_page, RelatedUnit.id.desc())
+            .first()
+        )
+
+    return (
+        query.join(TocEntry, TocEntry.id == RelatedUnit.toc_entry_id)
+        .filter(TocEntry.title.ilike(f"%{section}%"))
+        .order_by(TocEntry.ordinal)
+        .first()
+    )
+
+
+def related_sections(session: Session, unit_id: int, limit: int = TOP_K_NEIGHBORS) -> List[Tuple[RelatedUnit, float]]:
+    """
+    Look up the stored neighbours of a unit.
+
+    Args:
+        session: Database session
+        unit_id: Unit ID
+        limit: Maximum neighbours to return
+
+    Returns:
+        (neighbour unit, cosine similarity) pairs, most similar first
+    """
+    return (
+        session.query(RelatedUnit, RelatedNeighbor.score)
+        .join(RelatedNeighbor, RelatedNeighbor.neighbor_id == RelatedUnit.id)
+        .filter(RelatedNeighbor.unit_id == unit_id)
+        .order_by(RelatedNeighbor.score.desc())
+        .limit(limit)
+        .all()
+    )
+
+
+def related_books(session: Session, book_id: int, limit: int = TOP_K_NEIGHBORS, section_pairs: int = 3) -> List[Dict[str, Any]]:
+    """
+    Look up the books most similar to a book, with their closest section pairs.
+
+    Args:
+        session: Database session
+        book_id: Book ID
+        limit: Maximum books to return
+        section_pairs: Closest (this book's section, other book's section) pairs per book
+
+    Returns:
+        List of dictionaries with book_id, score, and sections (list of
+        (own unit, other unit, score)), most similar first
+    """
+    book_unit_id = (
+        session.query(RelatedUnit.id)
+        .filter(RelatedUnit.book_id == book_id, RelatedUnit.is_book.is_(True))
+        .scalar()
+    )
+    if book_unit_id is None:
+        return []
+
+    results = [
+        {"book_id": unit.book_id, "score": score, "sections": []}
+        for unit, score in related_sections(session, book_unit_id, limit)
+    ]
+    if not results or section_pairs <= 0:
+        return results
+
+    by_book = {result["book_id"]: result for result in results}
+    own = {
+        unit.id: unit
+        for unit in session.query(RelatedUnit).filter(RelatedUnit.book_id == book_id, RelatedUnit.is_book.is_(False))
+    }
+    pairs = (
+        session.query(RelatedNeighbor.unit_id, RelatedUnit, RelatedNeighbor.score)
+        .join(RelatedUnit, RelatedUnit.id == RelatedNeighbor.neighbor_id)
+        .filter(RelatedNeighbor.unit_id.in_(list(own)), RelatedUnit.book_id.in_(list(by_book)))
+        .order_by(RelatedNeighbor.score.desc())
+        .all()
+    )
+    for unit_id, other, score in pairs:
+        sections = by_book[other.book_id]["sections"]
+        if len(sections) < section_pairs:
+            sections.append((own[unit_id], other, score))
+    return results
@@ -0,0 +1,199 @@
+"""Memory-mapped per-book vector storage with brute-force cosine search."""
+
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ..utils.config import get_config
+
+# Rows scored per matrix product; bounds peak memory for very large books
+BATCH_ROWS = 65536
+
+
+def get_vector_dir() -> Path:
+    """Get the directory holding per-book vector files.
+
+    Returns:
+        Path to ~/.candlekeep/index/vectors
+    """
+    return get_config().index_dir / "vectors"
+
+
+def _save_atomic(path: Path, array: np.ndarray):
+    """Write a .npy file via a temporary file so readers never see a partial write."""
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
+
+class VectorStore:
+    """Stores one float32 embedding matrix per book.
+
+    Each book has two files in the vector directory:
+    - {book_id}.npy: float32 matrix of shape (chunks, dim), L2-normalized
+    - {book_id}.chunks.npy: int32 matrix of shape (chunks, 3) holding
+      (page_number, char_start, char_end) for each row
+
+    Files are opened with mmap_mode='r', so a query only pages in the
+    matrices it actually scores.
+    """
+
+    def __init__(self, root: Optional[Path] = None):
+        """Initialize vector store.
+
+        Args:
+            root: Directory for vector files (default: ~/.candlekeep/index/vectors)
+        """
+        self.root = Path(root) if root else get_vector_dir()
+
+    def _paths(self, book_id: int) -> Tuple[Path, Path]:
+        return self.root / f"{book_id}.npy", self.root / f"{book_id}.chunks.npy"
+
+    def add_book(self, book_id: int, vectors: np.ndarray, chunks: List[Tuple[int, int, int]]):
+        """
+        Store (or replace) the vectors for a book.
+
+        Args:
+            book_id: Book ID
+            vectors: float32 array of shape (len(chunks), dim)
+            chunks: (page_number, char_start, char_end) for each vector row
+        """
+        self.root.mkdir(parents=True, exist_ok=True)
+        vector_path, chunk_path = self._paths(book_id)
+        _save_atomic(chunk_path, np.asarray(chunks, dtype=np.int32).reshape(-1, 3))
+        _save_atomic(vector_path, np.ascontiguousarray(vectors, dtype=np.float32))
+
+    def remove_book(self, book_id: int) -> bool:
+        """
+        Delete a book's vectors.
+
+        Returns:
+            True if files were removed, False if the book was not indexed
+        """
+        removed = False
+        for path in self._paths(book_id):
+            if path.exists():
+                path.unlink()
+                removed = True
+        return removed
+
+    def book_ids(self) -> List[int]:
+        """List IDs of all indexed books.
+
+        Returns:
+            Sorted list of book IDs
+        """
+        if not self.root.exists():
+            return []
+        return sorted(
+            int(path.stem) for path in self.root.glob("*.npy")
+            if path.stem.isdigit()
+        )
+
+    def load_book(self, book_id: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Memory-map a book's vectors and chunk table.
+
+        Returns:
+            Tuple of (vectors, chunks)
+
+        Raises:
+            FileNotFoundError: If the book has no vectors
+        """
+        vector_path, chunk_path = self._paths(book_id)
+        return np.load(vector_path, mmap_mode="r"), np.load(chunk_path, mmap_mode="r")
+
+    def search(
+        self,
+        query: np.ndarray,
+        top_k: int = 10,
+        book_ids: Optional[List[int]] = None,
+        batch_rows: int = BATCH_ROWS,
+    ) -> List[Dict[str, Any]]:
+        """
+        Exact cosine search over every stored vector.
+
+        Rows are scored in blocks of batch_rows with one matrix-vector product
+        per block; each block keeps only its own top_k before the global merge.
+
+        Args:
+            query: L2-normalized query vector
+            top_k: Number of results to return
+            book_ids: Restrict search to these books (default: all)
+            batch_rows: Rows scored per matrix product
+
+        Returns:
+            List of hits sorted by descending score, each a dictionary with
+            book_id, page, start, end, and score
+        """
+        query = np.asarray(query, dtype=np.float32)
+        candidate_scores = []
+        candidate_books = []
+        candidate_rows = []
+
+        for book_id in (book_ids if book_ids is not None else self.book_ids()):
+            vector_path, _ = self._paths(book_id)
+            try:
+                vectors = np.load(vector_path, mmap_mode="r")
+            except FileNotFoundError:
+                continue
+
+            for offset in range(0, len(vectors), batch_rows):
+                scores = vectors[offset:offset + batch_rows] @ query
+                if len(scores) > top_k:
+                    keep = np.argpartition(scores, -top_k)[-top_k:]
+                else:
+                    keep = np.arange(len(scores))
+                candidate_scores.append(scores[keep])
+                candidate_books.append(np.full(len(keep), book_id, dtype=np.int64))
+                candidate_rows.append(keep + offset)
+
+        if not candidate_scores:
+            return []
+
+        scores = np.concatenate(candidate_scores)
+        order = np.argsort(-scores, kind="stable")[:top_k]
+        return self.resolve_hits(
+            np.concatenate(candidate_books)[order],
+            np.concatenate(candidate_rows)[order],
+            scores[order],
+        )
+
+    def resolve_hits(
+        self,
+        hit_books: np.ndarray,
+        hit_rows: np.ndarray,
+        scores: np.ndarray,
+    ) -> List[Dict[str, Any]]:
+        """
+        Attach page and character offsets to scored (book, chunk row) pairs.
+
+        Args:
+            hit_books: Book ID of each hit
+            hit_rows: Chunk row of each hit within its book
+            scores: Score of each hit
+
+        Returns:
+            List of hits in the given order, each a dictionary with
+            book_id, page, start, end, and score
+        """
+        # Chunk tables are only read for the books that made the final cut
+        chunk_tables = {}
+        hits = []
+        for book_id, row, score in zip(hit_books, hit_rows, scores):
+            book_id = int(book_id)
+            if book_id not in chunk_tables:
+                chunk_tables[book_id] = np.load(self._paths(book_id)[1], mmap_mode="r")
+            page, start, end = chunk_tables[book_id][row]
+            hits.append({
+                "book_id": book_id,
+                "page": int(page),
+                "start": int(start),
+                "end": int(end),
+                "score": float(score),
+            })
+
+        return hits
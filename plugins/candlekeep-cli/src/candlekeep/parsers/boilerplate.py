@@ -0,0 +1,219 @@
+"""Find and strip running headers, footers and page numbers.
+
+pymupdf4llm keeps whatever is printed at the top and bottom of every page
+(the book or chapter title, "Page 12 of 300", a bare page number), which
+costs tokens on every `pages` call and adds noise to search. This stage
+looks at the first and last EDGE_LINES non-blank lines of every page,
+normalized (markdown emphasis removed, lowercase, digits masked as "#"), and
+notes on which pages each normalized line occurs at that edge. A line is
+boilerplate where it runs across near-consecutive pages (at most
+MAX_PAGE_GAP apart, so headers on alternate pages count) and is removed
+there, working inward from the edge so a repeated line in the middle of real
+text is never touched. Headings are never boilerplate: "# Chapter 2" and
+"Chapter 3" normalize alike but open pages far apart.
+
+Page labels come from a single stripped edge line whose numbers climb with
+the physical page numbers on most of the pages it spans (so "Page 45 of 300"
+yields 45, and a constant "Volume 2" or a line on a few scattered pages
+yields nothing).
+"""
+
+import math
+import re
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from ..utils.content_utils import estimate_tokens, split_pages
+
+# Non-blank lines examined at the top and at the bottom of each page
+EDGE_LINES = 3
+
+# A line is boilerplate on runs of at least MIN_REPEAT_PAGES pages at the
+# same edge, no more than MAX_PAGE_GAP pages apart, that together cover at
+# least MIN_REPEAT_FRACTION of the book's pages
+MIN_REPEAT_PAGES = 3
+MIN_REPEAT_FRACTION = 0.05
+MAX_PAGE_GAP = 2
+
+# Longer lines are prose, not headers or footers
+MAX_LINE_CHARS = 120
+
+# Share of consecutive occurrences whose number must go up with the page for a line to give page labels,
+# and share of the pages between its first and last occurrence it must be on
+MIN_LABEL_ORDER = 0.8
+MIN_LABEL_COVERAGE = 0.4
+
+_DIGITS = re.compile(r'\d+')
+_SPACES = re.compile(r'\s+')
+
+# Markdown constructs that are content even when they repeat (headings, images, tables, code fences, rules)
+_STRUCTURAL_PREFIXES = ('#', '![', '|', '```', '---', '<')
+
+# A line set entirely in bold, the way pymupdf4llm renders headings it doesn't mark with "#"
+_BOLD_LINE = re.compile(r'^(\*\*|__).+(\*\*|__)$')
+
+
+def normalize_line(line: str) -> str:
+    """Normalize a line for comparison across pages ("" if it can't be boilerplate)."""
+    stripped = line.strip()
+    if (
+        not stripped
+        or len(stripped) > MAX_LINE_CHARS
+        or stripped.startswith(_STRUCTURAL_PREFIXES)
+        or _BOLD_LINE.match(stripped)
+    ):
+        return ""
+    text = stripped.strip('*_').strip()
+    return _DIGITS.sub('#', _SPACES.sub(' ', text.lower()))
+
+
+def _edge_lines(lines: List[str]) -> Tuple[List[int], List[int]]:
+    """Indices of the first and last EDGE_LINES non-blank lines (bottom ones from the end inward)."""
+    filled = [index for index, line in enumerate(lines) if line.strip()]
+    return filled[:EDGE_LINES], filled[::-1][:EDGE_LINES]
+
+
+def find_boilerplate(pages: List[List[str]]) -> Dict[Tuple[int, str], Set[int]]:
+    """
+    Find lines repeated at the top or bottom of near-consecutive pages.
+
+    Args:
+        pages: Lines of each page
+
+    Returns:
+        {(edge, normalized line): indices of the pages it is boilerplate on},
+        edge 0 for headers and 1 for footers
+    """
+    vocabulary: Dict[str, int] = {}
+    rows = []
+    for page_index, lines in enumerate(pages):
+        for edge, indices in enumerate(_edge_lines(lines)):
+            for index in indices:
+                normalized = normalize_line(lines[index])
+                if normalized:
+                    rows.append((page_index, edge, vocabulary.setdefault(normalized, len(vocabulary))))
+    if not rows:
+        return {}
+
+    # Distinct (edge, line, page) keys, sorted by line then page
+    table = np.array(rows, dtype=np.int64)
+    page_count = len(pages)
+    keys = np.unique((table[:, 2] * 2 + table[:, 1]) * page_count + table[:, 0])
+    line_keys, page_indices = keys // page_count, keys % page_count
+
+    # Runs: a new one starts at every new line or gap of more than MAX_PAGE_GAP pages
+    starts = np.ones(len(keys), dtype=bool)
+    starts[1:] = (line_keys[1:] != line_keys[:-1]) | (page_indices[1:] - page_indices[:-1] > MAX_PAGE_GAP)
+    run_ids = np.cumsum(starts) - 1
+    in_run = np.bincount(run_ids)[run_ids] >= MIN_REPEAT_PAGES
+
+    # Lines whose runs cover enough of the book
+    threshold = max(MIN_REPEAT_PAGES, math.ceil(MIN_REPEAT_FRACTION * page_count))
+    distinct_lines, line_of_key = np.unique(line_keys, return_inverse=True)
+    covered = np.bincount(line_of_key, weights=in_run, minlength=len(distinct_lines))
+    kept = in_run & (covered[line_of_key] >= threshold)
+
+    words = list(vocabulary)
+    boilerplate: Dict[Tuple[int, str], Set[int]] = {}
+    for line_key, page_index in zip(line_keys[kept].tolist(), page_indices[kept].tolist()):
+        boilerplate.setdefault((line_key % 2, words[line_key // 2]), set()).add(page_index)
+    return boilerplate
+
+
+def _label_sequence(values: List[Tuple[int, List[int]]]) -> Optional[Tuple[int, Dict[int, int]]]:
+    """
+    Page labels from one stripped line's numbers, if one number position climbs with the pages.
+
+    Args:
+        values: (physical page, numbers in the line) in page order
+
+    Returns:
+        (pages labelled, {physical page: printed page number}), or None if
+        no position qualifies
+    """
+    if len(values) < MIN_REPEAT_PAGES:
+        return None
+    pages = np.array([page for page, _ in values])
+    if len(values) < MIN_LABEL_COVERAGE * (pages[-1] - pages[0] + 1):
+        # On a sparse subset of the pages it spans (section openings, not a running footer)
+        return None
+    numbers = np.array([numbers for _, numbers in values])
+    page_steps = np.diff(pages)
+    for position in range(numbers.shape[1]):
+        steps = np.diff(numbers[:, position])
+        if np.mean((steps > 0) & (steps <= page_steps)) < MIN_LABEL_ORDER:
+            continue
+        # Keep the occurrences that climb from the previous one kept
+        labels: Dict[int, int] = {}
+        last: Optional[Tuple[int, int]] = None
+        for page, number in zip(pages.tolist(), numbers[:, position].tolist()):
+            if last is None or 0 < number - last[1] <= page - last[0]:
+                labels[page] = number
+                last = (page, number)
+        return len(labels), labels
+    return None
+
+
+def _page_labels(candidates: Dict[Tuple[int, str], List[Tuple[int, List[int]]]]) -> Dict[int, int]:
+    """
+    Pick page labels from the numbers in stripped lines: those of the
+    single edge line that labels the most pages.
+    """
+    best: Tuple[int, Dict[int, int]] = (0, {})
+    for values in candidates.values():
+        sequence = _label_sequence(values)
+        if sequence is not None and sequence[0] > best[0]:
+            best = sequence
+    return best[1]
+
+
+def strip_boilerplate(markdown_text: str) -> Tuple[str, Dict[int, int], Dict[str, int]]:
+    """
+    Remove running headers, footers and page numbers from paged markdown.
+
+    Args:
+        markdown_text: Markdown with page markers (returned unchanged without them)
+
+    Returns:
+        (markdown, page labels {physical page: printed page number}, stats)
+        where stats has lines (distinct boilerplate lines), lines_removed
+        and tokens_saved
+    """
+    stats = {'lines': 0, 'lines_removed': 0, 'tokens_saved': 0}
+    layout = split_pages(markdown_text)
+    if not layout:
+        return markdown_text, {}, stats
+
+    pages = [markdown_text[start:end].split('\n') for _, start, end in layout]
+    boilerplate = find_boilerplate(pages)
+    if not boilerplate:
+        return markdown_text, {}, stats
+
+    parts = []
+    candidates: Dict[Tuple[int, str], List[Tuple[int, List[int]]]] = {}
+    position = 0
+    for page_index, ((page_number, start, end), lines) in enumerate(zip(layout, pages)):
+        drop = set()
+        for edge, indices in enumerate(_edge_lines(lines)):
+            # Strip inward from the edge, stopping at the first real line
+            for index in indices:
+                normalized = normalize_line(lines[index])
+                if page_index not in boilerplate.get((edge, normalized), ()):
+                    break
+                drop.add(index)
+                numbers = [int(number) for number in _DIGITS.findall(lines[index])]
+                if numbers:
+                    # Lines of one pattern have the same number of numbers (digits are masked)
+                    candidates.setdefault((edge, normalized), []).append((page_number, numbers))
+
+        parts.append(markdown_text[position:start])
+        parts.append('\n'.join(line for index, line in enumerate(lines) if index not in drop))
+        stats['lines_removed'] += len(drop)
+        position = end
+    parts.append(markdown_text[position:])
+    stripped = ''.join(parts)
+
+    stats['lines'] = len(boilerplate)
+    stats['tokens_saved'] = estimate_tokens(markdown_text) - estimate_tokens(stripped)
+    return stripped, _page_labels(candidates), stats
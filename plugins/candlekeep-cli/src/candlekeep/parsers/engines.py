@@ -0,0 +1,595 @@
+"""PDF-to-markdown conversion engines and a budgeted page-by-page converter.
+
+Engines convert one page at a time, so a book can mix them:
+
+- layout: pymupdf4llm's layout-aware conversion (headings, tables, lists,
+  images). Good output, but some pages (huge scans, vector-heavy drawings)
+  take minutes or exhaust memory.
+- fast: PyMuPDF's plain text layer, one paragraph per text block. Orders of
+  magnitude faster and predictable, but without markdown structure.
+
+convert_pages() runs the preferred engine in a worker process and gives every
+page a time budget (and the worker a memory budget). A page that runs over,
+fails, or kills the worker is converted with the fallback engine instead,
+and a new worker carries on from the next page. After several overruns in a
+row the rest of the book goes straight to the fallback engine, so a
+pathological PDF costs at most a few budgets rather than hours.
+
+Both engines end every page with the same marker, `--- end of page=N ---`
+(N is the 0-based page index), so the rest of CandleKeep doesn't care which
+engine produced a page.
+
+Given a conversion cache (db.conversion_cache), pages whose content was
+converted before with the same engine settings are reused instead of
+converted, so a new edition or re-export only converts its changed pages.
+
+The layout engine can defer its images: it converts pages without them and
+references the regions pymupdf4llm would have rendered (its kept images and
+figures drawn with vector graphics) before the text below them, recording
+the regions only (engine.deferred_images). An image
+renderer (parsers.images.ImageRenderer) then renders them in parallel once
+the pages are converted, and the pages are pointed at the files it wrote
+before they are cached.
+"""
+
+import glob
+import hashlib
+import json
+import multiprocessing
+import os
+import re
+import shutil
+from collections import deque
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import fitz  # PyMuPDF
+import pymupdf4llm
+
+# Seconds a page may take with the preferred engine
+PAGE_TIME_BUDGET = 20.0
+
+# Address space the conversion worker may grow by, in MB (enforced where
+# the OS supports RLIMIT_AS, i.e. Linux)
+PAGE_MEMORY_BUDGET_MB = 2048
+
+# Seconds a new worker may take to open the PDF before its first page
+WORKER_STARTUP_TIMEOUT = 60.0
+
+# Overruns in a row after which the rest of the book uses the fallback engine
+MAX_OVERRUN_STREAK = 3
+
+# Pages sampled to learn the book's heading font sizes
+HEADER_SAMPLE_PAGES = 500
+
+# Markdown image reference: ![alt](path)
+IMAGE_REF_PATTERN = re.compile(r'!\[[^\]]*\]\(([^)]+)\)')
+
+# Name of an image written by pymupdf4llm: <pdf name>-<page index>-<image>.<ext>
+IMAGE_NAME_PATTERN = re.compile(r'-\d+-(\w+)\.(\w+)$')
+
+# Extensions images are written with
+IMAGE_EXTENSIONS = ('png', 'jpg')
+
+
+def page_marker(index: int) -> str:
+    """The separator that ends a converted page (index is 0-based)."""
+    return f"\n\n--- end of page={index} ---\n\n"
+
+
+class ConversionEngine:
+    """Converts single PDF pages to markdown. Subclasses set name and implement convert_page()."""
+
+    name = ""
+
+    # Directory the engine writes page images to, if any
+    image_dir: Optional[str] = None
+
+    # Image regions referenced but not rendered yet, as {'page', 'rect', 'path'}
+    # (0-based page index; rect in the page's unrotated coordinates), or None
+    # if the engine renders its images itself
+    deferred_images: Optional[List[Dict[str, Any]]] = None
+
+    def convert_page(self, doc: fitz.Document, index: int) -> str:
+        """
+        Convert one page.
+
+        Args:
+            doc: Open PDF document
+            index: 0-based page index
+
+        Returns:
+            Markdown for the page, without its page marker
+        """
+        raise NotImplementedError
+
+    def cache_key(self) -> str:
+        """Settings that affect the output, so cached pages are only reused by an identical engine."""
+        return json.dumps({'engine': self.name, 'pymupdf': fitz.VersionBind}, sort_keys=True)
+
+
+def _significant(cluster: fitz.Rect, paths: List[Dict[str, Any]]) -> bool:
+    """Whether a cluster of drawings is a figure rather than a frame, rule or box (only straight sides)."""
+    inside = [path['rect'] for path in paths if path['rect'] in cluster]
+    return len({round(rect.width) for rect in inside}) > 1 and len({round(rect.height) for rect in inside}) > 1
+
+
+def _image_regions(page: fitz.Page, chunk: Dict[str, Any], size_limit: float) -> List[Tuple[str, fitz.Rect]]:
+    """
+    Regions pymupdf4llm renders as images on a page converted without
+    write_images, as (name, rect) in reading order: the page's images it
+    kept (chunk['images']), or the whole page ('full') if one image covers
+    it, and the clusters of vector drawings outside its tables.
+    """
+    area = abs(page.rect)
+    regions = [fitz.Rect(image['bbox']) for image in chunk['images']]
+    full = any(abs(fitz.Rect(image['bbox']) & page.rect) >= 0.9 * area for image in page.get_image_info())
+    tables = [fitz.Rect(table['bbox']) for table in chunk['tables']]
+    paths = [
+        path for path in page.get_drawings()
+        if path['rect'].width < page.rect.width and path['rect'].height < page.rect.height
+        and not any(path['rect'].intersects(table) for table in tables)
+    ]
+    if paths:
+        regions += [
+            cluster for cluster in page.cluster_drawings(drawings=paths)
+            if _significant(cluster, paths) and not any(cluster in region for region in regions)
+        ]
+    regions.sort(key=lambda rect: (rect.y1, rect.x0))
+    named = [('full', page.rect)] if full else []
+    named += [
+        (str(number), rect) for number, rect in enumerate(regions)
+        if rect.width >= page.rect.width * size_limit and rect.height >= page.rect.height * size_limit
+    ]
+    return named
+
+
+def _insert_images(page: fitz.Page, markdown: str, images: List[Tuple[fitz.Rect, str]]) -> str:
+    """
+    Reference images in a page's markdown, each before the first block of
+    text beside or below it that starts at or below its top edge, or at
+    the end of the page if there is none.
+    """
+    blocks = sorted(
+        (
+            (fitz.Rect(block['bbox']), " ".join("".join(span['text'] for span in block['lines'][0]['spans']).split()))
+            for block in page.get_text("dict")['blocks'] if block['type'] == 0 and block['lines']
+        ),
+        key=lambda block: (block[0].y0, block[0].x0),
+    )
+    insertions = []
+    for order, (rect, path) in enumerate(images):
+        following = [
+            text for block, text in blocks
+            if text and block.y0 >= rect.y0 and block.x0 < rect.x1 and block.x1 > rect.x0
+        ]
+        position = markdown.find(" ".join(following[0].split()[:5])) if following else -1
+        reference = f"![]({path})\n\n"
+        if position < 0:
+            position = len(markdown)
+            reference = "\n" + reference
+        else:
+            position = markdown.rfind("\n", 0, position) + 1
+        insertions.append((position, order, reference))
+    parts, done = [], 0
+    for position, _, reference in sorted(insertions):
+        parts += [markdown[done:position], reference]
+        done = position
+    return "".join(parts) + markdown[done:]
+
+
+class LayoutEngine(ConversionEngine):
+    """Layout-aware conversion with pymupdf4llm."""
+
+    name = "layout"
+
+    def __init__(
+        self,
+        hdr_info: Optional[pymupdf4llm.IdentifyHeaders] = None,
+        defer_images: bool = False,
+        **options: Any,
+    ):
+        """
+        Args:
+            hdr_info: Heading font sizes of the whole book (see
+                identify_headers); computed per page if omitted, which
+                gives inconsistent heading levels
+            defer_images: With write_images, convert the page without
+                images and record the regions pymupdf4llm would render in
+                deferred_images, referencing them where the images would
+                be (before the text below them)
+            **options: Extra pymupdf4llm.to_markdown arguments (e.g.
+                write_images, image_path, image_format, dpi, image_size_limit)
+        """
+        self.hdr_info = hdr_info
+        self.options = options
+        if options.get('write_images'):
+            self.image_dir = str(options['image_path'])
+            if defer_images:
+                self.deferred_images = []
+
+    def convert_page(self, doc: fitz.Document, index: int) -> str:
+        if self.deferred_images is None:
+            return pymupdf4llm.to_markdown(doc, pages=[index], hdr_info=self.hdr_info, **self.options)
+
+        # Convert without images, then reference the regions pymupdf4llm would have rendered
+        options = dict(self.options, write_images=False, page_chunks=True)
+        chunk = pymupdf4llm.to_markdown(doc, pages=[index], hdr_info=self.hdr_info, **options)[0]
+        page = doc[index]
+        dpi = self.options.get('dpi', 150)
+        name = os.path.basename(self.options.get('filename') or doc.name).replace(" ", "-")
+        extension = self.options.get('image_format', 'png')
+        images = []
+        for number, rect in _image_regions(page, chunk, self.options.get('image_size_limit', 0.05)):
+            if int(rect.width * dpi / 72) <= 0 or int(rect.height * dpi / 72) <= 0:
+                continue
+            path = os.path.join(self.image_dir, f"{name}-{index}-{number}.{extension}").replace("\\", "/")
+            self.deferred_images.append({'page': index, 'rect': tuple(rect), 'path': path})
+            images.append((rect, path))
+        return _insert_images(page, chunk['text'], images)
+
+    def cache_key(self) -> str:
+        # Where images go doesn't matter: reused images are copied there
+        options = {name: value for name, value in self.options.items() if name != 'image_path'}
+        return json.dumps({
+            'engine': self.name,
+            'pymupdf4llm': pymupdf4llm.version,
+            'headers': headers_to_json(self.hdr_info) if self.hdr_info else None,
+            'options': options,
+            'deferred': self.deferred_images is not None,
+        }, sort_keys=True, default=str)
+
+
+class FastTextEngine(ConversionEngine):
+    """Plain text layer, one markdown paragraph per text block in reading order."""
+
+    name = "fast"
+
+    def convert_page(self, doc: fitz.Document, index: int) -> str:
+        blocks = doc[index].get_text("blocks", sort=True)
+        paragraphs = [block[4].strip() for block in blocks if block[6] == 0 and block[4].strip()]
+        return "\n\n".join(paragraphs)
+
+
+# Engines by name, for callers that pick one by configuration
+ENGINES = {engine.name: engine for engine in (LayoutEngine, FastTextEngine)}
+
+
+def identify_headers(doc: fitz.Document) -> pymupdf4llm.IdentifyHeaders:
+    """
+    Learn which font sizes are headings, from up to HEADER_SAMPLE_PAGES pages.
+
+    Scanning every page of a very long book costs as much as a conversion
+    pass, so long books are sampled at evenly spaced pages.
+    """
+    count = doc.page_count
+    if count <= HEADER_SAMPLE_PAGES:
+        return pymupdf4llm.IdentifyHeaders(doc)
+    step = count / HEADER_SAMPLE_PAGES
+    return pymupdf4llm.IdentifyHeaders(doc, pages=sorted({int(i * step) for i in range(HEADER_SAMPLE_PAGES)}))
+
+
+def page_fingerprint(doc: fitz.Document, index: int) -> str:
+    """
+    Hash of what a page displays: its content stream, fonts, images, form
+    XObjects, links and geometry. Object numbers and stream compression are
+    left out (streams are hashed decoded), so the same page has the same
+    fingerprint in a re-exported or revised PDF.
+    """
+    page = doc[index]
+    digest = hashlib.sha256()
+    digest.update(repr((tuple(page.rect), page.rotation)).encode())
+    digest.update(page.read_contents())
+    for _, ext, font_type, basefont, name, encoding, *_ in page.get_fonts(full=True):
+        digest.update(repr((ext, font_type, basefont, name, encoding)).encode())
+    for image in page.get_images(full=True):
+        xref, smask = image[0], image[1]
+        # Size, bits per component, color spaces and name; not the (compression) filter
+        digest.update(repr(image[2:8]).encode())
+        digest.update(hashlib.sha256(doc.xref_stream(xref) or b"").digest())
+        if smask:
+            digest.update(hashlib.sha256(doc.xref_stream(smask) or b"").digest())
+    for xref, name, _, _ in page.get_xobjects():
+        digest.update(name.encode())
+        digest.update(hashlib.sha256(doc.xref_stream(xref) or b"").digest())
+    for link in page.get_links():
+        digest.update(repr((link.get('kind'), link.get('uri'), link.get('page'), tuple(link['from']))).encode())
+    return digest.hexdigest()
+
+
+def _page_images(engine: ConversionEngine, markdown: str) -> List[str]:
+    """Paths of the images a converted page references that the engine wrote."""
+    if not engine.image_dir:
+        return []
+    prefix = engine.image_dir.replace("\\", "/").rstrip("/") + "/"
+    return [path for path in IMAGE_REF_PATTERN.findall(markdown) if path.startswith(prefix)]
+
+
+def _reuse_page(engine: ConversionEngine, doc: fitz.Document, index: int, markdown: str, images: List[str]) -> Optional[str]:
+    """
+    Adapt a cached page to this PDF: copy its images (in whatever encoding
+    they were written, with their variants, see parsers.images) to the
+    engine's image directory under the names this conversion would have
+    given them.
+
+    Returns:
+        The page markdown, or None if an image no longer exists (the page
+        must be converted again)
+    """
+    if not images:
+        return markdown
+    if not engine.image_dir:
+        return None
+    pdf_name = os.path.basename(doc.name).replace(" ", "-")
+    for path in images:
+        match = IMAGE_NAME_PATTERN.search(path)
+        written = [
+            name for name in glob.glob(glob.escape(os.path.splitext(path)[0]) + ".*")
+            if os.path.splitext(name)[1].lstrip(".") in IMAGE_EXTENSIONS
+        ]
+        if match is None or not written:
+            return None
+        new_stem = os.path.join(engine.image_dir, f"{pdf_name}-{index}-{match.group(1)}").replace("\\", "/")
+        stem = os.path.splitext(path)[0]
+        for name in written:
+            new_name = new_stem + name[len(stem):]
+            if new_name != name:
+                os.makedirs(engine.image_dir, exist_ok=True)
+                shutil.copyfile(name, new_name)
+        # The image itself, not a variant (.preview.png)
+        image = next(name for name in written if "." not in name[len(stem) + 1:])
+        markdown = markdown.replace(f"]({path})", f"]({new_stem + image[len(stem):]})")
+    return markdown
+
+
+def _retarget_images(markdown: str, targets: Dict[str, Optional[str]]) -> str:
+    """Point image references at the files written for them, removing those with none (None)."""
+    def _retarget(match):
+        if match.group(1) not in targets:
+            return match.group(0)
+        target = targets[match.group(1)]
+        if target is None:
+            return ''
+        return match.group(0).replace(f"]({match.group(1)})", f"]({target})")
+
+    return IMAGE_REF_PATTERN.sub(_retarget, markdown)
+
+
+def _limit_memory(budget_mb: int):
+    """Cap this process's address space at its current size plus budget_mb (Linux only)."""
+    try:
+        import resource
+
+        with open("/proc/self/statm") as f:
+            current = int(f.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+        limit = current + budget_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, resource.getrlimit(resource.RLIMIT_AS)[1]))
+    except (ImportError, OSError, ValueError):
+        pass
+
+
+def _convert_worker(pdf_path: str, indices: List[int], engine: ConversionEngine, memory_budget_mb: int, conn):
+    """
+    Worker process: convert pages in order, sending (index, markdown,
+    deferred images) for each, or (index, None, []) if the page failed
+    (including running out of memory). Sends ('ready', None, []) once the
+    PDF is open.
+    """
+    _limit_memory(memory_budget_mb)
+    doc = fitz.open(pdf_path)
+    conn.send(('ready', None, []))
+    deferred = engine.deferred_images
+    for index in indices:
+        if deferred is not None:
+            deferred.clear()
+        try:
+            text = engine.convert_page(doc, index)
+        except Exception:
+            # MemoryError included: the page's allocations are freed on unwind
+            text = None
+        conn.send((index, text, list(deferred) if deferred and text is not None else []))
+    conn.close()
+
+
+def _stop(process):
+    if process.is_alive():
+        process.kill()
+    process.join()
+
+
+def convert_pages(
+    pdf_path: Path,
+    indices: Optional[List[int]] = None,
+    engine: Optional[ConversionEngine] = None,
+    fallback: Optional[ConversionEngine] = None,
+    page_time_budget: float = PAGE_TIME_BUDGET,
+    page_memory_budget_mb: int = PAGE_MEMORY_BUDGET_MB,
+    cache=None,
+    image_renderer: Optional[Callable[[List[Dict[str, Any]]], Dict[str, Optional[str]]]] = None,
+) -> Dict[int, Tuple[str, str]]:
+    """
+    Convert pages of a PDF to markdown, one by one within budgets.
+
+    Args:
+        pdf_path: PDF file
+        indices: 0-based indices of the pages to convert (default: all)
+        engine: Preferred engine (default: LayoutEngine with the book's headings)
+        fallback: Engine for pages the preferred one can't convert within
+            budget (default: FastTextEngine). Runs in this process, so it
+            should be fast and unable to fail.
+        page_time_budget: Seconds a page may take with the preferred engine
+        page_memory_budget_mb: Memory the preferred engine's worker may use
+        cache: ConversionCache to reuse pages from and store the preferred
+            engine's pages in (not used when the preferred engine is the
+            fallback, which is cheaper than a lookup)
+        image_renderer: Renders the image regions a deferring engine
+            recorded, returning {referenced path: path written, or None if
+            the image was left out}; its finish() then returns {path
+            written: None} for the images it leaves out after all (the
+            decorative ones), and pages are pointed at the files kept.
+            Its cache_key() is part of the cache key.
+
+    Returns:
+        {index: (page markdown without its marker, engine name)}
+    """
+    fallback = fallback or FastTextEngine()
+    with fitz.open(str(pdf_path)) as doc:
+        engine = engine or LayoutEngine(hdr_info=identify_headers(doc))
+        pages: Dict[int, Tuple[str, str]] = {}
+        pending = deque(range(doc.page_count) if indices is None else sorted(set(indices)))
+        context = multiprocessing.get_context()
+
+        keys: Dict[int, str] = {}
+        if cache is not None and engine.name != fallback.name:
+            settings = engine.cache_key()
+            if image_renderer is not None:
+                settings += image_renderer.cache_key()
+            keys = {
+                index: hashlib.sha256(f"{settings}\n{page_fingerprint(doc, index)}".encode()).hexdigest()
+                for index in pending
+            }
+            cached = cache.get_many(keys.values())
+            for index in pending:
+                if keys[index] in cached:
+                    markdown = _reuse_page(engine, doc, index, *cached[keys[index]])
+                    if markdown is not None:
+                        pages[index] = (markdown, engine.name)
+            pending = deque(index for index in pending if index not in pages)
+            cache.record_lookups(len(pages), len(pending))
+        reused = set(pages)
+        overrun_streak = 0
+
+        # With no other engine to fall back to, convert everything in this process
+        while pending and engine.name != fallback.name and overrun_streak < MAX_OVERRUN_STREAK:
+            receiver, sender = context.Pipe(duplex=False)
+            process = context.Process(
+                target=_convert_worker,
+                args=(str(pdf_path), list(pending), engine, page_memory_budget_mb, sender),
+                daemon=True,
+            )
+            process.start()
+            sender.close()
+            try:
+                if not receiver.poll(WORKER_STARTUP_TIMEOUT):
+                    break
+                receiver.recv()
+
+                while pending:
+                    index = pending.popleft()
+                    text = None
+                    finished = receiver.poll(page_time_budget)
+                    crashed = False
+                    if finished:
+                        try:
+                            _, text, images = receiver.recv()
+                        except EOFError:
+                            # Worker died on this page (e.g. killed by the OS)
+                            crashed = True
+
+                    if text is not None:
+                        pages[index] = (text, engine.name)
+                        if images:
+                            engine.deferred_images.extend(images)
+                        overrun_streak = 0
+                        continue
+
+                    pages[index] = (fallback.convert_page(doc, index), fallback.name)
+                    if not finished:
+                        overrun_streak += 1
+                    if crashed or not finished:
+                        # Start a new worker from the next page
+                        break
+            except EOFError:
+                # Worker died while opening the PDF
+                break
+            finally:
+                receiver.close()
+                _stop(process)
+
+        # Whatever the preferred engine couldn't get to
+        for index in pending:
+            pages[index] = (fallback.convert_page(doc, index), fallback.name)
+
+    if image_renderer is not None and engine.deferred_images:
+        targets = image_renderer(engine.deferred_images)
+        dropped = image_renderer.finish()
+        targets = {path: None if target in dropped else target for path, target in targets.items()}
+        for index, (markdown, name) in pages.items():
+            if index not in reused and name == engine.name:
+                pages[index] = (_retarget_images(markdown, targets), name)
+
+    if keys:
+        # Pages that fell back are left out: a later conversion may manage them
+        cache.put_many({
+            keys[index]: (markdown, _page_images(engine, markdown))
+            for index, (markdown, name) in pages.items()
+            if index not in reused and name == engine.name
+        })
+    return pages
+
+
+def convert_pdf(
+    pdf_path: Path,
+    engine: Optional[ConversionEngine] = None,
+    fallback: Optional[ConversionEngine] = None,
+    page_time_budget: float = PAGE_TIME_BUDGET,
+    page_memory_budget_mb: int = PAGE_MEMORY_BUDGET_MB,
+    cache=None,
+    image_renderer: Optional[Callable[[List[Dict[str, Any]]], Dict[str, Optional[str]]]] = None,
+) -> Tuple[str, List[str]]:
+    """
+    Convert a whole PDF to markdown with page markers (see convert_pages).
+
+    Returns:
+        (markdown, name of the engine that converted each page, in page order)
+    """
+    pages = convert_pages(
+        pdf_path,
+        engine=engine,
+        fallback=fallback,
+        page_time_budget=page_time_budget,
+        page_memory_budget_mb=page_memory_budget_mb,
+        cache=cache,
+        image_renderer=image_renderer,
+    )
+    return join_pages(pages), [pages[index][1] for index in sorted(pages)]
+
+
+def join_pages(pages: Dict[int, Tuple[str, str]]) -> str:
+    """Assemble converted pages ({index: (markdown, engine)}) into one markdown document."""
+    return "".join(pages[index][0] + page_marker(index) for index in sorted(pages))
+
+
+def headers_to_json(hdr_info: pymupdf4llm.IdentifyHeaders) -> Dict[str, Any]:
+    """Heading font sizes (from identify_headers) as JSON, so they needn't be recomputed."""
+    return {
+        'body_limit': hdr_info.body_limit,
+        'header_id': {str(size): prefix for size, prefix in hdr_info.header_id.items()},
+    }
+
+
+def headers_from_json(data: Dict[str, Any]) -> pymupdf4llm.IdentifyHeaders:
+    """Rebuild identify_headers() output stored with headers_to_json()."""
+    hdr_info = pymupdf4llm.IdentifyHeaders.__new__(pymupdf4llm.IdentifyHeaders)
+    hdr_info.body_limit = data['body_limit']
+    hdr_info.header_id = {int(size): prefix for size, prefix in data['header_id'].items()}
+    return hdr_info
+
+
+def engine_runs(page_engines: List[str]) -> List[List[Any]]:
+    """
+    Compress per-page engine names into runs for storage.
+
+    Args:
+        page_engines: Engine of each page, in page order (page 1 first)
+
+    Returns:
+        [[first_page, last_page, engine], ...] with 1-based pages
+    """
+    runs: List[List[Any]] = []
+    for page, name in enumerate(page_engines, start=1):
+        if runs and runs[-1][2] == name:
+            runs[-1][1] = page
+        else:
+            runs.append([page, page, name])
+    return runs
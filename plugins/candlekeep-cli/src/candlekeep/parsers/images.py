@@ -0,0 +1,623 @@
+"""Render, encode and write the images of a converted PDF in parallel.
+
+The layout engine can defer its images (see parsers.engines): conversion
+then only records which page regions the markdown references. This module
+renders those regions in a pool of worker processes (each with the PDF
+open once), hands the encoded bytes to a pool of writer threads, and turns
+the images a book's markdown references into BookImage rows for a single
+bulk insert.
+
+Images are written compactly: with the 'auto' format each one is encoded
+as JPEG if it looks photographic (a luminance histogram of high entropy)
+and as PNG otherwise, and gray images drawn in color channels are stored
+as grayscale. A small preview variant (at most PREVIEW_MAX_SIDE pixels on
+its longer side) is written next to each larger image, so an agent can
+look at a figure before fetching it in full.
+
+Decorative images are skipped: blank ones (rules, fills) and ones repeated
+on DECORATIVE_MIN_PAGES pages or more (logos, bullets, backgrounds), found
+by their perceptual hash (see index.image_hash) among all of a book's
+images: an ImageRenderer links copies across its render calls and decides
+what is decorative once the book is rendered (drop_decorative), and a
+lazily converted book, rendered in separate batches, is checked as a whole
+when it is materialized (drop_repeated_images). A figure that appears again
+on fewer pages is written once, and its other references point to that file.
+"""
+
+import json
+import multiprocessing
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import fitz  # PyMuPDF
+import numpy as np
+
+from ..index.image_hash import (
+    DUPLICATE_DISTANCE,
+    FINE_DUPLICATE_DISTANCE,
+    FINE_HASH_SIZE,
+    BKTree,
+    dhash,
+    gray_pixels,
+    hamming,
+    hash_bands,
+    hash_to_db,
+)
+from ..utils.content_utils import split_pages
+from .engines import IMAGE_EXTENSIONS, IMAGE_REF_PATTERN, _retarget_images
+
+# Encodings images can be written in (PyMuPDF names); 'auto' picks one per image
+IMAGE_FORMATS = ('auto',) + IMAGE_EXTENSIONS
+
+DEFAULT_IMAGE_DPI = 150
+DEFAULT_IMAGE_FORMAT = 'auto'
+DEFAULT_IMAGE_PREVIEWS = True
+JPEG_QUALITY = 85
+
+# 'auto' encodes an image as JPEG when its luminance histogram has at least
+# this many bits of entropy (photographs ~7, diagrams and text well under 5)
+PHOTO_MIN_ENTROPY = 6.0
+
+# Pixels sampled per image for the entropy and grayscale checks
+SAMPLE_PIXELS = 65536
+
+# Longer side of preview variants (smaller images get none: they are cheap already)
+PREVIEW_MAX_SIDE = 256
+
+SKIP_DECORATIVE_IMAGES = True
+
+# Images whose luminance varies less than this (standard deviation) are blank
+BLANK_MAX_STD = 3.0
+
+# Images repeated on at least this many pages are decorative
+DECORATIVE_MIN_PAGES = 3
+
+# Copies differ in width and height by at most this fraction
+COPY_SIZE_TOLERANCE = 0.1
+
+# Threads writing encoded images to disk
+DEFAULT_WRITERS = 4
+
+# Images rendered per task sent to a worker process
+RENDER_BATCH_IMAGES = 16
+
+# The PDF opened once per worker process (see _open_pdf)
+_doc: Optional[fitz.Document] = None
+
+
+def default_image_workers() -> int:
+    """Render processes used when not configured: one per CPU."""
+    return os.cpu_count() or 1
+
+
+def _open_pdf(pdf_path: str):
+    global _doc
+    _doc = fitz.open(pdf_path)
+
+
+def preview_file_path(path: str) -> str:
+    """Path of an image's preview variant: <name>.preview.<ext>."""
+    stem, ext = os.path.splitext(path)
+    return f"{stem}.preview{ext}"
+
+
+def _overlapping_xref(page: fitz.Page, rect: fitz.Rect) -> int:
+    """xref of the embedded image covering most of rect (0 for vector graphics or a whole-page render)."""
+    best_xref, best_area = 0, 0.0
+    for info in page.get_image_info(xrefs=True):
+        area = abs(fitz.Rect(info['bbox']) & rect)
+        if info.get('xref') and area > best_area:
+            best_xref, best_area = info['xref'], area
+    return best_xref
+
+
+def _sample(pix: fitz.Pixmap) -> np.ndarray:
+    """Up to SAMPLE_PIXELS pixels of a pixmap, one row per pixel."""
+    samples = np.frombuffer(pix.samples, dtype=np.uint8).reshape(-1, pix.n)
+    return samples[::max(1, len(samples) // SAMPLE_PIXELS)]
+
+
+def _compact(pix: fitz.Pixmap) -> fitz.Pixmap:
+    """The pixmap as grayscale if its color channels are all equal (lossless)."""
+    if pix.n == 3 and not pix.alpha:
+        samples = np.frombuffer(pix.samples, dtype=np.uint8).reshape(-1, 3)
+        if (samples[:, 0] == samples[:, 1]).all() and (samples[:, 1] == samples[:, 2]).all():
+            return fitz.Pixmap(fitz.csGRAY, pix)
+    return pix
+
+
+def _is_photo(pix: fitz.Pixmap) -> bool:
+    """Whether an image is photographic: opaque, with a high-entropy luminance histogram."""
+    if pix.alpha:
+        return False
+    luminance = _sample(pix)[:, :3].mean(axis=1).astype(np.uint8)
+    p = np.bincount(luminance, minlength=256) / len(luminance)
+    p = p[p > 0]
+    return float(-(p * np.log2(p)).sum()) >= PHOTO_MIN_ENTROPY
+
+
+def _encode(pix: fitz.Pixmap, image_format: str) -> bytes:
+    if image_format == 'jpg':
+        return pix.tobytes('jpg', jpg_quality=JPEG_QUALITY)
+    return pix.tobytes(image_format)
+
+
+def _render_batch(
+    jobs: List[Dict[str, Any]],
+    dpi: int,
+    image_format: str,
+    previews: bool = False,
+    skip_blank: bool = False,
+) -> List[Tuple[Dict[str, Any], List[Tuple[str, bytes]], Dict[str, Any]]]:
+    """
+    Render and encode deferred image regions, and their previews (in a
+    worker process, or in this one after _open_pdf).
+
+    Returns:
+        (job, [(path, encoded bytes), ...], image info) for each job; blank
+        images are not encoded when skip_blank is set
+    """
+    results = []
+    page = None
+    for job in jobs:
+        if page is None or page.number != job['page']:
+            page = _doc[job['page']]
+            # The regions were recorded on the unrotated page (as pymupdf4llm converts it)
+            page.remove_rotation()
+        rect = fitz.Rect(job['rect'])
+        rendered = page.get_pixmap(clip=rect, dpi=dpi)
+        gray = gray_pixels(rendered)
+        if skip_blank and gray.std() < BLANK_MAX_STD:
+            results.append((job, [], {'file_path': job['path'], 'skipped': 'blank'}))
+            continue
+        pix = _compact(rendered)
+        chosen = image_format
+        if image_format == 'auto':
+            chosen = 'jpg' if _is_photo(pix) else 'png'
+        data = _encode(pix, chosen)
+        path = f"{os.path.splitext(job['path'])[0]}.{chosen}"
+        files = [(path, data)]
+        info = {
+            'file_path': path,
+            'width': pix.width,
+            'height': pix.height,
+            'format': chosen,
+            'colorspace': pix.colorspace.name if pix.colorspace else None,
+            'has_transparency': bool(pix.alpha),
+            'file_size': len(data),
+            'xref': _overlapping_xref(page, rect),
+            'phash': dhash(gray),
+            'fine_hash': dhash(gray, FINE_HASH_SIZE),
+            'skipped': None,
+            # What a full-color PNG would have taken (the encoding before 'auto')
+            'baseline_size': len(data) if pix is rendered and chosen == 'png' else len(rendered.tobytes('png')),
+            'preview_path': None,
+            'preview_width': None,
+            'preview_height': None,
+            'preview_file_size': None,
+        }
+
+        if previews and max(pix.width, pix.height) > PREVIEW_MAX_SIDE:
+            zoom = dpi / 72 * PREVIEW_MAX_SIDE / max(pix.width, pix.height)
+            preview = _compact(page.get_pixmap(clip=rect, matrix=fitz.Matrix(zoom, zoom)))
+            preview_data = _encode(preview, chosen)
+            files.append((preview_file_path(path), preview_data))
+            info.update({
+                'preview_path': preview_file_path(path),
+                'preview_width': preview.width,
+                'preview_height': preview.height,
+                'preview_file_size': len(preview_data),
+            })
+        results.append((job, files, info))
+    return results
+
+
+def _write(path: str, data: bytes):
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def render_images(
+    pdf_path: str,
+    jobs: List[Dict[str, Any]],
+    dpi: int = DEFAULT_IMAGE_DPI,
+    image_format: str = DEFAULT_IMAGE_FORMAT,
+    workers: Optional[int] = None,
+    writers: int = DEFAULT_WRITERS,
+    previews: bool = DEFAULT_IMAGE_PREVIEWS,
+    skip_decorative: bool = SKIP_DECORATIVE_IMAGES,
+    originals: Optional[BKTree] = None,
+) -> Tuple[Dict[str, Dict[str, Any]], float]:
+    """
+    Render deferred image regions and write them to their paths.
+
+    Images repeated on many pages are only known once the whole book is
+    rendered: pass the result (of every call, for a book rendered in
+    batches) to drop_decorative then.
+
+    Args:
+        pdf_path: The PDF the regions were recorded from
+        jobs: Regions from a deferring engine's deferred_images
+        dpi: Resolution
+        image_format: One of IMAGE_FORMATS; images are written with its
+            extension, which for 'auto' may differ from the one in the
+            job's path
+        workers: Render processes (default: one per CPU; 1 renders in this process)
+        writers: File writing threads
+        previews: Also write preview variants of larger images
+        skip_decorative: Leave out blank images, and write images that
+            repeat once
+        originals: Images of the book written by earlier calls, by hash
+            (updated with this call's), so their copies aren't written again
+
+    Returns:
+        ({job path: image info (file_path, page (0-based), width, height,
+        format, colorspace, has_transparency, file_size, xref, phash
+        (unsigned), baseline_size, the preview_* fields, and skipped: None,
+        'blank', 'decorative' (an earlier call's image, dropped) or 'copy'
+        (written as file_path by another job))}, seconds taken)
+
+    Raises:
+        ValueError: If image_format is not supported
+    """
+    if image_format not in IMAGE_FORMATS:
+        raise ValueError(f"Unknown image format: {image_format}. Use one of: {', '.join(IMAGE_FORMATS)}")
+    started = time.perf_counter()
+    if not jobs:
+        return {}, 0.0
+
+    # Batches of one page's images (pages render faster with their page loaded once)
+    by_page: Dict[int, List[Dict[str, Any]]] = defaultdict(list)
+    for job in jobs:
+        by_page[job['page']].append(job)
+    batches: List[List[Dict[str, Any]]] = []
+    for page in sorted(by_page):
+        page_jobs = by_page[page]
+        batches.extend(page_jobs[i:i + RENDER_BATCH_IMAGES] for i in range(0, len(page_jobs), RENDER_BATCH_IMAGES))
+
+    workers = min(workers or default_image_workers(), len(batches))
+    rendered: Dict[str, Dict[str, Any]] = {}
+    # Images of the book written so far, by hash
+    originals = BKTree() if originals is None else originals
+    with ThreadPoolExecutor(max_workers=writers) as writer_pool:
+        writes = []
+
+        def _hand_off(results):
+            for job, files, info in results:
+                info['page'] = job['page']
+                rendered[job['path']] = info
+                if info['skipped']:
+                    continue
+                if skip_decorative:
+                    original = _original_of(originals, info)
+                    if original is not None:
+                        # A copy of an image already dropped as decorative is decorative too
+                        info.update(skipped=original['skipped'] or 'copy', file_path=original['file_path'])
+                        continue
+                    originals.add(info['phash'], info)
+                os.makedirs(os.path.dirname(job['path']), exist_ok=True)
+                for path, data in files:
+                    writes.append(writer_pool.submit(_write, path, data))
+
+        if workers <= 1:
+            _open_pdf(pdf_path)
+            try:
+                for batch in batches:
+                    _hand_off(_render_batch(batch, dpi, image_format, previews, skip_decorative))
+            finally:
+                _doc.close()
+        else:
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context(),
+                initializer=_open_pdf,
+                initargs=(pdf_path,),
+            ) as render_pool:
+                for results in render_pool.map(
+                    _render_batch,
+                    batches,
+                    [dpi] * len(batches),
+                    [image_format] * len(batches),
+                    [previews] * len(batches),
+                    [skip_decorative] * len(batches),
+                ):
+                    _hand_off(results)
+
+        for write in writes:
+            write.result()
+
+    return rendered, time.perf_counter() - started
+
+
+def _original_of(originals: BKTree, info: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Info of an image already written that info's image is a copy of (close hashes, same size)."""
+    for _, original in originals.find(info['phash'], DUPLICATE_DISTANCE):
+        if (
+            hamming(original['fine_hash'], info['fine_hash']) <= FINE_DUPLICATE_DISTANCE
+            and abs(original['width'] - info['width']) <= COPY_SIZE_TOLERANCE * original['width']
+            and abs(original['height'] - info['height']) <= COPY_SIZE_TOLERANCE * original['height']
+        ):
+            return original
+    return None
+
+
+def drop_decorative(rendered: Dict[str, Dict[str, Any]]) -> Dict[str, None]:
+    """
+    Leave out the images found (themselves or as copies) on
+    DECORATIVE_MIN_PAGES pages or more of a book, deleting their files.
+
+    Args:
+        rendered: Info of all the book's images rendered so far (see
+            render_images); the dropped ones are marked 'decorative'
+
+    Returns:
+        {file path: None} for each file dropped, to retarget the pages
+        referencing it (see parsers.engines)
+    """
+    pages_of: Dict[str, set] = defaultdict(set)
+    for info in rendered.values():
+        if info['skipped'] in (None, 'copy'):
+            pages_of[info['file_path']].add(info['page'])
+    decorative = {path for path, pages in pages_of.items() if len(pages) >= DECORATIVE_MIN_PAGES}
+    for info in rendered.values():
+        if info['skipped'] in (None, 'copy') and info['file_path'] in decorative:
+            if info['skipped'] is None:
+                for name in (info['file_path'], info['preview_path']):
+                    if name:
+                        os.remove(name)
+            info['skipped'] = 'decorative'
+    return dict.fromkeys(decorative)
+
+
+class ImageRenderer:
+    """
+    Image renderer for a conversion (see parsers.engines.convert_pages):
+    renders the deferred images with render_images and keeps what was
+    rendered, for book_image_rows and reporting, and the images written,
+    so copies are linked and decorative images found across all its calls.
+    """
+
+    def __init__(
+        self,
+        pdf_path: str,
+        dpi: int = DEFAULT_IMAGE_DPI,
+        image_format: str = DEFAULT_IMAGE_FORMAT,
+        workers: Optional[int] = None,
+        previews: bool = DEFAULT_IMAGE_PREVIEWS,
+        skip_decorative: bool = SKIP_DECORATIVE_IMAGES,
+    ):
+        """
+        Args:
+            pdf_path: The PDF being converted
+            dpi, image_format, workers, previews: See render_images
+            skip_decorative: Leave out blank images, write images that
+                repeat once, and leave out much repeated ones on finish()
+
+        Raises:
+            ValueError: If image_format is not supported
+        """
+        if image_format not in IMAGE_FORMATS:
+            raise ValueError(f"Unknown image format: {image_format}. Use one of: {', '.join(IMAGE_FORMATS)}")
+        self.pdf_path = pdf_path
+        self.dpi = dpi
+        self.image_format = image_format
+        self.workers = workers
+        self.previews = previews
+        self.skip_decorative = skip_decorative
+        # {job path: image info} of everything rendered, and the time it took
+        self.rendered: Dict[str, Dict[str, Any]] = {}
+        # Images written so far by hash, so later calls link their copies
+        self.originals = BKTree()
+        self.seconds = 0.0
+        # Why rendering failed, if it did (the pages then lose their images)
+        self.error: Optional[str] = None
+
+    @property
+    def naming_format(self) -> str:
+        """Extension the conversion names images with ('auto' images written as JPEG are renamed)."""
+        return 'png' if self.image_format == 'auto' else self.image_format
+
+    def cache_key(self) -> str:
+        """Settings that change the pages' image references (see ConversionEngine.cache_key)."""
+        return json.dumps({
+            'image_format': self.image_format,
+            'previews': self.previews,
+            'skip_decorative': self.skip_decorative,
+        }, sort_keys=True)
+
+    def __call__(self, jobs: List[Dict[str, Any]]) -> Dict[str, Optional[str]]:
+        """
+        Render deferred image regions.
+
+        Returns:
+            {referenced path: path written, or None for images left out}
+        """
+        try:
+            rendered, seconds = render_images(
+                self.pdf_path, jobs, self.dpi, self.image_format, self.workers,
+                previews=self.previews, skip_decorative=self.skip_decorative, originals=self.originals,
+            )
+        except Exception as e:
+            self.error = str(e)
+            return {job['path']: None for job in jobs}
+        self.rendered.update(rendered)
+        self.seconds += seconds
+        return {
+            path: None if info['skipped'] in ('blank', 'decorative') else info['file_path']
+            for path, info in rendered.items()
+        }
+
+    def finish(self) -> Dict[str, None]:
+        """
+        Leave out the images repeated on many pages, once all the images
+        this renderer is given are rendered (see drop_decorative).
+
+        Returns:
+            {written path: None} for the images left out
+        """
+        if not self.skip_decorative:
+            return {}
+        return drop_decorative(self.rendered)
+
+
+def image_bytes_saved(rendered: Dict[str, Dict[str, Any]]) -> Tuple[int, int]:
+    """
+    Bytes the compact encodings saved over full-color PNGs.
+
+    Returns:
+        (bytes saved, bytes the PNGs would have taken)
+    """
+    written = [info for info in rendered.values() if not info['skipped']]
+    baseline = sum(info['baseline_size'] for info in written)
+    return baseline - sum(info['file_size'] for info in written), baseline
+
+
+def skipped_image_counts(rendered: Dict[str, Dict[str, Any]]) -> Dict[str, int]:
+    """Images render_images and drop_decorative skipped: {'blank': n, 'decorative': n, 'copy': n}."""
+    counts = {'blank': 0, 'decorative': 0, 'copy': 0}
+    for info in rendered.values():
+        if info['skipped']:
+            counts[info['skipped']] += 1
+    return counts
+
+
+def describe_image(path: str) -> Dict[str, Any]:
+    """
+    Image info (as render_images returns it) of an image file written
+    earlier, with its preview if there is one; xref is unknown (0).
+    """
+    pix = fitz.Pixmap(path)
+    gray = gray_pixels(pix)
+    info = {
+        'phash': dhash(gray),
+        'fine_hash': dhash(gray, FINE_HASH_SIZE),
+        'file_path': path,
+        'width': pix.width,
+        'height': pix.height,
+        'format': os.path.splitext(path)[1].lstrip('.').lower(),
+        'colorspace': pix.colorspace.name if pix.colorspace else None,
+        'has_transparency': bool(pix.alpha),
+        'file_size': os.path.getsize(path),
+        'xref': 0,
+        'preview_path': None,
+        'preview_width': None,
+        'preview_height': None,
+        'preview_file_size': None,
+    }
+    preview_path = preview_file_path(path)
+    if os.path.exists(preview_path):
+        preview = fitz.Pixmap(preview_path)
+        info.update({
+            'preview_path': preview_path,
+            'preview_width': preview.width,
+            'preview_height': preview.height,
+            'preview_file_size': os.path.getsize(preview_path),
+        })
+    return info
+
+
+def drop_repeated_images(markdown_text: str) -> Tuple[str, Dict[str, Dict[str, Any]]]:
+    """
+    Skip repeated and decorative images across a book whose pages were
+    rendered by separate renderers (a lazily converted book): files that
+    copy an image met earlier in the book are deleted and their references
+    pointed at it, then drop_decorative leaves out those on many pages.
+
+    Args:
+        markdown_text: The book's markdown, with page markers
+
+    Returns:
+        (the markdown with its image references updated, {file path: image
+        info (see describe_image)} of the files kept, for book_image_rows)
+    """
+    layout = split_pages(markdown_text) or [(1, 0, len(markdown_text))]
+    originals = BKTree()
+    # Image info of each (path, page) reference
+    found: Dict[Tuple[str, int], Dict[str, Any]] = {}
+    targets: Dict[str, str] = {}
+    for page_number, start, end in layout:
+        for path in IMAGE_REF_PATTERN.findall(markdown_text, start, end):
+            if (path, page_number) in found:
+                continue
+            if path in targets:
+                found[path, page_number] = {'file_path': targets[path], 'page': page_number, 'skipped': 'copy'}
+                continue
+            if not os.path.exists(path):
+                continue
+            info = describe_image(path)
+            info.update(page=page_number, skipped=None)
+            original = _original_of(originals, info)
+            if original is None:
+                originals.add(info['phash'], info)
+            else:
+                for name in (path, info['preview_path']):
+                    if name:
+                        os.remove(name)
+                info.update(skipped='copy', file_path=original['file_path'])
+            targets[path] = info['file_path']
+            found[path, page_number] = info
+
+    dropped = drop_decorative(found)
+    kept = {info['file_path']: info for info in found.values() if info['skipped'] is None}
+    markdown_text = _retarget_images(markdown_text, {
+        path: None if target in dropped else target for path, target in targets.items()
+    })
+    return markdown_text, kept
+
+
+# Image info fields stored in BookImage
+_ROW_COLUMNS = (
+    'file_path', 'width', 'height', 'format', 'colorspace', 'has_transparency', 'file_size', 'xref',
+    'preview_path', 'preview_width', 'preview_height', 'preview_file_size', 'phash',
+)
+
+
+def book_image_rows(
+    book_id: int,
+    markdown_text: str,
+    rendered: Optional[Dict[str, Dict[str, Any]]] = None,
+    page_labels: Optional[Dict[int, int]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    BookImage rows for the image files a book's markdown references.
+
+    Args:
+        book_id: Book ID
+        markdown_text: The book's markdown, with page markers
+        rendered: Info of images just rendered (render_images); other
+            referenced files (e.g. reused from the conversion cache) are read
+        page_labels: {physical page: printed page number}
+
+    Returns:
+        Row mappings in page order, for one bulk insert: one per image file
+        (at its first reference); references to missing files are skipped
+    """
+    # Rendered images by the path they were written to, which the markdown references
+    written = {info['file_path']: info for info in (rendered or {}).values() if not info['skipped']}
+    page_labels = page_labels or {}
+    layout = split_pages(markdown_text) or [(1, 0, len(markdown_text))]
+    rows = []
+    recorded = set()
+    for page_number, start, end in layout:
+        for path in IMAGE_REF_PATTERN.findall(markdown_text, start, end):
+            if path in recorded:
+                continue
+            recorded.add(path)
+            info = written.get(path)
+            if info is None:
+                if not os.path.exists(path):
+                    continue
+                info = describe_image(path)
+            row = {column: info[column] for column in _ROW_COLUMNS}
+            row.update(hash_bands(info['phash']))
+            row.update({
+                'phash': hash_to_db(info['phash']),
+                'book_id': book_id,
+                'page_number': page_number,
+                'printed_page_number': page_labels.get(page_number),
+            })
+            rows.append(row)
+    return rows
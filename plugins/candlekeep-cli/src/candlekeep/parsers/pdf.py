@@ -6,10 +6,22 @@ from pathlib import Path
 from typing import Dict, Optional, Any, List
 
 import fitz  # PyMuPDF
-import pymupdf4llm
 
+from ..db.conversion_cache import ConversionCache
+from ..utils.content_utils import label_runs
 from ..utils.file_utils import parse_filename_metadata
 from ..utils.image_utils import get_absolute_image_path
+from .boilerplate import strip_boilerplate
+from .toc_synthesis import synthesize_toc
+from .engines import (
+    ENGINES,
+    PAGE_TIME_BUDGET,
+    FastTextEngine,
+    LayoutEngine,
+    convert_pdf,
+    engine_runs,
+    identify_headers,
+)
 
 
 class PDFParser:
@@ -36,6 +48,12 @@ class PDFParser:
         except Exception as e:
             raise ValueError(f"Invalid PDF file: {e}")
 
+        # Engine that converted each page, set by convert_to_markdown()
+        self.page_engines: List[str] = []
+        self.reused_pages = 0
+        self.page_labels: Dict[int, int] = {}
+        self.boilerplate: Dict[str, int] = {}
+
     def __enter__(self):
         """Context manager entry."""
         return self
@@ -57,8 +75,12 @@ class PDFParser:
         embedded = self._extract_embedded_metadata()
         metadata.update(embedded)
 
-        # Extract table of contents
+        # Extract table of contents (synthesized from headings without an outline)
         toc = self._extract_table_of_contents()
+        metadata['toc_synthesized'] = False
+        if not toc:
+            toc = synthesize_toc(self.doc)
+            metadata['toc_synthesized'] = bool(toc)
         metadata['chapter_count'] = len(toc)
         metadata['table_of_contents'] = toc
 
@@ -177,51 +199,90 @@ class PDFParser:
         extract_images: bool = False,
         image_path: Optional[Path] = None,
         dpi: int = 150,
-        size_limit: float = 0.05
+        size_limit: float = 0.05,
+        engine: str = "layout",
+        page_time_budget: float = PAGE_TIME_BUDGET,
+        use_cache: bool = True,
+        remove_boilerplate: bool = True,
+        image_format: str = "png",
+        image_renderer=None,
     ) -> str:
         """
-        Convert PDF to markdown using pymupdf4llm with page separators.
+        Convert PDF to markdown with page separators, page by page.
+
+        Pages the layout engine can't convert within page_time_budget (or
+        its memory budget) fall back to the fast plain-text engine; see
+        parsers.engines. The engine used for each page is left in
+        self.page_engines, and the number of pages reused from the
+        conversion cache in self.reused_pages. Running headers, footers and
+        page numbers are removed (see parsers.boilerplate); the printed page
+        numbers found in them are left in self.page_labels and the removal
+        statistics in self.boilerplate. With an image_renderer
+        (parsers.images.ImageRenderer), images are rendered by it once the
+        pages are converted instead of during conversion.
 
         Args:
             extract_images: Whether to extract and save images (default: False)
             image_path: Directory to save extracted images (required if extract_images=True)
             dpi: Image resolution in DPI (default: 150)
             size_limit: Minimum image size as fraction of page area (default: 0.05 = 5%)
+            engine: Preferred engine, "layout" (pymupdf4llm) or "fast" (text layer only)
+            page_time_budget: Seconds a page may take with the layout engine
+            use_cache: Reuse pages converted before (in any book) with the
+                same content and settings, and cache newly converted ones
+            remove_boilerplate: Strip running headers, footers and page numbers
+            image_format: Image file format, "png" or "jpg"
+            image_renderer: Renders the images after conversion (see
+                parsers.engines.convert_pages)
 
         Returns:
             Markdown content as string with page markers (--- end of page=N ---)
 
         Raises:
-            ValueError: If extract_images=True but image_path is None
+            ValueError: If extract_images=True but image_path is None, or the engine is unknown
         """
         if extract_images and image_path is None:
             raise ValueError("image_path required when extract_images=True")
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown conversion engine: {engine}. Use one of: {', '.join(ENGINES)}")
 
         try:
-            # Prepare arguments for pymupdf4llm
-            conversion_args = {
-                "page_separators": True,  # Add page markers for content extraction
-            }
-
-            # Add image extraction parameters if requested
-            if extract_images:
-                conversion_args.update({
-                    "write_images": True,
-                    "image_path": str(image_path),
-                    "dpi": dpi,
-                    "image_size_limit": size_limit,
-                })
-
-            # Use pymupdf4llm for conversion
-            md_text = pymupdf4llm.to_markdown(
-                str(self.pdf_path),
-                **conversion_args
+            if engine == FastTextEngine.name:
+                preferred = FastTextEngine()
+            else:
+                # Add image extraction parameters if requested
+                conversion_args = {}
+                if extract_images:
+                    conversion_args.update({
+                        "write_images": True,
+                        "image_path": str(image_path),
+                        "image_format": image_format,
+                        "dpi": dpi,
+                        "image_size_limit": size_limit,
+                    })
+                preferred = LayoutEngine(
+                    hdr_info=identify_headers(self.doc), defer_images=image_renderer is not None, **conversion_args
+                )
+
+            cache = ConversionCache() if use_cache else None
+            md_text, self.page_engines = convert_pdf(
+                self.pdf_path,
+                engine=preferred,
+                page_time_budget=page_time_budget,
+                cache=cache,
+                image_renderer=image_renderer,
             )
+            if cache is not None:
+                self.reused_pages = cache.hits
+                cache.close()
+            if remove_boilerplate:
+                md_text, self.page_labels, self.boilerplate = strip_boilerplate(md_text)
             return md_text
         except Exception as e:
             raise ValueError(f"Failed to convert PDF to markdown: {e}")
 
-    def count_words(self, text: str) -> int:
+    @staticmethod
+    def count_words(text: str) -> int:
         """
         Count words in text.
 
@@ -249,6 +310,21 @@ class PDFParser:
         first_page = self.doc[0]
         return first_page.get_text()
 
+    def extract_page_texts(self, page_indices: List[int]) -> List[str]:
+        """
+        Extract the plain text layer of selected pages, without markdown conversion.
+
+        This is orders of magnitude faster than convert_to_markdown(), so it
+        suits quick checks before committing to a full conversion.
+
+        Args:
+            page_indices: 0-based page indices
+
+        Returns:
+            Text of each page, in the same order
+        """
+        return [self.doc[index].get_text() for index in page_indices]
+
     @staticmethod
     def convert_image_paths_to_absolute(
         markdown_content: str,
@@ -408,7 +484,9 @@ class PDFParser:
 
 def parse_pdf(
     pdf_path: Path,
-    convert_to_md: bool = True
+    convert_to_md: bool = True,
+    engine: str = "layout",
+    page_time_budget: float = PAGE_TIME_BUDGET,
 ) -> Dict[str, Any]:
     """
     Parse PDF and extract all metadata and content.
@@ -416,12 +494,19 @@ def parse_pdf(
     Args:
         pdf_path: Path to PDF file
         convert_to_md: Whether to convert to markdown (default: True)
+        engine: Preferred conversion engine (see PDFParser.convert_to_markdown)
+        page_time_budget: Seconds a page may take with the layout engine
 
     Returns:
         Dictionary containing:
         - All metadata fields
         - markdown_content (if convert_to_md=True)
         - word_count (if convert_to_md=True)
+        - conversion_engines (if convert_to_md=True): [first_page, last_page, engine] runs
+        - reused_pages (if convert_to_md=True): pages taken from the conversion cache
+        - page_labels (if convert_to_md=True): printed page numbers found in
+          headers and footers, as runs (see utils.content_utils.label_runs), or None
+        - boilerplate (if convert_to_md=True): header/footer removal statistics
 
     Raises:
         FileNotFoundError: If PDF doesn't exist
@@ -433,8 +518,12 @@ def parse_pdf(
 
         # Convert to markdown if requested
         if convert_to_md:
-            markdown_content = parser.convert_to_markdown()
+            markdown_content = parser.convert_to_markdown(engine=engine, page_time_budget=page_time_budget)
             metadata['markdown_content'] = markdown_content
             metadata['word_count'] = parser.count_words(markdown_content)
+            metadata['conversion_engines'] = engine_runs(parser.page_engines)
+            metadata['reused_pages'] = parser.reused_pages
+            metadata['page_labels'] = label_runs(parser.page_labels) or None
+            metadata['boilerplate'] = parser.boilerplate
 
         return metadata
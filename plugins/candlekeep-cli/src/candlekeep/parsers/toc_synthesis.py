@@ -0,0 +1,207 @@
+"""Build a table of contents from heading fonts, for PDFs without an outline.
+
+Scanned and exported PDFs often have no outline (`doc.get_toc()` is empty),
+which leaves agents without a map of the book. This stage reads every text
+line once (font size, boldness, position, length) into NumPy arrays and
+finds the body text size, the size with the most characters. Short lines
+set larger than the body, or bold at body size, are heading candidates;
+their sizes are clustered into tiers (sizes less than SIZE_GAP points apart
+are one tier, bold and regular apart), and the largest MAX_LEVELS tiers
+become TOC levels 1, 2, ... Tiers that are too common to be headings (bold
+words in running text) or too rare (a cover title) are dropped, as are
+running headers repeated at the top or bottom of many pages.
+
+Entries have the same shape as the PDF outline's (level, title, page), so
+the rest of the pipeline treats them alike; the book is flagged as having a
+synthesized TOC (Book.toc_synthesized).
+"""
+
+import math
+import re
+from typing import Any, Dict, List, Tuple
+
+import fitz  # PyMuPDF
+import numpy as np
+
+from .boilerplate import MIN_REPEAT_FRACTION, MIN_REPEAT_PAGES, normalize_line
+
+# Heading levels kept (largest tiers first)
+MAX_LEVELS = 3
+
+# Font sizes closer than this (points) belong to the same tier
+SIZE_GAP = 1.0
+
+# A line is a heading candidate if it is at least this much larger than the body text
+MIN_HEADING_RATIO = 1.15
+
+# Longer lines, or lines of longer blocks, are text, not headings
+MAX_TITLE_CHARS = 120
+MAX_TITLE_LINES = 3
+
+# Body-size bold lines are emphasis, not headings, when more than this many
+# per page on average are candidates, or fewer than MIN_BOLD_STANDALONE of
+# all body-size bold lines stand alone (the rest being inside paragraphs)
+MAX_BOLD_PER_PAGE = 1.5
+MIN_BOLD_STANDALONE = 0.5
+
+# A tier needs at least this many headings (a cover title is not a chapter)
+MIN_TIER_ENTRIES = 2
+
+# Top and bottom share of the page where running headers and footers sit
+EDGE_BAND = 0.1
+
+# Text extraction without images or ligature handling, which headings don't need
+_TEXT_FLAGS = fitz.TEXT_MEDIABOX_CLIP
+
+_HAS_LETTER = re.compile(r'[^\W\d_]')
+
+# Dot leaders of a printed contents page ("Introduction . . . . 1")
+_DOT_LEADER = re.compile(r'(?:\.\s*){4,}\S*$')
+
+
+def _collect_lines(doc: fitz.Document) -> Tuple[Dict[str, np.ndarray], List[str]]:
+    """
+    Read every text line of the document in one pass.
+
+    Returns:
+        (columns, texts): NumPy columns page (0-based), block, size (largest
+        span), bold, top (as a fraction of page height), chars;
+        and the line texts in the same order
+    """
+    pages, blocks, sizes, bolds, tops, chars = [], [], [], [], [], []
+    texts: List[str] = []
+    block_number = 0
+    for index in range(doc.page_count):
+        page = doc[index]
+        page_height = page.rect.height or 1.0
+        for block in page.get_text("dict", flags=_TEXT_FLAGS)["blocks"]:
+            block_number += 1
+            for line in block.get("lines", ()):
+                spans = [span for span in line["spans"] if span["text"].strip()]
+                if not spans:
+                    continue
+                text = " ".join(span["text"].strip() for span in spans)
+                y0 = line["bbox"][1]
+                pages.append(index)
+                blocks.append(block_number)
+                sizes.append(max(span["size"] for span in spans))
+                bolds.append(all(span["flags"] & fitz.TEXT_FONT_BOLD or "bold" in span["font"].lower() for span in spans))
+                tops.append(y0 / page_height)
+                chars.append(len(text))
+                texts.append(text)
+
+    columns = {
+        'page': np.array(pages, dtype=np.int32),
+        'block': np.array(blocks, dtype=np.int32),
+        'size': np.round(np.array(sizes, dtype=np.float32) * 2) / 2,
+        'bold': np.array(bolds, dtype=bool),
+        'top': np.array(tops, dtype=np.float32),
+        'chars': np.array(chars, dtype=np.int32),
+    }
+    return columns, texts
+
+
+def _body_size(columns: Dict[str, np.ndarray]) -> float:
+    """Font size with the most characters (half-point resolution)."""
+    half_points = (columns['size'] * 2).astype(np.int64)
+    return float(np.argmax(np.bincount(half_points, weights=columns['chars']))) / 2
+
+
+def _size_tiers(sizes: np.ndarray) -> np.ndarray:
+    """
+    Cluster font sizes: sort the distinct sizes and start a new tier at
+    every gap of SIZE_GAP points or more.
+
+    Returns:
+        Tier of each size, 0 for the largest
+    """
+    distinct = np.unique(sizes)[::-1]
+    tier_of_distinct = np.concatenate(([0], np.cumsum(-np.diff(distinct) >= SIZE_GAP)))
+    return tier_of_distinct[np.searchsorted(-distinct, -sizes)]
+
+
+def _running_lines(columns: Dict[str, np.ndarray], texts: List[str], candidates: np.ndarray) -> np.ndarray:
+    """
+    Mask of candidates that are running headers or footers: lines at the
+    page edge repeated on many consecutive pages. Headings repeat too
+    ("Chapter #" once digits are masked) but not on consecutive pages.
+    """
+    page_count = int(columns['page'].max()) + 1
+    threshold = max(MIN_REPEAT_PAGES, math.ceil(MIN_REPEAT_FRACTION * page_count))
+    at_edge = (columns['top'] < EDGE_BAND) | (columns['top'] > 1 - EDGE_BAND)
+    normalized = np.array([
+        normalize_line(text) if candidate and edge else ""
+        for text, candidate, edge in zip(texts, candidates.tolist(), at_edge.tolist())
+    ])
+    # Sorted distinct (line, page) pairs; count the pages whose previous page has the same line
+    keys, inverse = np.unique(normalized, return_inverse=True)
+    pairs = np.unique(np.stack([inverse, columns['page']], axis=1), axis=0)
+    follows = (pairs[1:, 0] == pairs[:-1, 0]) & (pairs[1:, 1] == pairs[:-1, 1] + 1)
+    consecutive = np.bincount(pairs[1:, 0][follows], minlength=len(keys))
+    return (consecutive[inverse] >= threshold) & (normalized != "")
+
+
+def synthesize_toc(doc: fitz.Document) -> List[Dict[str, Any]]:
+    """
+    Build TOC entries from the document's heading fonts.
+
+    Args:
+        doc: Open PDF document
+
+    Returns:
+        List of TOC entries with level, title, and page (1-based), like
+        the PDF outline; empty if no heading structure was found
+    """
+    if not doc.page_count:
+        return []
+    columns, texts = _collect_lines(doc)
+    if not texts:
+        return []
+
+    body = _body_size(columns)
+    size, bold, chars = columns['size'], columns['bold'], columns['chars']
+    has_letter = np.array([bool(_HAS_LETTER.search(text)) and not _DOT_LEADER.search(text) for text in texts])
+    block_lines = np.bincount(columns['block'])[columns['block']]
+    enlarged = size >= body * MIN_HEADING_RATIO
+    bold_body = bold & (size >= body) & ~enlarged
+    short = has_letter & (chars <= MAX_TITLE_CHARS) & (block_lines <= MAX_TITLE_LINES)
+    candidates = short & enlarged
+    if bold_body.any() and (short & bold_body).sum() >= MIN_BOLD_STANDALONE * bold_body.sum():
+        candidates |= short & bold_body
+    candidates &= ~_running_lines(columns, texts, candidates)
+    if not candidates.any():
+        return []
+
+    # Tiers: size clusters, with bold above regular at the same size
+    indices = np.flatnonzero(candidates)
+    size_tier = _size_tiers(size[indices])
+    tier_keys = size_tier * 2 + (~bold[indices]).astype(np.int64)
+    distinct_tiers, tier_of_line, tier_counts = np.unique(tier_keys, return_inverse=True, return_counts=True)
+
+    # Multi-line titles: lines of one tier in the same block are one heading
+    starts = np.ones(len(indices), dtype=bool)
+    starts[1:] = (columns['block'][indices[1:]] != columns['block'][indices[:-1]]) | (tier_of_line[1:] != tier_of_line[:-1])
+    heading_counts = np.bincount(tier_of_line[starts], minlength=len(distinct_tiers))
+    tier_enlarged = np.zeros(len(distinct_tiers), dtype=bool)
+    np.logical_or.at(tier_enlarged, tier_of_line, enlarged[indices])
+
+    max_bold = MAX_BOLD_PER_PAGE * doc.page_count
+    kept = [
+        tier for tier in range(len(distinct_tiers))
+        if heading_counts[tier] >= MIN_TIER_ENTRIES and (tier_enlarged[tier] or tier_counts[tier] <= max_bold)
+    ][:MAX_LEVELS]
+    if not kept:
+        return []
+    level_of_tier = {tier: level for level, tier in enumerate(kept, start=1)}
+
+    entries: List[Dict[str, Any]] = []
+    for position, index in enumerate(indices.tolist()):
+        level = level_of_tier.get(int(tier_of_line[position]))
+        if level is None:
+            continue
+        if not starts[position]:
+            # Continuation of the previous line's heading
+            entries[-1]['title'] += " " + texts[index]
+            continue
+        entries.append({'level': level, 'title': texts[index], 'page': int(columns['page'][index]) + 1})
+    return entries
@@ -21,6 +21,8 @@ class Config:
         self.library_dir = self.config_dir / "library"
         self.originals_dir = self.config_dir / "originals"
         self.images_dir = self.config_dir / "images"
+        self.index_dir = self.config_dir / "index"
+        self.cache_dir = self.config_dir / "cache"
         self._config_data: Optional[Dict[str, Any]] = None
 
     def exists(self) -> bool:
@@ -98,6 +100,8 @@ class Config:
         self.library_dir.mkdir(parents=True, exist_ok=True)
         self.originals_dir.mkdir(parents=True, exist_ok=True)
         self.images_dir.mkdir(parents=True, exist_ok=True)
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
 
     @property
     def is_initialized(self) -> bool:
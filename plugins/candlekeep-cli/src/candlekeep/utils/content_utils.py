@@ -1,7 +1,250 @@
 """Content extraction utilities for markdown files with page markers."""
 
 import re
-from typing import Optional, Tuple
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+
+# Page marker emitted by pymupdf4llm: --- end of page=N --- (N is a 0-based PDF index)
+PAGE_MARKER_PATTERN = re.compile(r'--- end of page=(\d+) ---')
+
+
+# Rough characters-per-token ratio for English prose in LLM tokenizers
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate how many LLM tokens a text will cost.
+
+    Args:
+        text: Text to measure
+
+    Returns:
+        Approximate token count (about one token per four characters)
+    """
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def split_pages(markdown_text: str) -> List[Tuple[int, int, int]]:
+    """
+    Locate every page in markdown with page markers.
+
+    Args:
+        markdown_text: Markdown content with page markers
+
+    Returns:
+        List of (page_number, start, end) tuples, where page_number is 1-based
+        and start/end are character offsets of the page content (markers excluded).
+        Returns an empty list if the text has no page markers.
+
+    Examples:
+        for page_number, start, end in split_pages(md):
+            page_text = md[start:end]
+    """
+    pages = []
+    start_pos = 0
+    for match in PAGE_MARKER_PATTERN.finditer(markdown_text):
+        pages.append((int(match.group(1)) + 1, start_pos, match.start()))
+        start_pos = match.end()
+    return pages
+
+
+def iter_markdown_pages(md_path: Path, last_page: Optional[int] = None) -> Iterator[Tuple[int, str]]:
+    """
+    Read a markdown file page by page.
+
+    Streams the file, so memory is bounded by the largest page rather than
+    the whole document. Pages match split_pages(): text after the last
+    marker is ignored, and a file without markers is a single page 1.
+
+    Args:
+        md_path: Markdown file with page markers
+        last_page: Stop reading after this page number (1-based)
+
+    Yields:
+        (page_number, page text stripped of surrounding whitespace)
+    """
+    buffer: List[str] = []
+    seen_marker = False
+    with open(md_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            # Markers normally sit on their own line, but handle several per line
+            pos = 0
+            for match in PAGE_MARKER_PATTERN.finditer(line):
+                buffer.append(line[pos:match.start()])
+                page_number = int(match.group(1)) + 1
+                yield page_number, "".join(buffer).strip()
+                if last_page is not None and page_number >= last_page:
+                    return
+                buffer = []
+                seen_marker = True
+                pos = match.end()
+            buffer.append(line[pos:])
+
+    if not seen_marker:
+        yield 1, "".join(buffer).strip()
+
+
+def detect_printed_page_number(page_text: str) -> Optional[int]:
+    """
+    Find the page number printed on a page of converted markdown.
+
+    Mirrors PDFParser.detect_printed_page_number: a standalone 1-4 digit
+    number in the last (then first) five non-blank lines of the page.
+
+    Args:
+        page_text: Markdown content of one page
+
+    Returns:
+        Printed page number, or None if not detectable
+    """
+    lines = [line.strip().strip('*_#').strip() for line in page_text.splitlines()]
+    lines = [line for line in lines if line]
+
+    for line in lines[-5:] + lines[:5]:
+        if line.isdigit() and 1 <= len(line) <= 4:
+            num = int(line)
+            if 1 <= num <= 9999:
+                return num
+
+    return None
+
+
+# Markdown that marks a page as holding a table (a header separator row) or a code block
+TABLE_SEPARATOR_PATTERN = re.compile(r'^\s*\|(?:\s*:?-{3,}:?\s*\|)+\s*$', re.MULTILINE)
+CODE_FENCE_PATTERN = re.compile(r'^\s*(?:```|~~~)', re.MULTILINE)
+IMAGE_PATTERN = re.compile(r'!\[[^\]]*\]\([^)]*\)')
+
+
+def page_stats(page_text: str) -> Dict[str, Any]:
+    """
+    Size and content statistics of one page, as `pages` serves it.
+
+    Args:
+        page_text: Markdown content of one page
+
+    Returns:
+        Dictionary with word_count, char_count, token_count (estimated),
+        image_count, has_table and has_code
+    """
+    text = page_text.strip()
+    return {
+        'word_count': len(text.split()),
+        'char_count': len(text),
+        'token_count': estimate_tokens(text),
+        'image_count': len(IMAGE_PATTERN.findall(text)),
+        'has_table': TABLE_SEPARATOR_PATTERN.search(text) is not None,
+        'has_code': CODE_FENCE_PATTERN.search(text) is not None,
+    }
+
+
+def label_runs(labels: Dict[int, int]) -> List[List[int]]:
+    """
+    Compress printed page numbers into runs for storage.
+
+    Args:
+        labels: {physical page: printed page number}
+
+    Returns:
+        [[first_page, last_page, first_printed_page], ...] where printed
+        numbers grow by one with each page of a run
+    """
+    runs: List[List[int]] = []
+    for page in sorted(labels):
+        if runs and page == runs[-1][1] + 1 and labels[page] == runs[-1][2] + page - runs[-1][0]:
+            runs[-1][1] = page
+        else:
+            runs.append([page, page, labels[page]])
+    return runs
+
+
+def expand_label_runs(runs: Optional[List[List[int]]]) -> Dict[int, int]:
+    """Inverse of label_runs: {physical page: printed page number} (empty for None)."""
+    return {
+        page: printed + page - first
+        for first, last, printed in runs or []
+        for page in range(first, last + 1)
+    }
+
+
+def compute_page_layout(markdown_text: str, page_labels: Optional[Dict[int, int]] = None) -> List[Dict[str, Any]]:
+    """
+    Compute character and UTF-8 byte offsets and statistics of every page.
+
+    Byte offsets let memory-mapped scans of the markdown file map a match
+    back to its page without decoding the file; the statistics (see
+    page_stats) let agents size a request before making it.
+
+    Args:
+        markdown_text: Markdown content, with or without page markers
+        page_labels: Known printed page numbers ({physical page: printed});
+            other pages get the number detected in their text, if any
+
+    Returns:
+        List of dictionaries with page_number (1-based), char_start, char_end,
+        byte_start, byte_end, printed_page_number and the page_stats fields.
+        Books without page markers are a single page 1.
+    """
+    pages = split_pages(markdown_text) or [(1, 0, len(markdown_text))]
+
+    layout = []
+    char_pos = 0
+    byte_pos = 0
+    for page_number, start, end in pages:
+        byte_start = byte_pos + len(markdown_text[char_pos:start].encode('utf-8'))
+        byte_end = byte_start + len(markdown_text[start:end].encode('utf-8'))
+        char_pos, byte_pos = end, byte_end
+        layout.append({
+            'page_number': page_number,
+            'char_start': start,
+            'char_end': end,
+            'byte_start': byte_start,
+            'byte_end': byte_end,
+            'printed_page_number': (page_labels or {}).get(page_number)
+            or detect_printed_page_number(markdown_text[start:end]),
+            **page_stats(markdown_text[start:end]),
+        })
+    return layout
+
+
+def chunk_markdown(markdown_text: str, max_words: int = 300) -> List[Tuple[int, int, int]]:
+    """
+    Split markdown into retrieval chunks.
+
+    Books with page markers are chunked one page per chunk. Books without
+    markers (plain markdown) are split on blank lines into windows of roughly
+    max_words words, all attributed to page 1 (which is how `pages` serves them).
+
+    Args:
+        markdown_text: Markdown content, with or without page markers
+        max_words: Target chunk size for unpaged content
+
+    Returns:
+        List of (page_number, start, end) tuples with character offsets
+    """
+    pages = split_pages(markdown_text)
+    if pages:
+        return [page for page in pages if markdown_text[page[1]:page[2]].strip()]
+
+    chunks = []
+    chunk_start = None
+    chunk_end = 0
+    words = 0
+    for match in re.finditer(r'\S(?:.*?)(?=\n\s*\n|\Z)', markdown_text, re.DOTALL):
+        if chunk_start is None:
+            chunk_start = match.start()
+        chunk_end = match.end()
+        words += len(match.group(0).split())
+        if words >= max_words:
+            chunks.append((1, chunk_start, chunk_end))
+            chunk_start = None
+            words = 0
+
+    if chunk_start is not None:
+        chunks.append((1, chunk_start, chunk_end))
+
+    return chunks
 
 
 def extract_pages_from_markdown(
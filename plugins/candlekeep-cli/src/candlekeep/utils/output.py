@@ -0,0 +1,122 @@
+"""Stream command results as text, JSON, or NDJSON.
+
+Commands produce an iterator of plain-dict records (one per book, TOC
+entry, page, ...). The chosen format renders each record as soon as it is
+produced, so output of any size is written in constant memory:
+
+- text: the LLM-oriented markdown, one block per record
+- json: one JSON object holding the records in an array, written incrementally
+- ndjson: one JSON object per line per record
+"""
+
+import itertools
+import json
+import sys
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
+
+OUTPUT_FORMATS = ('text', 'json', 'ndjson')
+
+
+def validate_format(output_format: str) -> str:
+    """
+    Check an output format name.
+
+    Raises:
+        ValueError: If the format is not supported
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Invalid format: {output_format}. Use one of: {', '.join(OUTPUT_FORMATS)}")
+    return output_format
+
+
+def to_json(value: Any) -> str:
+    """Serialize a record (or any JSON value) on one line."""
+    return json.dumps(value, ensure_ascii=False)
+
+
+def peek(records: Iterable[Dict[str, Any]]) -> Tuple[bool, Iterator[Dict[str, Any]]]:
+    """
+    Check whether a record stream is empty without losing its first record.
+
+    Returns:
+        (whether there is at least one record, iterator over all records)
+    """
+    records = iter(records)
+    first = next(records, None)
+    if first is None:
+        return False, records
+    return True, itertools.chain([first], records)
+
+
+def stream_records(
+    records: Iterable[Dict[str, Any]],
+    output_format: str,
+    collection: str,
+    render_text: Callable[[Dict[str, Any]], str],
+    header: Optional[Dict[str, Any]] = None,
+    header_lines: Iterable[str] = (),
+    footer: Optional[Callable[[], Tuple[List[str], Dict[str, Any]]]] = None,
+    out: Optional[TextIO] = None,
+    flush_each: bool = False,
+) -> int:
+    """
+    Write records as they are produced.
+
+    Args:
+        records: Records to write
+        output_format: One of OUTPUT_FORMATS
+        collection: JSON key of the record array (e.g. "books")
+        render_text: Formats one record for text output
+        header: JSON fields written before the record array
+        header_lines: Text lines written before the first record
+        footer: Called after the last record; returns (text lines, JSON
+            fields) for information only known once the stream is consumed
+        out: Stream to write to (default: stdout)
+        flush_each: Flush after every record, so results of a slow producer
+            (such as grep) show up as they are found
+
+    Returns:
+        Number of records written
+    """
+    out = out or sys.stdout
+    count = 0
+
+    if output_format == 'ndjson':
+        for record in records:
+            out.write(to_json(record) + "\n")
+            count += 1
+            if flush_each:
+                out.flush()
+        out.flush()
+        return count
+
+    if output_format == 'json':
+        out.write("{")
+        for key, value in (header or {}).items():
+            out.write(f"{to_json(key)}: {to_json(value)}, ")
+        out.write(f"{to_json(collection)}: [")
+        for record in records:
+            out.write((",\n" if count else "\n") + to_json(record))
+            count += 1
+            if flush_each:
+                out.flush()
+        out.write("\n]" if count else "]")
+        for key, value in (footer()[1] if footer else {}).items():
+            out.write(f", {to_json(key)}: {to_json(value)}")
+        out.write("}\n")
+        out.flush()
+        return count
+
+    for line in header_lines:
+        out.write(line + "\n")
+    if flush_each:
+        out.flush()
+    for record in records:
+        out.write(render_text(record) + "\n")
+        count += 1
+        if flush_each:
+            out.flush()
+    for line in (footer()[0] if footer else []):
+        out.write(line + "\n")
+    out.flush()
+    return count
@@ -0,0 +1,59 @@
+"""Tag utilities."""
+
+from typing import Iterable, List, Optional
+
+from sqlalchemy.orm import Session
+
+from ..db.models import Tag
+
+
+def normalize_tag_names(names: Optional[Iterable]) -> List[str]:
+    """
+    Clean a list of tag names.
+
+    Strips whitespace, drops empty entries, and removes case-insensitive
+    duplicates while keeping the first spelling.
+
+    Args:
+        names: Raw tag names (from --tags or frontmatter)
+
+    Returns:
+        Cleaned tag names in their original order
+    """
+    seen = set()
+    cleaned = []
+    for name in names or []:
+        name = str(name).strip()
+        if name and name.lower() not in seen:
+            seen.add(name.lower())
+            cleaned.append(name)
+    return cleaned
+
+
+def get_or_create_tags(session: Session, names: Optional[Iterable]) -> List[Tag]:
+    """
+    Look up tags by name, creating any that don't exist yet.
+
+    Args:
+        session: Database session
+        names: Tag names
+
+    Returns:
+        Tag objects in the same order as the cleaned names
+    """
+    cleaned = normalize_tag_names(names)
+    if not cleaned:
+        return []
+
+    # Tag.name uses NOCASE collation, so this IN matches case-insensitively
+    existing = {tag.name.lower(): tag for tag in session.query(Tag).filter(Tag.name.in_(cleaned))}
+
+    tags = []
+    for name in cleaned:
+        tag = existing.get(name.lower())
+        if tag is None:
+            tag = Tag(name=name)
+            session.add(tag)
+            existing[name.lower()] = tag
+        tags.append(tag)
+    return tags
@@ -0,0 +1,174 @@
+"""Table of contents utilities."""
+
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from ..db.bulk import insert_rows, next_id
+from ..db.models import TocEntry
+
+
+def compute_toc_spans(toc: List[Dict[str, Any]], page_count: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Derive page spans and parent links for flat TOC entries.
+
+    A section ends on the page before the next entry at the same or a higher
+    level starts (or on the book's last page). Its parent is the nearest
+    preceding entry with a lower level.
+
+    Args:
+        toc: TOC entries as produced by the parsers (level, title, page)
+        page_count: Total pages in the book, used to close the final sections
+
+    Returns:
+        List of dictionaries with ordinal, level, title, start_page, end_page,
+        and parent (ordinal of the parent entry, or None)
+    """
+    entries = []
+    open_sections: List[int] = []  # Ordinals of sections not yet closed, outermost first
+
+    for ordinal, raw in enumerate(toc or []):
+        level = max(int(raw.get('level') or 1), 1)
+        page = raw.get('page')
+        start_page = page if isinstance(page, int) else None
+
+        # Close every open section at this level or deeper
+        while open_sections and entries[open_sections[-1]]['level'] >= level:
+            _close_section(entries[open_sections.pop()], start_page)
+
+        entries.append({
+            'ordinal': ordinal,
+            'level': level,
+            'title': (raw.get('title') or '').strip() or 'Untitled',
+            'start_page': start_page,
+            'end_page': None,
+            'parent': open_sections[-1] if open_sections else None,
+        })
+        open_sections.append(ordinal)
+
+    for ordinal in open_sections:
+        _close_section(entries[ordinal], page_count + 1 if page_count else None)
+
+    return entries
+
+
+def _close_section(entry: Dict[str, Any], next_start: Optional[int]):
+    """Set a section's end page given where the following section starts."""
+    start = entry['start_page']
+    if not start or start < 1 or not next_start or next_start < 1:
+        return
+    entry['end_page'] = max(start, next_start - 1)
+
+
+def insert_toc_entries(
+    session: Session,
+    book_id: int,
+    toc: List[Dict[str, Any]],
+    page_count: Optional[int] = None,
+) -> int:
+    """
+    Insert a book's TocEntry rows (with parent links) in one bulk insert.
+
+    IDs are assigned up front so children can point at their parents
+    without a round trip per entry; the book must already be flushed in
+    the session, which makes its transaction the database's only writer.
+
+    Args:
+        session: Database session
+        book_id: Book ID
+        toc: TOC entries as produced by the parsers (level, title, page)
+        page_count: Total pages in the book
+
+    Returns:
+        Number of entries inserted
+    """
+    spans = compute_toc_spans(toc, page_count)
+    first_id = next_id(session, TocEntry) if spans else 0
+    return insert_rows(session, TocEntry, (
+        {
+            'id': first_id + span['ordinal'],
+            'book_id': book_id,
+            'parent_id': first_id + span['parent'] if span['parent'] is not None else None,
+            'ordinal': span['ordinal'],
+            'level': span['level'],
+            'title': span['title'],
+            'start_page': span['start_page'],
+            'end_page': span['end_page'],
+        }
+        for span in spans
+    ))
+
+
+def build_title_match(query: str) -> Tuple[Optional[str], List[str]]:
+    """
+    Turn a title search into a trigram FTS5 MATCH expression.
+
+    The trigram tokenizer only indexes terms of three or more characters, so
+    shorter terms are returned separately for a LIKE filter.
+
+    Args:
+        query: Free-text title query
+
+    Returns:
+        (MATCH expression or None, list of short terms)
+    """
+    terms = re.findall(r'\w+', query.lower())
+    long_terms = [term for term in terms if len(term) >= 3]
+    short_terms = [term for term in terms if len(term) < 3]
+    match = " AND ".join(f'"{term}"' for term in long_terms) if long_terms else None
+    return match, short_terms
+
+
+def search_toc_entries(
+    session: Session,
+    query: str,
+    limit: int = 20,
+    book_ids: Optional[List[int]] = None,
+) -> List[TocEntry]:
+    """
+    Find TOC sections across the library whose titles contain every query term.
+
+    Args:
+        session: Database session
+        query: Free-text title query
+        limit: Maximum number of sections to return
+        book_ids: Restrict search to these books (default: all)
+
+    Returns:
+        Matching TocEntry objects, best match first
+    """
+    match, short_terms = build_title_match(query)
+    if match is None and not short_terms:
+        return []
+
+    if match is not None:
+        sql = (
+            "SELECT toc_entries.id FROM toc_fts "
+            "JOIN toc_entries ON toc_entries.id = toc_fts.rowid "
+            "WHERE toc_fts MATCH :match"
+        )
+        order = " ORDER BY bm25(toc_fts), toc_entries.book_id, toc_entries.ordinal"
+    else:
+        sql = "SELECT toc_entries.id FROM toc_entries WHERE 1 = 1"
+        order = " ORDER BY toc_entries.book_id, toc_entries.ordinal"
+
+    params: Dict[str, Any] = {"match": match, "limit": limit}
+    for i, term in enumerate(short_terms):
+        sql += f" AND toc_entries.title LIKE :term{i}"
+        params[f"term{i}"] = f"%{term}%"
+    if book_ids:
+        sql += " AND toc_entries.book_id IN (" + ", ".join(f":book{i}" for i in range(len(book_ids))) + ")"
+        params.update({f"book{i}": book_id for i, book_id in enumerate(book_ids)})
+    sql += order + " LIMIT :limit"
+
+    entry_ids = [row[0] for row in session.execute(text(sql), params)]
+    if not entry_ids:
+        return []
+
+    entries = {
+        entry.id: entry
+        for entry in session.query(TocEntry).filter(TocEntry.id.in_(entry_ids))
+    }
+    return [entries[entry_id] for entry_id in entry_ids if entry_id in entries]